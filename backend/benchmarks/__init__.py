@@ -0,0 +1,3 @@
+"""
+メタ広告審査チェッカー - ベンチマーク
+"""
@@ -0,0 +1,104 @@
+"""
+============================================
+メタ広告審査チェッカー - HTML抽出ベンチマーク
+============================================
+
+大きな日本語LP（200KB超）を合成し、BeautifulSoup版の抽出と単一パス抽出エンジンの処理時間を比較
+
+使い方（backend/ から実行）:
+    python -m benchmarks.bench_html_extraction [--sections 200] [--repeat 5]
+"""
+
+import argparse
+import logging
+import time
+from statistics import median
+
+from bs4 import BeautifulSoup
+
+from src.utils import url_fetcher
+from src.utils.html_extractor import extract_page
+
+BASE_URL = "https://example.com/lp/"
+
+COPY = [
+    "今だけ初回限定50%OFFでお試しいただけます",
+    "医師監修の独自成分で毎日の健康をサポート",
+    "最短3日で実感できたという声が続々と届いています",
+    "定期コースはいつでも解約・休止が可能です",
+    "全国送料無料、30日間の返金保証付き",
+]
+
+
+def build_lp(sections: int) -> str:
+    """ヒーロー・特徴・箇条書き・注釈のセクションを繰り返した合成LPを生成"""
+    parts = [
+        '<!DOCTYPE html><html lang="ja"><head><meta charset="utf-8">',
+        '<title>【公式】サンプルサプリ 初回限定キャンペーン</title>',
+        '<meta property="og:title" content="サンプルサプリ 公式LP">',
+        '<meta property="og:description" content="初回限定50%OFFキャンペーン実施中">',
+        '<meta property="og:image" content="/img/ogp.jpg">',
+        '<script>window.__STATE__ = {"items": [1, 2, 3]};</script>',
+        '<style>.hero{color:red}</style></head><body>',
+        '<header class="site-header"><img src="/img/logo.png"><nav><ul>',
+        ''.join(f'<li><a href="#s{i}">メニュー項目{i}</a></li>' for i in range(8)),
+        '</ul></nav></header><main>',
+    ]
+    for i in range(sections):
+        copy = COPY[i % len(COPY)]
+        parts.append(
+            f'<section id="s{i}" class="{"hero mv" if i % 10 == 0 else "feature"}">'
+            f'<h2>ポイント{i}：{copy}</h2>'
+            f'<div class="visual"><img src="/img/section{i}.jpg" width="750" height="420" alt="{copy}"></div>'
+            f'<p>{copy}。<strong>{COPY[(i + 1) % len(COPY)]}</strong>'
+            f'{"お客様の声をご紹介します。" * 6}</p>'
+            f'<ul>{"".join(f"<li>{COPY[(i + j) % len(COPY)]}（{i}-{j}）</li>" for j in range(4))}</ul>'
+            f'<aside><p>注釈{i}：効果には個人差があります。</p></aside>'
+            f'<noscript><img src="/img/fallback{i}.jpg"></noscript>'
+            '</section>'
+        )
+    parts.append('<footer><p>Copyright サンプル株式会社</p></footer></main></body></html>')
+    return ''.join(parts)
+
+
+def _beautifulsoup_extraction(html: str) -> None:
+    soup = BeautifulSoup(html, "lxml")
+    url_fetcher._extract_metadata(soup, BASE_URL)
+    url_fetcher._extract_page_text(soup)
+    url_fetcher._extract_main_images(soup, BASE_URL, max_images=url_fetcher.MAX_IMAGE_CANDIDATES, html=html)
+
+
+def _single_pass_extraction(html: str) -> None:
+    extract_page(html, BASE_URL, max_images=url_fetcher.MAX_IMAGE_CANDIDATES)
+
+
+def _measure(func, html: str, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(html)
+        timings.append(time.perf_counter() - started)
+    return median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="HTML抽出ベンチマーク")
+    parser.add_argument("--sections", type=int, default=200, help="合成LPのセクション数")
+    parser.add_argument("--repeat", type=int, default=5, help="計測回数（中央値を表示）")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    html = build_lp(args.sections)
+    size_kb = len(html.encode("utf-8")) / 1024
+
+    legacy = _measure(_beautifulsoup_extraction, html, args.repeat)
+    single_pass = _measure(_single_pass_extraction, html, args.repeat)
+
+    print(f"HTML size:        {size_kb:.0f}KB")
+    print(f"BeautifulSoup:    {legacy * 1000:.1f}ms")
+    print(f"Single-pass lxml: {single_pass * 1000:.1f}ms")
+    print(f"Speedup:          {legacy / single_pass:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+============================================
+メタ広告審査チェッカー - 画像最適化ベンチマーク
+============================================
+
+LPでよく見る画像（大きな写真JPEG・写真PNG・ベタ塗りバナー・透過画像・小さな写真）を合成し、
+従来の最適化（全体デコード → LANCZOS → 元形式で optimize=True 保存）と、
+縮小デコード＋内容別エンコードの現行実装の処理時間（ms/枚）と出力サイズを比較
+
+使い方（backend/ から実行）:
+    python -m benchmarks.bench_image_optimize [--repeat 5] [--max-dimension 1024]
+"""
+
+import argparse
+import io
+import logging
+import time
+from statistics import median
+from typing import Callable, List, Tuple
+
+from PIL import Image, ImageDraw
+
+from src.utils.image import optimize_image, AI_IMAGE_MAX_DIMENSION
+
+
+def legacy_optimize(image_data: bytes, max_dimension: int) -> bytes:
+    """従来の実装（全体デコード → LANCZOS → 元形式で optimize=True 保存）"""
+    image = Image.open(io.BytesIO(image_data))
+    image_format = image.format or "PNG"
+    width, height = image.size
+    if width > max_dimension or height > max_dimension:
+        ratio = min(max_dimension / width, max_dimension / height)
+        image = image.resize((int(width * ratio), int(height * ratio)), Image.Resampling.LANCZOS)
+    output = io.BytesIO()
+    image.save(output, format=image_format, optimize=True, quality=85)
+    return output.getvalue()
+
+
+def current_optimize(image_data: bytes, max_dimension: int) -> bytes:
+    return optimize_image(image_data, max_dimension=max_dimension).data
+
+
+def _encode(image: Image.Image, image_format: str, **options) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return buffer.getvalue()
+
+
+def _photo(size: Tuple[int, int]) -> Image.Image:
+    """グラデーションとノイズで写真に近い色分布の画像を合成"""
+    gradient = Image.linear_gradient('L').resize(size)
+    return Image.merge('RGB', [
+        Image.blend(Image.effect_noise(size, 40), gradient, 0.6),
+        Image.effect_noise(size, 50),
+        gradient.transpose(Image.Transpose.ROTATE_180),
+    ])
+
+
+def _banner(size: Tuple[int, int]) -> Image.Image:
+    """ベタ塗りの図形と文字のバナー"""
+    image = Image.new('RGB', size, (250, 245, 235))
+    draw = ImageDraw.Draw(image)
+    width, height = size
+    draw.rectangle([0, 0, width, height // 5], fill=(200, 30, 40))
+    draw.ellipse([width // 10, height // 3, width // 2, height - 20], fill=(30, 90, 200))
+    for i in range(12):
+        draw.text((width // 2 + 40, height // 3 + i * 30), "初回限定 50%OFF キャンペーン実施中", fill=(20, 20, 20))
+    return image
+
+
+def _transparent(size: Tuple[int, int]) -> Image.Image:
+    image = Image.new('RGBA', size, (0, 0, 0, 0))
+    ImageDraw.Draw(image).ellipse([10, 10, size[0] - 10, size[1] - 10], fill=(240, 180, 20, 255))
+    return image
+
+
+def build_corpus() -> List[Tuple[str, bytes]]:
+    return [
+        ("photo 3000x2000 JPEG", _encode(_photo((3000, 2000)), "JPEG", quality=92)),
+        ("photo 2400x1600 PNG", _encode(_photo((2400, 1600)), "PNG")),
+        ("banner 2000x1000 PNG", _encode(_banner((2000, 1000)), "PNG")),
+        ("logo 1200x1200 RGBA PNG", _encode(_transparent((1200, 1200)), "PNG")),
+        ("photo 800x600 JPEG", _encode(_photo((800, 600)), "JPEG", quality=92)),
+    ]
+
+
+def _measure(func: Callable[[bytes, int], bytes], data: bytes, max_dimension: int, repeat: int) -> Tuple[float, int]:
+    timings = []
+    output = b""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = func(data, max_dimension)
+        timings.append(time.perf_counter() - started)
+    return median(timings) * 1000, len(output)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="画像最適化ベンチマーク")
+    parser.add_argument("--repeat", type=int, default=5, help="計測回数（中央値を表示）")
+    parser.add_argument("--max-dimension", type=int, default=AI_IMAGE_MAX_DIMENSION, help="最大寸法（px）")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    totals = {"legacy_ms": 0.0, "legacy_bytes": 0, "current_ms": 0.0, "current_bytes": 0}
+
+    print(f"{'image':<26}{'input':>9}{'legacy ms':>11}{'legacy KB':>11}{'current ms':>12}{'current KB':>12}")
+    for name, data in build_corpus():
+        legacy_ms, legacy_bytes = _measure(legacy_optimize, data, args.max_dimension, args.repeat)
+        current_ms, current_bytes = _measure(current_optimize, data, args.max_dimension, args.repeat)
+        totals["legacy_ms"] += legacy_ms
+        totals["legacy_bytes"] += legacy_bytes
+        totals["current_ms"] += current_ms
+        totals["current_bytes"] += current_bytes
+        print(
+            f"{name:<26}{len(data) / 1024:>8.0f}K{legacy_ms:>11.1f}{legacy_bytes / 1024:>11.0f}"
+            f"{current_ms:>12.1f}{current_bytes / 1024:>12.0f}"
+        )
+
+    print(
+        f"{'total':<26}{'':>9}{totals['legacy_ms']:>11.1f}{totals['legacy_bytes'] / 1024:>11.0f}"
+        f"{totals['current_ms']:>12.1f}{totals['current_bytes'] / 1024:>12.0f}"
+    )
+    print(f"Speedup: {totals['legacy_ms'] / totals['current_ms']:.1f}x, "
+          f"output size: {totals['current_bytes'] / totals['legacy_bytes']:.0%} of legacy")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+============================================
+メタ広告審査チェッカー - 画像内テキスト量推定ベンチマーク
+============================================
+
+背景（ベタ塗り・なだらかな写真・質感のある写真）と文字の配置（5×5グリッドのうち0〜25セル、
+黒文字 / 白抜き文字、太い見出し）を組み合わせたフィクスチャを合成し、
+正解のテキスト量（文字を描いたセルの割合）に対する推定誤差と処理時間（ms/枚）を計測
+
+使い方（backend/ から実行）:
+    python -m benchmarks.bench_text_overlay [--repeat 3] [--seed 1]
+"""
+
+import argparse
+import io
+import logging
+import random
+import time
+from statistics import mean, median
+from typing import List, Tuple
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from src.utils.text_overlay import estimate_text_overlay
+
+
+def _encode(image: Image.Image, image_format: str) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **({"quality": 88} if image_format == "JPEG" else {}))
+    return buffer.getvalue()
+
+
+def _flat(size: Tuple[int, int]) -> Image.Image:
+    return Image.new('RGB', size, (250, 240, 230))
+
+
+def _smooth(size: Tuple[int, int]) -> Image.Image:
+    """グラデーションと図形のなだらかな画像"""
+    width, height = size
+    gradient = Image.linear_gradient('L').resize(size)
+    image = Image.merge('RGB', [gradient, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT), gradient.rotate(90)])
+    ImageDraw.Draw(image).ellipse([width // 5, height // 5, width * 3 // 5, height * 4 // 5], fill=(200, 30, 40))
+    return image.filter(ImageFilter.GaussianBlur(2))
+
+
+def _textured(size: Tuple[int, int], noise: int = 70, blur: float = 1.0) -> Image.Image:
+    """ノイズで質感を付けた写真相当の画像"""
+    gradient = Image.linear_gradient('L').resize(size)
+    image = Image.merge('RGB', [
+        Image.blend(Image.effect_noise(size, noise), gradient, 0.6),
+        Image.effect_noise(size, noise + 10),
+        gradient.transpose(Image.Transpose.ROTATE_180),
+    ])
+    return image.filter(ImageFilter.GaussianBlur(blur))
+
+
+def _draw_cells(image: Image.Image, cells: List[int], fill: Tuple[int, int, int]) -> Image.Image:
+    """指定セルに、セル内に収まる文字列を行送りしながら描く"""
+    image = image.copy()
+    draw = ImageDraw.Draw(image)
+    cell_w, cell_h = image.width / 5, image.height / 5
+    size = int(cell_h / 6)
+    font = ImageFont.load_default(size=size)
+    for cell in cells:
+        row, col = divmod(cell, 5)
+        y = row * cell_h + cell_h * 0.1
+        while y + size < (row + 1) * cell_h - cell_h * 0.1:
+            draw.text((col * cell_w + cell_w * 0.08, y), "50%OFF!", font=font, fill=fill)
+            y += size * 1.4
+    return image
+
+
+def _headline(image: Image.Image, fill: Tuple[int, int, int]) -> Tuple[Image.Image, float]:
+    """2行目に太い見出しを描き、見出しが掛かるセルの割合を返す"""
+    image = image.copy()
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=int(image.height * 0.14))
+    origin = (image.width * 0.05, image.height * 0.23)
+    draw.text(origin, "SALE", font=font, fill=fill)
+    left, top, right, bottom = draw.textbbox(origin, "SALE", font=font)
+    cell_w, cell_h = image.width / 5, image.height / 5
+    cols = int(right // cell_w) - int(left // cell_w) + 1
+    rows = int(bottom // cell_h) - int(top // cell_h) + 1
+    return image, cols * rows * 4.0
+
+
+def build_fixtures(seed: int) -> List[Tuple[str, bytes, float]]:
+    """(名前, 画像データ, 正解のテキスト量) のリスト"""
+    rng = random.Random(seed)
+    backgrounds = [
+        ("flat", _flat((1000, 1000)), (20, 20, 20)),
+        ("smooth", _smooth((1000, 1000)), (255, 255, 255)),
+        ("photo", _textured((1200, 800)), (255, 255, 255)),
+        ("photo-dark-text", _textured((1000, 1000), noise=50, blur=1.5), (10, 10, 10)),
+    ]
+    fixtures = []
+    for name, background, fill in backgrounds:
+        image_format = "PNG" if name == "flat" else "JPEG"
+        for count in (0, 1, 3, 5, 10, 25):
+            cells = rng.sample(range(25), count)
+            fixtures.append((f"{name} {count} cells", _encode(_draw_cells(background, cells, fill), image_format), count * 4.0))
+        headline, truth = _headline(background, fill)
+        fixtures.append((f"{name} headline", _encode(headline, image_format), truth))
+    return fixtures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="画像内テキスト量推定ベンチマーク")
+    parser.add_argument("--repeat", type=int, default=3, help="計測回数（中央値を表示）")
+    parser.add_argument("--seed", type=int, default=1, help="文字を描くセルの乱数シード")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    errors, timings, false_positives, clean = [], [], 0, 0
+
+    print(f"{'fixture':<28}{'truth %':>9}{'est %':>8}{'error':>8}{'ms':>8}")
+    for name, data, truth in build_fixtures(args.seed):
+        runs = []
+        estimate = None
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            estimate = estimate_text_overlay(data)
+            runs.append((time.perf_counter() - started) * 1000)
+        elapsed = median(runs)
+        error = abs(estimate.percentage - truth)
+        errors.append(error)
+        timings.append(elapsed)
+        if truth == 0:
+            clean += 1
+            false_positives += estimate.has_text
+        print(f"{name:<28}{truth:>9.0f}{estimate.percentage:>8.0f}{error:>8.0f}{elapsed:>8.1f}")
+
+    print(
+        f"\nMean absolute error: {mean(errors):.1f} points (max {max(errors):.0f}), "
+        f"clean images flagged: {false_positives}/{clean}, "
+        f"median {median(timings):.1f}ms/image"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
 from .utils import setup_logging, get_logger, http_exception_handler, general_exception_handler
+from .utils.http_clients import get_http_clients
+from .utils.cpu_pool import get_cpu_pool
 
 # 環境変数の読み込み（.env.local優先、なければ.env）
 import pathlib
@@ -47,10 +49,20 @@ async def lifespan(app: FastAPI):
     if openai_key:
         logger.info("✅ OPENAI_API_KEY configured (optional)")
 
+    # 共有HTTPクライアント（接続プール）を生成
+    http_clients = get_http_clients()
+    await http_clients.start()
+
+    # CPU処理用ワーカープールを起動
+    cpu_pool = get_cpu_pool()
+    await cpu_pool.start()
+
     yield
 
     # Shutdown
     logger.info("👋 Shutting down Meta Ad Review Checker API...")
+    await http_clients.aclose()
+    await cpu_pool.aclose()
 
 
 # --------------------------------------------
@@ -88,6 +100,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # 呼び出し元ごとの利用枠をフロントエンドから読めるようにする
+    expose_headers=["Retry-After", "X-RateLimit-Limit", "X-RateLimit-Remaining"],
 )
 
 logger.info(f"CORS configured for origins: {allowed_origins}")
@@ -105,10 +119,11 @@ app.add_exception_handler(Exception, general_exception_handler)
 # Routes
 # --------------------------------------------
 
-from .routes import health, check
+from .routes import health, check, metrics
 
 app.include_router(health.router)
 app.include_router(check.router)
+app.include_router(metrics.router)
 
 
 # --------------------------------------------
@@ -3,12 +3,17 @@
 メタ広告審査チェッカー - 広告審査エンドポイント
 ============================================
 
-POST /api/check - URL審査（LP・広告ページのURL審査専用）
+POST /api/check - URL審査（LP・広告ページのURL審査）
+POST /api/check/creative - クリエイティブ審査（画像ファイル＋広告テキストのmultipartアップロード）
+POST /api/check/stream - URL審査（server-sent eventsで判定結果を確定した項目から順に返却）
 """
 
+import json
 import logging
-from typing import Optional
-from fastapi import APIRouter
+from contextlib import asynccontextmanager
+from typing import Optional, Tuple, AsyncIterator, Dict, Any
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 
 from ..types import (
     AdCheckRequest,
@@ -26,20 +31,100 @@ from ..types import (
     ImageImprovementTextOverlay,
     ImageImprovementContentIssue,
 )
-from ..utils.url_fetcher import fetch_page_data
-from ..services import AnthropicService, ModerationService, build_meta_ad_review_prompt
+from ..utils.errors import ValidationError
+from ..utils.url_fetcher import fetch_page_data, PageImage
+from ..utils.http_clients import get_http_clients
+from ..utils.cpu_pool import get_cpu_pool
+from ..utils.image import open_and_optimize_image
+from ..utils.upload import parse_creative_upload
+from ..utils.pdf_render import get_pdf_renderer
+from ..utils.text_overlay import get_text_overlay_estimator
+from ..utils.json_stream import IncrementalJsonParser, JsonStreamEvent
+from ..utils.tenants import Tenant, TenantAdmission, get_tenant_quotas
+from ..utils.fair_queue import get_fair_scheduler
+from ..services import AnthropicService, ModerationService, build_meta_ad_review_prompt, META_AD_REVIEW_SYSTEM_PROMPT, META_AD_REVIEW_TOOL
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api", tags=["ad-check"])
 
 
+# --------------------------------------------
+# 呼び出し元ごとの利用枠
+# --------------------------------------------
+
+@asynccontextmanager
+async def _tenant_admission(request: Request, response: Response) -> AsyncIterator[TenantAdmission]:
+    """
+    呼び出し元（APIキー → クライアントIP）を識別し、その利用枠から1件を予約
+
+    レスポンスには呼び出し元自身の枠の残り（X-RateLimit-Limit / X-RateLimit-Remaining）を付ける。
+    審査が失敗した場合は予約を返却する（ストリーミングの応答開始後の失敗は_StreamReservationsで返却）。
+    リクエストボディの検証（422）の後に予約するよう、依存関係ではなくルート内で使う
+    """
+    quotas = get_tenant_quotas()
+    tenant = quotas.identify(request.headers, request.client.host if request.client else None)
+    admission = await quotas.admit(tenant)
+    response.headers.update(admission.headers())
+    try:
+        yield admission
+    except Exception:
+        await quotas.release(tenant)
+        raise
+
+
+class _StreamReservations:
+    """
+    ストリーミング審査で予約した利用枠（呼び出し元ごとの枠・Claude API全体のレート制限）
+
+    結果を返せなかった場合（エラーイベント・クライアントの切断・応答を読み始める前の切断）に1回だけ返却する
+    """
+
+    def __init__(self, tenant: Optional[Tenant], anthropic_service: AnthropicService):
+        self.tenant = tenant
+        self.anthropic_service = anthropic_service
+        self.completed = False
+        self._released = False
+
+    async def release(self) -> None:
+        """結果を返していなければ予約を返却（2回目以降は何もしない）"""
+        if self.completed or self._released:
+            return
+        self._released = True
+        if self.tenant is not None:
+            await get_tenant_quotas().release(self.tenant)
+        await self.anthropic_service.release_rate_limit()
+
+
+class _ReservedStreamingResponse(StreamingResponse):
+    """
+    送信の終了後に予約を返却するStreamingResponse
+
+    ジェネレーターのfinallyは一度も読まれなかった場合（応答開始前の切断）に実行されないため、
+    完了・切断・送信エラーのいずれでも実行されるここで返却する
+    """
+
+    def __init__(self, content: AsyncIterator[str], reservations: _StreamReservations, **kwargs: Any):
+        super().__init__(content, **kwargs)
+        self.reservations = reservations
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.reservations.release()
+
+
 # --------------------------------------------
 # POST /api/check - URL審査AI判定
 # --------------------------------------------
 
 @router.post("/check", response_model=AdCheckResponse)
-async def check_advertisement(request: AdCheckRequest) -> AdCheckResponse:
+async def check_advertisement(
+    request: AdCheckRequest,
+    http_request: Request,
+    http_response: Response,
+) -> AdCheckResponse:
     """
     LP・広告ページのURLを審査し、Meta広告審査の合否予測と改善提案を返却
 
@@ -57,6 +142,302 @@ async def check_advertisement(request: AdCheckRequest) -> AdCheckResponse:
     - 503: タイムアウト
     """
     logger.info(f"Starting URL ad check: {request.page_url}")
+    async with _tenant_admission(http_request, http_response) as admission:
+        prompt, page_images, overlay_estimates, page_text = await _prepare_url_review(request)
+
+        # --------------------------------------------
+        # 2. Gemini APIへのリクエスト送信
+        # --------------------------------------------
+        response = await _review_with_ai(prompt, page_images, overlay_estimates, page_text, admission.tenant)
+
+    logger.info(f"Ad check completed: score={response.overall_score}, status={response.status}")
+    return response
+
+
+# --------------------------------------------
+# POST /api/check/creative - クリエイティブ審査AI判定
+# --------------------------------------------
+
+# multipart/form-dataの本文はルート内でストリーミング解析するため、OpenAPIのスキーマを明示
+CREATIVE_UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "image": {"type": "string", "format": "binary", "description": "広告画像（JPEG/PNG/WebP/PDF、20MBまで）"},
+                        "headline": {"type": "string", "description": "見出し"},
+                        "description": {"type": "string", "description": "説明文"},
+                        "cta": {"type": "string", "description": "CTA"},
+                    },
+                },
+            },
+        },
+    },
+}
+
+
+@router.post("/check/creative", response_model=AdCheckResponse, openapi_extra=CREATIVE_UPLOAD_OPENAPI)
+async def check_creative(request: Request, http_response: Response) -> AdCheckResponse:
+    """
+    広告クリエイティブ（画像ファイル＋広告テキスト）をmultipart/form-dataで受け取り審査
+
+    ## 処理フロー:
+    1. アップロードを受信しながら解析（大きな画像はディスクに退避、形式・サイズは受信中に検証）
+    2. 画像を1回だけ開いて形式・寸法の取得と最適化（PDFは先頭ページ（PDF_MAX_PAGES）をページごとに画像化）
+    3. Claude APIでの審査、スコア計算とステータス判定
+
+    ## エラー:
+    - 400: バリデーションエラー
+    - 413: ファイルサイズ超過（20MB）
+    - 415: 非対応の画像形式
+    - 429: レート制限超過
+    - 500: サーバーエラー
+    """
+    async with _tenant_admission(request, http_response) as admission:
+        upload = await parse_creative_upload(
+            request.headers.get("content-type", ""),
+            request.headers.get("content-length"),
+            request.stream(),
+        )
+        try:
+            headline, description, cta = (
+                (upload.fields.get(name) or "").strip() or None for name in ("headline", "description", "cta")
+            )
+            if upload.file is None and not (headline or description or cta):
+                raise ValidationError(
+                    message="テキストまたは画像のいずれかを入力してください。",
+                    details={"fields": ["headline", "description", "cta", "image"]}
+                )
+
+            images: list = []
+            if upload.file is not None and upload.file.format == "PDF":
+                # 複数ページのPDFは先頭ページをページごとに並行して描画（2ページ目以降の表記も審査対象にする）
+                pages = await get_pdf_renderer().render(upload.file.spool.source, size=upload.file.size)
+                for page in pages:
+                    images.append(PageImage(
+                        url=f"upload:{upload.file.filename or 'creative.pdf'}#page={page.page_number}",
+                        data=page.image.data,
+                        source='upload',
+                        media_type=page.image.media_type,
+                        width=page.image.width,
+                        height=page.image.height,
+                        b64=page.image.b64,
+                    ))
+            elif upload.file is not None:
+                validated = await get_cpu_pool().run(
+                    open_and_optimize_image, upload.file.spool.source,
+                    size=upload.file.size, label="creative_image",
+                )
+                optimized = validated.optimized
+                images.append(PageImage(
+                    url=f"upload:{upload.file.filename or 'image'}",
+                    data=optimized.data,
+                    source='upload',
+                    media_type=optimized.media_type,
+                    width=optimized.width,
+                    height=optimized.height,
+                    b64=optimized.b64,
+                ))
+        finally:
+            upload.close()
+
+        logger.info(f"Starting creative ad check: image={'yes' if images else 'no'}, headline={headline!r}")
+
+        text_overlay_estimator = get_text_overlay_estimator()
+        overlay_estimates = await text_overlay_estimator.score([image.data for image in images])
+
+        prompt = build_meta_ad_review_prompt(
+            headline=headline,
+            description=description,
+            cta=cta,
+            has_image=bool(images),
+            image_count=len(images),
+        )
+        ad_text = "\n".join(text for text in (headline, description, cta) if text)
+        response = await _review_with_ai(prompt, images, overlay_estimates, ad_text or None, admission.tenant)
+
+    logger.info(f"Creative ad check completed: score={response.overall_score}, status={response.status}")
+    return response
+
+
+# --------------------------------------------
+# POST /api/check/stream - URL審査AI判定（ストリーミング）
+# --------------------------------------------
+
+# 確定した時点で送るトップレベルの項目（violations / recommendationsは要素ごとに送る）
+STREAMED_FIELDS = ("overall_score", "status", "confidence", "text_overlay_percentage", "nsfw_detected")
+
+
+@router.post("/check/stream")
+async def check_advertisement_stream(
+    request: AdCheckRequest,
+    http_request: Request,
+    http_response: Response,
+) -> StreamingResponse:
+    """
+    LP・広告ページのURLを審査し、判定結果をserver-sent events（text/event-stream）で返却
+
+    Claude APIの応答をストリーミングで受信しながらJSONを逐次解析し、確定した項目から順に送る。
+    ページの取得・レート制限の確認は応答を開始する前に行うため、その段階のエラーは通常のHTTPエラーになる
+
+    ## イベント:
+    - start: 審査の開始（{"image_count": 添付画像数}）
+    - field: スコア・ステータス等の確定（{"name": "overall_score", "value": 45}）
+    - violation: 違反項目1件（{"index": 0, "violation": {...}}）
+    - recommendation: 改善提案1件（{"index": 0, "recommendation": {...}}）
+    - result: POST /api/check と同じAdCheckResponse（補助チェックの反映後の最終結果）
+    - error: 応答開始後のエラー（{"error": ..., "message": ..., "status_code": ...}）
+
+    ## エラー（応答開始前）:
+    - 400: バリデーションエラー
+    - 429: レート制限超過
+    - 500: サーバーエラー
+    """
+    logger.info(f"Starting streaming URL ad check: {request.page_url}")
+    async with _tenant_admission(http_request, http_response) as admission:
+        prompt, page_images, overlay_estimates, page_text = await _prepare_url_review(request)
+
+        anthropic_service = AnthropicService(http_client=get_http_clients().anthropic)
+        await anthropic_service.ensure_within_rate_limit()
+
+    reservations = _StreamReservations(admission.tenant, anthropic_service)
+    return _ReservedStreamingResponse(
+        _stream_review(anthropic_service, prompt, page_images, overlay_estimates, page_text, reservations),
+        reservations,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **admission.headers()},
+    )
+
+
+async def _stream_review(
+    anthropic_service: AnthropicService,
+    prompt: str,
+    images: list,
+    overlay_estimates: list,
+    moderation_text: Optional[str],
+    reservations: _StreamReservations,
+) -> AsyncIterator[str]:
+    """
+    Claude APIの応答を逐次解析し、server-sent eventsとして送る
+
+    応答の開始後はエラーをHTTPステータスで返せないため、結果を返せなかった場合
+    （エラーイベント・クライアントの切断）は予約した利用枠を返却する
+    """
+    parser = IncrementalJsonParser(array_keys=("violations", "recommendations"))
+    chunks = []
+    overall_score: Optional[int] = None
+    try:
+        yield _sse("start", {"image_count": len(images)})
+
+        logger.info(f"Streaming Claude API response with {len(images)} images...")
+        async with get_fair_scheduler().slot(*_queue_identity(reservations.tenant)):
+            async for text in anthropic_service.stream_content_with_retry(
+                prompt=prompt,
+                images=images if images else None,
+                temperature=0.3,
+                system=META_AD_REVIEW_SYSTEM_PROMPT,
+                tool=META_AD_REVIEW_TOOL,
+            ):
+                chunks.append(text)
+                for event in parser.feed(text):
+                    if event.kind == "field" and event.key == "overall_score" and isinstance(event.value, (int, float)):
+                        overall_score = max(0, min(100, int(event.value)))
+                    partial = _partial_result_event(event, overall_score)
+                    if partial is not None:
+                        yield _sse(*partial)
+
+        # 最終結果は完全な応答テキストから通常どおり構築
+        ai_response = await anthropic_service.parse_json_response("".join(chunks))
+        response = await _finalize_review(ai_response, overlay_estimates, moderation_text)
+        logger.info(f"Streaming ad check completed: score={response.overall_score}, status={response.status}")
+        reservations.completed = True
+        yield _sse("result", response.model_dump(mode="json"))
+
+    except HTTPException as e:
+        detail = e.detail if isinstance(e.detail, dict) else {"error": "http_error", "message": str(e.detail)}
+        logger.warning(f"Streaming ad check failed: {e.status_code} {detail.get('error')}")
+        yield _sse("error", {**detail, "status_code": e.status_code})
+
+    except Exception as e:
+        logger.error(f"Unexpected error during streaming ad check: {type(e).__name__}: {str(e)}", exc_info=True)
+        yield _sse("error", {
+            "error": "internal_server_error",
+            "message": "予期しないエラーが発生しました。",
+            "details": {"error_type": type(e).__name__},
+            "status_code": 500,
+        })
+
+    finally:
+        await reservations.release()
+
+
+def _queue_identity(tenant: Optional[Tenant]) -> Tuple[str, float]:
+    """公平キューでの呼び出し元と重み（呼び出し元が不明な場合は共通の1つとして扱う）"""
+    if tenant is None:
+        return "anonymous", 1.0
+    return tenant.id, tenant.weight
+
+
+def _partial_result_event(event: JsonStreamEvent, overall_score: Optional[int]) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """
+    逐次解析で確定した値を途中経過のイベントに変換（最終結果と同じ変換・正規化を適用）
+
+    Args:
+        event: 確定した値
+        overall_score: 確定済みのスコア（ステータスの整合性チェック用）
+
+    Returns:
+        Optional[Tuple[str, Dict[str, Any]]]: (イベント名, データ)、送らない値の場合はNone
+    """
+    if event.kind == "item" and isinstance(event.value, dict):
+        try:
+            if event.key == "violations":
+                return "violation", {"index": event.index, "violation": _build_violation(event.value).model_dump(mode="json")}
+            return "recommendation", {
+                "index": event.index,
+                "recommendation": _build_recommendation(event.value).model_dump(mode="json"),
+            }
+        except (ValueError, TypeError) as e:
+            # 変換できない要素は途中経過では送らない（最終結果の構築時に改めて扱う）
+            logger.debug(f"Skipping partial {event.key} item {event.index}: {str(e)}")
+            return None
+
+    if event.kind == "field" and event.key in STREAMED_FIELDS:
+        value = event.value
+        if event.key == "overall_score" and overall_score is not None:
+            value = overall_score
+        elif event.key == "status" and isinstance(value, str) and overall_score is not None:
+            value = _normalize_status(value, overall_score).value
+        elif event.key == "confidence" and isinstance(value, (int, float)):
+            value = max(0.0, min(1.0, value))
+        return "field", {"name": event.key, "value": value}
+
+    return None
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """server-sent eventsの1イベント"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+# --------------------------------------------
+# Helper Functions
+# --------------------------------------------
+
+async def _prepare_url_review(request: AdCheckRequest) -> Tuple[str, list, list, Optional[str]]:
+    """
+    URL審査の前処理（ページデータの取得・画像内テキスト量の事前推定・プロンプト構築）
+
+    Args:
+        request: URL審査リクエスト
+
+    Returns:
+        Tuple[str, list, list, Optional[str]]: (プロンプト, 送信する画像, 画像ごとのテキスト量の推定結果, ページ本文)
+    """
+    http_clients = get_http_clients()
 
     # --------------------------------------------
     # 1. URLからページデータを取得
@@ -67,7 +448,7 @@ async def check_advertisement(request: AdCheckRequest) -> AdCheckResponse:
     page_images: list = []
 
     logger.info(f"Fetching page data from URL: {request.page_url}")
-    page_data = await fetch_page_data(request.page_url)
+    page_data = await fetch_page_data(request.page_url, client=http_clients.page)
 
     page_title = page_data.title
     page_description = page_data.description
@@ -75,16 +456,20 @@ async def check_advertisement(request: AdCheckRequest) -> AdCheckResponse:
 
     # LP内の画像を取得（OGP画像 + 主要画像）
     if page_data.images:
-        page_images = [img.data for img in page_data.images]
+        page_images = list(page_data.images)
         logger.info(f"Found {len(page_images)} images from LP")
 
     logger.info(f"Page data fetched: title={page_title}, images={len(page_images)}")
+    if page_data.truncated:
+        logger.warning(f"Page HTML was truncated at {page_data.html_bytes} bytes; text extracted from the capped prefix")
     if page_text:
         logger.debug(f"Page text preview (first 500 chars): {page_text[:500]}")
 
-    # --------------------------------------------
-    # 2. Gemini APIへのリクエスト送信
-    # --------------------------------------------
+    # 画像内テキスト量をローカルで事前推定（AIの推定値との突き合わせ・文字のない画像の送信省略用）
+    text_overlay_estimator = get_text_overlay_estimator()
+    overlay_estimates = await text_overlay_estimator.score([image.data for image in page_images])
+    page_images = text_overlay_estimator.select_images(page_images, overlay_estimates)
+
     has_images = len(page_images) > 0
 
     logger.info("Building prompt for Claude API...")
@@ -100,48 +485,90 @@ async def check_advertisement(request: AdCheckRequest) -> AdCheckResponse:
         image_count=len(page_images),
     )
 
-    logger.info(f"Calling Claude API with {len(page_images)} images...")
-    anthropic_service = AnthropicService()
-    ai_response_text = await anthropic_service.generate_content_with_retry(
-        prompt=prompt,
-        images=page_images if page_images else None,
-        temperature=0.3,
-    )
+    return prompt, page_images, overlay_estimates, page_text
+
+
+async def _review_with_ai(
+    prompt: str,
+    images: list,
+    overlay_estimates: list,
+    moderation_text: Optional[str],
+    tenant: Optional[Tenant] = None,
+) -> AdCheckResponse:
+    """
+    Claude APIで審査し、補助チェックと合わせてレスポンスを構築
+
+    Args:
+        prompt: 審査プロンプト
+        images: 添付する画像（PageImage）
+        overlay_estimates: 画像ごとのテキスト量のローカル推定結果
+        moderation_text: Moderation APIでチェックするテキスト
+        tenant: 呼び出し元（同時呼び出し数が埋まっている間の公平キューで使用）
+
+    Returns:
+        AdCheckResponse: 構造化されたレスポンス
+    """
+    logger.info(f"Calling Claude API with {len(images)} images...")
+    anthropic_service = AnthropicService(http_client=get_http_clients().anthropic)
+    async with get_fair_scheduler().slot(*_queue_identity(tenant)):
+        ai_response_text = await anthropic_service.generate_content_with_retry(
+            prompt=prompt,
+            images=images if images else None,
+            temperature=0.3,
+            system=META_AD_REVIEW_SYSTEM_PROMPT,
+            tool=META_AD_REVIEW_TOOL,
+        )
 
     # --------------------------------------------
     # 3. AI応答の解析
     # --------------------------------------------
     logger.info("Parsing AI response...")
-    ai_response = anthropic_service.parse_json_response(ai_response_text)
+    ai_response = await anthropic_service.parse_json_response(ai_response_text)
+    return await _finalize_review(ai_response, overlay_estimates, moderation_text)
+
+
+async def _finalize_review(
+    ai_response: dict,
+    overlay_estimates: list,
+    moderation_text: Optional[str],
+) -> AdCheckResponse:
+    """
+    AIの応答に補助チェック（テキスト量の突き合わせ・Moderation API）を合わせてレスポンスを構築
+
+    Args:
+        ai_response: 解析済みのAIの応答
+        overlay_estimates: 画像ごとのテキスト量のローカル推定結果
+        moderation_text: Moderation APIでチェックするテキスト
+
+    Returns:
+        AdCheckResponse: 構造化されたレスポンス
+    """
+    ai_response["text_overlay_percentage"] = get_text_overlay_estimator().cross_check(
+        ai_response.get("text_overlay_percentage"), overlay_estimates
+    )
 
     # --------------------------------------------
     # 4. 補助チェック（OpenAI Moderation API - オプション）
     # --------------------------------------------
     moderation_result = None
-    if page_text:
+    moderation_service = ModerationService(client=get_http_clients().openai)
+    if moderation_text:
         logger.info("Running optional moderation check...")
-        moderation_service = ModerationService()
         if moderation_service.is_available():
-            # ページテキストをModeration APIでチェック（2000文字に制限）
-            moderation_result = await moderation_service.check_content(page_text[:2000])
+            # テキストをModeration APIでチェック（2000文字に制限）
+            moderation_result = await moderation_service.check_content(moderation_text[:2000])
 
     # --------------------------------------------
     # 5. スコア計算とステータス判定
     # --------------------------------------------
     logger.info("Calculating score and status...")
-    response = _build_response_from_ai_result(ai_response, moderation_result)
-
-    logger.info(f"Ad check completed: score={response.overall_score}, status={response.status}")
-    return response
+    return _build_response_from_ai_result(ai_response, moderation_result, moderation_service)
 
 
-# --------------------------------------------
-# Helper Functions
-# --------------------------------------------
-
 def _build_response_from_ai_result(
     ai_result: dict,
-    moderation_result: Optional[dict] = None
+    moderation_result: Optional[dict] = None,
+    moderation_service: Optional[ModerationService] = None,
 ) -> AdCheckResponse:
     """
     AIの応答からAdCheckResponseを構築
@@ -149,139 +576,20 @@ def _build_response_from_ai_result(
     Args:
         ai_result: Gemini APIから返されたJSONオブジェクト
         moderation_result: OpenAI Moderation APIの結果（オプション）
+        moderation_service: 結果の解釈に使うModerationService（未指定の場合は作成）
 
     Returns:
         AdCheckResponse: 構造化されたレスポンス
     """
     # Violationsの構築（nullチェック）
-    violations = []
-    # カテゴリのマッピング（AIが返す値 → enum値）
-    category_mapping = {
-        "misleading_claims": "misleading",
-        "misleading_claim": "misleading",
-        "false_claims": "misleading",
-        "exaggerated_claims": "misleading",
-        "prohibited": "prohibited_content",
-        "sexual": "nsfw",
-        "adult": "nsfw",
-    }
     violations_raw = ai_result.get("violations")
     violations_list = violations_raw if isinstance(violations_raw, list) else []
-    for v in violations_list:
-        raw_category = v.get("category", "misleading")
-        # マッピングがあれば変換、なければそのまま使用
-        mapped_category = category_mapping.get(raw_category, raw_category)
-        # それでも無効な場合はデフォルト値を使用
-        try:
-            category = ViolationCategory(mapped_category)
-        except ValueError:
-            logger.warning(f"Unknown violation category: {raw_category}, using 'misleading'")
-            category = ViolationCategory.MISLEADING
-
-        try:
-            severity = ViolationSeverity(v.get("severity", "medium"))
-        except ValueError:
-            severity = ViolationSeverity.MEDIUM
-
-        try:
-            location = ViolationLocation(v.get("location", "text"))
-        except ValueError:
-            location = ViolationLocation.TEXT
-
-        violations.append(
-            Violation(
-                category=category,
-                severity=severity,
-                description=v.get("description", ""),
-                location=location,
-            )
-        )
+    violations = [_build_violation(v) for v in violations_list]
 
     # Recommendationsの構築（新形式対応、nullチェック）
-    recommendations = []
-    # アクションタイプのマッピング
-    action_type_mapping = {
-        "change": "replace",
-        "modify": "rephrase",
-        "delete": "remove",
-        "move": "relocate",
-    }
-    # 優先度のマッピング
-    priority_mapping = {
-        "high": "must",
-        "medium": "recommended",
-        "low": "optional",
-        "critical": "must",
-    }
-
     recommendations_raw = ai_result.get("recommendations")
     recommendations_list = recommendations_raw if isinstance(recommendations_raw, list) else []
-    for r in recommendations_list:
-        # 新形式の場合
-        if "target" in r and "suggestions" in r:
-            # target の安全な変換
-            raw_target = r.get("target", "text")
-            try:
-                target = RecommendationTarget(raw_target)
-            except ValueError:
-                logger.warning(f"Unknown target: {raw_target}, using 'text'")
-                target = RecommendationTarget.TEXT
-
-            # action_type の安全な変換
-            raw_action_type = r.get("action_type", "replace")
-            mapped_action_type = action_type_mapping.get(raw_action_type, raw_action_type)
-            try:
-                action_type = RecommendationActionType(mapped_action_type)
-            except ValueError:
-                logger.warning(f"Unknown action_type: {raw_action_type}, using 'replace'")
-                action_type = RecommendationActionType.REPLACE
-
-            # priority の安全な変換
-            raw_priority = r.get("priority", "recommended")
-            mapped_priority = priority_mapping.get(raw_priority, raw_priority)
-            try:
-                priority = RecommendationPriority(mapped_priority)
-            except ValueError:
-                logger.warning(f"Unknown priority: {raw_priority}, using 'recommended'")
-                priority = RecommendationPriority.RECOMMENDED
-
-            # suggestionsがnullの場合に空リストにフォールバック
-            suggestions_raw = r.get("suggestions")
-            suggestions_list = suggestions_raw if isinstance(suggestions_raw, list) else []
-
-            recommendations.append(
-                Recommendation(
-                    target=target,
-                    target_field=r.get("target_field"),
-                    related_violation_category=r.get("related_violation_category"),
-                    action_type=action_type,
-                    priority=priority,
-                    estimated_score_impact=max(0, min(100, r.get("estimated_score_impact") or 10)),
-                    title=r.get("title") or "改善提案",
-                    before=r.get("before") or "",
-                    suggestions=suggestions_list,
-                    reason=r.get("reason") or "",
-                )
-            )
-        else:
-            # 旧形式からの変換（後方互換性）
-            after_text = r.get("after")
-            suggestions_from_old = [after_text] if after_text else []
-
-            recommendations.append(
-                Recommendation(
-                    target=RecommendationTarget.TEXT,
-                    target_field=None,
-                    related_violation_category=None,
-                    action_type=RecommendationActionType.REPLACE,
-                    priority=RecommendationPriority.RECOMMENDED,
-                    estimated_score_impact=10,
-                    title="改善提案",
-                    before=r.get("before") or "",
-                    suggestions=suggestions_from_old,
-                    reason=r.get("reason") or "",
-                )
-            )
+    recommendations = [_build_recommendation(r) for r in recommendations_list]
 
     # ImageImprovementの構築
     image_improvement = None
@@ -331,8 +639,8 @@ def _build_response_from_ai_result(
     # Moderation APIの結果をマージ（オプション）
     nsfw_detected = ai_result.get("nsfw_detected", False)
     if moderation_result:
-        from ..services import ModerationService
-        moderation_service = ModerationService()
+        if moderation_service is None:
+            moderation_service = ModerationService()
 
         # Moderationでフラグされたカテゴリを追加
         flagged_categories = moderation_service.extract_flagged_categories(moderation_result)
@@ -360,19 +668,7 @@ def _build_response_from_ai_result(
 
     # スコアとステータスの検証
     overall_score = max(0, min(100, ai_result.get("overall_score", 50)))
-    status_str = ai_result.get("status", "needs_review")
-
-    # ステータスの妥当性チェック（スコアと整合性を取る）
-    if status_str == "approved" and overall_score < 70:
-        status_str = "needs_review"
-    elif status_str == "rejected" and overall_score > 49:
-        status_str = "needs_review"
-
-    try:
-        status = AdStatus(status_str)
-    except ValueError:
-        logger.warning(f"Unknown status: {status_str}, using 'needs_review'")
-        status = AdStatus.NEEDS_REVIEW
+    status = _normalize_status(ai_result.get("status", "needs_review"), overall_score)
 
     # 信頼度の検証
     confidence = max(0.0, min(1.0, ai_result.get("confidence", 0.8)))
@@ -390,3 +686,138 @@ def _build_response_from_ai_result(
         api_used="claude-sonnet-4",
         image_improvement=image_improvement,
     )
+
+
+# カテゴリのマッピング（AIが返す値 → enum値）
+VIOLATION_CATEGORY_MAPPING = {
+    "misleading_claims": "misleading",
+    "misleading_claim": "misleading",
+    "false_claims": "misleading",
+    "exaggerated_claims": "misleading",
+    "prohibited": "prohibited_content",
+    "sexual": "nsfw",
+    "adult": "nsfw",
+}
+# アクションタイプのマッピング
+ACTION_TYPE_MAPPING = {
+    "change": "replace",
+    "modify": "rephrase",
+    "delete": "remove",
+    "move": "relocate",
+}
+# 優先度のマッピング
+PRIORITY_MAPPING = {
+    "high": "must",
+    "medium": "recommended",
+    "low": "optional",
+    "critical": "must",
+}
+
+
+def _build_violation(v: dict) -> Violation:
+    """AIが返した違反項目1件をViolationに変換（未知の値はデフォルト値に置き換え）"""
+    raw_category = v.get("category", "misleading")
+    # マッピングがあれば変換、なければそのまま使用
+    mapped_category = VIOLATION_CATEGORY_MAPPING.get(raw_category, raw_category)
+    # それでも無効な場合はデフォルト値を使用
+    try:
+        category = ViolationCategory(mapped_category)
+    except ValueError:
+        logger.warning(f"Unknown violation category: {raw_category}, using 'misleading'")
+        category = ViolationCategory.MISLEADING
+
+    try:
+        severity = ViolationSeverity(v.get("severity", "medium"))
+    except ValueError:
+        severity = ViolationSeverity.MEDIUM
+
+    try:
+        location = ViolationLocation(v.get("location", "text"))
+    except ValueError:
+        location = ViolationLocation.TEXT
+
+    return Violation(
+        category=category,
+        severity=severity,
+        description=v.get("description", ""),
+        location=location,
+    )
+
+
+def _build_recommendation(r: dict) -> Recommendation:
+    """AIが返した改善提案1件をRecommendationに変換（旧形式も変換）"""
+    # 新形式の場合
+    if "target" in r and "suggestions" in r:
+        # target の安全な変換
+        raw_target = r.get("target", "text")
+        try:
+            target = RecommendationTarget(raw_target)
+        except ValueError:
+            logger.warning(f"Unknown target: {raw_target}, using 'text'")
+            target = RecommendationTarget.TEXT
+
+        # action_type の安全な変換
+        raw_action_type = r.get("action_type", "replace")
+        mapped_action_type = ACTION_TYPE_MAPPING.get(raw_action_type, raw_action_type)
+        try:
+            action_type = RecommendationActionType(mapped_action_type)
+        except ValueError:
+            logger.warning(f"Unknown action_type: {raw_action_type}, using 'replace'")
+            action_type = RecommendationActionType.REPLACE
+
+        # priority の安全な変換
+        raw_priority = r.get("priority", "recommended")
+        mapped_priority = PRIORITY_MAPPING.get(raw_priority, raw_priority)
+        try:
+            priority = RecommendationPriority(mapped_priority)
+        except ValueError:
+            logger.warning(f"Unknown priority: {raw_priority}, using 'recommended'")
+            priority = RecommendationPriority.RECOMMENDED
+
+        # suggestionsがnullの場合に空リストにフォールバック
+        suggestions_raw = r.get("suggestions")
+        suggestions_list = suggestions_raw if isinstance(suggestions_raw, list) else []
+
+        return Recommendation(
+            target=target,
+            target_field=r.get("target_field"),
+            related_violation_category=r.get("related_violation_category"),
+            action_type=action_type,
+            priority=priority,
+            estimated_score_impact=max(0, min(100, r.get("estimated_score_impact") or 10)),
+            title=r.get("title") or "改善提案",
+            before=r.get("before") or "",
+            suggestions=suggestions_list,
+            reason=r.get("reason") or "",
+        )
+
+    # 旧形式からの変換（後方互換性）
+    after_text = r.get("after")
+    suggestions_from_old = [after_text] if after_text else []
+
+    return Recommendation(
+        target=RecommendationTarget.TEXT,
+        target_field=None,
+        related_violation_category=None,
+        action_type=RecommendationActionType.REPLACE,
+        priority=RecommendationPriority.RECOMMENDED,
+        estimated_score_impact=10,
+        title="改善提案",
+        before=r.get("before") or "",
+        suggestions=suggestions_from_old,
+        reason=r.get("reason") or "",
+    )
+
+
+def _normalize_status(status_str: str, overall_score: int) -> AdStatus:
+    """ステータスの妥当性チェック（スコアと整合性を取る）"""
+    if status_str == "approved" and overall_score < 70:
+        status_str = "needs_review"
+    elif status_str == "rejected" and overall_score > 49:
+        status_str = "needs_review"
+
+    try:
+        return AdStatus(status_str)
+    except ValueError:
+        logger.warning(f"Unknown status: {status_str}, using 'needs_review'")
+        return AdStatus.NEEDS_REVIEW
@@ -0,0 +1,90 @@
+"""
+============================================
+メタ広告審査チェッカー - メトリクスエンドポイント
+============================================
+
+GET /api/metrics - 接続プール・キャッシュ等の内部状態を返却（運用監視用）
+METRICS_API_KEY を設定した場合のみ有効（X-Admin-Key / Authorization: Bearer で指定）
+"""
+
+import os
+import hmac
+from typing import Any, Dict, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+
+from ..utils.http_clients import get_http_clients
+from ..utils.page_cache import get_page_cache
+from ..utils.image_store import get_image_store
+from ..utils.cpu_pool import get_cpu_pool
+from ..utils.cdn_rewrite import get_cdn_rewrite_layer
+from ..utils.image_budget import get_image_budget_encoder
+from ..utils.text_overlay import get_text_overlay_estimator
+from ..utils.pdf_render import get_pdf_renderer
+from ..utils.tenants import get_tenant_quotas
+from ..utils.fair_queue import get_fair_scheduler
+from ..utils.errors import create_error_detail
+from ..services import get_rate_limiter, get_usage_tracker
+
+
+# --------------------------------------------
+# Configuration
+# --------------------------------------------
+
+# 運用監視用のキー（未設定の場合はエンドポイント自体を無効にして404を返す）
+METRICS_API_KEY = os.getenv("METRICS_API_KEY", "").strip()
+
+# ルーター作成
+router = APIRouter(
+    prefix="/api",
+    tags=["metrics"]
+)
+
+
+def require_metrics_key(
+    x_admin_key: Optional[str] = Header(default=None),
+    authorization: Optional[str] = Header(default=None),
+) -> None:
+    """
+    運用監視用のキーを確認
+
+    Raises:
+        HTTPException: 未設定の場合は404、キーがない・一致しない場合は401
+    """
+    if not METRICS_API_KEY:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=create_error_detail("not_found", "Not Found"),
+        )
+    provided = x_admin_key
+    if provided is None and authorization and authorization.lower().startswith("bearer "):
+        provided = authorization[7:]
+    if provided is None or not hmac.compare_digest(provided.strip().encode(), METRICS_API_KEY.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=create_error_detail("unauthorized", "メトリクスの参照には管理用のキーが必要です。"),
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+@router.get("/metrics", dependencies=[Depends(require_metrics_key)])
+async def get_metrics() -> Dict[str, Any]:
+    """
+    メトリクスエンドポイント
+
+    Returns:
+        Dict[str, Any]: 各サブシステムの統計情報
+    """
+    return {
+        "http_pools": get_http_clients().pool_stats(),
+        "page_cache": get_page_cache().stats(),
+        "image_store": get_image_store().stats(),
+        "cpu_pool": get_cpu_pool().stats(),
+        "cdn_rewrite": get_cdn_rewrite_layer().stats(),
+        "image_budget": get_image_budget_encoder().stats(),
+        "text_overlay": get_text_overlay_estimator().stats(),
+        "pdf_render": get_pdf_renderer().stats(),
+        "claude_usage": get_usage_tracker().stats(),
+        "rate_limit": await get_rate_limiter().stats(),
+        "tenant_quotas": get_tenant_quotas().stats(),
+        "fair_queue": get_fair_scheduler().stats(),
+    }
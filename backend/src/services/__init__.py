@@ -4,8 +4,16 @@
 ============================================
 """
 
-from .anthropic_service import AnthropicService, get_rate_limiter
-from .prompts import build_meta_ad_review_prompt
+from .anthropic_service import AnthropicService, get_rate_limiter, get_usage_tracker
+from .prompts import build_meta_ad_review_prompt, META_AD_REVIEW_SYSTEM_PROMPT, META_AD_REVIEW_TOOL
 from .moderation import ModerationService
 
-__all__ = ["AnthropicService", "get_rate_limiter", "build_meta_ad_review_prompt", "ModerationService"]
+__all__ = [
+    "AnthropicService",
+    "get_rate_limiter",
+    "get_usage_tracker",
+    "build_meta_ad_review_prompt",
+    "META_AD_REVIEW_SYSTEM_PROMPT",
+    "META_AD_REVIEW_TOOL",
+    "ModerationService",
+]
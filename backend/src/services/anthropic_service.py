@@ -4,16 +4,20 @@
 ============================================
 
 Anthropic Claude APIとの連携、リトライロジック、タイムアウト処理、レート制限を提供
+静的なシステムプロンプトはプロンプトキャッシュ付きで送り、トークン使用量（キャッシュの読み書きを含む）を記録する
+出力はtool useでスキーマに沿ったJSONに制約し、打ち切り時は続きだけを追加で生成、壊れたJSONはローカルで修復する
+呼び出しの結果（TTFT・429/529・タイムアウト）は公平キューに伝え、同時呼び出し数の上限の調整に使う
 """
 
 import os
 import json
 import asyncio
+import math
 import time
-import base64
+import random
 import logging
-from typing import Optional, Dict, Any, List
-from collections import deque
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Union, AsyncIterator
 
 import httpx
 
@@ -22,6 +26,13 @@ from ..utils.errors import (
     RateLimitExceededError,
     ServiceUnavailableError,
 )
+from ..utils.image import detect_image_media_type, encode_image_to_base64
+from ..utils.cpu_pool import get_cpu_pool
+from ..utils.image_budget import get_image_budget_encoder
+from ..utils.json_repair import repair_json
+from ..utils.rate_limit import RateLimiter, create_rate_limit_backend
+from ..utils.fair_queue import get_fair_scheduler
+from ..utils.url_fetcher import PageImage
 
 logger = logging.getLogger(__name__)
 
@@ -31,57 +42,145 @@ logger = logging.getLogger(__name__)
 # --------------------------------------------
 
 CLAUDE_MODEL = "claude-sonnet-4-20250514"
+ANTHROPIC_MESSAGES_URL = "https://api.anthropic.com/v1/messages"
 CLAUDE_TIMEOUT = 60
 MAX_RETRIES = 3
 INITIAL_RETRY_DELAY = 1
+MAX_OUTPUT_TOKENS = 8192
 
-# レート制限: 1時間あたり最大10リクエスト
-RATE_LIMIT_MAX_REQUESTS = 10
+# レート制限: 全体で1時間あたり最大10リクエスト（呼び出し元ごとの枠はutils/tenants.py）
+RATE_LIMIT_MAX_REQUESTS = max(1, int(os.getenv("RATE_LIMIT_MAX_REQUESTS", "10")))
 RATE_LIMIT_WINDOW_SECONDS = 3600  # 1時間
 
+# ストリーミングで最初のテキストを受信する前ならリトライするHTTPステータス（529: overloaded）
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 529}
+# 同時呼び出し数の上限を減らすHTTPステータス（上流の過負荷）
+OVERLOAD_STATUS_CODES = {429, 503, 529}
+
+# プロンプトキャッシュ（システムプロンプトをキャッシュし、5分以内の後続リクエストではキャッシュ読み込みとして処理）
+PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "true").lower() == "true"
+
+# 構造化出力（tool useで出力をスキーマに沿ったJSONに制約）
+STRUCTURED_OUTPUT_ENABLED = os.getenv("STRUCTURED_OUTPUT_ENABLED", "true").lower() == "true"
+
+# max_tokensで打ち切られた応答の続きを生成する追加呼び出しの最大出力トークン数
+CONTINUATION_MAX_TOKENS = int(os.getenv("CLAUDE_CONTINUATION_MAX_TOKENS", "2048"))
+
 
 # --------------------------------------------
 # Global Rate Limiter
 # --------------------------------------------
 
-class RateLimiter:
-    """シンプルなスライディングウィンドウレート制限"""
-
-    def __init__(self, max_requests: int, window_seconds: int):
-        self.max_requests = max_requests
-        self.window_seconds = window_seconds
-        self._timestamps: deque = deque()
-
-    def is_allowed(self) -> bool:
-        """リクエストが許可されるかチェック"""
-        now = time.time()
-        # ウィンドウ外のタイムスタンプを削除
-        while self._timestamps and self._timestamps[0] < now - self.window_seconds:
-            self._timestamps.popleft()
-        return len(self._timestamps) < self.max_requests
-
-    def record(self):
-        """リクエストを記録"""
-        self._timestamps.append(time.time())
-
-    def remaining(self) -> int:
-        """残りリクエスト数"""
-        now = time.time()
-        while self._timestamps and self._timestamps[0] < now - self.window_seconds:
-            self._timestamps.popleft()
-        return max(0, self.max_requests - len(self._timestamps))
-
-    def retry_after(self) -> int:
-        """次にリクエスト可能になるまでの秒数"""
-        if self.is_allowed():
-            return 0
-        now = time.time()
-        oldest = self._timestamps[0]
-        return int(oldest + self.window_seconds - now) + 1
+# グローバルレートリミッター
+# （RATE_LIMIT_BACKENDがsqlite / redisの場合はワーカー・インスタンス間で共有）
+_rate_limiter = RateLimiter(RATE_LIMIT_MAX_REQUESTS, RATE_LIMIT_WINDOW_SECONDS, backend=create_rate_limit_backend())
 
 
-# グローバルレートリミッター
-_rate_limiter = RateLimiter(RATE_LIMIT_MAX_REQUESTS, RATE_LIMIT_WINDOW_SECONDS)
+# --------------------------------------------
+# Token Usage
+# --------------------------------------------
+
+@dataclass
+class ClaudeUsage:
+    """1リクエストのトークン使用量と応答時間"""
+    input_tokens: int = 0
+    output_tokens: int = 0
+    # プロンプトキャッシュへの書き込み / キャッシュからの読み込みトークン数
+    cache_creation_input_tokens: int = 0
+    cache_read_input_tokens: int = 0
+    latency_ms: float = 0.0
+    # ストリーミングの場合、最初のテキストを受信するまでの時間
+    first_token_ms: Optional[float] = None
+
+    @property
+    def cache_status(self) -> str:
+        """'read'（キャッシュヒット）, 'write'（キャッシュ作成）, 'none'（キャッシュなし）"""
+        if self.cache_read_input_tokens:
+            return "read"
+        if self.cache_creation_input_tokens:
+            return "write"
+        return "none"
+
+    @classmethod
+    def from_response(
+        cls,
+        usage: Optional[Dict[str, Any]],
+        latency_ms: float,
+        first_token_ms: Optional[float] = None,
+    ) -> "ClaudeUsage":
+        usage = usage or {}
+        return cls(
+            input_tokens=usage.get("input_tokens") or 0,
+            output_tokens=usage.get("output_tokens") or 0,
+            cache_creation_input_tokens=usage.get("cache_creation_input_tokens") or 0,
+            cache_read_input_tokens=usage.get("cache_read_input_tokens") or 0,
+            latency_ms=latency_ms,
+            first_token_ms=first_token_ms,
+        )
+
+
+class UsageTracker:
+    """Claude APIのトークン使用量の集計（キャッシュの読み書き別の応答時間を含む）"""
+
+    def __init__(self):
+        self.counters = {
+            "requests": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cache_creation_input_tokens": 0,
+            "cache_read_input_tokens": 0,
+            # 打ち切られた応答の続きの生成 / ローカルでのJSON修復 / 修復できなかった応答
+            "continuations": 0,
+            "json_repairs": 0,
+            "json_parse_failures": 0,
+        }
+        self._latency: Dict[str, Dict[str, float]] = {}
+
+    def record(self, usage: ClaudeUsage) -> None:
+        """1リクエスト分の使用量を記録"""
+        self.counters["requests"] += 1
+        self.counters["input_tokens"] += usage.input_tokens
+        self.counters["output_tokens"] += usage.output_tokens
+        self.counters["cache_creation_input_tokens"] += usage.cache_creation_input_tokens
+        self.counters["cache_read_input_tokens"] += usage.cache_read_input_tokens
+
+        stats = self._latency.setdefault(
+            usage.cache_status, {"count": 0, "ms_total": 0.0, "streamed": 0, "first_token_ms_total": 0.0}
+        )
+        stats["count"] += 1
+        stats["ms_total"] += usage.latency_ms
+        if usage.first_token_ms is not None:
+            stats["streamed"] += 1
+            stats["first_token_ms_total"] += usage.first_token_ms
+
+    def stats(self) -> Dict[str, Any]:
+        """使用量の統計情報"""
+        prompt_tokens = (
+            self.counters["input_tokens"]
+            + self.counters["cache_creation_input_tokens"]
+            + self.counters["cache_read_input_tokens"]
+        )
+        return {
+            **self.counters,
+            "prompt_cache_enabled": PROMPT_CACHE_ENABLED,
+            "structured_output_enabled": STRUCTURED_OUTPUT_ENABLED,
+            # 入力トークンのうちキャッシュから読み込んだ割合
+            "cache_read_ratio": round(self.counters["cache_read_input_tokens"] / prompt_tokens, 3) if prompt_tokens else 0.0,
+            "by_cache_status": {
+                status: {
+                    "count": stats["count"],
+                    "avg_latency_ms": round(stats["ms_total"] / stats["count"], 1),
+                    "avg_first_token_ms": (
+                        round(stats["first_token_ms_total"] / stats["streamed"], 1) if stats["streamed"] else None
+                    ),
+                }
+                for status, stats in self._latency.items()
+            },
+        }
+
+
+# グローバル使用量トラッカー
+_usage_tracker = UsageTracker()
 
 
 # --------------------------------------------
@@ -91,104 +190,399 @@ _rate_limiter = RateLimiter(RATE_LIMIT_MAX_REQUESTS, RATE_LIMIT_WINDOW_SECONDS)
 class AnthropicService:
     """Anthropic Claude API サービスクラス"""
 
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, http_client: Optional[httpx.AsyncClient] = None):
+        """
+        初期化
+
+        Args:
+            api_key: Anthropic APIキー（未指定の場合は環境変数から取得）
+            http_client: 共有HTTPクライアント（未指定の場合は呼び出しごとに作成）
+        """
         self.api_key = (api_key or os.getenv("ANTHROPIC_API_KEY", "")).strip()
         if not self.api_key:
             raise ValueError("ANTHROPIC_API_KEY is not set")
+        self.http_client = http_client
+        # 直近のリクエストで添付した画像の推定トークン数
+        self.last_image_tokens = 0
+        # 直近のリクエストのトークン使用量
+        self.last_usage: Optional[ClaudeUsage] = None
+        # 直近のリクエストの停止理由（'end_turn' / 'tool_use' / 'max_tokens' など）
+        self.last_stop_reason: Optional[str] = None
+        # レート制限の予約（成功時に確定）
+        self._rate_limit_reserved = False
 
         logger.info(f"AnthropicService initialized with model: {CLAUDE_MODEL}")
 
+    async def ensure_within_rate_limit(self) -> None:
+        """
+        レート制限の1件を予約（ストリーミングでは応答を開始する前に呼び出す）
+
+        予約はこのインスタンスのリクエストが成功すると確定し、失敗すると返却される
+        （予約済みの場合は何もしない。リクエストを送る前に中止した場合はrelease_rate_limitで返却する）
+
+        Raises:
+            RateLimitExceededError: 制限に達している場合
+        """
+        if self._rate_limit_reserved:
+            return
+        decision = await _rate_limiter.acquire()
+        if not decision.allowed:
+            retry_after = math.ceil(decision.retry_after)
+            logger.warning(f"Rate limit exceeded. Retry after {retry_after}s. Remaining: {decision.remaining}")
+            raise RateLimitExceededError(
+                message=f"リクエスト制限に達しました（1時間あたり{_rate_limiter.max_requests}回まで）。あと{retry_after}秒後に再試行してください。",
+                retry_after=retry_after,
+            )
+        self._rate_limit_reserved = True
+
+    async def release_rate_limit(self) -> None:
+        """確定していない予約を返却（リクエストが失敗した場合・送る前に中止した場合）"""
+        if self._rate_limit_reserved:
+            self._rate_limit_reserved = False
+            await _rate_limiter.release()
+
     async def generate_content_with_retry(
         self,
         prompt: str,
         image_data: Optional[bytes] = None,
-        images: Optional[List[bytes]] = None,
+        images: Optional[List[Union[bytes, PageImage]]] = None,
         temperature: float = 0.3,
+        system: Optional[str] = None,
+        tool: Optional[Dict[str, Any]] = None,
     ) -> str:
-        """Claude APIにリクエスト送信（レート制限+リトライ付き）"""
+        """
+        Claude APIにリクエスト送信（レート制限+リトライ付き）
+
+        imagesには画像バイナリか、Base64表現を保持したPageImageを渡せる
+        （PageImageの場合は保存済みのBase64をそのまま使う）
+        systemには全リクエスト共通の静的なプロンプトを渡す（PROMPT_CACHE_ENABLEDの場合はキャッシュ対象）
+        toolを渡すと、出力をそのツールの入力スキーマに沿ったJSONに制約する（STRUCTURED_OUTPUT_ENABLEDの場合）
+
+        応答がmax_tokensで打ち切られた場合は、全体をやり直さず続きだけを短い追加呼び出しで受け取る
+        """
 
         # レート制限チェック
-        if not _rate_limiter.is_allowed():
-            retry_after = _rate_limiter.retry_after()
-            logger.warning(f"Rate limit exceeded. Retry after {retry_after}s. Remaining: {_rate_limiter.remaining()}")
-            raise RateLimitExceededError(
-                message=f"リクエスト制限に達しました（1時間あたり{RATE_LIMIT_MAX_REQUESTS}回まで）。あと{retry_after}秒後に再試行してください。",
-                retry_after=retry_after,
-            )
+        await self.ensure_within_rate_limit()
 
         # 画像統合
         all_images = images or []
         if image_data and image_data not in all_images:
             all_images = [image_data] + all_images
 
-        for attempt in range(MAX_RETRIES):
-            try:
-                result = await asyncio.wait_for(
-                    self._call_claude_api(prompt, all_images, temperature),
-                    timeout=CLAUDE_TIMEOUT,
-                )
-                # 成功時にレートリミッターに記録
-                _rate_limiter.record()
-                return result
-
-            except asyncio.TimeoutError:
-                logger.warning(f"Claude API timeout (attempt {attempt + 1}/{MAX_RETRIES})")
-                if attempt == MAX_RETRIES - 1:
-                    raise ServiceUnavailableError(
-                        message="AI審査がタイムアウトしました。時間を置いて再試行してください。",
-                        details={"timeout_seconds": CLAUDE_TIMEOUT},
-                    )
-                await self._exponential_backoff(attempt)
-
-            except RateLimitExceededError:
-                raise  # レート制限はそのまま上に投げる
+        try:
+            # リクエストはリトライ間で使い回す（画像のエンコードとシリアライズは1回だけ）
+            content = await self._build_content(prompt, all_images)
+            request_kwargs = await self._build_request(content, temperature, system, tool)
 
-            except Exception as e:
-                error_message = str(e).lower()
+            for attempt in range(MAX_RETRIES):
+                try:
+                    result = await asyncio.wait_for(
+                        self._call_claude_api(request_kwargs),
+                        timeout=CLAUDE_TIMEOUT,
+                    )
+                    # 成功時にレート制限の予約を確定
+                    self._rate_limit_reserved = False
+                    break
 
-                if "rate" in error_message or "429" in error_message:
-                    logger.warning(f"Claude API rate limit (attempt {attempt + 1}/{MAX_RETRIES})")
+                except asyncio.TimeoutError:
+                    logger.warning(f"Claude API timeout (attempt {attempt + 1}/{MAX_RETRIES})")
+                    get_fair_scheduler().record_overload("timeout")
                     if attempt == MAX_RETRIES - 1:
-                        raise RateLimitExceededError(retry_after=60)
+                        raise ServiceUnavailableError(
+                            message="AI審査がタイムアウトしました。時間を置いて再試行してください。",
+                            details={"timeout_seconds": CLAUDE_TIMEOUT},
+                        )
                     await self._exponential_backoff(attempt)
-                    continue
 
-                if "500" in error_message or "503" in error_message or "overloaded" in error_message:
-                    logger.warning(f"Claude API server error (attempt {attempt + 1}/{MAX_RETRIES}): {error_message}")
-                    if attempt == MAX_RETRIES - 1:
+                except RateLimitExceededError:
+                    raise  # レート制限はそのまま上に投げる
+
+                except Exception as e:
+                    error_message = str(e).lower()
+
+                    if "rate" in error_message or "429" in error_message:
+                        logger.warning(f"Claude API rate limit (attempt {attempt + 1}/{MAX_RETRIES})")
+                        if attempt == MAX_RETRIES - 1:
+                            raise RateLimitExceededError(retry_after=60)
+                        await self._exponential_backoff(attempt)
+                        continue
+
+                    if "500" in error_message or "503" in error_message or "overloaded" in error_message:
+                        logger.warning(f"Claude API server error (attempt {attempt + 1}/{MAX_RETRIES}): {error_message}")
+                        if attempt == MAX_RETRIES - 1:
+                            raise ExternalAPIError(
+                                message="AI審査サービスでエラーが発生しました。",
+                                details={"error": str(e)},
+                            )
+                        await self._exponential_backoff(attempt)
+                        continue
+
+                    logger.error(f"Claude API error: {str(e)}")
+                    raise ExternalAPIError(
+                        message="AI審査の実行中にエラーが発生しました。",
+                        details={"error": str(e)},
+                    )
+            else:
+                raise ExternalAPIError(message="AI審査に失敗しました。")
+        finally:
+            await self.release_rate_limit()
+
+        # 続きの生成はリトライの外で行う（失敗・タイムアウトしても受信済みの出力は捨てない）
+        if self.last_stop_reason == "max_tokens":
+            result = result.rstrip() + await self._collect_continuation(content, result, temperature, system, tool)
+        return result
+
+    async def stream_content_with_retry(
+        self,
+        prompt: str,
+        images: Optional[List[Union[bytes, PageImage]]] = None,
+        temperature: float = 0.3,
+        system: Optional[str] = None,
+        tool: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Claude APIの応答テキストをストリーミングで受信（レート制限+リトライ付き）
+
+        最初のテキストを受信する前の失敗（429・5xx・接続エラー）のみリトライし、
+        受信を始めた後の失敗はそのまま送出する（送信済みのテキストと重複させないため）
+        toolを渡した場合はツールの入力（JSON）の差分を返す。max_tokensで打ち切られた場合は
+        続きを追加呼び出しで受信して、そのまま続けて返す
+
+        Yields:
+            str: 応答テキストの差分
+        """
+        await self.ensure_within_rate_limit()
+
+        try:
+            content = await self._build_content(prompt, images or [])
+            request_kwargs = await self._build_request(content, temperature, system, tool)
+
+            for attempt in range(MAX_RETRIES):
+                received: List[str] = []
+                try:
+                    async for text in self._stream_claude_api(request_kwargs):
+                        received.append(text)
+                        yield text
+                    self._rate_limit_reserved = False
+                    if self.last_stop_reason == "max_tokens":
+                        async for text in self._stream_continuation(content, "".join(received), temperature, system, tool):
+                            yield text
+                    return
+
+                except RateLimitExceededError:
+                    raise
+
+                except Exception as e:
+                    status_code = _error_status_code(e)
+                    retryable = status_code in RETRYABLE_STATUS_CODES or isinstance(e, httpx.TransportError)
+                    if received or not retryable or attempt == MAX_RETRIES - 1:
+                        if status_code == 429:
+                            raise RateLimitExceededError(retry_after=60)
+                        if isinstance(e, ExternalAPIError):
+                            raise
+                        logger.error(f"Claude API streaming error: {str(e)}")
                         raise ExternalAPIError(
-                            message="AI審査サービスでエラーが発生しました。",
+                            message="AI審査の実行中にエラーが発生しました。",
                             details={"error": str(e)},
                         )
+                    logger.warning(f"Claude API streaming failed before first token (attempt {attempt + 1}/{MAX_RETRIES}): {str(e)}")
                     await self._exponential_backoff(attempt)
-                    continue
+        finally:
+            # 応答の途中で接続が切れた場合（aclose）も予約を返却
+            await self.release_rate_limit()
+
+    async def _stream_continuation(
+        self,
+        content: List[Dict[str, Any]],
+        partial: str,
+        temperature: float,
+        system: Optional[str],
+        tool: Optional[Dict[str, Any]],
+    ) -> AsyncIterator[str]:
+        """
+        max_tokensで打ち切られた応答の続きを受信
+
+        打ち切られた出力をアシスタントの応答の書き出し（prefill）として送り、続きだけを生成させる。
+        失敗した場合は何も返さない（打ち切られたJSONは解析時にローカルで修復する）
+        """
+        logger.warning(f"Claude API response was cut at max_tokens ({len(partial)} characters). Requesting continuation...")
+        _usage_tracker.counters["continuations"] += 1
+        try:
+            request_kwargs = await self._build_request(
+                content, temperature, system, tool, prefill=partial.rstrip(), max_tokens=CONTINUATION_MAX_TOKENS
+            )
+            async for text in self._stream_claude_api(request_kwargs):
+                yield text
+        except Exception as e:
+            logger.warning(f"Claude API continuation failed, falling back to local JSON repair: {str(e)}")
+
+    async def _collect_continuation(
+        self,
+        content: List[Dict[str, Any]],
+        partial: str,
+        temperature: float,
+        system: Optional[str],
+        tool: Optional[Dict[str, Any]],
+    ) -> str:
+        """
+        打ち切られた応答の続きを受信して連結（CLAUDE_TIMEOUTを過ぎた場合は受信済みの分だけ返す）
 
-                logger.error(f"Claude API error: {str(e)}")
-                raise ExternalAPIError(
-                    message="AI審査の実行中にエラーが発生しました。",
-                    details={"error": str(e)},
-                )
+        足りない部分は解析時にローカルで修復するため、ここでは送出しない
+        """
+        chunks: List[str] = []
 
-        raise ExternalAPIError(message="AI審査に失敗しました。")
+        async def receive() -> None:
+            async for text in self._stream_continuation(content, partial, temperature, system, tool):
+                chunks.append(text)
+
+        try:
+            await asyncio.wait_for(receive(), timeout=CLAUDE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Claude API continuation timed out after {CLAUDE_TIMEOUT}s, falling back to local JSON repair"
+            )
+        return "".join(chunks)
+
+    async def _collect(self, chunks: AsyncIterator[str]) -> str:
+        """ストリーミングの差分を連結"""
+        return "".join([text async for text in chunks])
+
+    async def _stream_claude_api(self, request_kwargs: Dict[str, Any]) -> AsyncIterator[str]:
+        """
+        Claude APIのストリーミング呼び出し（server-sent eventsからテキストの差分を取り出す）
+
+        ツールを指定した場合はツールの入力（JSON）の差分を返す。停止理由はlast_stop_reasonに記録する
+        """
+        owned_client = None
+        http_client = self.http_client
+        if http_client is None:
+            owned_client = http_client = httpx.AsyncClient(verify=False, timeout=CLAUDE_TIMEOUT)
+        usage: Dict[str, Any] = {}
+        first_token_ms: Optional[float] = None
+        self.last_stop_reason = None
+        started = time.perf_counter()
+        try:
+            async with http_client.stream("POST", ANTHROPIC_MESSAGES_URL, **request_kwargs) as response:
+                if response.status_code != 200:
+                    error_body = (await response.aread()).decode("utf-8", errors="replace")
+                    logger.error(f"Claude API error: {response.status_code} {error_body[:300]}")
+                    raise ExternalAPIError(
+                        message="AI審査の実行中にエラーが発生しました。",
+                        details={"status_code": response.status_code, "error": error_body[:200]},
+                    )
+
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    event = json.loads(line[5:])
+                    event_type = event.get("type")
+                    if event_type == "message_start":
+                        usage.update(event.get("message", {}).get("usage") or {})
+                    elif event_type == "message_delta":
+                        usage.update(event.get("usage") or {})
+                        self.last_stop_reason = event.get("delta", {}).get("stop_reason") or self.last_stop_reason
+                    elif event_type == "content_block_delta":
+                        delta = event.get("delta", {})
+                        if delta.get("type") == "text_delta":
+                            text = delta.get("text", "")
+                        elif delta.get("type") == "input_json_delta":
+                            text = delta.get("partial_json", "")
+                        else:
+                            continue
+                        if not text:
+                            continue
+                        if first_token_ms is None:
+                            first_token_ms = (time.perf_counter() - started) * 1000
+                        yield text
+                    elif event_type == "error":
+                        error = event.get("error") or {}
+                        raise ExternalAPIError(
+                            message="AI審査の実行中にエラーが発生しました。",
+                            details={"status_code": 529 if error.get("type") == "overloaded_error" else None, "error": error},
+                        )
+        except ExternalAPIError as e:
+            status_code = _error_status_code(e)
+            if status_code in OVERLOAD_STATUS_CODES:
+                get_fair_scheduler().record_overload(f"status {status_code}")
+            raise
+        except httpx.TimeoutException:
+            get_fair_scheduler().record_overload("timeout")
+            raise
+        finally:
+            if owned_client is not None:
+                await owned_client.aclose()
+
+        latency_ms = (time.perf_counter() - started) * 1000
+        self._record_usage(usage, latency_ms, first_token_ms)
+        # 出力の長さに左右されない最初のテキストまでの時間で、上流の混雑を判断する
+        get_fair_scheduler().record_success(first_token_ms if first_token_ms is not None else latency_ms)
+
+    def _record_usage(self, usage: Optional[Dict[str, Any]], latency_ms: float, first_token_ms: Optional[float] = None) -> None:
+        """応答のusageを記録"""
+        self.last_usage = ClaudeUsage.from_response(usage, latency_ms, first_token_ms)
+        _usage_tracker.record(self.last_usage)
+        logger.info(
+            f"Claude API usage: input={self.last_usage.input_tokens}, "
+            f"cache_read={self.last_usage.cache_read_input_tokens}, "
+            f"cache_write={self.last_usage.cache_creation_input_tokens}, "
+            f"output={self.last_usage.output_tokens}, latency={latency_ms:.0f}ms"
+            + (f", first_token={first_token_ms:.0f}ms" if first_token_ms is not None else "")
+            + (f", stop_reason={self.last_stop_reason}" if self.last_stop_reason else "")
+        )
 
-    async def _call_claude_api(
+    async def _call_claude_api(self, request_kwargs: Dict[str, Any]) -> str:
+        """
+        Claude APIの実際の呼び出し
+
+        応答はストリーミングで受信して連結する（max_tokensで打ち切られた場合に、
+        受信済みの出力を続きの生成に使えるようにするため）
+        """
+        result_text = await self._collect(self._stream_claude_api(request_kwargs))
+        if result_text:
+            logger.debug(f"Claude API response received: {len(result_text)} characters")
+            return result_text
+
+        raise ExternalAPIError(
+            message="AI審査の結果が空でした。",
+            details={"stop_reason": self.last_stop_reason},
+        )
+
+    async def _build_content(
         self,
         prompt: str,
-        images: Optional[List[bytes]] = None,
-        temperature: float = 0.3,
-    ) -> str:
-        """Claude APIの実際の呼び出し"""
+        images: Optional[List[Union[bytes, PageImage]]],
+    ) -> List[Dict[str, Any]]:
+        """ユーザーメッセージのコンテンツ（画像+テキストプロンプト）を構築"""
+
+        cpu_pool = get_cpu_pool()
 
         # メッセージコンテンツ構築
         content = []
 
-        # 画像追加（最大3枚）
+        # 画像追加（最大3枚、合計トークン数を予算内に収める）
         if images:
-            for idx, img_data in enumerate(images[:3]):
+            images = images[:3]
+            budgeted = await get_image_budget_encoder().fit(
+                [image.data if isinstance(image, PageImage) else image for image in images]
+            )
+            self.last_image_tokens = sum(result.tokens for result in budgeted)
+            for idx, (image, fitted) in enumerate(zip(images, budgeted)):
                 try:
-                    # 画像のメディアタイプを推定
-                    media_type = self._detect_media_type(img_data)
-                    b64_data = base64.b64encode(img_data).decode("utf-8")
+                    if fitted.data is not None:
+                        # 予算に合わせて縮小・再エンコード済み
+                        media_type = fitted.media_type
+                        b64_data = fitted.b64
+                    elif isinstance(image, PageImage):
+                        media_type = image.media_type or self._detect_media_type(image.data)
+                        b64_data = image.b64 or await cpu_pool.run(
+                            encode_image_to_base64, image.data, size=len(image.data), label="base64_encode"
+                        )
+                    else:
+                        # 画像のメディアタイプを推定
+                        media_type = self._detect_media_type(image)
+                        b64_data = await cpu_pool.run(
+                            encode_image_to_base64, image, size=len(image), label="base64_encode"
+                        )
                     content.append({
                         "type": "image",
                         "source": {
@@ -197,90 +591,141 @@ class AnthropicService:
                             "data": b64_data,
                         },
                     })
-                    logger.info(f"Added image {idx + 1} to content ({media_type})")
+                    logger.info(f"Added image {idx + 1} to content ({media_type}, {fitted.width}x{fitted.height}, ~{fitted.tokens} tokens)")
                 except Exception as e:
                     logger.warning(f"Failed to process image {idx + 1}: {str(e)}")
 
         # テキストプロンプト追加
         content.append({"type": "text", "text": prompt})
+        return content
 
-        # httpxで直接Anthropic APIを呼び出し（SSL検証無効でVercel互換性確保）
-        async with httpx.AsyncClient(verify=False, timeout=CLAUDE_TIMEOUT) as http_client:
-            response = await http_client.post(
-                "https://api.anthropic.com/v1/messages",
-                headers={
-                    "x-api-key": self.api_key,
-                    "anthropic-version": "2023-06-01",
-                    "content-type": "application/json",
-                },
-                json={
-                    "model": CLAUDE_MODEL,
-                    "max_tokens": 8192,
-                    "temperature": temperature,
-                    "messages": [{"role": "user", "content": content}],
-                },
-            )
-
-        if response.status_code != 200:
-            error_body = response.text
-            logger.error(f"Claude API error: {response.status_code} {error_body[:300]}")
-            raise ExternalAPIError(
-                message="AI審査の実行中にエラーが発生しました。",
-                details={"status_code": response.status_code, "error": error_body[:200]},
-            )
-
-        result = response.json()
-        if result.get("content") and len(result["content"]) > 0:
-            result_text = result["content"][0]["text"]
-            logger.debug(f"Claude API response received: {len(result_text)} characters")
-            return result_text
-
-        raise ExternalAPIError(
-            message="AI審査の結果が空でした。",
-            details={"stop_reason": result.get("stop_reason")},
+    async def _build_request(
+        self,
+        content: List[Dict[str, Any]],
+        temperature: float,
+        system: Optional[str],
+        tool: Optional[Dict[str, Any]] = None,
+        prefill: Optional[str] = None,
+        max_tokens: int = MAX_OUTPUT_TOKENS,
+    ) -> Dict[str, Any]:
+        """
+        リクエストのヘッダーとボディ（シリアライズ済み）を構築
+
+        Args:
+            content: ユーザーメッセージのコンテンツ
+            temperature: 温度
+            system: システムプロンプト
+            tool: 出力を制約するツール（tool_choiceで指定）
+            prefill: アシスタントの応答の書き出し（打ち切られた応答の続きを生成する場合）
+            max_tokens: 最大出力トークン数
+
+        Returns:
+            Dict[str, Any]: httpxに渡すheadersとcontent
+        """
+        messages = [{"role": "user", "content": content}]
+        if prefill:
+            messages.append({"role": "assistant", "content": [{"type": "text", "text": prefill}]})
+
+        body = {
+            "model": CLAUDE_MODEL,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stream": True,
+            "messages": messages,
+        }
+        if tool and STRUCTURED_OUTPUT_ENABLED:
+            body["tools"] = [tool]
+            # 続きの生成ではツールを呼ばせず、書き出しに続くテキストとして生成させる
+            # （ツール定義は残し、システムプロンプトと共通のキャッシュを使う）
+            body["tool_choice"] = {"type": "none"} if prefill else {"type": "tool", "name": tool["name"]}
+        if system:
+            # ツール定義 → システムプロンプト → 画像 → リクエストごとのテキストの順に並ぶため、
+            # 先頭のツール定義とシステムプロンプトだけがキャッシュされる
+            system_block = {"type": "text", "text": system}
+            if PROMPT_CACHE_ENABLED:
+                system_block["cache_control"] = {"type": "ephemeral"}
+            body["system"] = [system_block]
+        # 画像のBase64を含むリクエストボディのシリアライズもプールで実行
+        body_size = len(system or "") + len(prefill or "") + sum(
+            len(block["source"]["data"]) if block["type"] == "image" else len(block["text"]) for block in content
         )
+        return {
+            "headers": {
+                "x-api-key": self.api_key,
+                "anthropic-version": "2023-06-01",
+                "content-type": "application/json",
+            },
+            "content": await get_cpu_pool().run(_encode_request_body, body, size=body_size, label="json_encode"),
+        }
 
     def _detect_media_type(self, image_data: bytes) -> str:
         """画像バイナリからメディアタイプを推定"""
-        if image_data[:8] == b'\x89PNG\r\n\x1a\n':
-            return "image/png"
-        if image_data[:2] == b'\xff\xd8':
-            return "image/jpeg"
-        if image_data[:4] == b'GIF8':
-            return "image/gif"
-        if image_data[:4] == b'RIFF' and image_data[8:12] == b'WEBP':
-            return "image/webp"
-        return "image/jpeg"  # デフォルト
+        return detect_image_media_type(image_data) or "image/jpeg"  # デフォルト
 
     async def _exponential_backoff(self, attempt: int) -> None:
+        # 同時に失敗したリクエストが揃って再試行しないよう、待ち時間の後半をランダムにずらす
         delay = INITIAL_RETRY_DELAY * (2 ** attempt)
-        logger.info(f"Retrying after {delay} seconds...")
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        logger.info(f"Retrying after {delay:.2f} seconds...")
         await asyncio.sleep(delay)
 
-    def parse_json_response(self, response_text: str) -> Dict[str, Any]:
-        """AIの応答からJSON部分を抽出・解析"""
+    async def parse_json_response(self, response_text: str) -> Dict[str, Any]:
+        """
+        AIの応答からJSON部分を抽出・解析（大きな応答はCPUプールで解析）
+
+        そのまま解析できない場合（前後の説明文・余分なカンマ・打ち切り）はローカルで修復して解析し、
+        修復もできない場合のみエラーにする
+        """
+        cpu_pool = get_cpu_pool()
+        json_text = response_text.strip()
+        if json_text.startswith("```json"):
+            json_text = json_text[7:]
+        if json_text.startswith("```"):
+            json_text = json_text[3:]
+        if json_text.endswith("```"):
+            json_text = json_text[:-3]
+        json_text = json_text.strip()
+
         try:
-            json_text = response_text.strip()
-            if json_text.startswith("```json"):
-                json_text = json_text[7:]
-            if json_text.startswith("```"):
-                json_text = json_text[3:]
-            if json_text.endswith("```"):
-                json_text = json_text[:-3]
-            json_text = json_text.strip()
-
-            parsed = json.loads(json_text)
+            parsed = await cpu_pool.run(json.loads, json_text, size=len(json_text), label="json_parse")
             logger.debug("JSON response parsed successfully")
             return parsed
-
         except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON response: {str(e)}\nResponse: {response_text[:500]}")
+            parse_error = e
+
+        try:
+            parsed = await cpu_pool.run(repair_json, response_text, size=len(response_text), label="json_repair")
+        except ValueError as e:
+            _usage_tracker.counters["json_parse_failures"] += 1
+            logger.error(f"Failed to parse JSON response: {str(parse_error)}\nResponse: {response_text[:500]}")
             raise ExternalAPIError(
                 message="AI審査の結果を解析できませんでした。",
                 details={"error": str(e), "response_preview": response_text[:200]},
             )
 
+        _usage_tracker.counters["json_repairs"] += 1
+        logger.warning(f"Repaired malformed JSON response locally: {str(parse_error)}")
+        return parsed
+
+
+def _error_status_code(error: Exception) -> Optional[int]:
+    """ExternalAPIErrorの詳細からClaude APIのHTTPステータスを取り出す"""
+    detail = getattr(error, "detail", None)
+    if isinstance(detail, dict):
+        return (detail.get("details") or {}).get("status_code")
+    return None
+
+
+def _encode_request_body(body: Dict[str, Any]) -> bytes:
+    """リクエストボディをJSONにシリアライズ"""
+    return json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
 
 def get_rate_limiter() -> RateLimiter:
     """グローバルレートリミッターを取得"""
     return _rate_limiter
+
+
+def get_usage_tracker() -> UsageTracker:
+    """グローバル使用量トラッカーを取得"""
+    return _usage_tracker
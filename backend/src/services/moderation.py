@@ -21,15 +21,18 @@ logger = logging.getLogger(__name__)
 class ModerationService:
     """OpenAI Moderation APIサービスクラス（オプション）"""
 
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, client: Optional[AsyncOpenAI] = None):
         """
         初期化
 
         Args:
             api_key: OpenAI APIキー（未指定の場合は環境変数から取得）
+            client: 共有AsyncOpenAIクライアント（指定時は新規作成しない）
         """
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
-        if not self.api_key:
+        if client is not None:
+            self.client = client
+        elif not self.api_key:
             logger.warning("OPENAI_API_KEY not set. Moderation API will be unavailable.")
             self.client = None
         else:
@@ -4,9 +4,14 @@
 ============================================
 
 Meta広告審査基準に基づいたAIプロンプトを構築
+- 静的な部分（審査基準・指示・出力形式）: META_AD_REVIEW_SYSTEM_PROMPT（プロンプトキャッシュの対象）
+- リクエストごとの部分（審査対象の広告・画像の指示）: build_meta_ad_review_prompt()
+- 出力スキーマ（tool use）: AdCheckResponseから生成したMETA_AD_REVIEW_TOOL
 """
 
-from typing import Optional
+from typing import Any, Dict, Optional
+
+from ..types import AdCheckResponse
 
 
 # --------------------------------------------
@@ -62,101 +67,22 @@ META_AD_POLICY = """
 
 
 # --------------------------------------------
-# プロンプト構築関数
+# 審査の指示・出力形式（全リクエスト共通）
 # --------------------------------------------
 
-def build_meta_ad_review_prompt(
-    headline: Optional[str] = None,
-    description: Optional[str] = None,
-    cta: Optional[str] = None,
-    has_image: bool = False,
-    page_url: Optional[str] = None,
-    page_title: Optional[str] = None,
-    page_description: Optional[str] = None,
-    page_text: Optional[str] = None,
-    image_count: int = 0,
-) -> str:
-    """
-    Meta広告審査用のプロンプトを構築
-
-    Args:
-        headline: 見出し
-        description: 説明文
-        cta: CTA（Call To Action）
-        has_image: 画像が含まれているか
-        page_url: ランディングページURL
-        page_title: ページタイトル（OGP/title）
-        page_description: ページ説明（OGP/meta description）
-        page_text: ページ本文テキスト
-        image_count: 画像の枚数
-
-    Returns:
-        str: 構築されたプロンプト
-    """
-    # 広告テキストの組み立て
-    ad_text_parts = []
-    if headline:
-        ad_text_parts.append(f"【見出し】\n{headline}")
-    if description:
-        ad_text_parts.append(f"【説明文】\n{description}")
-    if cta:
-        ad_text_parts.append(f"【CTA】\n{cta}")
-
-    # URL審査の場合、ページ情報を追加
-    if page_url:
-        ad_text_parts.append(f"【ランディングページURL】\n{page_url}")
-        if page_title:
-            ad_text_parts.append(f"【ページタイトル】\n{page_title}")
-        if page_description:
-            ad_text_parts.append(f"【ページ説明】\n{page_description}")
-        if page_text:
-            # ページテキストは構造化済みなので、より多くを含める
-            truncated_text = page_text[:3000] + "..." if len(page_text) > 3000 else page_text
-            ad_text_parts.append(f"【ページ本文（見出し・重要テキスト抽出）】\n{truncated_text}")
-
-    ad_text = "\n\n".join(ad_text_parts) if ad_text_parts else "（テキストなし）"
-
-    # 画像の有無と枚数に応じた指示
-    if page_url and image_count > 1:
-        image_note = f"""※ ランディングページから{image_count}枚の画像が添付されています（OGP画像＋主要画像）。
-- **すべての画像を分析**してください
-- 各画像の内容（テキスト量、コンテンツ）を確認してください
-- 全体として最も問題のある画像のテキスト量をtext_overlay_percentageに設定してください
-- 画像内にテキストが見える場合は、必ず0%より大きい値を設定してください
-- image_improvementには、問題のある画像についての改善提案を含めてください"""
-    elif page_url and has_image:
-        image_note = """※ OGP画像（ランディングページのシェア画像）が添付されています。
-- 画像内のテキスト量を0-100%で正確に推定してください
-- 画像内にテキストが見える場合は、必ず0%より大きい値を設定してください
-- テキストがある場合、text_overlay_percentageフィールドに推定値を入力してください"""
-    elif has_image:
-        image_note = """※ 画像が添付されています。
-- 画像内のテキスト量を0-100%で正確に推定してください
-- 画像内にテキストが見える場合は、必ず0%より大きい値を設定してください
-- テキストがある場合、text_overlay_percentageフィールドに推定値を入力してください"""
-    else:
-        image_note = "※ 画像はありません。text_overlay_percentageはnullにしてください。"
-
-    # プロンプト構築
-    prompt = f"""あなたはMeta（Facebook/Instagram）広告の審査エキスパートです。
-以下の広告が、Metaの広告ポリシーに準拠しているかを厳格に審査し、JSON形式で結果を返してください。
+# システムプロンプトとして送る静的な部分（Claude APIのプロンプトキャッシュの対象。
+# 内容を変えるとキャッシュが作り直されるため、リクエストごとに変わる値は含めない）
+META_AD_REVIEW_SYSTEM_PROMPT = """あなたはMeta（Facebook/Instagram）広告の審査エキスパートです。
+ユーザーメッセージで渡される広告が、Metaの広告ポリシーに準拠しているかを厳格に審査し、JSON形式で結果を返してください。
 
 ⚠️ **最重要ルール**:
-- 以下に記載された「審査対象の広告」テキストに**実際に存在する表現のみ**を分析してください
+- ユーザーメッセージの「審査対象の広告」テキストに**実際に存在する表現のみ**を分析してください
 - テキストに存在しない表現を捏造したり、推測で問題を作り出さないでください
 - beforeフィールドには**問題のあるテキスト表現を直接引用**してください（URLそのものは問題ではありません）
 - URL自体を「現在の問題」として扱わないでください。URLではなく、ページ内の具体的な問題表現を指摘してください
 - 具体的な問題が見つからない場合、beforeフィールドには改善前の状態を簡潔に説明してください（例：「CTAが明確でない」）
 
-{META_AD_POLICY}
-
----
-
-## 審査対象の広告
-
-{ad_text}
-
-{image_note}
+""" + META_AD_POLICY + """
 
 ---
 
@@ -217,26 +143,26 @@ def build_meta_ad_review_prompt(
 
 ## 出力形式（必ずこのJSON形式で返してください）
 
-{{
+{
   "overall_score": 45,
   "status": "needs_review",
   "confidence": 0.85,
   "violations": [
-    {{
+    {
       "category": "misleading",
       "severity": "high",
       "description": "「業界最安値」「100%保証」は根拠なき絶対表現として誇大広告に該当します。",
       "location": "text"
-    }},
-    {{
+    },
+    {
       "category": "text_overlay",
       "severity": "medium",
       "description": "画像内のテキスト量が約35%です。Metaは20%以下を推奨しているため、リーチが大幅に制限される可能性があります。",
       "location": "image"
-    }}
+    }
   ],
   "recommendations": [
-    {{
+    {
       "target": "text",
       "target_field": "headline",
       "related_violation_category": "misleading",
@@ -251,8 +177,8 @@ def build_meta_ad_review_prompt(
         "納得価格の充実サポート！無料で相談"
       ],
       "reason": "「最安値」「100%」は根拠なき絶対表現としてMetaポリシーに抵触します。具体的な数値や比較データがない限り、誇大広告と判定されます。"
-    }},
-    {{
+    },
+    {
       "target": "text",
       "target_field": "description",
       "related_violation_category": "misleading",
@@ -266,8 +192,8 @@ def build_meta_ad_review_prompt(
         "あなたのダイエットを応援。まずは無料カウンセリング"
       ],
       "reason": "「必ず」「たった〇日で」といった断定的な効果保証は、ダイエット分野では特に厳しく審査されます。個人差を考慮した表現に変更してください。"
-    }},
-    {{
+    },
+    {
       "target": "image",
       "target_field": null,
       "related_violation_category": "text_overlay",
@@ -281,13 +207,13 @@ def build_meta_ad_review_prompt(
         "ロゴと商品名のみ残し、キャッチコピーは説明文に移動"
       ],
       "reason": "画像内テキストが20%を超えるとリーチが制限されます。15%以下を目標にテキストを削減してください。"
-    }}
+    }
   ],
   "text_overlay_percentage": 35,
   "nsfw_detected": false,
   "prohibited_content": [],
-  "image_improvement": {{
-    "text_overlay": {{
+  "image_improvement": {
+    "text_overlay": {
       "current_percentage": 35,
       "target_percentage": 15,
       "problematic_areas": [
@@ -301,10 +227,10 @@ def build_meta_ad_review_prompt(
         "ロゴと商品名のみ残し、キャッチコピーは説明文に移動",
         "画像は商品/サービスの視覚的魅力に集中させる"
       ]
-    }},
+    },
     "content_issues": []
-  }}
-}}
+  }
+}
 
 **重要な注意事項**:
 1. 必ずJSON形式のみを返してください。説明文やマークダウンは不要です。
@@ -315,4 +241,147 @@ def build_meta_ad_review_prompt(
 6. 推測や仮定ではなく、**入力された実際のテキストに基づいて**判定してください
 """
 
+
+# --------------------------------------------
+# 出力スキーマ（tool use）
+# --------------------------------------------
+
+REVIEW_TOOL_NAME = "submit_ad_review"
+
+# サーバー側で設定する項目（AIには出力させない）
+_SERVER_SIDE_FIELDS = ("checked_at", "api_used")
+
+
+def build_review_output_schema() -> Dict[str, Any]:
+    """
+    AdCheckResponseのJSONスキーマから、AIに出力させる部分のスキーマを生成
+
+    $refはインライン展開し、型定義と重複するタイトルは除く（型定義を変更すればスキーマも追従する）
+
+    Returns:
+        Dict[str, Any]: tool useのinput_schemaとして渡すJSONスキーマ
+    """
+    schema = AdCheckResponse.model_json_schema()
+    definitions = schema.pop("$defs", {})
+    for field in _SERVER_SIDE_FIELDS:
+        schema["properties"].pop(field, None)
+    schema["required"] = [field for field in schema.get("required", []) if field not in _SERVER_SIDE_FIELDS]
+    return _inline_schema_refs(schema, definitions)
+
+
+def _inline_schema_refs(node: Any, definitions: Dict[str, Any]) -> Any:
+    """スキーマ内の$refを定義で置き換え、タイトルを除く"""
+    if isinstance(node, list):
+        return [_inline_schema_refs(item, definitions) for item in node]
+    if not isinstance(node, dict):
+        return node
+    if "$ref" in node:
+        resolved = definitions[node["$ref"].rsplit("/", 1)[-1]]
+        node = {**resolved, **{key: value for key, value in node.items() if key != "$ref"}}
+    return {
+        key: _inline_schema_refs(value, definitions)
+        for key, value in node.items()
+        # "title"という名前のプロパティ（Recommendation.title）は残す
+        if not (key == "title" and isinstance(value, str))
+    }
+
+
+# 審査結果を返すツール（tool_choiceで指定し、出力をこのスキーマのJSONに制約する。
+# ツール定義はシステムプロンプトより前に並ぶため、システムプロンプトと一緒にキャッシュされる）
+META_AD_REVIEW_TOOL = {
+    "name": REVIEW_TOOL_NAME,
+    "description": "Meta広告の審査結果を提出する",
+    "input_schema": build_review_output_schema(),
+}
+
+
+# --------------------------------------------
+# プロンプト構築関数
+# --------------------------------------------
+
+def build_meta_ad_review_prompt(
+    headline: Optional[str] = None,
+    description: Optional[str] = None,
+    cta: Optional[str] = None,
+    has_image: bool = False,
+    page_url: Optional[str] = None,
+    page_title: Optional[str] = None,
+    page_description: Optional[str] = None,
+    page_text: Optional[str] = None,
+    image_count: int = 0,
+) -> str:
+    """
+    Meta広告審査用のプロンプト（リクエストごとに変わるユーザーメッセージ部分）を構築
+    審査基準・指示・出力形式はMETA_AD_REVIEW_SYSTEM_PROMPTとしてシステムプロンプトで送る
+
+    Args:
+        headline: 見出し
+        description: 説明文
+        cta: CTA（Call To Action）
+        has_image: 画像が含まれているか
+        page_url: ランディングページURL
+        page_title: ページタイトル（OGP/title）
+        page_description: ページ説明（OGP/meta description）
+        page_text: ページ本文テキスト
+        image_count: 画像の枚数
+
+    Returns:
+        str: 構築されたプロンプト（審査対象の広告と画像に関する指示）
+    """
+    # 広告テキストの組み立て
+    ad_text_parts = []
+    if headline:
+        ad_text_parts.append(f"【見出し】\n{headline}")
+    if description:
+        ad_text_parts.append(f"【説明文】\n{description}")
+    if cta:
+        ad_text_parts.append(f"【CTA】\n{cta}")
+
+    # URL審査の場合、ページ情報を追加
+    if page_url:
+        ad_text_parts.append(f"【ランディングページURL】\n{page_url}")
+        if page_title:
+            ad_text_parts.append(f"【ページタイトル】\n{page_title}")
+        if page_description:
+            ad_text_parts.append(f"【ページ説明】\n{page_description}")
+        if page_text:
+            # ページテキストは構造化済みなので、より多くを含める
+            truncated_text = page_text[:3000] + "..." if len(page_text) > 3000 else page_text
+            ad_text_parts.append(f"【ページ本文（見出し・重要テキスト抽出）】\n{truncated_text}")
+
+    ad_text = "\n\n".join(ad_text_parts) if ad_text_parts else "（テキストなし）"
+
+    # 画像の有無と枚数に応じた指示
+    if page_url and image_count > 1:
+        image_note = f"""※ ランディングページから{image_count}枚の画像が添付されています（OGP画像＋主要画像）。
+- **すべての画像を分析**してください
+- 各画像の内容（テキスト量、コンテンツ）を確認してください
+- 全体として最も問題のある画像のテキスト量をtext_overlay_percentageに設定してください
+- 画像内にテキストが見える場合は、必ず0%より大きい値を設定してください
+- image_improvementには、問題のある画像についての改善提案を含めてください"""
+    elif page_url and has_image:
+        image_note = """※ OGP画像（ランディングページのシェア画像）が添付されています。
+- 画像内のテキスト量を0-100%で正確に推定してください
+- 画像内にテキストが見える場合は、必ず0%より大きい値を設定してください
+- テキストがある場合、text_overlay_percentageフィールドに推定値を入力してください"""
+    elif has_image:
+        image_note = """※ 画像が添付されています。
+- 画像内のテキスト量を0-100%で正確に推定してください
+- 画像内にテキストが見える場合は、必ず0%より大きい値を設定してください
+- テキストがある場合、text_overlay_percentageフィールドに推定値を入力してください"""
+    else:
+        image_note = "※ 画像はありません。text_overlay_percentageはnullにしてください。"
+
+    # リクエストごとに変わる部分（審査基準・指示・出力形式はMETA_AD_REVIEW_SYSTEM_PROMPT）
+    prompt = f"""## 審査対象の広告
+
+{ad_text}
+
+{image_note}
+
+---
+
+システムプロンプトの審査基準と指示に従って上記の広告を審査し、指定のJSON形式のみを返してください。
+"""
+
     return prompt
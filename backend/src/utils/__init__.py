@@ -23,6 +23,7 @@ from .image import (
     process_and_validate_image,
     extract_mime_type_from_base64,
     optimize_image_for_ai,
+    detect_image_media_type,
 )
 
 from .logger import setup_logging, get_logger
@@ -47,6 +48,7 @@ __all__ = [
     "process_and_validate_image",
     "extract_mime_type_from_base64",
     "optimize_image_for_ai",
+    "detect_image_media_type",
     # Logging
     "setup_logging",
     "get_logger",
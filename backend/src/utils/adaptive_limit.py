@@ -0,0 +1,140 @@
+"""
+============================================
+メタ広告審査チェッカー - Claude APIの同時呼び出し数の自動調整
+============================================
+
+Claude APIの応答から同時呼び出し数の上限を調整する（AIMD＋レイテンシの勾配）
+- 成功: 上限の近くまで使われている間は、上限1回分の成功ごとに1ずつ増やす
+- 429/529・タイムアウト: 半分に減らす
+- 最初のテキストまでの時間（TTFT）が基準（最小値）のCLAUDE_LATENCY_TOLERANCE倍を超えた場合:
+  超えた割合に応じて減らす（429になる前に上流の混雑で減らす）
+
+同時に送った一群のリクエストがまとめて失敗しても1回分だけ減らすよう、減らした直後の一定時間は減らさない
+"""
+
+import os
+import time
+import logging
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# --------------------------------------------
+# Configuration
+# --------------------------------------------
+
+# 同時呼び出し数の下限・上限
+CLAUDE_MIN_CONCURRENCY = int(os.getenv("CLAUDE_MIN_CONCURRENCY", "1"))
+CLAUDE_CONCURRENCY_CEILING = int(os.getenv("CLAUDE_CONCURRENCY_CEILING", "16"))
+# TTFTが基準のこの倍数を超えたら混雑とみなす
+CLAUDE_LATENCY_TOLERANCE = float(os.getenv("CLAUDE_LATENCY_TOLERANCE", "2.0"))
+
+# 429/529・タイムアウト時の縮小率
+_BACKOFF_RATIO = 0.5
+# 基準のTTFTを実測値へ近づける割合（上流が恒常的に遅くなった場合に基準を追従させる）
+_BASELINE_DRIFT = 0.05
+# 減らした後、次に減らすまでの最短秒数（基準のTTFTの方が長い場合はそちら）
+_MIN_DECREASE_INTERVAL_SECONDS = 1.0
+
+
+# --------------------------------------------
+# Adaptive Concurrency Limit
+# --------------------------------------------
+
+class AdaptiveConcurrencyLimit:
+    """応答のレイテンシとエラーから同時呼び出し数の上限を調整"""
+
+    def __init__(
+        self,
+        initial: int,
+        min_limit: Optional[int] = None,
+        max_limit: Optional[int] = None,
+        tolerance: Optional[float] = None,
+    ):
+        """
+        初期化
+
+        Args:
+            initial: 上限の初期値
+            min_limit: 上限の下限（未指定の場合はCLAUDE_MIN_CONCURRENCY）
+            max_limit: 上限の上限（未指定の場合はCLAUDE_CONCURRENCY_CEILING）
+            tolerance: 混雑とみなすTTFTの基準に対する倍数（未指定の場合はCLAUDE_LATENCY_TOLERANCE）
+        """
+        self.min_limit = max(1, min_limit or CLAUDE_MIN_CONCURRENCY)
+        self.max_limit = max(self.min_limit, max_limit or CLAUDE_CONCURRENCY_CEILING)
+        self.tolerance = max(1.0, tolerance or CLAUDE_LATENCY_TOLERANCE)
+        self._limit = float(min(self.max_limit, max(self.min_limit, initial)))
+        self._baseline_ms: Optional[float] = None
+        self._last_latency_ms: Optional[float] = None
+        self._last_decrease = float("-inf")
+        self.counters = {
+            "increases": 0,
+            "decreases": 0,
+            "overloads": 0,
+            "latency_inflations": 0,
+        }
+
+    @property
+    def current(self) -> int:
+        """現在の上限"""
+        return int(self._limit)
+
+    def record_success(self, latency_ms: float, in_flight: int) -> None:
+        """
+        成功した呼び出しを記録
+
+        Args:
+            latency_ms: 最初のテキストまでの時間（ミリ秒）
+            in_flight: 記録時点の同時呼び出し数（上限まで使われていない間は増やさない）
+        """
+        self._last_latency_ms = latency_ms
+        if self._baseline_ms is None or latency_ms < self._baseline_ms:
+            self._baseline_ms = latency_ms
+        else:
+            self._baseline_ms += (latency_ms - self._baseline_ms) * _BASELINE_DRIFT
+
+        gradient = self._baseline_ms * self.tolerance / max(latency_ms, 1e-3)
+        if gradient < 1.0:
+            self.counters["latency_inflations"] += 1
+            self._decrease(max(_BACKOFF_RATIO, gradient), f"latency {latency_ms:.0f}ms > {self.tolerance}x baseline {self._baseline_ms:.0f}ms")
+            return
+
+        if in_flight * 2 >= self.current and self._limit < self.max_limit:
+            previous = self.current
+            self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+            if self.current > previous:
+                self.counters["increases"] += 1
+                logger.info(f"Claude API concurrency limit increased: {previous} -> {self.current}")
+
+    def record_overload(self, reason: str) -> None:
+        """
+        過負荷（429/529・タイムアウト）を記録
+
+        Args:
+            reason: ログに残す理由
+        """
+        self.counters["overloads"] += 1
+        self._decrease(_BACKOFF_RATIO, reason)
+
+    def _decrease(self, factor: float, reason: str) -> None:
+        now = time.monotonic()
+        interval = max(_MIN_DECREASE_INTERVAL_SECONDS, (self._baseline_ms or 0.0) / 1000)
+        if now - self._last_decrease < interval:
+            return
+        self._last_decrease = now
+        previous = self.current
+        self._limit = max(float(self.min_limit), self._limit * factor)
+        self.counters["decreases"] += 1
+        logger.warning(f"Claude API concurrency limit decreased: {previous} -> {self.current} ({reason})")
+
+    def stats(self) -> Dict[str, Any]:
+        """統計情報"""
+        return {
+            **self.counters,
+            "limit": self.current,
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "baseline_latency_ms": round(self._baseline_ms, 1) if self._baseline_ms is not None else None,
+            "last_latency_ms": round(self._last_latency_ms, 1) if self._last_latency_ms is not None else None,
+        }
@@ -0,0 +1,266 @@
+"""
+============================================
+メタ広告審査チェッカー - 画像CDNリサイズURL書き換え
+============================================
+
+オンザフライでリサイズできる画像CDN（imgix / Cloudinary / Shopify / WordPress Photon / Next.js画像最適化）の
+URLを、AIに送る最大寸法以下のWebP/JPEGを返すURLに書き換える。
+書き換え規則はCDNごとのCdnRewriterとして登録でき、取得に失敗した場合は元URLで取得し直す（url_fetcher側）。
+"""
+
+import os
+import re
+import logging
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any, Callable
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode, SplitResult
+
+logger = logging.getLogger(__name__)
+
+
+# --------------------------------------------
+# Configuration
+# --------------------------------------------
+
+CDN_REWRITE_ENABLED = os.getenv("CDN_REWRITE_ENABLED", "true").lower() == "true"
+
+# 書き換え後のリクエストで送るAcceptヘッダー（Accept次第で形式を変えるCDN向け）
+CDN_ACCEPT_HEADER = "image/webp,image/jpeg;q=0.9,image/*;q=0.5"
+
+# Next.js画像最適化のデフォルトで許可されている幅（deviceSizes）
+NEXT_IMAGE_WIDTHS = (640, 750, 828, 1080, 1200, 1920, 2048, 3840)
+
+# Cloudinaryの変換パラメータ（パスセグメントが変換指定かどうかの判定用）
+CLOUDINARY_TRANSFORMATION_PATTERN = re.compile(
+    r'^(?:(?:a|ac|af|ar|b|bo|br|c|co|cs|d|dl|dn|dpr|du|e|eo|f|fl|fn|fps|g|h|if|ki|l|o|p|pg|q|r|so|sp|t|u|vc|vs|w|x|y|z)_[^/,]+,?)+$'
+)
+CLOUDINARY_DELIVERY_TYPES = {'upload', 'fetch', 'private', 'authenticated'}
+PHOTON_HOST_PATTERN = re.compile(r'^i[0-3]\.wp\.com$')
+
+
+# --------------------------------------------
+# Data Classes
+# --------------------------------------------
+
+@dataclass
+class CdnRewriter:
+    """CDNごとの書き換え規則"""
+    name: str
+    # URLがこのCDNのものか
+    matches: Callable[[SplitResult], bool]
+    # 書き換え後のURL（書き換え不要・不可の場合はNone）
+    rewrite: Callable[[SplitResult, int], Optional[str]]
+
+
+@dataclass
+class CdnRewrite:
+    """書き換え結果"""
+    url: str
+    cdn: str
+    headers: Dict[str, str]
+
+
+# --------------------------------------------
+# Rewriters
+# --------------------------------------------
+
+def _with_query(parts: SplitResult, query: Dict[str, str]) -> str:
+    return urlunsplit(parts._replace(query=urlencode(query, safe=',')))
+
+
+def _dimension(value: Optional[str]) -> Optional[int]:
+    """寸法指定の値を整数に変換（数値でなければNone）"""
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _capped(value: Optional[str], max_dimension: int) -> int:
+    """既存の寸法指定がmax_dimension以下ならそれを、なければmax_dimensionを返す"""
+    current = _dimension(value)
+    return current if current is not None and 1 <= current <= max_dimension else max_dimension
+
+
+def _rewrite_imgix(parts: SplitResult, max_dimension: int) -> Optional[str]:
+    query = dict(parse_qsl(parts.query, keep_blank_values=True))
+    if query.get('fit') in ('crop', 'facearea') or 'rect' in query:
+        # 切り抜き指定は寸法を変えると結果が変わるため書き換えない
+        return None
+    query['w'] = str(_capped(query.get('w'), max_dimension))
+    query['h'] = str(_capped(query.get('h'), max_dimension))
+    query['fit'] = 'max'
+    if query.get('fm') not in ('jpg', 'pjpg', 'webp'):
+        query['fm'] = 'webp'
+    return _with_query(parts, query)
+
+
+def _rewrite_cloudinary(parts: SplitResult, max_dimension: int) -> Optional[str]:
+    segments = parts.path.split('/')
+    # /<cloud>/image/<配信タイプ>/<変換>.../<バージョン>/<公開ID>
+    try:
+        index = segments.index('image') + 1
+    except ValueError:
+        return None
+    if index >= len(segments) or segments[index] not in CLOUDINARY_DELIVERY_TYPES:
+        return None
+    index += 1
+    # 既存の変換指定の後ろに追加する（末尾のセグメントは公開ID）
+    while index < len(segments) - 1 and CLOUDINARY_TRANSFORMATION_PATTERN.match(segments[index]):
+        index += 1
+    limit = f"c_limit,w_{max_dimension},h_{max_dimension},f_webp,q_auto"
+    segments.insert(index, limit)
+    return urlunsplit(parts._replace(path='/'.join(segments)))
+
+
+def _rewrite_shopify(parts: SplitResult, max_dimension: int) -> Optional[str]:
+    query = dict(parse_qsl(parts.query, keep_blank_values=True))
+    width = _capped(query.get('width'), max_dimension)
+    if str(width) == query.get('width'):
+        return None
+    query['width'] = str(width)
+    return _with_query(parts, query)
+
+
+def _rewrite_photon(parts: SplitResult, max_dimension: int) -> Optional[str]:
+    query = dict(parse_qsl(parts.query, keep_blank_values=True))
+    if 'resize' in query or 'crop' in query:
+        # 切り抜き指定は寸法を変えると結果が変わるため書き換えない
+        return None
+    sizes = [_dimension(value) for value in [query.get('w'), query.get('h'), *query.get('fit', '').split(',')]]
+    sizes = [size for size in sizes if size is not None]
+    if sizes and max(sizes) <= max_dimension:
+        # 既に目標寸法以下
+        return None
+    for key in ('w', 'h'):
+        query.pop(key, None)
+    query['fit'] = f"{max_dimension},{max_dimension}"
+    query['strip'] = 'all'
+    return _with_query(parts, query)
+
+
+def _rewrite_next_image(parts: SplitResult, max_dimension: int) -> Optional[str]:
+    query = dict(parse_qsl(parts.query, keep_blank_values=True))
+    if 'url' not in query:
+        return None
+    # 任意の幅は400エラーになるため、許可されている幅のうち目標寸法以上の最小値を使う
+    width = next((w for w in NEXT_IMAGE_WIDTHS if w >= max_dimension), NEXT_IMAGE_WIDTHS[-1])
+    current = _dimension(query.get('w'))
+    if current is not None and current <= width:
+        return None
+    query['w'] = str(width)
+    return _with_query(parts, query)
+
+
+DEFAULT_REWRITERS = (
+    CdnRewriter('imgix', lambda p: p.hostname is not None and p.hostname.endswith('.imgix.net'), _rewrite_imgix),
+    CdnRewriter(
+        'cloudinary',
+        lambda p: p.hostname is not None and p.hostname.endswith('res.cloudinary.com'),
+        _rewrite_cloudinary,
+    ),
+    CdnRewriter(
+        'shopify',
+        lambda p: p.hostname == 'cdn.shopify.com' or p.path.startswith('/cdn/shop/'),
+        _rewrite_shopify,
+    ),
+    CdnRewriter('photon', lambda p: p.hostname is not None and bool(PHOTON_HOST_PATTERN.match(p.hostname)), _rewrite_photon),
+    CdnRewriter('next_image', lambda p: p.path.endswith('/_next/image'), _rewrite_next_image),
+)
+
+
+# --------------------------------------------
+# Rewrite Layer
+# --------------------------------------------
+
+class CdnRewriteLayer:
+    """登録されたCDNの書き換え規則を順に試し、書き換え結果と削減バイト数を集計"""
+
+    def __init__(self, enabled: bool = CDN_REWRITE_ENABLED):
+        self.enabled = enabled
+        self.rewriters: List[CdnRewriter] = list(DEFAULT_REWRITERS)
+        self.counters = {
+            "rewrites": 0,
+            "served": 0,
+            "fallbacks": 0,
+            "bytes_downloaded": 0,
+            "bytes_saved": 0,
+        }
+        self._by_cdn: Dict[str, Dict[str, int]] = {}
+
+    def register(self, rewriter: CdnRewriter) -> None:
+        """書き換え規則を追加（既存の規則より優先）"""
+        self.rewriters.insert(0, rewriter)
+
+    def rewrite(self, url: str, max_dimension: int) -> Optional[CdnRewrite]:
+        """
+        画像URLをCDNのリサイズURLに書き換え
+
+        Args:
+            url: 画像URL
+            max_dimension: 取得する画像の最大寸法（px）
+
+        Returns:
+            Optional[CdnRewrite]: 書き換え結果（対象外・書き換え不要の場合はNone）
+        """
+        if not self.enabled:
+            return None
+        try:
+            parts = urlsplit(url)
+        except ValueError:
+            return None
+        for rewriter in self.rewriters:
+            if not rewriter.matches(parts):
+                continue
+            rewritten = rewriter.rewrite(parts, max_dimension)
+            if rewritten and rewritten != url:
+                self._count(rewriter.name, "rewrites")
+                return CdnRewrite(url=rewritten, cdn=rewriter.name, headers={"Accept": CDN_ACCEPT_HEADER})
+            return None
+        return None
+
+    def record_served(self, cdn: str, downloaded: int, original_size: Optional[int] = None) -> Optional[int]:
+        """
+        書き換えURLで取得できたことを記録
+
+        Args:
+            cdn: CDN名
+            downloaded: 書き換えURLからダウンロードしたバイト数
+            original_size: 元URLの画像のバイト数（ヘッダープローブ等で分かっている場合）
+
+        Returns:
+            Optional[int]: 削減できたバイト数（元のサイズが不明の場合はNone）
+        """
+        self._count(cdn, "served")
+        self.counters["bytes_downloaded"] += downloaded
+        if original_size is None:
+            return None
+        saved = max(0, original_size - downloaded)
+        self._count(cdn, "bytes_saved", saved)
+        return saved
+
+    def record_fallback(self, cdn: str) -> None:
+        """書き換えURLで取得できず、元URLで取得し直したことを記録"""
+        self._count(cdn, "fallbacks")
+
+    def _count(self, cdn: str, counter: str, amount: int = 1) -> None:
+        self.counters[counter] += amount
+        per_cdn = self._by_cdn.setdefault(cdn, {"rewrites": 0, "served": 0, "fallbacks": 0, "bytes_saved": 0})
+        per_cdn[counter] += amount
+
+    def stats(self) -> Dict[str, Any]:
+        """書き換えの統計情報"""
+        return {
+            **self.counters,
+            "enabled": self.enabled,
+            "cdns": {cdn: dict(counts) for cdn, counts in self._by_cdn.items()},
+        }
+
+
+# グローバル書き換えレイヤー
+_cdn_rewrite_layer = CdnRewriteLayer()
+
+
+def get_cdn_rewrite_layer() -> CdnRewriteLayer:
+    """グローバルCDN書き換えレイヤーを取得"""
+    return _cdn_rewrite_layer
@@ -0,0 +1,195 @@
+"""
+============================================
+メタ広告審査チェッカー - CPU処理用エグゼキューター
+============================================
+
+HTML解析・画像最適化・Base64エンコード・大きなJSONの解析など、
+CPUを占有する同期処理をイベントループの外（スレッド／プロセスプール）で実行する
+（アプリケーションのlifespanで起動・停止し、小さな入力はその場で実行する）
+"""
+
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Optional, Dict, Any, Callable, TypeVar, Tuple
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+# --------------------------------------------
+# Configuration
+# --------------------------------------------
+
+# thread: スレッドプール（Pillow・lxml・PyMuPDFはGILを解放する処理が多い） / process: プロセスプール
+CPU_POOL_KIND = os.getenv("CPU_POOL_KIND", "thread").lower()
+# ワーカー数（0の場合はプールを使わず常にその場で実行）
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+# この入力サイズ（バイト／文字）未満の処理はプールに渡さずその場で実行
+CPU_POOL_INLINE_THRESHOLD = int(os.getenv("CPU_POOL_INLINE_THRESHOLD", str(16 * 1024)))
+
+
+# --------------------------------------------
+# Worker Functions
+# --------------------------------------------
+
+def _warm_up(delay: float) -> None:
+    """ワーカーの起動と重いモジュールの読み込みを済ませる"""
+    from PIL import Image  # noqa: F401
+    from lxml import etree  # noqa: F401
+    time.sleep(delay)
+
+
+def _timed_call(func: Callable[..., T], args: Tuple[Any, ...]) -> Tuple[T, float]:
+    """ワーカー内で処理を実行し、実行時間（秒）とあわせて返す"""
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+# --------------------------------------------
+# CPU Pool
+# --------------------------------------------
+
+class CpuPool:
+    """CPU処理用のワーカープール（処理種別ごとの実行時間と待ち行列の深さを計測）"""
+
+    def __init__(
+        self,
+        kind: str = CPU_POOL_KIND,
+        workers: int = CPU_POOL_WORKERS,
+        inline_threshold: int = CPU_POOL_INLINE_THRESHOLD,
+    ):
+        self.kind = kind
+        self.workers = workers
+        self.inline_threshold = inline_threshold
+        self._executor: Optional[Executor] = None
+        # プールに投入済みで未完了の処理数
+        self.pending = 0
+        self.peak_queue_depth = 0
+        self.counters = {
+            "submitted": 0,
+            "inline": 0,
+            "completed": 0,
+            "failed": 0,
+        }
+        self._tasks: Dict[str, Dict[str, float]] = {}
+
+    @property
+    def started(self) -> bool:
+        return self._executor is not None
+
+    @property
+    def queue_depth(self) -> int:
+        """ワーカーの空きを待っている処理数"""
+        return max(0, self.pending - self.workers)
+
+    async def start(self) -> None:
+        """プールを起動し、全ワーカーを事前に立ち上げる（lifespanのstartupで呼び出す）"""
+        if self.started or self.workers <= 0:
+            return
+
+        if self.kind == "process":
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="cpu-pool")
+
+        # ワーカー数分の処理を同時に投入して、全ワーカーを起動させる
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(self._executor, _warm_up, 0.05) for _ in range(self.workers)
+        ))
+        logger.info(f"CPU pool started: kind={self.kind}, workers={self.workers}")
+
+    async def aclose(self) -> None:
+        """プールを停止（lifespanのshutdownで呼び出す）"""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            await asyncio.get_running_loop().run_in_executor(None, executor.shutdown)
+            logger.info("CPU pool stopped")
+
+    async def run(self, func: Callable[..., T], *args: Any, size: Optional[int] = None, label: str = "task") -> T:
+        """
+        同期処理をプールで実行
+
+        Args:
+            func: 実行する関数（プロセスプールの場合はモジュールレベルの関数であること）
+            *args: 関数の引数
+            size: 入力サイズ（inline_threshold未満ならその場で実行）
+            label: メトリクス集計用の処理種別
+
+        Returns:
+            関数の戻り値
+        """
+        if self._executor is None or (size is not None and size < self.inline_threshold):
+            self.counters["inline"] += 1
+            result, elapsed = _timed_call(func, args)
+            self._record(label, elapsed, 0.0, inline=True)
+            return result
+
+        self.counters["submitted"] += 1
+        self.pending += 1
+        self.peak_queue_depth = max(self.peak_queue_depth, self.queue_depth)
+        submitted_at = time.perf_counter()
+        try:
+            result, elapsed = await asyncio.get_running_loop().run_in_executor(
+                self._executor, _timed_call, func, args
+            )
+        except BaseException:
+            self.counters["failed"] += 1
+            raise
+        finally:
+            self.pending -= 1
+
+        self.counters["completed"] += 1
+        waited = max(0.0, time.perf_counter() - submitted_at - elapsed)
+        self._record(label, elapsed, waited, inline=False)
+        return result
+
+    def _record(self, label: str, elapsed: float, waited: float, inline: bool) -> None:
+        stats = self._tasks.get(label)
+        if stats is None:
+            stats = {"count": 0, "inline": 0, "run_ms_total": 0.0, "run_ms_max": 0.0, "wait_ms_total": 0.0}
+            self._tasks[label] = stats
+        elapsed_ms = elapsed * 1000
+        stats["count"] += 1
+        stats["inline"] += int(inline)
+        stats["run_ms_total"] += elapsed_ms
+        stats["run_ms_max"] = max(stats["run_ms_max"], elapsed_ms)
+        stats["wait_ms_total"] += waited * 1000
+
+    def stats(self) -> Dict[str, Any]:
+        """プールの統計情報"""
+        tasks = {}
+        for label, stats in self._tasks.items():
+            pooled = stats["count"] - stats["inline"]
+            tasks[label] = {
+                "count": stats["count"],
+                "inline": stats["inline"],
+                "avg_run_ms": round(stats["run_ms_total"] / stats["count"], 2),
+                "max_run_ms": round(stats["run_ms_max"], 2),
+                "avg_wait_ms": round(stats["wait_ms_total"] / pooled, 2) if pooled else 0.0,
+            }
+        return {
+            **self.counters,
+            "kind": self.kind,
+            "workers": self.workers,
+            "started": self.started,
+            "inline_threshold": self.inline_threshold,
+            "pending": self.pending,
+            "queue_depth": self.queue_depth,
+            "peak_queue_depth": self.peak_queue_depth,
+            "tasks": tasks,
+        }
+
+
+# グローバルCPUプール
+_cpu_pool = CpuPool()
+
+
+def get_cpu_pool() -> CpuPool:
+    """グローバルCPUプールを取得"""
+    return _cpu_pool
@@ -73,11 +73,20 @@ class UnsupportedMediaTypeError(HTTPException):
 
 class RateLimitExceededError(HTTPException):
     """レート制限超過エラー（429）"""
-    def __init__(self, message: str = "リクエスト制限を超えました。しばらく待ってから再試行してください。", retry_after: Optional[int] = None):
+    def __init__(
+        self,
+        message: str = "リクエスト制限を超えました。しばらく待ってから再試行してください。",
+        retry_after: Optional[int] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ):
         details = {"retry_after_seconds": retry_after} if retry_after else None
+        headers = dict(headers or {})
+        if retry_after:
+            headers.setdefault("Retry-After", str(retry_after))
         super().__init__(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail=create_error_detail("rate_limit_exceeded", message, details)
+            detail=create_error_detail("rate_limit_exceeded", message, details),
+            headers=headers or None,
         )
 
 
@@ -135,7 +144,8 @@ async def http_exception_handler(request: Request, exc: HTTPException) -> JSONRe
     """HTTPExceptionのハンドラー（CORSヘッダー付き）"""
     # リクエストからOriginを取得
     origin = request.headers.get("origin")
-    cors_headers = get_cors_headers(origin)
+    # 例外に付いたヘッダー（Retry-After等）も返す
+    cors_headers = {**(exc.headers or {}), **get_cors_headers(origin)}
 
     # カスタムHTTPExceptionの場合は詳細情報を保持
     if isinstance(exc.detail, dict):
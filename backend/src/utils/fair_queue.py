@@ -0,0 +1,199 @@
+"""
+============================================
+メタ広告審査チェッカー - 呼び出し元間の公平キュー
+============================================
+
+Claude APIの同時呼び出し数（CLAUDE_MAX_CONCURRENCY）が埋まっている間、待機中のリクエストを
+呼び出し元ごとの重み付き公平キュー（start-time fair queuing）で順に処理する
+- 呼び出し元ごとに「仮想的な開始時刻」を1/重みずつ進め、最も小さいものから処理する
+- 1つの呼び出し元が大量に送っても、他の呼び出し元のリクエストは重みに応じた順番で割り込める
+- 空きがある間は待たずにそのまま処理する
+
+同時呼び出し数の上限は、Claude APIの応答（レイテンシ・429/529）から自動で調整する
+（CLAUDE_ADAPTIVE_CONCURRENCY、調整方法はutils/adaptive_limit.py）
+"""
+
+import os
+import time
+import heapq
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from .errors import ServiceUnavailableError
+from .adaptive_limit import AdaptiveConcurrencyLimit
+
+logger = logging.getLogger(__name__)
+
+
+# --------------------------------------------
+# Configuration
+# --------------------------------------------
+
+# Claude APIの同時呼び出し数の上限（自動調整する場合は初期値）
+CLAUDE_MAX_CONCURRENCY = int(os.getenv("CLAUDE_MAX_CONCURRENCY", "4"))
+# 同時呼び出し数の上限を応答から自動調整する
+CLAUDE_ADAPTIVE_CONCURRENCY = os.getenv("CLAUDE_ADAPTIVE_CONCURRENCY", "true").lower() == "true"
+# 空きを待つ最大秒数（超えた場合は503）
+FAIR_QUEUE_TIMEOUT = float(os.getenv("FAIR_QUEUE_TIMEOUT", "30"))
+
+# 呼び出し元ごとの仮想時刻をこの数を超えて保持しない（処理済みのものから捨てる）
+_MAX_TRACKED_TENANTS = 4096
+
+
+# --------------------------------------------
+# Fair Scheduler
+# --------------------------------------------
+
+class FairScheduler:
+    """重み付き公平キューによる同時実行数の制御"""
+
+    def __init__(
+        self,
+        capacity: Optional[int] = None,
+        timeout: Optional[float] = None,
+        adaptive: Optional[bool] = None,
+    ):
+        """
+        初期化
+
+        Args:
+            capacity: 同時実行数の上限（未指定の場合はCLAUDE_MAX_CONCURRENCY、自動調整する場合は初期値）
+            timeout: 空きを待つ最大秒数（未指定の場合はFAIR_QUEUE_TIMEOUT）
+            adaptive: 上限を自動調整するか（未指定の場合はCLAUDE_ADAPTIVE_CONCURRENCY）
+        """
+        self._capacity = max(1, capacity or CLAUDE_MAX_CONCURRENCY)
+        adaptive = CLAUDE_ADAPTIVE_CONCURRENCY if adaptive is None else adaptive
+        self.limit = AdaptiveConcurrencyLimit(self._capacity) if adaptive else None
+        self.timeout = FAIR_QUEUE_TIMEOUT if timeout is None else timeout
+        self._in_flight = 0
+        self._virtual_time = 0.0
+        # 呼び出し元 → 最後に割り当てた仮想的な終了時刻
+        self._finish_tags: Dict[str, float] = {}
+        # (開始時刻, 到着順, 呼び出し元, 待機中のFuture)
+        self._waiters: List[Tuple[float, int, str, asyncio.Future]] = []
+        self._sequence = 0
+        self.counters = {
+            "admitted": 0,
+            "queued": 0,
+            "timeouts": 0,
+            "max_queue_depth": 0,
+        }
+        self._wait_ms_total = 0.0
+
+    @property
+    def capacity(self) -> int:
+        """現在の同時実行数の上限"""
+        return self.limit.current if self.limit is not None else self._capacity
+
+    @asynccontextmanager
+    async def slot(self, tenant_id: str, weight: float = 1.0) -> AsyncIterator[None]:
+        """
+        同時実行の枠を1つ確保して処理する
+
+        Args:
+            tenant_id: 呼び出し元
+            weight: 呼び出し元の重み（大きいほど多く処理される）
+
+        Raises:
+            ServiceUnavailableError: timeout秒以内に空きができなかった場合
+        """
+        await self._acquire(tenant_id, weight)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, tenant_id: str, weight: float) -> None:
+        start_tag = max(self._virtual_time, self._finish_tags.get(tenant_id, 0.0))
+        self._finish_tags[tenant_id] = start_tag + 1.0 / max(weight, 0.01)
+        if len(self._finish_tags) > _MAX_TRACKED_TENANTS:
+            self._finish_tags = {
+                tenant: tag for tenant, tag in self._finish_tags.items() if tag > self._virtual_time
+            }
+
+        if self._in_flight < self.capacity and not self._waiters:
+            self._in_flight += 1
+            self._virtual_time = start_tag
+            self.counters["admitted"] += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._sequence += 1
+        heapq.heappush(self._waiters, (start_tag, self._sequence, tenant_id, future))
+        # 待機をやめたものしか残っていなければ、空きの分をすぐ割り当てる
+        self._dispatch()
+        self.counters["queued"] += 1
+        self.counters["max_queue_depth"] = max(self.counters["max_queue_depth"], len(self._waiters))
+        logger.info(f"Claude API concurrency saturated ({self._in_flight}/{self.capacity}), queued tenant={tenant_id}")
+
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            raise ServiceUnavailableError(
+                message="審査リクエストが混み合っています。時間を置いて再試行してください。",
+                details={"queue_timeout_seconds": self.timeout},
+            )
+        except BaseException:
+            # 枠を割り当てられた直後に取り消された場合は、その枠を返す
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+        finally:
+            self._wait_ms_total += (time.perf_counter() - started) * 1000
+        self.counters["admitted"] += 1
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """空きの分だけ、開始時刻の小さい待機中のリクエストから処理を始める"""
+        while self._waiters and self._in_flight < self.capacity:
+            start_tag, _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                # タイムアウト・切断で待機をやめたもの
+                continue
+            self._in_flight += 1
+            self._virtual_time = max(self._virtual_time, start_tag)
+            future.set_result(None)
+
+    # --------------------------------------------
+    # 上限の自動調整
+    # --------------------------------------------
+
+    def record_success(self, latency_ms: float) -> None:
+        """Claude APIの呼び出しの成功を記録（latency_ms: 最初のテキストまでの時間）"""
+        if self.limit is not None:
+            self.limit.record_success(latency_ms, self._in_flight)
+            # 上限が増えた分は待機中のリクエストに割り当てる
+            self._dispatch()
+
+    def record_overload(self, reason: str) -> None:
+        """Claude APIの過負荷（429/529・タイムアウト）を記録（実行中のものは終わるまで待ち、新たに割り当てない）"""
+        if self.limit is not None:
+            self.limit.record_overload(reason)
+
+    def stats(self) -> Dict[str, Any]:
+        """統計情報"""
+        waiting = sum(1 for *_, future in self._waiters if not future.done())
+        return {
+            **self.counters,
+            "capacity": self.capacity,
+            "in_flight": self._in_flight,
+            "waiting": waiting,
+            "avg_wait_ms": round(self._wait_ms_total / self.counters["queued"], 1) if self.counters["queued"] else 0.0,
+            "adaptive": self.limit.stats() if self.limit is not None else None,
+        }
+
+
+# グローバルインスタンス
+_fair_scheduler = FairScheduler()
+
+
+def get_fair_scheduler() -> FairScheduler:
+    """グローバルな公平キューを取得"""
+    return _fair_scheduler
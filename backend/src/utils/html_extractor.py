@@ -0,0 +1,607 @@
+"""
+============================================
+メタ広告審査チェッカー - 単一パスHTML抽出エンジン
+============================================
+
+lxmlでHTMLを1回だけ走査し、メタデータ・画像候補・構造化テキストをまとめて抽出
+（tests/unit/test_html_extractor.py のBeautifulSoup版の参照実装と同じ結果を返す）
+"""
+
+import logging
+from bisect import bisect_right
+from itertools import islice
+from dataclasses import dataclass, field
+from typing import Optional, List, Tuple, Dict
+from urllib.parse import urljoin
+
+from lxml import etree
+
+from .image import is_valid_image_url, select_image_source
+from .json_images import extract_images_from_json_data
+
+logger = logging.getLogger(__name__)
+
+
+# --------------------------------------------
+# Configuration
+# --------------------------------------------
+
+# テキスト抽出で無視する要素
+TEXT_EXCLUDED_TAGS = {'script', 'style', 'noscript'}
+# メインコンテンツ内で本文から除外する要素
+MAIN_EXCLUDED_TAGS = {'nav', 'footer', 'aside'}
+# ヒーローセクション判定に使うclassのキーワード
+HERO_CLASS_KEYWORDS = ('hero', 'main-visual', 'mv', 'kv', 'top', 'first')
+
+# 主要画像を探す祖先要素の条件（優先順）
+# ('tag', 値): タグ名一致 / ('class', 値): classトークン一致 / ('class*', 値): class属性の部分一致
+HERO_IMAGE_SELECTORS: Tuple[Tuple[str, str], ...] = (
+    ('tag', 'header'),
+    ('tag', 'section'),
+    ('class', 'hero'),
+    ('class', 'main-visual'),
+    ('class', 'mv'),
+    ('class', 'kv'),
+    ('class', 'top'),
+    ('class', 'banner'),
+    ('class*', 'hero'),
+    ('class*', 'main'),
+    ('class*', 'visual'),
+)
+# セレクタごとに採用する画像の最大数
+IMAGES_PER_SELECTOR = 3
+
+
+# --------------------------------------------
+# Data Classes
+# --------------------------------------------
+
+@dataclass
+class ExtractedPage:
+    """HTMLからの抽出結果"""
+    title: Optional[str] = None
+    description: Optional[str] = None
+    og_image_url: Optional[str] = None
+    # LP内の主要画像URL候補（優先順）
+    image_candidates: List[str] = field(default_factory=list)
+    # 構造化テキスト（【H1】/【ヒーロー】/【強調】等のタグ付き）
+    page_text: str = ''
+
+
+@dataclass
+class _Span:
+    """テキスト断片リスト上の要素範囲（pre: 文書順の要素番号、last: 子孫の最大要素番号）"""
+    pre: int
+    start: int
+    end: int = -1
+    last: int = -1
+
+
+@dataclass
+class _ImageNode:
+    """img要素の情報"""
+    # srcset・遅延読み込み属性から選んだ画像URL（相対パスのまま）
+    src: Optional[str]
+    width: Optional[str]
+    height: Optional[str]
+    # 祖先要素が一致したHERO_IMAGE_SELECTORSのビットマスク
+    selector_mask: int
+
+
+class _Collector:
+    """走査中に分類したノードの記録"""
+
+    def __init__(self):
+        self.pieces: List[str] = []
+        # メタデータ
+        self.meta_property: Dict[str, Optional[str]] = {}
+        self.meta_description: Optional[str] = None
+        self.meta_description_seen = False
+        self.title: Optional[str] = None
+        # 画像
+        self.images: List[_ImageNode] = []
+        # テキスト
+        self.headings: Dict[str, List[_Span]] = {'h1': [], 'h2': [], 'h3': []}
+        self.hero_sections = 0
+        self.hero_blocks: List[Tuple[Tuple[int, ...], _Span]] = []
+        self.emphasis: List[_Span] = []
+        self.paragraphs: List[_Span] = []
+        self.list_items: List[_Span] = []
+        self.main_candidates: Dict[str, _Span] = {}
+        self.main_excluded: List[_Span] = []
+
+
+# --------------------------------------------
+# Parsing
+# --------------------------------------------
+
+def _parse_html(html: str):
+    """HTMLをlxmlでパース（エンコーディング宣言付きの文字列にも対応）"""
+    if not html:
+        return None
+    try:
+        return etree.fromstring(html, etree.HTMLParser())
+    except ValueError:
+        return etree.fromstring(html.encode('utf-8'), etree.HTMLParser(encoding='utf-8'))
+
+
+def _own_selector_mask(tag: str, class_attr: Optional[str]) -> int:
+    """要素自身が一致するHERO_IMAGE_SELECTORSのビットマスク"""
+    mask = 0
+    class_tokens = class_attr.split() if class_attr else ()
+    for bit, (kind, value) in enumerate(HERO_IMAGE_SELECTORS):
+        if kind == 'tag':
+            matched = tag == value
+        elif kind == 'class':
+            matched = value in class_tokens
+        else:
+            matched = class_attr is not None and value in class_attr
+        if matched:
+            mask |= 1 << bit
+    return mask
+
+
+def _picture_sources(img) -> List[Dict[str, str]]:
+    """
+    <picture>内でimgより前にある<source>要素の属性（文書順）
+
+    libxml2は<source>を空要素として扱わないため、後続の<source>やimgが
+    前の<source>の子になる。祖先の<source>も<picture>に達するまで辿る。
+    """
+    sources: List[Dict[str, str]] = []
+    node = img
+    while True:
+        sources.extend(dict(sibling.attrib) for sibling in node.itersiblings(preceding=True)
+                       if isinstance(sibling.tag, str) and sibling.tag.lower() == 'source')
+        parent = node.getparent()
+        if parent is None or not isinstance(parent.tag, str):
+            return []
+        parent_tag = parent.tag.lower()
+        if parent_tag == 'picture':
+            break
+        if parent_tag != 'source':
+            return []
+        sources.append(dict(parent.attrib))
+        node = parent
+    sources.reverse()
+    return sources
+
+
+def _walk(root) -> _Collector:
+    """
+    ツリーを1回だけ走査してノードを分類
+
+    テキストは strip 済みの断片として文書順に1つのリストへ集め、
+    各要素は断片リスト上の範囲（_Span）として記録する。
+    """
+    collector = _Collector()
+    pieces = collector.pieces
+    selector_counts = [0] * len(HERO_IMAGE_SELECTORS)
+    # 走査スタック: (要素のselectorマスク, テキスト除外要素か, 開いたヒーローセクション番号, 範囲)
+    stack: List[Tuple[int, bool, Optional[int], Optional[_Span]]] = []
+    excluded_depth = 0
+    open_heroes: List[int] = []
+    pre = 0
+
+    def add_text(text: Optional[str]) -> None:
+        if text and excluded_depth == 0:
+            stripped = text.strip()
+            if stripped:
+                pieces.append(stripped)
+
+    for event, element in etree.iterwalk(root, events=('start', 'end', 'comment', 'pi')):
+        if event in ('comment', 'pi'):
+            # コメント・処理命令: 本文は無視し、後続テキスト（tail）のみ採用
+            add_text(element.tail)
+            continue
+
+        tag = element.tag
+        if event == 'start':
+            pre += 1
+            tag = tag.lower()
+            class_attr = element.get('class')
+
+            # 画像（noscript内も含めて全て対象）
+            if tag == 'img':
+                ancestor_mask = 0
+                for bit, count in enumerate(selector_counts):
+                    if count:
+                        ancestor_mask |= 1 << bit
+                collector.images.append(_ImageNode(
+                    src=select_image_source(element.attrib, _picture_sources(element)),
+                    width=element.get('width'),
+                    height=element.get('height'),
+                    selector_mask=ancestor_mask,
+                ))
+            elif tag == 'meta':
+                content = element.get('content')
+                prop = element.get('property')
+                if prop in ('og:title', 'og:description', 'og:image') and prop not in collector.meta_property:
+                    collector.meta_property[prop] = content
+                if element.get('name') == 'description' and not collector.meta_description_seen:
+                    collector.meta_description_seen = True
+                    collector.meta_description = content
+
+            own_mask = _own_selector_mask(tag, class_attr)
+            for bit in range(len(HERO_IMAGE_SELECTORS)):
+                if own_mask & (1 << bit):
+                    selector_counts[bit] += 1
+
+            is_excluded = tag in TEXT_EXCLUDED_TAGS
+            span: Optional[_Span] = None
+            hero_index: Optional[int] = None
+
+            if tag == 'title' and collector.title is None:
+                # 最初のtitle要素（script等の除外対象外）
+                collector.title = ''.join(text.strip() for text in element.itertext())
+
+            if excluded_depth == 0 and not is_excluded:
+                span = _Span(pre=pre, start=len(pieces))
+                if tag in collector.headings:
+                    collector.headings[tag].append(span)
+                elif tag in ('strong', 'b', 'em'):
+                    collector.emphasis.append(span)
+                elif tag == 'p':
+                    collector.paragraphs.append(span)
+                elif tag == 'li':
+                    collector.list_items.append(span)
+                elif tag in MAIN_EXCLUDED_TAGS:
+                    collector.main_excluded.append(span)
+                elif tag in ('main', 'article', 'body') and tag not in collector.main_candidates:
+                    collector.main_candidates[tag] = span
+
+                if tag in ('p', 'span', 'div') and open_heroes:
+                    collector.hero_blocks.append((tuple(open_heroes), span))
+
+                if tag in ('header', 'section') and class_attr:
+                    lowered = class_attr.lower()
+                    if any(keyword in lowered for keyword in HERO_CLASS_KEYWORDS):
+                        if collector.hero_sections < 3:
+                            hero_index = collector.hero_sections
+                            open_heroes.append(hero_index)
+                        collector.hero_sections += 1
+
+            stack.append((own_mask, is_excluded, hero_index, span))
+            if is_excluded:
+                excluded_depth += 1
+            add_text(element.text)
+
+        else:
+            own_mask, is_excluded, hero_index, span = stack.pop()
+            if span is not None:
+                span.end = len(pieces)
+                span.last = pre
+            if hero_index is not None:
+                open_heroes.remove(hero_index)
+            for bit in range(len(HERO_IMAGE_SELECTORS)):
+                if own_mask & (1 << bit):
+                    selector_counts[bit] -= 1
+            if is_excluded:
+                excluded_depth -= 1
+            add_text(element.tail)
+
+    return collector
+
+
+# --------------------------------------------
+# Assembly
+# --------------------------------------------
+
+def _build_metadata(collector: _Collector, base_url: str, result: ExtractedPage) -> None:
+    """メタデータを組み立て（優先順位: og:title > title / og:description > meta description）"""
+    og_title = collector.meta_property.get('og:title')
+    if og_title:
+        result.title = og_title
+    elif collector.title is not None:
+        result.title = collector.title
+
+    og_desc = collector.meta_property.get('og:description')
+    if og_desc:
+        result.description = og_desc
+    elif collector.meta_description:
+        result.description = collector.meta_description
+
+    og_image = collector.meta_property.get('og:image')
+    if og_image:
+        # 相対パスの場合は絶対パスに変換
+        result.og_image_url = urljoin(base_url, og_image)
+
+
+def _build_image_candidates(
+    collector: _Collector,
+    base_url: str,
+    max_images: int,
+    json_images: List[str],
+) -> List[str]:
+    """主要画像URL候補を組み立て（JSON埋め込み → ヒーロー要素内 → サイズ指定あり → 先頭の画像）"""
+    image_urls: List[str] = []
+    seen = set()
+
+    def add(url: str) -> bool:
+        if url not in seen:
+            seen.add(url)
+            image_urls.append(url)
+        return len(image_urls) >= max_images
+
+    # 0. Vue.js/React等のJSON埋め込み画像を優先
+    for img_url in json_images[:max_images]:
+        if add(img_url):
+            return image_urls
+
+    # 1. hero/mainセクション内の画像を優先（セレクタごとに先頭3枚まで）
+    for bit in range(len(HERO_IMAGE_SELECTORS)):
+        matched = [image for image in collector.images if image.selector_mask & (1 << bit)]
+        for image in matched[:IMAGES_PER_SELECTOR]:
+            if image.src and is_valid_image_url(image.src):
+                if add(urljoin(base_url, image.src)):
+                    return image_urls
+
+    # 2. 大きな画像を探す（width/height属性がある場合）
+    for image in collector.images[:20]:
+        if not image.src or not is_valid_image_url(image.src):
+            continue
+        try:
+            w = int((image.width or '').replace('px', ''))
+            h = int((image.height or '').replace('px', ''))
+        except ValueError:
+            continue
+        if w >= 300 or h >= 200:  # 比較的大きな画像
+            if add(urljoin(base_url, image.src)):
+                return image_urls
+
+    # 3. それでも見つからない場合、最初の数枚の画像を取得
+    for image in collector.images[:10]:
+        if image.src and is_valid_image_url(image.src):
+            if add(urljoin(base_url, image.src)):
+                return image_urls
+
+    return image_urls
+
+
+class TextDedupIndex:
+    """
+    抽出済みテキストの包含判定インデックス
+
+    `text in ' '.join(parts)` と同じ判定を、連結文字列を作り直さずに行う。
+    連結文字列の全位置を先頭GRAM_SIZE文字のn-gramで索引化し、問い合わせ時は
+    テキスト中で最も出現位置の少ないn-gramの候補位置だけを照合する。
+    """
+
+    GRAM_SIZE = 4
+
+    def __init__(self):
+        self._chars: List[str] = []
+        self._grams: Dict[str, List[int]] = {}
+
+    def add(self, text: str) -> None:
+        """テキストを連結（区切りは半角スペース）"""
+        chars = self._chars
+        # 直前の末尾と跨るn-gramも索引化する
+        first = max(0, len(chars) - self.GRAM_SIZE + 1)
+        if chars:
+            chars.append(' ')
+        chars.extend(text)
+        grams = self._grams
+        for position in range(first, len(chars) - self.GRAM_SIZE + 1):
+            gram = ''.join(chars[position:position + self.GRAM_SIZE])
+            grams.setdefault(gram, []).append(position)
+
+    def __contains__(self, text: str) -> bool:
+        length = len(text)
+        if length < self.GRAM_SIZE:
+            return text in ''.join(self._chars)
+
+        best_offset = 0
+        best_positions: Optional[List[int]] = None
+        for offset in range(length - self.GRAM_SIZE + 1):
+            positions = self._grams.get(text[offset:offset + self.GRAM_SIZE])
+            if positions is None:
+                return False
+            if best_positions is None or len(positions) < len(best_positions):
+                best_offset, best_positions = offset, positions
+
+        chars = self._chars
+        for position in best_positions:
+            start = position - best_offset
+            if start >= 0 and ''.join(chars[start:start + length]) == text:
+                return True
+        return False
+
+
+class PageTextBuilder:
+    """構造化テキストの組み立て（重複除外と文字数予算の管理）"""
+
+    def __init__(self, max_length: int):
+        self.max_length = max_length
+        self.parts: List[str] = []
+        self._seen = TextDedupIndex()
+        # 空白を詰めた結合後の文字数
+        self._length = -1
+
+    @property
+    def exhausted(self) -> bool:
+        """これ以上追加しても出力（max_lengthで切り詰め）が変わらないか"""
+        return self._length > self.max_length
+
+    def is_new(self, text: str) -> bool:
+        return text not in self._seen  # 重複チェック
+
+    def add(self, text: str) -> None:
+        self.parts.append(text)
+        self._seen.add(text)
+        self._length += 1 + len(' '.join(text.split()))
+
+    def build(self) -> str:
+        # 結合し、連続する空白を1つに
+        full_text = ' '.join('\n'.join(self.parts).split())
+
+        # 最大文字数で切り詰め
+        if len(full_text) > self.max_length:
+            full_text = full_text[:self.max_length] + '...'
+        return full_text
+
+
+def _build_page_text(collector: _Collector, max_length: int) -> Tuple[str, int]:
+    """
+    構造化テキストを組み立て
+
+    元のツリーは変更せず、除外要素（nav, footer, aside）はテキスト断片の範囲として読み飛ばす。
+    結合後の文字数がmax_lengthを超えた時点で以降の抽出を打ち切る。
+    """
+    pieces = collector.pieces
+    # テキスト断片の累積オフセット（要素のテキストを連結文字列のスライスで取得）
+    offsets = [0]
+    for piece in pieces:
+        offsets.append(offsets[-1] + len(piece))
+    joined = ''.join(pieces)
+
+    def text_of(span: _Span) -> str:
+        return joined[offsets[span.start]:offsets[span.end]]
+
+    builder = PageTextBuilder(max_length)
+
+    # 1. 見出しタグを優先的に抽出（h1 > h2 > h3）
+    for tag in ('h1', 'h2', 'h3'):
+        for span in collector.headings[tag]:
+            text = text_of(span)
+            if text and len(text) > 2:  # 2文字以上のみ
+                builder.add(f"【{tag.upper()}】{text}")
+            if builder.exhausted:
+                return builder.build(), len(builder.parts)
+
+    # 2. headerやhero内のキャッチコピー（重要な広告文言が多い）
+    for hero_index in range(min(collector.hero_sections, 3)):
+        for heroes, span in collector.hero_blocks:
+            if hero_index not in heroes:
+                continue
+            text = text_of(span)
+            if text and 5 < len(text) < 200:  # 短すぎず長すぎないテキスト
+                if builder.is_new(text):
+                    builder.add(f"【ヒーロー】{text}")
+                    if builder.exhausted:
+                        return builder.build(), len(builder.parts)
+
+    # 3. 強調テキスト（strong, b, em）
+    for span in collector.emphasis[:20]:
+        text = text_of(span)
+        if text and 3 < len(text) < 100:
+            if builder.is_new(text):
+                builder.add(f"【強調】{text}")
+                if builder.exhausted:
+                    return builder.build(), len(builder.parts)
+
+    # メインコンテンツ（main > article > body）内の nav, footer, aside は以降の抽出から除外
+    main = (
+        collector.main_candidates.get('main')
+        or collector.main_candidates.get('article')
+        or collector.main_candidates.get('body')
+    )
+    removed: List[_Span] = []
+    if main is not None:
+        for span in collector.main_excluded:
+            if main.pre < span.pre <= main.last and not (removed and removed[-1].pre < span.pre <= removed[-1].last):
+                removed.append(span)
+    # 除外範囲は互いに重ならず文書順に並ぶ
+    removed_pres = [span.pre for span in removed]
+    removed_ends = [span.end for span in removed]
+
+    def is_removed(span: _Span) -> bool:
+        index = bisect_right(removed_pres, span.pre) - 1
+        return index >= 0 and span.pre <= removed[index].last
+
+    def text_without_removed(span: _Span) -> str:
+        index = bisect_right(removed_ends, span.start)
+        if index == len(removed) or removed[index].start >= span.end:
+            return text_of(span)
+        parts = []
+        position = span.start
+        while index < len(removed) and removed[index].start < span.end:
+            parts.append(joined[offsets[position]:offsets[removed[index].start]])
+            position = removed[index].end
+            index += 1
+        parts.append(joined[offsets[position]:offsets[span.end]])
+        return ''.join(parts)
+
+    # 4. メインコンテンツの段落テキスト
+    if main is not None:
+        paragraphs = (
+            span for span in collector.paragraphs
+            if main.pre < span.pre <= main.last and not is_removed(span)
+        )
+        for span in islice(paragraphs, 30):  # 最大30段落
+            text = text_without_removed(span)
+            if text and len(text) > 10:
+                if builder.is_new(text):
+                    builder.add(text)
+                    if builder.exhausted:
+                        return builder.build(), len(builder.parts)
+
+    # 5. リスト項目（特徴や利点が書かれていることが多い）
+    list_items = (span for span in collector.list_items if not is_removed(span))
+    for span in islice(list_items, 20):
+        text = text_without_removed(span)
+        if text and 5 < len(text) < 200:
+            if builder.is_new(text):
+                builder.add(f"・{text}")
+                if builder.exhausted:
+                    break
+
+    return builder.build(), len(builder.parts)
+
+
+# --------------------------------------------
+# Public API
+# --------------------------------------------
+
+def extract_page(
+    html: str,
+    base_url: str,
+    max_images: int = 10,
+    max_text_length: int = 5000,
+) -> ExtractedPage:
+    """
+    HTMLを1回だけ走査して、メタデータ・主要画像候補・構造化テキストを抽出
+
+    Args:
+        html: HTML文字列
+        base_url: ベースURL（相対パス解決用）
+        max_images: 画像候補の最大数
+        max_text_length: 本文テキストの最大文字数
+
+    Returns:
+        ExtractedPage: 抽出結果
+    """
+    result = ExtractedPage()
+    root = _parse_html(html)
+    if root is None:
+        return result
+
+    collector = _walk(root)
+    _build_metadata(collector, base_url, result)
+    json_images = extract_images_from_json_data(html, base_url, limit=max_images)
+    result.image_candidates = _build_image_candidates(collector, base_url, max_images, json_images)
+    result.page_text, part_count = _build_page_text(collector, max_text_length)
+
+    logger.info(f"Extracted page text: {len(result.page_text)} chars, {part_count} parts")
+
+    return result
+
+
+def extract_head_metadata(html_head: str, base_url: str) -> ExtractedPage:
+    """
+    <head>部分のHTMLからメタデータ（title / description / og:image）のみを抽出
+
+    本文のダウンロード完了を待たずにOGP画像の取得を始めるために使う。
+
+    Args:
+        html_head: </head>までのHTML文字列
+        base_url: ベースURL（相対パス解決用）
+
+    Returns:
+        ExtractedPage: メタデータのみを設定した抽出結果
+    """
+    result = ExtractedPage()
+    root = _parse_html(html_head)
+    if root is not None:
+        _build_metadata(_walk(root), base_url, result)
+    return result
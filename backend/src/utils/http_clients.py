@@ -0,0 +1,282 @@
+"""
+============================================
+メタ広告審査チェッカー - 共有HTTPクライアント
+============================================
+
+LP取得・Claude API・OpenAI Moderation API用の長寿命HTTPクライアントを管理
+（アプリケーションのlifespanで生成・破棄し、各サービスに注入する）
+"""
+
+import os
+import asyncio
+import logging
+import importlib.util
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+# --------------------------------------------
+# Configuration
+# --------------------------------------------
+
+PAGE_USER_AGENT = 'Mozilla/5.0 (compatible; MetaAdChecker/1.0)'
+
+
+@dataclass
+class PoolConfig:
+    """接続プール設定"""
+    name: str
+    max_connections: int
+    max_keepalive_connections: int
+    keepalive_expiry: float
+    # 同一ホストへの同時接続数の上限
+    max_per_host: int
+    timeout: float
+    http2: bool = False
+
+    @classmethod
+    def from_env(
+        cls,
+        name: str,
+        max_connections: int,
+        max_keepalive_connections: int,
+        max_per_host: int,
+        timeout: float,
+        keepalive_expiry: float = 30.0,
+    ) -> "PoolConfig":
+        """環境変数（HTTP_POOL_<NAME>_*）で既定値を上書きして設定を作成"""
+        prefix = f"HTTP_POOL_{name.upper()}_"
+        http2 = os.getenv(f"{prefix}HTTP2", os.getenv("HTTP_POOL_HTTP2", "false")).lower() == "true"
+        return cls(
+            name=name,
+            max_connections=int(os.getenv(f"{prefix}MAX_CONNECTIONS", str(max_connections))),
+            max_keepalive_connections=int(os.getenv(f"{prefix}MAX_KEEPALIVE", str(max_keepalive_connections))),
+            keepalive_expiry=float(os.getenv(f"{prefix}KEEPALIVE_EXPIRY", str(keepalive_expiry))),
+            max_per_host=int(os.getenv(f"{prefix}MAX_PER_HOST", str(max_per_host))),
+            timeout=float(os.getenv(f"{prefix}TIMEOUT", str(timeout))),
+            http2=http2,
+        )
+
+
+def _http2_available() -> bool:
+    """HTTP/2に必要なh2パッケージがインストールされているか"""
+    return importlib.util.find_spec("h2") is not None
+
+
+# --------------------------------------------
+# Host-Limited Transport
+# --------------------------------------------
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """レスポンス本文のクローズ時に接続枠を解放するストリーム"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+        # 読み切った時点で解放（aclose()が呼ばれない経路への備え）
+        self._release()
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class _HostSlot:
+    """ホストごとの接続枠（利用中・待機中のリクエストがなくなった時点で破棄）"""
+
+    __slots__ = ("semaphore", "users")
+
+    def __init__(self, limit: int):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.users = 0
+
+
+class HostLimitedTransport(httpx.AsyncBaseTransport):
+    """ホスト単位の同時接続数制限と利用状況の計測を行うトランスポート"""
+
+    def __init__(self, transport: httpx.AsyncHTTPTransport, config: PoolConfig):
+        self._transport = transport
+        self.config = config
+        # LPごとにホストが変わるため、使われていないホストの枠は保持しない
+        self._host_slots: Dict[str, _HostSlot] = {}
+        self.in_flight = 0
+        self.queued = 0
+        self.peak_in_flight = 0
+        self.requests_total = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = _HostSlot(self.config.max_per_host)
+        slot.users += 1
+
+        self.queued += 1
+        try:
+            await slot.semaphore.acquire()
+        except BaseException:
+            self._leave(host, slot)
+            raise
+        finally:
+            self.queued -= 1
+
+        self.in_flight += 1
+        self.requests_total += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self.in_flight -= 1
+                slot.semaphore.release()
+                self._leave(host, slot)
+
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+
+        if isinstance(response.stream, httpx.ByteStream):
+            # 本文がメモリ上にある場合は接続を保持しないので即解放
+            release()
+        else:
+            response.stream = _ReleasingStream(response.stream, release)
+        return response
+
+    def _leave(self, host: str, slot: _HostSlot) -> None:
+        """リクエストの終了（待機の中断を含む）を記録し、誰も使っていないホストの枠を破棄"""
+        slot.users -= 1
+        if slot.users == 0 and self._host_slots.get(host) is slot:
+            del self._host_slots[host]
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        """接続プールの利用状況"""
+        connections = getattr(getattr(self._transport, "_pool", None), "connections", None) or []
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {
+            "max_connections": self.config.max_connections,
+            "max_per_host": self.config.max_per_host,
+            "http2": self.config.http2,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "active_hosts": len(self._host_slots),
+            "peak_in_flight": self.peak_in_flight,
+            "requests_total": self.requests_total,
+            "open_connections": len(connections),
+            "idle_connections": idle,
+            "saturation": round(self.in_flight / self.config.max_connections, 3) if self.config.max_connections else 0.0,
+        }
+
+
+def _build_client(
+    config: PoolConfig, verify: bool = True, **client_kwargs
+) -> Tuple[httpx.AsyncClient, HostLimitedTransport]:
+    """プール設定からhttpx.AsyncClientを作成"""
+    if config.http2 and not _http2_available():
+        logger.warning(f"HTTP/2 requested for '{config.name}' pool but h2 is not installed. Falling back to HTTP/1.1")
+        config.http2 = False
+
+    transport = httpx.AsyncHTTPTransport(
+        verify=verify,
+        http2=config.http2,
+        limits=httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry,
+        ),
+    )
+    limited = HostLimitedTransport(transport, config)
+    client = httpx.AsyncClient(transport=limited, timeout=config.timeout, **client_kwargs)
+    return client, limited
+
+
+# --------------------------------------------
+# Client Registry
+# --------------------------------------------
+
+class HttpClientRegistry:
+    """アプリケーション全体で共有するHTTPクライアント"""
+
+    def __init__(self):
+        self.page: Optional[httpx.AsyncClient] = None
+        self.anthropic: Optional[httpx.AsyncClient] = None
+        self.openai = None  # Optional[AsyncOpenAI]
+        self._openai_http: Optional[httpx.AsyncClient] = None
+        self._transports: Dict[str, HostLimitedTransport] = {}
+
+    @property
+    def started(self) -> bool:
+        return self.page is not None
+
+    async def start(self) -> None:
+        """クライアントを生成（lifespanのstartupで呼び出す）"""
+        if self.started:
+            return
+
+        # LP・画像取得用（SSL検証無効は従来のfetch_page_dataと同じ）
+        self.page, self._transports["page"] = _build_client(
+            PoolConfig.from_env("page", max_connections=50, max_keepalive_connections=20, max_per_host=6, timeout=15.0),
+            verify=False,
+            follow_redirects=True,
+            headers={'User-Agent': PAGE_USER_AGENT},
+        )
+
+        # Claude API用（SSL検証無効でVercel互換性確保）
+        self.anthropic, self._transports["anthropic"] = _build_client(
+            PoolConfig.from_env("anthropic", max_connections=20, max_keepalive_connections=10, max_per_host=20, timeout=60.0),
+            verify=False,
+        )
+
+        # OpenAI Moderation API用（APIキーがある場合のみ）
+        openai_key = os.getenv("OPENAI_API_KEY")
+        if openai_key:
+            from openai import AsyncOpenAI
+
+            self._openai_http, self._transports["openai"] = _build_client(
+                PoolConfig.from_env("openai", max_connections=10, max_keepalive_connections=5, max_per_host=10, timeout=30.0),
+            )
+            self.openai = AsyncOpenAI(api_key=openai_key, http_client=self._openai_http)
+
+        logger.info("Shared HTTP clients started")
+
+    async def aclose(self) -> None:
+        """クライアントを破棄（lifespanのshutdownで呼び出す）"""
+        for client in (self.page, self.anthropic, self._openai_http):
+            if client is not None:
+                await client.aclose()
+        self.page = None
+        self.anthropic = None
+        self.openai = None
+        self._openai_http = None
+        self._transports = {}
+        logger.info("Shared HTTP clients closed")
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """各接続プールの利用状況"""
+        return {name: transport.stats() for name, transport in self._transports.items()}
+
+
+# グローバルクライアントレジストリ
+_registry = HttpClientRegistry()
+
+
+def get_http_clients() -> HttpClientRegistry:
+    """共有HTTPクライアントレジストリを取得"""
+    return _registry
@@ -9,7 +9,8 @@ Base64エンコード/デコード、形式検証、サイズ制限を提供
 import base64
 import io
 import logging
-from typing import Optional, Tuple
+from dataclasses import dataclass
+from typing import Optional, Tuple, List, Mapping, Sequence, Union
 from PIL import Image
 
 from .errors import ValidationError, FileSizeExceededError, UnsupportedMediaTypeError
@@ -24,6 +25,19 @@ logger = logging.getLogger(__name__)
 MAX_FILE_SIZE_MB = 20
 MAX_FILE_SIZE_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024  # 20MB
 
+# AIに送る画像の最大寸法（px）
+AI_IMAGE_MAX_DIMENSION = 1024
+# 最適化処理のバージョン（処理内容を変えたら更新し、保存済みの最適化結果を無効化する）
+OPTIMIZER_VERSION = "2"
+# 写真系画像のJPEG品質
+OPTIMIZED_JPEG_QUALITY = 85
+# 縮小時、reduce()（整数分の1の平均化）で縮めた後に最終リサンプルへ残す倍率
+RESIZE_REDUCING_GAP = 2.0
+# この色数以下ならパレットPNG（ロゴ・バナー等のベタ塗り画像、可逆）
+PALETTE_MAX_COLORS = 256
+# この色数以下ならPNG（アンチエイリアス付きの図版・スクリーンショット）、超えれば写真としてJPEG
+FLAT_IMAGE_MAX_COLORS = 4096
+
 SUPPORTED_FORMATS = {"JPEG", "PNG", "WEBP", "PDF"}
 SUPPORTED_MIME_TYPES = {
     "image/jpeg": "JPEG",
@@ -34,6 +48,191 @@ SUPPORTED_MIME_TYPES = {
 }
 
 
+# --------------------------------------------
+# Media Type Detection
+# --------------------------------------------
+
+# マジックバイト判定に必要な先頭バイト数
+IMAGE_SNIFF_BYTES = 12
+
+
+def detect_image_media_type(image_data: bytes) -> Optional[str]:
+    """
+    先頭のマジックバイトから画像のメディアタイプを判定
+
+    Args:
+        image_data: 画像のバイナリデータ（先頭IMAGE_SNIFF_BYTESバイト以上）
+
+    Returns:
+        Optional[str]: メディアタイプ（JPEG/PNG/GIF/WebP）、判定できない場合はNone
+    """
+    if image_data[:8] == b'\x89PNG\r\n\x1a\n':
+        return "image/png"
+    if image_data[:3] == b'\xff\xd8\xff':
+        return "image/jpeg"
+    if image_data[:4] == b'GIF8':
+        return "image/gif"
+    if image_data[:4] == b'RIFF' and image_data[8:12] == b'WEBP':
+        return "image/webp"
+    return None
+
+
+# --------------------------------------------
+# Image URL Helpers
+# --------------------------------------------
+
+def is_valid_image_url(url: str) -> bool:
+    """画像URLとして有効かチェック"""
+    if not url:
+        return False
+    # data:URLやsvgは除外
+    if url.startswith('data:'):
+        return False
+    # 小さなアイコン系を除外
+    lower_url = url.lower()
+    exclude_patterns = ['icon', 'logo', 'favicon', 'sprite', 'loading', 'placeholder', '.svg', '.gif']
+    return not any(pattern in lower_url for pattern in exclude_patterns)
+
+
+# img要素の画像URL属性（遅延読み込みライブラリの属性を優先。srcはプレースホルダーの場合がある）
+IMAGE_SRC_ATTRIBUTES = ('data-lazy-src', 'data-src', 'data-original', 'src')
+IMAGE_SRCSET_ATTRIBUTES = ('data-lazy-srcset', 'data-srcset', 'srcset')
+
+
+@dataclass
+class SrcsetCandidate:
+    """srcset内の画像候補"""
+    url: str
+    # 幅記述子（例: 800w）
+    width: Optional[int] = None
+    # 密度記述子（例: 2x、記述子なしは1x）
+    density: Optional[float] = None
+
+
+def parse_srcset(value: str) -> List[SrcsetCandidate]:
+    """
+    srcset属性を解析
+
+    URL内のカンマ（Cloudinaryの変換パラメータ、data:URL等）を区切りと誤認しないよう、
+    HTML仕様と同様にURLは空白まで、記述子はカンマまでとして読み取る。
+
+    Args:
+        value: srcset属性の値
+
+    Returns:
+        List[SrcsetCandidate]: 画像候補（記述子を解釈できない候補は除外）
+    """
+    candidates: List[SrcsetCandidate] = []
+    position = 0
+    length = len(value)
+    while position < length:
+        while position < length and (value[position].isspace() or value[position] == ','):
+            position += 1
+        if position >= length:
+            break
+        start = position
+        while position < length and not value[position].isspace():
+            position += 1
+        url = value[start:position]
+        descriptor = ''
+        if url.endswith(','):
+            url = url.rstrip(',')
+        else:
+            start = position
+            while position < length and value[position] != ',':
+                position += 1
+            descriptor = value[start:position].strip().lower()
+
+        candidate = SrcsetCandidate(url=url)
+        try:
+            if not descriptor:
+                candidate.density = 1.0
+            elif descriptor.endswith('w'):
+                candidate.width = int(descriptor[:-1])
+            elif descriptor.endswith('x'):
+                candidate.density = float(descriptor[:-1])
+            else:
+                continue
+        except ValueError:
+            continue
+        if url:
+            candidates.append(candidate)
+    return candidates
+
+
+def _pick_srcset_variant(
+    candidates: List[SrcsetCandidate],
+    display_width: Optional[int],
+    target_dimension: int,
+) -> Optional[str]:
+    """目標寸法を満たす最小の候補を選ぶ（満たす候補がなければ最大の候補）"""
+    sized = []
+    for candidate in candidates:
+        if candidate.width is not None:
+            sized.append((candidate.width, candidate.url))
+        elif display_width:
+            sized.append((display_width * candidate.density, candidate.url))
+    if not sized:
+        # 表示幅が不明な密度記述子のみ: 最も高密度の候補
+        densest = max(candidates, key=lambda candidate: candidate.density or 0.0, default=None)
+        return densest.url if densest else None
+
+    large_enough = [item for item in sized if item[0] >= target_dimension]
+    if large_enough:
+        return min(large_enough, key=lambda item: item[0])[1]
+    return max(sized, key=lambda item: item[0])[1]
+
+
+def select_image_source(
+    attributes: Mapping[str, str],
+    sources: Sequence[Mapping[str, str]] = (),
+    target_dimension: int = AI_IMAGE_MAX_DIMENSION,
+) -> Optional[str]:
+    """
+    img要素（と<picture>内の<source>要素）から取得する画像URLを選ぶ
+
+    srcset / data-srcset / data-lazy-srcset と<source>のsrcsetから、目標寸法以上の最小の候補を選ぶ。
+    レスポンシブ候補がなければ data-lazy-src / data-src / data-original / src を使う。
+
+    Args:
+        attributes: img要素の属性
+        sources: 同じ<picture>内でimgより前にある<source>要素の属性
+        target_dimension: AIに送る画像の最大寸法（px）
+
+    Returns:
+        Optional[str]: 画像URL（相対パスのまま）。有効なURLがなければNone
+    """
+    candidates: List[SrcsetCandidate] = []
+    for source in sources:
+        media_type = (source.get('type') or '').split(';')[0].strip().lower()
+        if media_type and media_type not in SUPPORTED_MIME_TYPES:
+            # AVIF・SVG等、最適化処理で扱えない形式は除外
+            continue
+        for name in IMAGE_SRCSET_ATTRIBUTES:
+            valid = [c for c in parse_srcset(source.get(name) or '') if is_valid_image_url(c.url)]
+            if valid:
+                candidates.extend(valid)
+                break
+    for name in IMAGE_SRCSET_ATTRIBUTES:
+        valid = [c for c in parse_srcset(attributes.get(name) or '') if is_valid_image_url(c.url)]
+        if valid:
+            candidates.extend(valid)
+            break
+
+    if candidates:
+        try:
+            display_width = int(str(attributes.get('width') or '').replace('px', ''))
+        except ValueError:
+            display_width = None
+        return _pick_srcset_variant(candidates, display_width, target_dimension)
+
+    for name in IMAGE_SRC_ATTRIBUTES:
+        src = attributes.get(name)
+        if src and is_valid_image_url(src):
+            return src
+    return None
+
+
 # --------------------------------------------
 # Base64 Helpers
 # --------------------------------------------
@@ -122,54 +321,39 @@ def is_pdf_file(data: bytes) -> bool:
 
 def convert_pdf_to_image(pdf_data: bytes) -> bytes:
     """
-    PDFの1ページ目を画像（PNG）に変換
+    PDFの1ページ目を画像に変換（長辺AI_IMAGE_MAX_DIMENSIONになるDPIで描画し、内容に応じてJPEG/PNG/WebPで出力）
 
     Args:
         pdf_data: PDFのバイナリデータ
 
     Returns:
-        bytes: 変換されたPNG画像データ
+        bytes: 変換された画像データ
 
     Raises:
         ValidationError: PDF変換に失敗した場合
     """
-    try:
-        import fitz  # PyMuPDF
-
-        # PDFを開く
-        pdf_document = fitz.open(stream=pdf_data, filetype="pdf")
+    image_data, _ = encode_optimized_image(render_pdf_first_page(pdf_data))
+    logger.info(f"PDF converted to image: output_size={len(image_data)/1024:.2f}KB")
+    return image_data
 
-        if len(pdf_document) == 0:
-            raise ValidationError(
-                message="PDFファイルにページが含まれていません。",
-                details={"error": "PDF has no pages"}
-            )
 
-        # 1ページ目を取得
-        first_page = pdf_document[0]
-
-        # 高解像度で画像に変換（DPI: 150）
-        mat = fitz.Matrix(150 / 72, 150 / 72)  # 72 DPI → 150 DPI
-        pix = first_page.get_pixmap(matrix=mat)
-
-        # PNG形式でバイトに変換
-        png_data = pix.tobytes("png")
+def render_pdf_first_page(source: Union[bytes, str], max_dimension: int = AI_IMAGE_MAX_DIMENSION) -> Image.Image:
+    """
+    PDFの1ページ目を画像として描画（長辺がmax_dimensionになるDPIで描画し、Pillowの画像を返す）
 
-        page_count = len(pdf_document)
-        pdf_document.close()
+    Args:
+        source: PDFのバイナリデータ、またはファイルパス
+        max_dimension: 描画結果の長辺（px）
 
-        logger.info(f"PDF converted to image: page_count={page_count}, output_size={len(png_data)/1024:.2f}KB")
+    Returns:
+        Image.Image: 描画したRGB画像
 
-        return png_data
+    Raises:
+        ValidationError: PDF変換に失敗した場合
+    """
+    from .pdf_render import render_pdf_page_image
 
-    except ValidationError:
-        raise
-    except Exception as e:
-        logger.error(f"PDF to image conversion failed: {str(e)}")
-        raise ValidationError(
-            message="PDFの変換に失敗しました。PDFファイルが破損しているか、正しい形式ではありません。",
-            details={"error": str(e)}
-        )
+    return render_pdf_page_image(source, 0, max_dimension=max_dimension)
 
 
 def validate_image_format(image_data: bytes) -> str:
@@ -249,7 +433,7 @@ def process_and_validate_image(base64_string: str) -> Tuple[bytes, str]:
 
     Returns:
         Tuple[bytes, str]: (画像データ, フォーマット名)
-        ※PDFの場合は変換後のPNG画像データとフォーマット"PNG"を返す
+        ※PDFの場合は変換後の画像データとその形式（"JPEG", "PNG", "WEBP"）を返す
 
     Raises:
         ValidationError: デコードまたは画像の破損
@@ -269,7 +453,7 @@ def process_and_validate_image(base64_string: str) -> Tuple[bytes, str]:
     if image_format == "PDF":
         logger.info("Converting PDF to image (first page only)...")
         image_data = convert_pdf_to_image(image_data)
-        image_format = "PNG"  # 変換後はPNG形式
+        image_format = SUPPORTED_MIME_TYPES[detect_image_media_type(image_data)]
         logger.info(f"PDF converted successfully: output_size={len(image_data)/1024:.2f}KB")
 
     logger.info(f"Image validated successfully: format={image_format}, size={len(image_data)/1024:.2f}KB")
@@ -302,36 +486,216 @@ def extract_mime_type_from_base64(base64_string: str) -> Optional[str]:
 # Image Optimization (Optional)
 # --------------------------------------------
 
-def optimize_image_for_ai(image_data: bytes, max_dimension: int = 2048) -> bytes:
+@dataclass
+class OptimizedImage:
+    """AI送信用に最適化した画像とそのメタデータ"""
+    data: bytes
+    media_type: str
+    width: int
+    height: int
+    # Claude APIに送るBase64表現（未計算の場合はNone）
+    b64: Optional[str] = None
+    # 知覚ハッシュ（dHash、ほぼ同一画像の判定用。未計算の場合はNone）
+    dhash: Optional[str] = None
+
+    def base64(self) -> str:
+        """Base64表現を取得（初回のみエンコード）"""
+        if self.b64 is None:
+            self.b64 = encode_image_to_base64(self.data)
+        return self.b64
+
+
+def _has_transparency(image: Image.Image) -> bool:
+    """実際に透過している画素があるか"""
+    if image.mode in ('RGBA', 'LA', 'PA'):
+        return image.getchannel('A').getextrema()[0] < 255
+    return 'transparency' in image.info
+
+
+def to_grayscale(image: Image.Image) -> Image.Image:
+    """グレースケールに変換（透過部分は白背景として扱う）"""
+    if image.mode in ('RGBA', 'LA', 'PA', 'P'):
+        rgba = image.convert('RGBA')
+        background = Image.new('RGBA', rgba.size, (255, 255, 255, 255))
+        image = Image.alpha_composite(background, rgba)
+    return image.convert('L')
+
+
+def encode_optimized_image(image: Image.Image, quality: int = OPTIMIZED_JPEG_QUALITY) -> Tuple[bytes, str]:
     """
-    AI処理用に画像を最適化（必要に応じてリサイズ）
+    内容に応じた形式でエンコード（写真 → JPEG / 透過写真 → WebP / ベタ塗り・図版 → PNG）
+
+    Args:
+        image: デコード済みの画像
+        quality: JPEG/WebPの品質
+
+    Returns:
+        Tuple[bytes, str]: (エンコード結果, 形式名)
+    """
+    output = io.BytesIO()
+    if _has_transparency(image):
+        rgba = image.convert('RGBA')
+        if rgba.getcolors(maxcolors=FLAT_IMAGE_MAX_COLORS) is not None:
+            rgba.save(output, format="PNG", compress_level=6)
+            return output.getvalue(), "PNG"
+        rgba.save(output, format="WEBP", quality=quality)
+        return output.getvalue(), "WEBP"
+
+    # グレースケールは最大256色のため、色数の閾値を下げて判定
+    grayscale = image.mode == 'L'
+    rgb = image if image.mode in ('RGB', 'L') else image.convert('RGB')
+    colors = rgb.getcolors(maxcolors=PALETTE_MAX_COLORS // 4 if grayscale else FLAT_IMAGE_MAX_COLORS)
+    if colors is None:
+        rgb.save(output, format="JPEG", quality=quality, optimize=True)
+        return output.getvalue(), "JPEG"
+
+    if not grayscale and len(colors) <= PALETTE_MAX_COLORS:
+        # 全色を含むパレットで変換（誤差拡散なし・可逆）
+        palette = Image.new('P', (1, 1))
+        palette.putpalette([channel for _, color in colors for channel in color])
+        rgb = rgb.quantize(palette=palette, dither=Image.Dither.NONE)
+    rgb.save(output, format="PNG", compress_level=6)
+    return output.getvalue(), "PNG"
+
+
+def optimize_image(image_data: bytes, max_dimension: int = 2048) -> OptimizedImage:
+    """
+    AI処理用に画像を最適化し、寸法・メディアタイプとともに返す
+
+    JPEGはデコード時にDCTスケーリング（draft）で縮小し、それ以外もreduce()で整数分の1に
+    縮めてから最終サイズへリサンプルする。出力形式は元の形式ではなく内容（色数・透過）で選ぶ。
 
     Args:
         image_data: 画像のバイナリデータ
         max_dimension: 最大寸法（デフォルト: 2048px）
 
     Returns:
-        bytes: 最適化された画像データ
+        OptimizedImage: 最適化された画像（最適化に失敗した場合は元データ）
     """
     try:
-        image = Image.open(io.BytesIO(image_data))
+        return _optimize_opened(Image.open(io.BytesIO(image_data)), max_dimension)
+
+    except Exception as e:
+        logger.warning(f"Image optimization failed, using original: {str(e)}")
+        width, height = get_image_dimensions(image_data)
+        return OptimizedImage(
+            data=image_data,
+            media_type=detect_image_media_type(image_data) or "image/jpeg",
+            width=width,
+            height=height,
+        )
+
 
-        # 画像が大きすぎる場合はリサイズ
-        width, height = image.size
-        if width > max_dimension or height > max_dimension:
-            # アスペクト比を維持してリサイズ
-            ratio = min(max_dimension / width, max_dimension / height)
-            new_size = (int(width * ratio), int(height * ratio))
-            image = image.resize(new_size, Image.Resampling.LANCZOS)
+def _optimize_opened(image: Image.Image, max_dimension: int) -> OptimizedImage:
+    """開いた画像（未デコードでも可）を縮小・エンコード"""
+    # 画像が大きすぎる場合はリサイズ
+    width, height = image.size
+    if width > max_dimension or height > max_dimension:
+        # アスペクト比を維持してリサイズ
+        ratio = min(max_dimension / width, max_dimension / height)
+        new_size = (max(1, int(width * ratio)), max(1, int(height * ratio)))
+        if image.format == "JPEG":
+            # デコード時に1/2・1/4・1/8へ縮小（new_size以上の範囲で最小）
+            image.draft(image.mode, new_size)
+        image = image.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=RESIZE_REDUCING_GAP)
+
+        logger.info(f"Image resized: {width}x{height} -> {new_size[0]}x{new_size[1]}")
+    else:
+        image.load()
+
+    data, image_format = encode_optimized_image(image)
+    return OptimizedImage(
+        data=data,
+        media_type=detect_image_media_type(data) or Image.MIME.get(image_format, "image/jpeg"),
+        width=image.size[0],
+        height=image.size[1],
+    )
+
+
+@dataclass
+class ValidatedImage:
+    """形式・寸法を検証し、AI送信用に最適化したアップロード画像"""
+    # 元の形式（"JPEG", "PNG", "WEBP", "PDF"）と寸法（PDFは1ページ目の描画サイズ）
+    format: str
+    width: int
+    height: int
+    optimized: OptimizedImage
+
+
+def open_and_optimize_image(
+    source: Union[bytes, str],
+    max_dimension: int = AI_IMAGE_MAX_DIMENSION,
+) -> ValidatedImage:
+    """
+    画像を1回だけ開いて、形式の検証・寸法の取得・最適化をまとめて行う（CPUプールで実行）
+    PDFの場合は1ページ目を描画して最適化
 
-            logger.info(f"Image resized: {width}x{height} -> {new_size[0]}x{new_size[1]}")
+    Args:
+        source: 画像のバイナリデータ、またはファイルパス（ディスクに退避したアップロード）
+        max_dimension: 最適化後の最大寸法（px）
 
-        # 最適化された画像をバイトに変換
-        output = io.BytesIO()
-        image_format = image.format or "PNG"
-        image.save(output, format=image_format, optimize=True, quality=85)
-        return output.getvalue()
+    Returns:
+        ValidatedImage: 検証・最適化済みの画像
+
+    Raises:
+        ValidationError: 画像の破損
+        UnsupportedMediaTypeError: 非対応形式
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            is_pdf = is_pdf_file(f.read(4))
+    else:
+        is_pdf = is_pdf_file(source)
+    if is_pdf:
+        page = render_pdf_first_page(source, max_dimension)
+        optimized = _optimize_opened(page, max_dimension)
+        optimized.base64()
+        return ValidatedImage("PDF", page.width, page.height, optimized)
 
+    try:
+        image = Image.open(source if isinstance(source, str) else io.BytesIO(source))
     except Exception as e:
-        logger.warning(f"Image optimization failed, using original: {str(e)}")
-        return image_data
+        logger.error(f"Image format validation error: {str(e)}")
+        raise ValidationError(
+            message="画像ファイルが破損しているか、正しい形式ではありません。",
+            details={"error": str(e)}
+        )
+
+    if image.format not in SUPPORTED_FORMATS:
+        raise UnsupportedMediaTypeError(
+            message=f"対応していない画像形式です（{image.format}）。JPEG、PNG、WebP、PDFのいずれかを使用してください。",
+            details={
+                "detected_format": image.format,
+                "supported_formats": list(SUPPORTED_FORMATS)
+            }
+        )
+
+    width, height = image.size
+    try:
+        optimized = _optimize_opened(image, max_dimension)
+    except Exception as e:
+        logger.error(f"Image decode error: {str(e)}")
+        raise ValidationError(
+            message="画像ファイルが破損しているか、正しい形式ではありません。",
+            details={"error": str(e)}
+        )
+    optimized.base64()
+    logger.info(
+        f"Image validated: format={image.format}, size={width}x{height} -> "
+        f"{optimized.width}x{optimized.height} ({len(optimized.data)/1024:.0f}KB)"
+    )
+    return ValidatedImage(image.format, width, height, optimized)
+
+
+def optimize_image_for_ai(image_data: bytes, max_dimension: int = 2048) -> bytes:
+    """
+    AI処理用に画像を最適化（必要に応じてリサイズ）
+
+    Args:
+        image_data: 画像のバイナリデータ
+        max_dimension: 最大寸法（デフォルト: 2048px）
+
+    Returns:
+        bytes: 最適化された画像データ
+    """
+    return optimize_image(image_data, max_dimension).data
@@ -0,0 +1,283 @@
+"""
+============================================
+メタ広告審査チェッカー - 画像トークン予算エンコーダー
+============================================
+
+Claude APIに添付する画像のトークン数（画素数 / 750）をリクエスト単位の予算に収める。
+予算を超える場合は、文字の多い画像（テキストオーバーレイの判定に細部が必要）に多くの画素を配分し、
+画像ごとに寸法と品質を決めて再エンコードする。
+"""
+
+import io
+import os
+import math
+import logging
+from dataclasses import dataclass
+from typing import Optional, List, Tuple, Dict, Any
+
+from PIL import Image, ImageFilter
+
+from .image import encode_optimized_image, encode_image_to_base64, detect_image_media_type
+from .image_probe import parse_image_header, IMAGE_PROBE_BYTES
+from .cpu_pool import get_cpu_pool
+
+logger = logging.getLogger(__name__)
+
+
+# --------------------------------------------
+# Configuration
+# --------------------------------------------
+
+# 1リクエストあたりの画像トークン予算（全画像の合計）
+IMAGE_TOKEN_BUDGET = int(os.getenv("IMAGE_TOKEN_BUDGET", "3600"))
+# 1枚あたりの最低トークン数（予算が厳しくても判読できる寸法を残す）
+MIN_IMAGE_TOKENS = int(os.getenv("MIN_IMAGE_TOKENS", "300"))
+# 文字の多い画像への配分の重み（文字密度1.0の画像は 1 + この値 倍の配分）
+TEXT_DETAIL_WEIGHT = float(os.getenv("TEXT_DETAIL_WEIGHT", "2.0"))
+
+# Claudeの画像トークン数の目安（幅 × 高さ / 750）
+PIXELS_PER_TOKEN = 750
+# Claude側で長辺がこれを超える画像は縮小される
+CLAUDE_MAX_LONG_EDGE = 1568
+# 文字密度の推定に使う縮小画像の長辺
+TEXT_DENSITY_SAMPLE = 256
+# エッジ画素の割合がこの値で文字密度1.0とみなす
+TEXT_EDGE_SATURATION = 0.15
+# 文字密度がこの値以上の画像は高めの品質で再エンコード
+TEXT_HEAVY_THRESHOLD = 0.5
+TEXT_HEAVY_QUALITY = 90
+PHOTO_QUALITY = 80
+
+
+# --------------------------------------------
+# Data Classes
+# --------------------------------------------
+
+@dataclass
+class BudgetedImage:
+    """予算に合わせてエンコードした画像"""
+    width: int
+    height: int
+    # 推定トークン数（予算適用後 / 適用前）
+    tokens: int
+    original_tokens: int
+    # 再エンコードした場合のデータ（元のまま送る場合はNone）
+    data: Optional[bytes] = None
+    media_type: Optional[str] = None
+    b64: Optional[str] = None
+    # 文字密度の推定値（0.0〜1.0、予算内で推定不要だった場合はNone）
+    text_density: Optional[float] = None
+
+
+# --------------------------------------------
+# Estimation
+# --------------------------------------------
+
+def _effective_size(width: int, height: int) -> Tuple[int, int]:
+    """Claude側の縮小を反映した寸法"""
+    long_edge = max(width, height)
+    if long_edge <= CLAUDE_MAX_LONG_EDGE:
+        return width, height
+    ratio = CLAUDE_MAX_LONG_EDGE / long_edge
+    return max(1, round(width * ratio)), max(1, round(height * ratio))
+
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    """画像1枚の推定トークン数"""
+    width, height = _effective_size(width, height)
+    return math.ceil(width * height / PIXELS_PER_TOKEN)
+
+
+def estimate_text_density(image: Image.Image) -> float:
+    """
+    画像の文字密度を推定（縮小したグレースケール画像の強いエッジ画素の割合）
+
+    Args:
+        image: デコード済みの画像
+
+    Returns:
+        float: 0.0（写真・ベタ塗り）〜 1.0（文字が多い）
+    """
+    sample = image.convert('L')
+    sample.thumbnail((TEXT_DENSITY_SAMPLE, TEXT_DENSITY_SAMPLE))
+    histogram = sample.filter(ImageFilter.FIND_EDGES).histogram()
+    edge_ratio = sum(histogram[64:]) / max(1, sum(histogram))
+    return min(1.0, edge_ratio / TEXT_EDGE_SATURATION)
+
+
+def allocate_tokens(full_tokens: List[int], weights: List[float], budget: int, floor: int = 0) -> List[int]:
+    """
+    予算を重みに比例して配分（必要量を超える分は他の画像に再配分）
+
+    Args:
+        full_tokens: 画像ごとの縮小しない場合のトークン数
+        weights: 画像ごとの配分の重み
+        budget: 予算
+        floor: 1枚あたりの最低トークン数（予算より優先）
+
+    Returns:
+        List[int]: 画像ごとの配分トークン数
+    """
+    allocation = [0.0] * len(full_tokens)
+    remaining = float(budget)
+    active = set(range(len(full_tokens)))
+    while active:
+        total_weight = sum(weights[i] for i in active)
+        shares = {i: remaining * weights[i] / total_weight for i in active}
+        satisfied = [i for i in active if shares[i] >= full_tokens[i]]
+        if not satisfied:
+            for i in active:
+                allocation[i] = shares[i]
+            break
+        for i in satisfied:
+            allocation[i] = full_tokens[i]
+            remaining -= full_tokens[i]
+            active.remove(i)
+    return [int(max(tokens, min(full, floor))) for tokens, full in zip(allocation, full_tokens)]
+
+
+# --------------------------------------------
+# Encoding
+# --------------------------------------------
+
+def _image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    header = parse_image_header(data[:IMAGE_PROBE_BYTES])
+    if header is not None:
+        return header.width, header.height
+    try:
+        return Image.open(io.BytesIO(data)).size
+    except Exception:
+        return None
+
+
+def fit_images_to_budget(images: List[bytes], budget: int = IMAGE_TOKEN_BUDGET) -> List[BudgetedImage]:
+    """
+    画像の合計トークン数を予算に収める（CPUプールで実行）
+
+    予算内で、Claude側の縮小対象（長辺1568px超）もなければ、デコードせずに元のまま送る。
+
+    Args:
+        images: 画像バイナリのリスト
+        budget: 画像トークン予算
+
+    Returns:
+        List[BudgetedImage]: 画像ごとのエンコード結果（入力と同じ順）
+    """
+    sizes = [_image_size(data) or (0, 0) for data in images]
+    full_tokens = [estimate_image_tokens(*size) for size in sizes]
+    oversized = any(_effective_size(*size) != size for size in sizes)
+    if sum(full_tokens) <= budget and not oversized:
+        return [
+            BudgetedImage(width=w, height=h, tokens=t, original_tokens=t)
+            for (w, h), t in zip(sizes, full_tokens)
+        ]
+
+    decoded: List[Optional[Image.Image]] = []
+    densities: List[float] = []
+    for data in images:
+        try:
+            image = Image.open(io.BytesIO(data))
+            image.load()
+        except Exception:
+            image = None
+        decoded.append(image)
+        densities.append(estimate_text_density(image) if image is not None else 0.0)
+
+    weights = [1.0 + TEXT_DETAIL_WEIGHT * density for density in densities]
+    allocation = allocate_tokens(full_tokens, weights, budget, floor=MIN_IMAGE_TOKENS)
+
+    results: List[BudgetedImage] = []
+    for image, (width, height), full, tokens, density in zip(decoded, sizes, full_tokens, allocation, densities):
+        target = _effective_size(width, height)
+        if tokens < full:
+            scale = math.sqrt(tokens / full)
+            target = (max(1, int(target[0] * scale)), max(1, int(target[1] * scale)))
+        if image is None or target == (width, height):
+            results.append(BudgetedImage(
+                width=width, height=height, tokens=full, original_tokens=full, text_density=density
+            ))
+            continue
+
+        resized = image.resize(target, Image.Resampling.LANCZOS, reducing_gap=2.0)
+        quality = TEXT_HEAVY_QUALITY if density >= TEXT_HEAVY_THRESHOLD else PHOTO_QUALITY
+        data, image_format = encode_optimized_image(resized, quality=quality)
+        results.append(BudgetedImage(
+            width=target[0],
+            height=target[1],
+            tokens=estimate_image_tokens(*target),
+            original_tokens=full,
+            data=data,
+            media_type=detect_image_media_type(data) or Image.MIME.get(image_format, "image/jpeg"),
+            b64=encode_image_to_base64(data),
+            text_density=density,
+        ))
+    return results
+
+
+# --------------------------------------------
+# Budget Encoder
+# --------------------------------------------
+
+class ImageBudgetEncoder:
+    """リクエスト単位で画像トークン予算を適用し、推定トークン数を集計"""
+
+    def __init__(self, budget: int = IMAGE_TOKEN_BUDGET):
+        self.budget = budget
+        self.counters = {
+            "requests": 0,
+            "images": 0,
+            "resized": 0,
+            "tokens_total": 0,
+            "tokens_saved": 0,
+        }
+        self.last_request_tokens = 0
+
+    async def fit(self, images: List[bytes]) -> List[BudgetedImage]:
+        """
+        画像を予算に収める
+
+        Args:
+            images: 画像バイナリのリスト
+
+        Returns:
+            List[BudgetedImage]: 画像ごとのエンコード結果（入力と同じ順）
+        """
+        if not images:
+            return []
+        results = await get_cpu_pool().run(
+            fit_images_to_budget, images, self.budget,
+            size=sum(len(data) for data in images), label="image_budget",
+        )
+
+        total = sum(result.tokens for result in results)
+        original = sum(result.original_tokens for result in results)
+        self.counters["requests"] += 1
+        self.counters["images"] += len(results)
+        self.counters["resized"] += sum(1 for result in results if result.data is not None)
+        self.counters["tokens_total"] += total
+        self.counters["tokens_saved"] += max(0, original - total)
+        self.last_request_tokens = total
+        logger.info(
+            f"Estimated image tokens: {total} (budget {self.budget}, before {original}): "
+            + ", ".join(f"{r.width}x{r.height}={r.tokens}" for r in results)
+        )
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        """予算エンコーダーの統計情報"""
+        requests = self.counters["requests"]
+        return {
+            **self.counters,
+            "budget": self.budget,
+            "avg_tokens_per_request": round(self.counters["tokens_total"] / requests, 1) if requests else 0.0,
+            "last_request_tokens": self.last_request_tokens,
+        }
+
+
+# グローバル予算エンコーダー
+_image_budget_encoder = ImageBudgetEncoder()
+
+
+def get_image_budget_encoder() -> ImageBudgetEncoder:
+    """グローバル画像トークン予算エンコーダーを取得"""
+    return _image_budget_encoder
@@ -0,0 +1,115 @@
+"""
+============================================
+メタ広告審査チェッカー - 画像の知覚ハッシュ
+============================================
+
+LP内の同じ画像の別解像度・別形式（サムネイルと原寸、JPEGとWebPなど）を見分けるための
+差分ハッシュ（dHash, 64bit）を計算する。
+ハッシュ間のハミング距離が閾値以下の画像を「ほぼ同一」とみなす。
+"""
+
+import io
+import os
+import logging
+from typing import Optional, Sequence
+
+from PIL import Image, ImageChops
+
+from .image import to_grayscale
+
+logger = logging.getLogger(__name__)
+
+
+# --------------------------------------------
+# Configuration
+# --------------------------------------------
+
+# ほぼ同一とみなすハミング距離の上限（64bit中）
+IMAGE_DEDUPE_DISTANCE = int(os.getenv("IMAGE_DEDUPE_DISTANCE", "10"))
+
+# ハッシュの一辺のビット数（HASH_SIZE x HASH_SIZE = 64bit）
+HASH_SIZE = 8
+
+
+# --------------------------------------------
+# Hashing
+# --------------------------------------------
+
+def dhash_image(image: Image.Image) -> str:
+    """
+    デコード済み画像の差分ハッシュ（dHash）を計算
+
+    グレースケールの (HASH_SIZE + 1) x HASH_SIZE に縮小し、横に隣り合う画素の明暗を
+    ビットにする。比較・ビット化はPillowの画像演算でまとめて行う。
+
+    Args:
+        image: デコード済みの画像
+
+    Returns:
+        str: 64bitハッシュの16進文字列（16文字）
+    """
+    # 透過部分は白背景として扱う（透過PNGと白背景JPEGの同一画像を揃える）
+    small = to_grayscale(image).resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX)
+
+    left = small.crop((0, 0, HASH_SIZE, HASH_SIZE))
+    right = small.crop((1, 0, HASH_SIZE + 1, HASH_SIZE))
+    # 右の画素が明るい位置だけ正になる（負は0に丸められる）
+    brighter = ImageChops.subtract(right, left)
+    bits = brighter.point(lambda value: 255 if value else 0).convert('1')
+    return bits.tobytes().hex()
+
+
+def dhash_bytes(image_data: bytes) -> Optional[str]:
+    """
+    画像バイナリの差分ハッシュを計算（JPEGは縮小デコード）
+
+    Args:
+        image_data: 画像のバイナリデータ
+
+    Returns:
+        Optional[str]: ハッシュ（画像として読めない場合はNone）
+    """
+    try:
+        image = Image.open(io.BytesIO(image_data))
+        if image.format == "JPEG":
+            image.draft('L', (HASH_SIZE * 8, HASH_SIZE * 8))
+        return dhash_image(image)
+    except Exception as e:
+        logger.warning(f"Image hash failed: {str(e)}")
+        return None
+
+
+def hamming_distance(a: str, b: str) -> int:
+    """2つのハッシュのハミング距離"""
+    return (int(a, 16) ^ int(b, 16)).bit_count()
+
+
+def find_near_duplicate(
+    image_hash: Optional[str],
+    hashes: Sequence[Optional[str]],
+    max_distance: Optional[int] = None,
+) -> Optional[int]:
+    """
+    ほぼ同一の画像のハッシュを探す
+
+    Args:
+        image_hash: 対象画像のハッシュ
+        hashes: 比較対象のハッシュ（Noneは比較しない）
+        max_distance: ほぼ同一とみなす距離の上限（未指定の場合はIMAGE_DEDUPE_DISTANCE）
+
+    Returns:
+        Optional[int]: 最も近いハッシュの位置（距離が上限を超える場合・ハッシュがない場合はNone）
+    """
+    if image_hash is None:
+        return None
+    if max_distance is None:
+        max_distance = IMAGE_DEDUPE_DISTANCE
+
+    best_index, best_distance = None, max_distance + 1
+    for index, other in enumerate(hashes):
+        if other is None:
+            continue
+        distance = hamming_distance(image_hash, other)
+        if distance < best_distance:
+            best_index, best_distance = index, distance
+    return best_index
@@ -0,0 +1,273 @@
+"""
+============================================
+メタ広告審査チェッカー - 画像ヘッダープローブ
+============================================
+
+画像候補の先頭数KBだけをRangeリクエストで取得し、JPEG/PNG/WebP/GIFのヘッダーから
+形式と寸法を読み取る。面積と縦横比で候補を順位付けし、上位の候補だけを全体ダウンロードする。
+"""
+
+import os
+import re
+import struct
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Optional, List, Tuple, Dict
+
+import httpx
+
+from .page_cache import CachePolicy, compute_cache_policy
+
+logger = logging.getLogger(__name__)
+
+
+# --------------------------------------------
+# Configuration
+# --------------------------------------------
+
+IMAGE_PROBE_ENABLED = os.getenv("IMAGE_PROBE_ENABLED", "true").lower() == "true"
+# プローブで取得する先頭バイト数（EXIF等でSOFが後ろにあるJPEGを考慮）
+IMAGE_PROBE_BYTES = int(os.getenv("IMAGE_PROBE_BYTES", str(16 * 1024)))
+# プローブの同時実行数
+IMAGE_PROBE_CONCURRENCY = int(os.getenv("IMAGE_PROBE_CONCURRENCY", "6"))
+# これより短い辺を持つ画像はバッジ・アイコン類とみなして後回しにする
+MIN_MAIN_IMAGE_DIMENSION = int(os.getenv("MIN_MAIN_IMAGE_DIMENSION", "200"))
+# 縦横比がこの範囲外の画像（細長い帯・ボタン等）はスコアを減らす
+PREFERRED_ASPECT_RANGE = (0.5, 2.0)
+
+CONTENT_RANGE_PATTERN = re.compile(r'bytes\s+\d+-\d+/(\d+)', re.IGNORECASE)
+
+# JPEGのSOFマーカー（DHT / JPG / DAC を除く）
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# 長さフィールドを持たないJPEGマーカー
+JPEG_STANDALONE_MARKERS = {0x01, 0xD8} | set(range(0xD0, 0xD8))
+
+
+# --------------------------------------------
+# Data Classes
+# --------------------------------------------
+
+@dataclass
+class ImageHeader:
+    """画像ヘッダーから読み取った情報"""
+    format: str  # 'jpeg', 'png', 'webp', 'gif'
+    width: int
+    height: int
+
+    @property
+    def area(self) -> int:
+        return self.width * self.height
+
+
+@dataclass
+class ProbeResult:
+    """画像候補のプローブ結果"""
+    url: str
+    header: Optional[ImageHeader] = None
+    # 画像全体のバイト数（Content-Range / Content-Lengthから取得できた場合）
+    total_size: Optional[int] = None
+    # プローブに失敗した理由: 'http_error', 'fetch_error'
+    error: Optional[str] = None
+    # プローブ応答のキャッシュ方針（結果を画像ストアに記録する場合の鮮度）
+    cache_policy: Optional[CachePolicy] = None
+
+    @property
+    def score(self) -> float:
+        """順位付けのスコア（面積 × 縦横比の補正）"""
+        if self.header is None:
+            return 0.0
+        aspect = self.header.width / self.header.height if self.header.height else 0.0
+        low, high = PREFERRED_ASPECT_RANGE
+        if aspect <= 0:
+            return 0.0
+        if aspect > high:
+            factor = high / aspect
+        elif aspect < low:
+            factor = aspect / low
+        else:
+            factor = 1.0
+        return self.header.area * factor
+
+    @property
+    def is_small(self) -> bool:
+        return self.header is not None and min(self.header.width, self.header.height) < MIN_MAIN_IMAGE_DIMENSION
+
+
+# --------------------------------------------
+# Header Parsing
+# --------------------------------------------
+
+def _parse_jpeg(data: bytes) -> Optional[Tuple[int, int]]:
+    """JPEGのセグメントを辿り、SOFから寸法を読み取る"""
+    position = 2
+    length = len(data)
+    while position + 4 <= length:
+        if data[position] != 0xFF:
+            return None
+        marker = data[position + 1]
+        if marker == 0xFF:
+            # フィルバイト
+            position += 1
+            continue
+        if marker in JPEG_STANDALONE_MARKERS:
+            position += 2
+            continue
+        segment_length = struct.unpack('>H', data[position + 2:position + 4])[0]
+        if marker in JPEG_SOF_MARKERS:
+            if position + 9 > length:
+                return None
+            height, width = struct.unpack('>HH', data[position + 5:position + 9])
+            return width, height
+        position += 2 + segment_length
+    return None
+
+
+def _parse_webp(data: bytes) -> Optional[Tuple[int, int]]:
+    """WebP（VP8 / VP8L / VP8X）の寸法を読み取る"""
+    chunk = data[12:16]
+    if chunk == b'VP8 ' and len(data) >= 30:
+        width, height = struct.unpack('<HH', data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L' and len(data) >= 25:
+        bits = struct.unpack('<I', data[21:25])[0]
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X' and len(data) >= 30:
+        width = int.from_bytes(data[24:27], 'little') + 1
+        height = int.from_bytes(data[27:30], 'little') + 1
+        return width, height
+    return None
+
+
+def parse_image_header(data: bytes) -> Optional[ImageHeader]:
+    """
+    画像の先頭バイトから形式と寸法を読み取る
+
+    Args:
+        data: 画像の先頭部分
+
+    Returns:
+        Optional[ImageHeader]: 読み取れない場合はNone
+    """
+    size: Optional[Tuple[int, int]] = None
+    image_format = None
+
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and len(data) >= 24 and data[12:16] == b'IHDR':
+        image_format = 'png'
+        size = struct.unpack('>II', data[16:24])
+    elif data[:3] == b'\xff\xd8\xff':
+        image_format = 'jpeg'
+        size = _parse_jpeg(data)
+    elif data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        image_format = 'webp'
+        size = _parse_webp(data)
+    elif data[:6] in (b'GIF87a', b'GIF89a') and len(data) >= 10:
+        image_format = 'gif'
+        size = struct.unpack('<HH', data[6:10])
+
+    if size is None or not all(size):
+        return None
+    return ImageHeader(format=image_format, width=size[0], height=size[1])
+
+
+# --------------------------------------------
+# Probing
+# --------------------------------------------
+
+def _total_size(response: httpx.Response) -> Optional[int]:
+    """画像全体のバイト数（206ならContent-Range、200ならContent-Length）"""
+    if response.status_code == 206:
+        match = CONTENT_RANGE_PATTERN.match(response.headers.get('content-range', ''))
+        return int(match.group(1)) if match else None
+    content_length = response.headers.get('content-length')
+    return int(content_length) if content_length and content_length.isdigit() else None
+
+
+async def probe_image(client: httpx.AsyncClient, image_url: str, probe_bytes: int = IMAGE_PROBE_BYTES) -> ProbeResult:
+    """
+    画像の先頭部分だけを取得して形式と寸法を読み取る
+
+    Rangeに対応しないサーバー（200応答）でも、先頭probe_bytesを読んだ時点で受信を打ち切る。
+
+    Args:
+        client: HTTPクライアント
+        image_url: 画像URL
+        probe_bytes: 取得する先頭バイト数
+
+    Returns:
+        ProbeResult: プローブ結果
+    """
+    result = ProbeResult(url=image_url)
+    try:
+        async with client.stream('GET', image_url, headers={'Range': f'bytes=0-{probe_bytes - 1}'}) as response:
+            response.raise_for_status()
+            result.total_size = _total_size(response)
+            result.cache_policy = compute_cache_policy(response.headers)
+            buffer = bytearray()
+            async for chunk in response.aiter_bytes():
+                buffer.extend(chunk)
+                if len(buffer) >= probe_bytes:
+                    break
+        result.header = parse_image_header(bytes(buffer[:probe_bytes]))
+    except httpx.HTTPStatusError as e:
+        logger.debug(f"Image probe failed: HTTP {e.response.status_code}: {image_url}")
+        result.error = 'http_error'
+    except Exception as e:
+        logger.debug(f"Image probe failed: {str(e)}: {image_url}")
+        result.error = 'fetch_error'
+    return result
+
+
+async def rank_image_candidates(
+    client: httpx.AsyncClient,
+    image_urls: List[str],
+    concurrency: int = IMAGE_PROBE_CONCURRENCY,
+    known: Optional[Dict[str, ProbeResult]] = None,
+) -> List[ProbeResult]:
+    """
+    画像候補をプローブし、メイン画像らしい順に並べ替える
+
+    並び順: 十分な大きさの画像（スコア順）→ 寸法不明 → 小さい画像（スコア順）→ プローブ失敗。
+    同順位は元の候補順を保つ。
+
+    Args:
+        client: HTTPクライアント
+        image_urls: 画像URL候補（抽出時の優先順）
+        concurrency: 同時プローブ数
+        known: 寸法が分かっている候補（画像ストアの記録等、プローブしない）
+
+    Returns:
+        List[ProbeResult]: 順位付けしたプローブ結果
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    known = known or {}
+
+    async def probe(image_url: str) -> ProbeResult:
+        if image_url in known:
+            return known[image_url]
+        async with semaphore:
+            return await probe_image(client, image_url)
+
+    results = await asyncio.gather(*(probe(image_url) for image_url in image_urls))
+
+    def rank_key(item: Tuple[int, ProbeResult]):
+        index, result = item
+        if result.error:
+            group = 3
+        elif result.header is None:
+            group = 1
+        elif result.is_small:
+            group = 2
+        else:
+            group = 0
+        return group, -result.score, index
+
+    ranked = [result for _, result in sorted(enumerate(results), key=rank_key)]
+    logger.info(
+        "Image candidates ranked: "
+        + ", ".join(
+            f"{r.header.width}x{r.header.height}" if r.header else (r.error or 'unknown')
+            for r in ranked
+        )
+    )
+    return ranked
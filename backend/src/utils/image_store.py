@@ -0,0 +1,288 @@
+"""
+============================================
+メタ広告審査チェッカー - 最適化済み画像ストア
+============================================
+
+LP画像の最適化結果をディスクに保存し、チェック間で再利用する
+- 画像URL + バリデーター（ETag / Last-Modified）→ 元画像のSHA-256・形式・寸法・バイト数
+  （プローブだけした候補はSHA-256なしで寸法のみ記録し、再チェック時のプローブを省略する）
+- 元画像のSHA-256 + 最適化バリアント → 最適化済み画像とメタデータ（寸法・メディアタイプ・Base64・知覚ハッシュ）
+
+ディスクI/O（JSONの読み書き・Base64のデコード・削除）はイベントループを止めないようスレッドで行う。
+容量はファイルごとのサイズと最終アクセス時刻の索引で管理し、ディレクトリの走査は起動後の最初の1回だけ行う
+"""
+
+import os
+import asyncio
+import json
+import base64
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, Tuple
+
+from .image import OptimizedImage
+
+logger = logging.getLogger(__name__)
+
+
+# --------------------------------------------
+# Configuration
+# --------------------------------------------
+
+IMAGE_STORE_ENABLED = os.getenv("IMAGE_STORE_ENABLED", "true").lower() == "true"
+IMAGE_STORE_DIR = os.getenv(
+    "IMAGE_STORE_DIR",
+    os.path.join(tempfile.gettempdir(), "meta-ad-checker", "images"),
+)
+IMAGE_STORE_MAX_BYTES = int(os.getenv("IMAGE_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+# 容量超過時に、この割合まで古い順に削除する
+EVICTION_TARGET_RATIO = 0.9
+
+
+# --------------------------------------------
+# Data Classes
+# --------------------------------------------
+
+@dataclass
+class UrlRecord:
+    """画像URLと元画像ハッシュ・寸法の対応"""
+    url: str
+    # 元画像のSHA-256（プローブだけで全体をダウンロードしていない場合はNone）
+    sha256: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fresh_until: float = 0.0
+    # 元画像の形式・寸法・バイト数（主要画像候補の順位付けに使用）
+    format: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    size: Optional[int] = None
+
+    def is_fresh(self, now: float) -> bool:
+        return now < self.fresh_until
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """条件付きGET用のリクエストヘッダー"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+def sha256_hex(data: bytes) -> str:
+    """SHA-256ハッシュ（16進文字列）"""
+    return hashlib.sha256(data).hexdigest()
+
+
+# --------------------------------------------
+# Image Store
+# --------------------------------------------
+
+class ImageStore:
+    """コンテンツアドレス方式のディスク画像ストア（容量超過時はアクセスの古い順に削除）"""
+
+    def __init__(self, root: str = IMAGE_STORE_DIR, max_bytes: int = IMAGE_STORE_MAX_BYTES, enabled: bool = IMAGE_STORE_ENABLED):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # パス → (最終アクセス時刻, サイズ)（最初に使う時に1回だけディレクトリを走査して作成）
+        self._index: Optional[Dict[str, Tuple[float, int]]] = None
+        self._total_bytes: Optional[int] = None
+        self.counters = {
+            "url_hits": 0,
+            "content_hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "evictions": 0,
+            "errors": 0,
+        }
+
+    # ---- パス ----
+
+    def _object_path(self, sha256: str, variant: str) -> str:
+        return os.path.join(self.root, "objects", sha256[:2], f"{sha256}-{variant}.json")
+
+    def _url_path(self, url: str) -> str:
+        key = sha256_hex(url.encode("utf-8"))
+        return os.path.join(self.root, "urls", key[:2], f"{key}.json")
+
+    # ---- 読み込み ----
+
+    def _read_json(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+            # アクセス時刻を更新（LRU判定に使用）
+            os.utime(path, None)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self.counters["errors"] += 1
+            logger.warning(f"Image store read failed: {path}: {str(e)}")
+            return None
+        with self._lock:
+            if self._index is not None and path in self._index:
+                self._index[path] = (time.time(), self._index[path][1])
+        return record
+
+    async def get_url(self, url: str) -> Optional[UrlRecord]:
+        """画像URLの記録を取得"""
+        if not self.enabled:
+            return None
+        return await asyncio.to_thread(self._load_url, url)
+
+    def _load_url(self, url: str) -> Optional[UrlRecord]:
+        record = self._read_json(self._url_path(url))
+        if not record:
+            return None
+        return UrlRecord(**record)
+
+    async def get_object(self, sha256: str, variant: str) -> Optional[OptimizedImage]:
+        """元画像ハッシュから最適化済み画像を取得"""
+        if not self.enabled:
+            return None
+        return await asyncio.to_thread(self._load_object, sha256, variant)
+
+    def _load_object(self, sha256: str, variant: str) -> Optional[OptimizedImage]:
+        record = self._read_json(self._object_path(sha256, variant))
+        if not record:
+            return None
+        return OptimizedImage(
+            data=base64.b64decode(record["b64"]),
+            media_type=record["media_type"],
+            width=record["width"],
+            height=record["height"],
+            b64=record["b64"],
+            dhash=record.get("dhash"),
+        )
+
+    def record_hit(self, counter: str) -> None:
+        self.counters[counter] += 1
+
+    # ---- 書き込み ----
+
+    def _write_json(self, path: str, record: Dict[str, Any]) -> int:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        payload = json.dumps(record, ensure_ascii=False).encode("utf-8")
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return len(payload)
+
+    async def put_object(self, sha256: str, variant: str, image: OptimizedImage, original_size: int) -> None:
+        """最適化済み画像を保存"""
+        if not self.enabled:
+            return
+        await asyncio.to_thread(self._store_object, sha256, variant, image, original_size)
+
+    def _store_object(self, sha256: str, variant: str, image: OptimizedImage, original_size: int) -> None:
+        record = {
+            "sha256": sha256,
+            "variant": variant,
+            "media_type": image.media_type,
+            "width": image.width,
+            "height": image.height,
+            "original_size": original_size,
+            "size": len(image.data),
+            "b64": image.base64(),
+            "dhash": image.dhash,
+            "created_at": time.time(),
+        }
+        self._write(self._object_path(sha256, variant), record)
+
+    async def put_url(self, record: UrlRecord) -> None:
+        """画像URLの記録を保存"""
+        if not self.enabled:
+            return
+        await asyncio.to_thread(self._write, self._url_path(record.url), record.__dict__.copy())
+
+    def _write(self, path: str, record: Dict[str, Any]) -> None:
+        try:
+            written = self._write_json(path, record)
+        except OSError as e:
+            self.counters["errors"] += 1
+            logger.warning(f"Image store write failed: {path}: {str(e)}")
+            return
+
+        self.counters["writes"] += 1
+        with self._lock:
+            index = self._ensure_index()
+            # 同じパスの上書きは差分だけ加算
+            _, previous = index.get(path, (0.0, 0))
+            index[path] = (time.time(), written)
+            self._total_bytes += written - previous
+            over_capacity = self._total_bytes > self.max_bytes
+
+        if over_capacity:
+            self.evict()
+
+    # ---- 容量管理 ----
+
+    def _ensure_index(self) -> Dict[str, Tuple[float, int]]:
+        """容量管理の索引（未作成の場合は既存のファイルを1回だけ走査、_lockを保持して呼び出す）"""
+        if self._index is None:
+            index: Dict[str, Tuple[float, int]] = {}
+            for dirpath, _, filenames in os.walk(self.root):
+                for filename in filenames:
+                    if not filename.endswith(".json"):
+                        continue
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    index[path] = (stat.st_mtime, stat.st_size)
+            self._index = index
+            self._total_bytes = sum(size for _, size in index.values())
+        return self._index
+
+    def evict(self) -> None:
+        """アクセスの古い順に削除して容量上限の90%まで減らす（索引を使い、ディレクトリは走査しない）"""
+        with self._lock:
+            index = self._ensure_index()
+            target = int(self.max_bytes * EVICTION_TARGET_RATIO)
+            for path, (_, size) in sorted(index.items(), key=lambda item: item[1][0]):
+                if self._total_bytes <= target:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    continue
+                del index[path]
+                self._total_bytes -= size
+                self.counters["evictions"] += 1
+            total = self._total_bytes
+        logger.info(f"Image store evicted to {total/1024/1024:.1f}MB")
+
+    def stats(self) -> Dict[str, Any]:
+        """ストアの統計情報"""
+        return {
+            **self.counters,
+            "enabled": self.enabled,
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+# グローバル画像ストア
+_image_store = ImageStore()
+
+
+def get_image_store() -> ImageStore:
+    """グローバル画像ストアを取得"""
+    return _image_store
@@ -0,0 +1,208 @@
+"""
+============================================
+メタ広告審査チェッカー - 埋め込みJSON画像スキャナー
+============================================
+
+SPA/LPビルダーがHTMLに埋め込むJSONデータから画像URLを抽出
+- UTAGE等のVue.js属性（v-bind:data / :data / data-elements）の "type": "image" 要素
+- JSON-LD（<script type="application/ld+json">）の image フィールド
+- Next.js（__NEXT_DATA__）・Nuxt（__NUXT__ / __NUXT_DATA__）の状態データ内の画像URL
+"""
+
+import os
+import re
+import json
+import logging
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+from urllib.parse import urljoin
+
+from .image import is_valid_image_url
+
+logger = logging.getLogger(__name__)
+
+
+# --------------------------------------------
+# Configuration
+# --------------------------------------------
+
+# 1つのJSONブロックとして解析する最大文字数（超過したブロックは読み飛ばす）
+EMBEDDED_JSON_MAX_CHARS = int(os.getenv("EMBEDDED_JSON_MAX_CHARS", str(4 * 1024 * 1024)))
+
+# 埋め込みJSONの種類（優先順）
+SOURCE_ATTRIBUTE = 'attribute'
+SOURCE_JSON_LD = 'json_ld'
+SOURCE_APP_STATE = 'app_state'
+SOURCE_PRIORITY = (SOURCE_ATTRIBUTE, SOURCE_JSON_LD, SOURCE_APP_STATE)
+
+# HTMLを1回だけ走査するパターン（Vue.js属性 / scriptタグ）
+EMBEDDED_JSON_PATTERN = re.compile(
+    r"(?:v-bind)?:data='(?P<vue>[^']+)'"
+    r"|data-elements='(?P<elements>[^']+)'"
+    r"|(?i:<script\b(?P<script_attrs>[^>]*)>)(?P<script>.*?)(?i:</script\s*>)",
+    re.DOTALL,
+)
+JSON_LD_TYPE_PATTERN = re.compile(r'type\s*=\s*["\']?application/ld\+json', re.IGNORECASE)
+APP_STATE_ID_PATTERN = re.compile(r'id\s*=\s*["\']?(__NEXT_DATA__|__NUXT_DATA__)', re.IGNORECASE)
+# Nuxt 2の window.__NUXT__=(function(a,b){...}(...)) はJSONではないため、文字列リテラルを走査する
+NUXT_STATE_MARKER = '__NUXT__'
+STRING_LITERAL_PATTERN = re.compile(r'"((?:[^"\\\n]|\\.)*)"')
+
+# 状態データ内で画像URLとみなす文字列
+IMAGE_URL_PATTERN = re.compile(r'^(?:https?:)?/[^\s"\'<>]*\.(?:jpe?g|png|webp|avif)(?:[?#][^\s"\'<>]*)?$', re.IGNORECASE)
+# Vue.js属性のJSONで画像を表す要素の type
+ATTRIBUTE_IMAGE_TYPES = {'image', 'image-text'}
+
+
+# --------------------------------------------
+# JSON Walkers
+# --------------------------------------------
+
+def _walk(data: Any) -> Iterator[Any]:
+    """JSON値を深さ優先（文書順）で列挙（再帰を使わない）"""
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        yield node
+        if isinstance(node, dict):
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+
+
+def _attribute_images(data: Any) -> Iterator[str]:
+    """Vue.js属性のJSONから "type": "image" / "image-text" 要素の img_src を列挙"""
+    for node in _walk(data):
+        if isinstance(node, dict) and node.get('type') in ATTRIBUTE_IMAGE_TYPES and node.get('img_src'):
+            img_src = node['img_src']
+            if isinstance(img_src, str):
+                yield img_src.replace('\\/', '/')
+
+
+def _json_ld_images(data: Any) -> Iterator[str]:
+    """JSON-LDの image フィールド（文字列 / 配列 / ImageObject）を列挙"""
+    for node in _walk(data):
+        if not isinstance(node, dict) or 'image' not in node:
+            continue
+        values = node['image'] if isinstance(node['image'], list) else [node['image']]
+        for value in values:
+            if isinstance(value, dict):
+                value = value.get('url') or value.get('contentUrl')
+            if isinstance(value, str):
+                yield value
+
+
+def _app_state_images(data: Any) -> Iterator[str]:
+    """Next.js / Nuxtの状態データから画像URLらしい文字列を列挙"""
+    for node in _walk(data):
+        if isinstance(node, str) and IMAGE_URL_PATTERN.match(node):
+            yield node
+
+
+def _nuxt_script_images(script: str) -> Iterator[str]:
+    """Nuxt 2の __NUXT__ スクリプトの文字列リテラルから画像URLを列挙"""
+    for match in STRING_LITERAL_PATTERN.finditer(script):
+        literal = match.group(1)
+        if '\\' in literal:
+            try:
+                literal = json.loads(f'"{literal}"')
+            except ValueError:
+                continue
+        if IMAGE_URL_PATTERN.match(literal):
+            yield literal
+
+
+def _load_json(text: str, source: str) -> Optional[Any]:
+    """JSONブロックを解析（サイズ上限超過・解析失敗はNone）"""
+    if len(text) > EMBEDDED_JSON_MAX_CHARS:
+        logger.debug(f"Skipped embedded JSON ({source}): {len(text)} chars exceeds limit")
+        return None
+    try:
+        return json.loads(text)
+    except (json.JSONDecodeError, TypeError) as e:
+        logger.debug(f"Failed to parse JSON data ({source}): {e}")
+        return None
+
+
+# --------------------------------------------
+# Scanner
+# --------------------------------------------
+
+class _Collector:
+    """種類ごとに画像URLを集める（重複除外・上限管理）"""
+
+    def __init__(self, base_url: str, limit: int):
+        self.base_url = base_url
+        self.limit = limit
+        self.urls: Dict[str, List[str]] = {source: [] for source in SOURCE_PRIORITY}
+        self._seen = set()
+
+    def full(self, source: str) -> bool:
+        return len(self.urls[source]) >= self.limit
+
+    def add_all(self, source: str, image_urls: Iterable[str]) -> None:
+        for img_url in image_urls:
+            if self.full(source):
+                return
+            if not is_valid_image_url(img_url):
+                continue
+            full_url = urljoin(self.base_url, img_url)
+            if full_url not in self._seen:
+                self._seen.add(full_url)
+                self.urls[source].append(full_url)
+
+    def result(self) -> List[str]:
+        merged: List[str] = []
+        for source in SOURCE_PRIORITY:
+            merged.extend(self.urls[source])
+        return merged[:self.limit]
+
+
+def extract_images_from_json_data(html: str, base_url: str, limit: int = 10) -> List[str]:
+    """
+    HTMLに埋め込まれたJSONデータから画像URLを抽出
+
+    HTMLは1回だけ走査し、Vue.js属性 → JSON-LD → Next.js/Nuxtの状態データの順に優先する。
+    最優先のVue.js属性だけで上限に達した時点で走査を打ち切る。
+
+    Args:
+        html: 生のHTML文字列
+        base_url: ベースURL（相対パス解決用）
+        limit: 取得する最大画像数
+
+    Returns:
+        List[str]: 画像URLのリスト（優先順）
+    """
+    if limit <= 0:
+        return []
+    collector = _Collector(base_url, limit)
+
+    for match in EMBEDDED_JSON_PATTERN.finditer(html):
+        blob = match.group('vue') or match.group('elements')
+        if blob is not None:
+            # UTAGE等のSPA/Vue.jsサイトで使用されるパターン（HTMLエンティティをデコード）
+            data = _load_json(blob.replace('&quot;', '"').replace('&#039;', "'"), SOURCE_ATTRIBUTE)
+            if data is not None:
+                collector.add_all(SOURCE_ATTRIBUTE, _attribute_images(data))
+            if collector.full(SOURCE_ATTRIBUTE):
+                break
+            continue
+
+        attrs = match.group('script_attrs') or ''
+        script = match.group('script')
+        if JSON_LD_TYPE_PATTERN.search(attrs):
+            if not collector.full(SOURCE_JSON_LD):
+                data = _load_json(script, SOURCE_JSON_LD)
+                if data is not None:
+                    collector.add_all(SOURCE_JSON_LD, _json_ld_images(data))
+        elif APP_STATE_ID_PATTERN.search(attrs):
+            if not collector.full(SOURCE_APP_STATE):
+                data = _load_json(script, SOURCE_APP_STATE)
+                if data is not None:
+                    collector.add_all(SOURCE_APP_STATE, _app_state_images(data))
+        elif NUXT_STATE_MARKER in script and not collector.full(SOURCE_APP_STATE):
+            if len(script) <= EMBEDDED_JSON_MAX_CHARS:
+                collector.add_all(SOURCE_APP_STATE, _nuxt_script_images(script))
+
+    image_urls = collector.result()
+    logger.info(f"Extracted {len(image_urls)} images from JSON data")
+    return image_urls
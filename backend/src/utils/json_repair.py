@@ -0,0 +1,155 @@
+"""
+============================================
+メタ広告審査チェッカー - JSONの修復
+============================================
+
+AIの応答がそのままではJSONとして解析できない場合に、ローカルで修復して解析する
+- 前後の説明文・コードブロック（```json）を除き、最初のJSONオブジェクトだけを取り出す
+- 閉じ括弧の直前の余分なカンマを除く
+- 途中で打ち切られた応答は、最後に確定した値までで切り詰めて括弧を閉じる
+
+修復できない場合はValueErrorを送出する（呼び出し側でAI審査のエラーとして扱う）
+"""
+
+import json
+from typing import Any, List, Optional, Tuple
+
+# 文字列内の制御文字（改行など）を許容
+_DECODER = json.JSONDecoder(strict=False)
+_CLOSERS = {'{': '}', '[': ']'}
+
+
+# --------------------------------------------
+# Public API
+# --------------------------------------------
+
+def repair_json(text: str) -> Any:
+    """
+    壊れたJSONテキストを修復して解析
+
+    Args:
+        text: AIの応答テキスト
+
+    Returns:
+        Any: 解析結果（通常は辞書）
+
+    Raises:
+        ValueError: JSONが見つからない、または修復できない場合
+    """
+    starts = [i for i in (text.find('{'), text.find('[')) if i >= 0]
+    if not starts:
+        raise ValueError("JSON object not found in response")
+    candidate = _strip_trailing_commas(text[min(starts):])
+
+    try:
+        # 後ろに続く説明文は無視
+        value, _ = _DECODER.raw_decode(candidate)
+        return value
+    except json.JSONDecodeError:
+        pass
+
+    closed = _close_truncated(candidate)
+    if closed is None:
+        raise ValueError("JSON could not be repaired")
+    return _DECODER.decode(closed)
+
+
+# --------------------------------------------
+# Helper Functions
+# --------------------------------------------
+
+def _strip_trailing_commas(text: str) -> str:
+    """文字列の外にある「,」のうち、閉じ括弧の直前のものを除く"""
+    out: List[str] = []
+    in_string = escape = False
+    for i, c in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif c == '\\':
+                escape = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c == ',':
+            j = i + 1
+            while j < len(text) and text[j] in ' \t\r\n':
+                j += 1
+            if j < len(text) and text[j] in '}]':
+                continue
+        out.append(c)
+    return "".join(out)
+
+
+def _close_truncated(text: str) -> Optional[str]:
+    """
+    途中で打ち切られたJSONを、最後に値が確定した位置までで切り詰めて括弧を閉じる
+
+    書きかけの文字列・数値・キーは途中の値を返さないよう捨てる。配列の要素のオブジェクト
+    （violationsの1件など）は閉じていなければ要素ごと捨てる
+
+    Returns:
+        Optional[str]: 閉じたJSONテキスト（最初の括弧すら確定していない場合はNone）
+    """
+    # 開いている括弧と、オブジェクトの場合は次にキーを待っているか
+    stack: List[List[Any]] = []
+    in_string = escape = string_is_key = False
+    literal_start: Optional[int] = None
+    safe: Optional[Tuple[int, List[str]]] = None
+
+    def mark_safe(end: int) -> None:
+        nonlocal safe
+        brackets = [bracket for bracket, _ in stack]
+        if '[' in brackets and '{' in brackets[brackets.index('['):]:
+            return
+        safe = (end, brackets)
+
+    for i, c in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif c == '\\':
+                escape = True
+            elif c == '"':
+                in_string = False
+                if not string_is_key:
+                    mark_safe(i + 1)
+            continue
+
+        if literal_start is not None:
+            if c not in ',}] \t\r\n':
+                continue
+            literal_start = None
+            mark_safe(i)
+
+        if c == '"':
+            in_string = True
+            string_is_key = bool(stack) and stack[-1][0] == '{' and stack[-1][1]
+        elif c in '{[':
+            stack.append([c, c == '{'])
+            mark_safe(i + 1)
+        elif c in '}]':
+            if not stack:
+                break
+            stack.pop()
+            mark_safe(i + 1)
+            if not stack:
+                break
+        elif c == ':':
+            if stack:
+                stack[-1][1] = False
+        elif c == ',':
+            if stack and stack[-1][0] == '{':
+                stack[-1][1] = True
+        elif c not in ' \t\r\n':
+            literal_start = i
+
+    # 末尾のtrue/false/nullは確定した値として扱う（数値は続きがあり得るため捨てる）
+    if literal_start is not None and text[literal_start:] in ('true', 'false', 'null'):
+        mark_safe(len(text))
+
+    if safe is None:
+        return None
+    end, brackets = safe
+    return text[:end] + "".join(_CLOSERS[bracket] for bracket in reversed(brackets))
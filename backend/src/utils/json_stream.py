@@ -0,0 +1,188 @@
+"""
+============================================
+メタ広告審査チェッカー - JSONの逐次解析
+============================================
+
+ストリーミングで届くAIの応答（JSONオブジェクト）をチャンクごとに読み進め、
+値が確定した時点でイベントとして取り出す
+- トップレベルのキーの値（"overall_score": 45 など）が閉じたら 'field'
+- 指定した配列（violations / recommendations）の要素が閉じたら、配列全体を待たずに 'item'
+
+全体を読み終えた後の解析はこれまでどおり完全な応答テキストで行う（ここでの結果は途中経過の表示用）
+"""
+
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+# --------------------------------------------
+# Data Classes
+# --------------------------------------------
+
+@dataclass
+class JsonStreamEvent:
+    """値が確定したトップレベルのキー、または配列の要素"""
+    # 'field'（トップレベルのキーの値）または 'item'（配列の要素）
+    kind: str
+    key: str
+    value: Any
+    # 'item'の場合の配列内の位置（0始まり）
+    index: Optional[int] = None
+
+
+# --------------------------------------------
+# Incremental Parser
+# --------------------------------------------
+
+class IncrementalJsonParser:
+    """
+    トップレベルのJSONオブジェクトを文字単位で走査する逐次パーサー
+
+    先頭の「```json」などオブジェクト前の文字は読み飛ばす。確定した値だけをjson.loadsで
+    解析するため、読み込み済みの文字を再走査せずに済む（応答全体でO(n)）
+    """
+
+    def __init__(self, array_keys: Sequence[str] = ()):
+        self.array_keys = set(array_keys)
+        self._text = ""
+        self._pos = 0
+        # 開いている括弧（'{' / '['）
+        self._stack: List[str] = []
+        self._started = False
+        self._finished = False
+        self._in_string = False
+        self._escape = False
+        # トップレベルのキーと値の開始位置
+        self._expect_key = True
+        self._key: Optional[str] = None
+        self._key_start: Optional[int] = None
+        self._value_start: Optional[int] = None
+        # 監視対象の配列内の要素の開始位置と位置
+        self._item_start: Optional[int] = None
+        self._item_index = 0
+
+    @property
+    def finished(self) -> bool:
+        """トップレベルのオブジェクトが閉じたか"""
+        return self._finished
+
+    def _in_watched_array(self) -> bool:
+        return len(self._stack) == 2 and self._stack[1] == '[' and self._key in self.array_keys
+
+    def _decode(self, start: int, end: int) -> Any:
+        return json.loads(self._text[start:end])
+
+    def _emit(self, events: List[JsonStreamEvent], kind: str, start: int, end: int) -> None:
+        try:
+            value = self._decode(start, end)
+        except ValueError as e:
+            logger.debug(f"Skipping undecodable streamed value for {self._key}: {str(e)}")
+            return
+        if kind == 'item':
+            events.append(JsonStreamEvent('item', self._key, value, self._item_index))
+            self._item_index += 1
+        else:
+            events.append(JsonStreamEvent('field', self._key, value))
+
+    def feed(self, chunk: str) -> List[JsonStreamEvent]:
+        """
+        チャンクを読み込み、新たに確定した値を返す
+
+        Args:
+            chunk: 応答テキストの続き
+
+        Returns:
+            List[JsonStreamEvent]: このチャンクで確定した値（出現順）
+        """
+        events: List[JsonStreamEvent] = []
+        if self._finished:
+            return events
+        self._text += chunk
+        text = self._text
+
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if not self._started:
+                if c == '{':
+                    self._started = True
+                    self._stack.append(c)
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1 and self._expect_key and self._key_start is not None:
+                        try:
+                            self._key = self._decode(self._key_start, i + 1)
+                        except ValueError:
+                            self._key = None
+                        self._key_start = None
+                continue
+
+            depth = len(self._stack)
+            if c in ' \t\r\n':
+                continue
+
+            if c in '}]':
+                # 閉じ括弧の直前で終わるスカラー値
+                if depth == 1 and self._value_start is not None:
+                    self._emit(events, 'field', self._value_start, i)
+                    self._value_start = None
+                elif self._in_watched_array() and self._item_start is not None:
+                    self._emit(events, 'item', self._item_start, i)
+                    self._item_start = None
+                self._stack.pop()
+                depth = len(self._stack)
+                if depth == 0:
+                    self._finished = True
+                    self._pos = i + 1
+                    return events
+                if depth == 1 and self._value_start is not None:
+                    self._emit(events, 'field', self._value_start, i + 1)
+                    self._value_start = None
+                elif self._in_watched_array() and self._item_start is not None:
+                    self._emit(events, 'item', self._item_start, i + 1)
+                    self._item_start = None
+                continue
+
+            if c == ',':
+                if depth == 1:
+                    if self._value_start is not None:
+                        self._emit(events, 'field', self._value_start, i)
+                        self._value_start = None
+                    self._expect_key = True
+                elif self._in_watched_array() and self._item_start is not None:
+                    self._emit(events, 'item', self._item_start, i)
+                    self._item_start = None
+                continue
+
+            if c == ':' and depth == 1:
+                self._expect_key = False
+                continue
+
+            # 値（または1階層目のキー）の開始
+            if depth == 1:
+                if self._expect_key:
+                    if c == '"':
+                        self._key_start = i
+                elif self._value_start is None:
+                    self._value_start = i
+                    self._item_index = 0
+            elif self._in_watched_array() and self._item_start is None:
+                self._item_start = i
+
+            if c == '"':
+                self._in_string = True
+            elif c in '{[':
+                self._stack.append(c)
+
+        self._pos = len(text)
+        return events
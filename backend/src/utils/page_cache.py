@@ -0,0 +1,309 @@
+"""
+============================================
+メタ広告審査チェッカー - LPキャッシュ
+============================================
+
+正規化URLをキーに、抽出済みのページデータをメモリ上にキャッシュ（HTML本体は保持しない）
+（Cache-Control / ETag / Last-Modified に従った条件付き再検証、LRU方式で容量制限）
+"""
+
+import os
+import re
+import time
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Optional, Dict, Any, Mapping
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+logger = logging.getLogger(__name__)
+
+
+# --------------------------------------------
+# Configuration
+# --------------------------------------------
+
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "256"))
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# 鮮度情報がないレスポンスの既定の鮮度（秒）
+PAGE_CACHE_DEFAULT_TTL = int(os.getenv("PAGE_CACHE_DEFAULT_TTL", "0"))
+# stale-while-revalidateモード（期限切れでも猶予期間内は即返却し、裏で再検証）
+PAGE_CACHE_SWR = os.getenv("PAGE_CACHE_SWR", "false").lower() == "true"
+# サーバーがstale-while-revalidateを指定しない場合の猶予期間（秒）
+PAGE_CACHE_SWR_SECONDS = int(os.getenv("PAGE_CACHE_SWR_SECONDS", "300"))
+# Last-Modifiedからのヒューリスティック鮮度の上限（秒）
+HEURISTIC_FRESHNESS_CAP = 24 * 3600
+
+# 正規化時に除去する計測用クエリパラメータ
+TRACKING_PARAM_PATTERN = re.compile(r'^(utm_[a-z_]+|fbclid|gclid|yclid|msclkid|_ga)$', re.IGNORECASE)
+
+
+# --------------------------------------------
+# URL Canonicalization
+# --------------------------------------------
+
+def canonicalize_url(url: str) -> str:
+    """
+    キャッシュキー用にURLを正規化
+
+    スキーム・ホストの小文字化、既定ポートとフラグメントの除去、
+    計測用パラメータの除去とクエリの並べ替えを行う。
+
+    Args:
+        url: 正規化するURL
+
+    Returns:
+        str: 正規化されたURL
+    """
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    port = parts.port
+    if port and not ((scheme == 'http' and port == 80) or (scheme == 'https' and port == 443)):
+        host = f"{host}:{port}"
+
+    query = [
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not TRACKING_PARAM_PATTERN.match(key)
+    ]
+    query.sort()
+
+    return urlunsplit((scheme, host, parts.path or '/', urlencode(query), ''))
+
+
+# --------------------------------------------
+# Cache Policy
+# --------------------------------------------
+
+@dataclass
+class CachePolicy:
+    """レスポンスヘッダーから算出したキャッシュ方針"""
+    storable: bool
+    fresh_until: float
+    stale_until: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+def _parse_cache_control(value: str) -> Dict[str, Optional[str]]:
+    """Cache-Controlヘッダーをディレクティブ辞書に変換"""
+    directives: Dict[str, Optional[str]] = {}
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, arg = part.partition('=')
+        directives[name.strip().lower()] = arg.strip().strip('"') or None
+    return directives
+
+
+def _parse_http_date(value: Optional[str]) -> Optional[float]:
+    """HTTP日付をUNIX時刻に変換"""
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _int_directive(directives: Dict[str, Optional[str]], name: str) -> Optional[int]:
+    value = directives.get(name)
+    if value is None or not value.isdigit():
+        return None
+    return int(value)
+
+
+def compute_cache_policy(headers: Mapping[str, str], now: Optional[float] = None) -> CachePolicy:
+    """
+    レスポンスヘッダーから鮮度と再検証情報を算出（RFC 9111準拠の簡易実装）
+
+    Args:
+        headers: レスポンスヘッダー
+        now: 現在時刻（テスト用）
+
+    Returns:
+        CachePolicy: キャッシュ方針
+    """
+    now = time.time() if now is None else now
+    directives = _parse_cache_control(headers.get('cache-control', ''))
+    etag = headers.get('etag')
+    last_modified = headers.get('last-modified')
+
+    if 'no-store' in directives:
+        return CachePolicy(storable=False, fresh_until=now, stale_until=now)
+
+    # 鮮度の算出（max-age > Expires > Last-Modifiedによるヒューリスティック > 既定値）
+    age = headers.get('age', '')
+    current_age = int(age) if age.isdigit() else 0
+    date = _parse_http_date(headers.get('date')) or now
+    max_age = _int_directive(directives, 'max-age')
+
+    if 'no-cache' in directives:
+        lifetime = 0.0
+    elif max_age is not None:
+        lifetime = float(max_age)
+    elif headers.get('expires'):
+        expires = _parse_http_date(headers.get('expires'))
+        lifetime = max(0.0, expires - date) if expires else 0.0
+    elif last_modified:
+        modified = _parse_http_date(last_modified)
+        lifetime = min(HEURISTIC_FRESHNESS_CAP, max(0.0, (date - modified) * 0.1)) if modified else 0.0
+    else:
+        lifetime = float(PAGE_CACHE_DEFAULT_TTL)
+
+    fresh_until = now + max(0.0, lifetime - current_age)
+
+    swr = _int_directive(directives, 'stale-while-revalidate')
+    stale_until = fresh_until + (swr if swr is not None else PAGE_CACHE_SWR_SECONDS)
+
+    storable = fresh_until > now or bool(etag or last_modified)
+    return CachePolicy(
+        storable=storable,
+        fresh_until=fresh_until,
+        stale_until=stale_until,
+        etag=etag,
+        last_modified=last_modified,
+    )
+
+
+# --------------------------------------------
+# Page Cache
+# --------------------------------------------
+
+@dataclass
+class CachedPage:
+    """キャッシュエントリ"""
+    url: str
+    # 抽出済みのページデータ（url_fetcher.PageData、画像本体は含まない）
+    page_data: Any
+    policy: CachePolicy
+    size: int
+
+    def is_fresh(self, now: float) -> bool:
+        return now < self.policy.fresh_until
+
+    def is_usable_stale(self, now: float) -> bool:
+        return now < self.policy.stale_until
+
+    def has_validators(self) -> bool:
+        return bool(self.policy.etag or self.policy.last_modified)
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """条件付きGET用のリクエストヘッダー"""
+        headers = {}
+        if self.policy.etag:
+            headers['If-None-Match'] = self.policy.etag
+        if self.policy.last_modified:
+            headers['If-Modified-Since'] = self.policy.last_modified
+        return headers
+
+
+def _page_data_size(page_data: Any) -> int:
+    """エントリの容量計算用のバイト数（本文テキスト・タイトル・説明文・画像候補URL）"""
+    texts = [page_data.page_text, page_data.title, page_data.description, *(page_data.image_candidates or [])]
+    return sum(len(text.encode('utf-8')) for text in texts if text)
+
+
+class PageCache:
+    """LRU方式のLPキャッシュ（エントリ数とバイト数で容量制限）"""
+
+    def __init__(
+        self,
+        max_entries: int = PAGE_CACHE_MAX_ENTRIES,
+        max_bytes: int = PAGE_CACHE_MAX_BYTES,
+        stale_while_revalidate: bool = PAGE_CACHE_SWR,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stale_while_revalidate = stale_while_revalidate
+        self._entries: "OrderedDict[str, CachedPage]" = OrderedDict()
+        self._bytes = 0
+        self._revalidating: set = set()
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "stale_hits": 0,
+            "revalidated": 0,
+            # stale-while-revalidateの裏での再検証（返却済みのstale_hitsの続きのため、ヒット率には含めない）
+            "background_revalidations": 0,
+            "evictions": 0,
+        }
+
+    def get(self, key: str) -> Optional[CachedPage]:
+        """エントリを取得（LRU順を更新）"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, url: str, page_data: Any, policy: CachePolicy) -> None:
+        """エントリを保存（容量超過分は古い順に破棄）"""
+        self.remove(key)
+        if not policy.storable:
+            return
+
+        size = _page_data_size(page_data)
+        if size > self.max_bytes:
+            return
+
+        self._entries[key] = CachedPage(url=url, page_data=page_data, policy=policy, size=size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            self.counters["evictions"] += 1
+
+    def refresh(self, key: str, policy: CachePolicy) -> None:
+        """304応答を受けてエントリの鮮度を更新（バリデーターは新しい値があれば置換）"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        policy.etag = policy.etag or entry.policy.etag
+        policy.last_modified = policy.last_modified or entry.policy.last_modified
+        entry.policy = policy
+
+    def remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def begin_revalidation(self, key: str) -> bool:
+        """バックグラウンド再検証を開始（同一キーの重複実行を防止）"""
+        if key in self._revalidating:
+            return False
+        self._revalidating.add(key)
+        return True
+
+    def end_revalidation(self, key: str) -> None:
+        self._revalidating.discard(key)
+
+    def record(self, counter: str) -> None:
+        self.counters[counter] += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """キャッシュの統計情報"""
+        lookups = self.counters["hits"] + self.counters["stale_hits"] + self.counters["revalidated"] + self.counters["misses"]
+        served = lookups - self.counters["misses"]
+        return {
+            **self.counters,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hit_ratio": round(served / lookups, 3) if lookups else 0.0,
+        }
+
+
+# グローバルLPキャッシュ
+_page_cache = PageCache()
+
+
+def get_page_cache() -> PageCache:
+    """グローバルLPキャッシュを取得"""
+    return _page_cache
@@ -0,0 +1,390 @@
+"""
+============================================
+メタ広告審査チェッカー - PDFクリエイティブの描画
+============================================
+
+PDFの先頭ページ（最大PDF_MAX_PAGESページ）をAI送信用の画像に変換する
+- DPIはページサイズから決め、描画結果がそのままAI送信用の寸法（長辺1024px）になるようにする
+- PNGを経由せず、描画結果を内容に応じた形式（JPEG / WebP / PNG）で直接エンコード
+- 未描画のページはPDFを1回だけ開いて1つのCPUプールのタスクでまとめて描画し、
+  結果は画像ストアに PDFのSHA-256 + ページ番号 で保存
+"""
+
+import os
+import asyncio
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Optional, List, Tuple, Dict, Any, Union
+
+from PIL import Image
+
+from .errors import ValidationError
+from .image import AI_IMAGE_MAX_DIMENSION, OPTIMIZER_VERSION, OptimizedImage, encode_optimized_image, detect_image_media_type
+from .image_store import get_image_store, sha256_hex
+from .cpu_pool import get_cpu_pool
+
+logger = logging.getLogger(__name__)
+
+
+# --------------------------------------------
+# Configuration
+# --------------------------------------------
+
+# 審査に使うページ数（先頭から）
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "3"))
+# 描画DPIの範囲（名刺サイズの小さなページ・ポスターサイズの大きなページで極端な値にしない）
+PDF_RENDER_MIN_DPI = float(os.getenv("PDF_RENDER_MIN_DPI", "36"))
+PDF_RENDER_MAX_DPI = float(os.getenv("PDF_RENDER_MAX_DPI", "200"))
+
+# PDFの座標系（1インチ = 72ポイント）
+POINTS_PER_INCH = 72
+
+# PyMuPDFはスレッドセーフではないため、スレッドプールではPDFを開く・描画（ラスタライズ）する間だけ直列化する
+# （エンコードはロックの外で実行し、別のPDFの描画と並行できる。プロセスプールではワーカーごとに独立）
+_FITZ_LOCK = threading.Lock()
+
+
+# --------------------------------------------
+# Data Classes
+# --------------------------------------------
+
+@dataclass
+class PdfInfo:
+    """PDFの概要（描画前の確認用）"""
+    sha256: str
+    page_count: int
+    # 描画対象ページのサイズ（ポイント、先頭からPDF_MAX_PAGESページまで）
+    page_sizes: List[Tuple[float, float]] = field(default_factory=list)
+
+
+@dataclass
+class RenderedPdfPage:
+    """AI送信用に描画したPDFの1ページ"""
+    # ページ番号（1始まり）
+    page_number: int
+    dpi: float
+    image: OptimizedImage
+    # 画像ストアに保存済みの描画結果を再利用した場合True
+    cached: bool = False
+
+
+# --------------------------------------------
+# Rendering
+# --------------------------------------------
+
+def choose_render_dpi(
+    width_pt: float,
+    height_pt: float,
+    max_dimension: int = AI_IMAGE_MAX_DIMENSION,
+    min_dpi: Optional[float] = None,
+    max_dpi: Optional[float] = None,
+) -> float:
+    """
+    ページの長辺がmax_dimension（px）になるDPIを選ぶ
+
+    Args:
+        width_pt: ページの幅（ポイント）
+        height_pt: ページの高さ（ポイント）
+        max_dimension: 描画結果の長辺（px）
+        min_dpi: DPIの下限（未指定の場合はPDF_RENDER_MIN_DPI）
+        max_dpi: DPIの上限（未指定の場合はPDF_RENDER_MAX_DPI）
+
+    Returns:
+        float: 描画DPI（A4縦の場合は約88DPI）
+    """
+    min_dpi = PDF_RENDER_MIN_DPI if min_dpi is None else min_dpi
+    max_dpi = PDF_RENDER_MAX_DPI if max_dpi is None else max_dpi
+    long_edge = max(width_pt, height_pt, 1.0)
+    dpi = POINTS_PER_INCH * max_dimension / long_edge
+    return round(min(max_dpi, max(min_dpi, dpi)), 2)
+
+
+def _open_pdf(source: Union[bytes, str]):
+    """PDFを開く（ページがない場合はValidationError）"""
+    import fitz  # PyMuPDF
+
+    if isinstance(source, str):
+        pdf_document = fitz.open(source, filetype="pdf")
+    else:
+        pdf_document = fitz.open(stream=source, filetype="pdf")
+
+    if len(pdf_document) == 0:
+        pdf_document.close()
+        raise ValidationError(
+            message="PDFファイルにページが含まれていません。",
+            details={"error": "PDF has no pages"}
+        )
+    return pdf_document
+
+
+def _conversion_error(e: Exception) -> ValidationError:
+    logger.error(f"PDF to image conversion failed: {str(e)}")
+    return ValidationError(
+        message="PDFの変換に失敗しました。PDFファイルが破損しているか、正しい形式ではありません。",
+        details={"error": str(e)}
+    )
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def inspect_pdf(source: Union[bytes, str], max_pages: Optional[int] = None) -> PdfInfo:
+    """
+    PDFのハッシュ・ページ数・描画対象ページのサイズを取得（描画はしない、CPUプールで実行）
+
+    Args:
+        source: PDFのバイナリデータ、またはファイルパス
+        max_pages: 描画対象のページ数（未指定の場合はPDF_MAX_PAGES）
+
+    Returns:
+        PdfInfo: PDFの概要
+
+    Raises:
+        ValidationError: PDFが破損している、またはページがない場合
+    """
+    max_pages = PDF_MAX_PAGES if max_pages is None else max_pages
+    try:
+        with _FITZ_LOCK:
+            pdf_document = _open_pdf(source)
+            try:
+                page_count = len(pdf_document)
+                page_sizes = [
+                    (pdf_document[index].rect.width, pdf_document[index].rect.height)
+                    for index in range(min(page_count, max(1, max_pages)))
+                ]
+            finally:
+                pdf_document.close()
+    except ValidationError:
+        raise
+    except Exception as e:
+        raise _conversion_error(e)
+
+    sha256 = _file_sha256(source) if isinstance(source, str) else sha256_hex(source)
+    return PdfInfo(sha256=sha256, page_count=page_count, page_sizes=page_sizes)
+
+
+def _rasterize(page, dpi: float) -> Image.Image:
+    """ページを指定DPIでRGB画像に描画（_FITZ_LOCKを保持して呼び出す）"""
+    import fitz  # PyMuPDF
+
+    scale = dpi / POINTS_PER_INCH
+    pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+    return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+
+def render_pdf_page_image(
+    source: Union[bytes, str],
+    page_index: int = 0,
+    dpi: Optional[float] = None,
+    max_dimension: int = AI_IMAGE_MAX_DIMENSION,
+) -> Image.Image:
+    """
+    PDFの1ページを画像として描画（透過なしのRGB）
+
+    Args:
+        source: PDFのバイナリデータ、またはファイルパス
+        page_index: ページ番号（0始まり）
+        dpi: 描画DPI（未指定の場合はページサイズとmax_dimensionから選ぶ）
+        max_dimension: DPIを選ぶ際の描画結果の長辺（px）
+
+    Returns:
+        Image.Image: 描画したRGB画像
+
+    Raises:
+        ValidationError: PDF変換に失敗した場合
+    """
+    try:
+        with _FITZ_LOCK:
+            pdf_document = _open_pdf(source)
+            try:
+                page = pdf_document[page_index]
+                if dpi is None:
+                    dpi = choose_render_dpi(page.rect.width, page.rect.height, max_dimension)
+                image = _rasterize(page, dpi)
+            finally:
+                pdf_document.close()
+    except ValidationError:
+        raise
+    except Exception as e:
+        raise _conversion_error(e)
+
+    logger.info(f"PDF page rendered: page={page_index + 1}, dpi={dpi:g}, size={image.width}x{image.height}")
+    return image
+
+
+def _encode_page(image: Image.Image, max_dimension: int) -> OptimizedImage:
+    """描画したページをAI送信用にエンコード（DPIの下限でmax_dimensionを超えた場合のみ縮小）"""
+    if max(image.size) > max_dimension:
+        ratio = max_dimension / max(image.size)
+        image = image.resize(
+            (max(1, int(image.width * ratio)), max(1, int(image.height * ratio))), Image.Resampling.LANCZOS
+        )
+
+    data, image_format = encode_optimized_image(image)
+    optimized = OptimizedImage(
+        data=data,
+        media_type=detect_image_media_type(data) or Image.MIME.get(image_format, "image/jpeg"),
+        width=image.width,
+        height=image.height,
+    )
+    optimized.base64()
+    return optimized
+
+
+def render_pdf_pages(
+    source: Union[bytes, str],
+    pages: List[Tuple[int, float]],
+    max_dimension: int = AI_IMAGE_MAX_DIMENSION,
+) -> List[OptimizedImage]:
+    """
+    PDFを1回だけ開いて複数ページを描画し、AI送信用にエンコード（CPUプールで実行）
+
+    Args:
+        source: PDFのバイナリデータ、またはファイルパス
+        pages: (ページ番号（0始まり）, 描画DPI) のリスト
+        max_dimension: 最大寸法（DPIの下限で超えた場合のみ縮小）
+
+    Returns:
+        List[OptimizedImage]: pagesと同じ順のBase64計算済みの描画結果
+
+    Raises:
+        ValidationError: PDF変換に失敗した場合
+    """
+    results: List[OptimizedImage] = []
+    try:
+        with _FITZ_LOCK:
+            pdf_document = _open_pdf(source)
+        try:
+            for page_index, dpi in pages:
+                with _FITZ_LOCK:
+                    image = _rasterize(pdf_document[page_index], dpi)
+                results.append(_encode_page(image, max_dimension))
+                logger.info(f"PDF page rendered: page={page_index + 1}, dpi={dpi:g}, size={image.width}x{image.height}")
+        finally:
+            with _FITZ_LOCK:
+                pdf_document.close()
+    except ValidationError:
+        raise
+    except Exception as e:
+        raise _conversion_error(e)
+    return results
+
+
+# --------------------------------------------
+# PDF Renderer
+# --------------------------------------------
+
+class PdfRenderer:
+    """PDFクリエイティブの複数ページ描画（未描画ページのまとめての描画と画像ストアでの再利用）"""
+
+    def __init__(
+        self,
+        max_pages: int = PDF_MAX_PAGES,
+        min_dpi: float = PDF_RENDER_MIN_DPI,
+        max_dpi: float = PDF_RENDER_MAX_DPI,
+    ):
+        self.max_pages = max_pages
+        self.min_dpi = min_dpi
+        self.max_dpi = max_dpi
+        self.counters = {
+            "documents": 0,
+            "pages_rendered": 0,
+            "cache_hits": 0,
+            "truncated_documents": 0,
+        }
+
+    def _variant(self, page_number: int, dpi: float, max_dimension: int) -> str:
+        """画像ストアのバリアント名（ページ・描画条件が変われば別エントリになる）"""
+        return f"pdf-p{page_number}-{dpi:g}dpi-{max_dimension}px-v{OPTIMIZER_VERSION}"
+
+    async def render(
+        self,
+        source: Union[bytes, str],
+        size: Optional[int] = None,
+        max_dimension: int = AI_IMAGE_MAX_DIMENSION,
+    ) -> List[RenderedPdfPage]:
+        """
+        PDFの先頭ページを描画
+
+        Args:
+            source: PDFのバイナリデータ、またはファイルパス（ディスクに退避したアップロード）
+            size: PDFのバイト数（CPUプールのその場実行の判定に使用）
+            max_dimension: 描画結果の長辺（px）
+
+        Returns:
+            List[RenderedPdfPage]: ページ順の描画結果
+
+        Raises:
+            ValidationError: PDFが破損している、またはページがない場合
+        """
+        pool = get_cpu_pool()
+        store = get_image_store()
+        if size is None and isinstance(source, bytes):
+            size = len(source)
+
+        info = await pool.run(inspect_pdf, source, self.max_pages, size=size, label="pdf_inspect")
+        self.counters["documents"] += 1
+        if info.page_count > len(info.page_sizes):
+            self.counters["truncated_documents"] += 1
+
+        pages: List[Optional[RenderedPdfPage]] = [None] * len(info.page_sizes)
+        pending = []
+        plans = []
+        for index, (width_pt, height_pt) in enumerate(info.page_sizes):
+            dpi = choose_render_dpi(width_pt, height_pt, max_dimension, self.min_dpi, self.max_dpi)
+            plans.append((index, dpi, self._variant(index + 1, dpi, max_dimension)))
+        # 描画済みのページを画像ストアからまとめて読み込む
+        cached_pages = await asyncio.gather(*(store.get_object(info.sha256, variant) for _, _, variant in plans))
+        for (index, dpi, variant), cached in zip(plans, cached_pages):
+            if cached is not None:
+                self.counters["cache_hits"] += 1
+                pages[index] = RenderedPdfPage(index + 1, dpi, cached, cached=True)
+            else:
+                pending.append((index, dpi, variant))
+
+        # 未描画のページは、PDFを1回だけ開いて1つのタスクでまとめて描画
+        rendered: List[OptimizedImage] = []
+        if pending:
+            rendered = await pool.run(
+                render_pdf_pages, source, [(index, dpi) for index, dpi, _ in pending], max_dimension,
+                size=size, label="pdf_render",
+            )
+        for (index, dpi, _), image in zip(pending, rendered):
+            pages[index] = RenderedPdfPage(index + 1, dpi, image)
+        await asyncio.gather(*(
+            store.put_object(info.sha256, variant, image, size or 0)
+            for (_, _, variant), image in zip(pending, rendered)
+        ))
+        self.counters["pages_rendered"] += len(pending)
+
+        logger.info(
+            f"PDF rendered: pages={len(pages)}/{info.page_count}, rendered={len(pending)}, "
+            f"cached={len(pages) - len(pending)}, "
+            + ", ".join(f"p{page.page_number}={page.image.width}x{page.image.height}@{page.dpi:g}dpi" for page in pages)
+        )
+        return pages
+
+    def stats(self) -> Dict[str, Any]:
+        """描画の統計情報"""
+        return {
+            **self.counters,
+            "max_pages": self.max_pages,
+            "min_dpi": self.min_dpi,
+            "max_dpi": self.max_dpi,
+        }
+
+
+# グローバルPDF描画
+_pdf_renderer = PdfRenderer()
+
+
+def get_pdf_renderer() -> PdfRenderer:
+    """グローバルPDF描画を取得"""
+    return _pdf_renderer
@@ -0,0 +1,394 @@
+"""
+============================================
+メタ広告審査チェッカー - レート制限
+============================================
+
+GCRA（Generic Cell Rate Algorithm）によるレート制限と、状態を保存するバックエンド
+- キーごとの状態は「理論上の次の到着時刻（TAT）」1つだけ（リクエスト数によらず一定のメモリ）
+- 判定と更新は各バックエンドでアトミックに行う
+  - memory: プロセス内（ワーカーごとに独立）
+  - sqlite: WALモードのSQLiteファイル（同一ホストの複数ワーカーで共有）
+  - redis: Redisプロトコルのサーバー（複数ホスト・複数インスタンスで共有、Luaスクリプトで更新）
+
+window秒あたりmax_requests件の制限は、window秒間にmax_requests件までのバーストを許し、
+その後はwindow / max_requests秒ごとに1件ずつ回復する
+
+sqlite・redisはブロッキングI/Oのため、イベントループを止めないようスレッドで呼び出す。
+共有バックエンドが失敗した場合は、RATE_LIMIT_BACKEND_COOLDOWN秒の間プロセス内の状態で判定する
+"""
+
+import os
+import math
+import time
+import asyncio
+import sqlite3
+import logging
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# --------------------------------------------
+# Configuration
+# --------------------------------------------
+
+# memory / sqlite / redis
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_SQLITE_PATH = os.getenv(
+    "RATE_LIMIT_SQLITE_PATH",
+    os.path.join(tempfile.gettempdir(), "meta-ad-checker", "rate_limit.sqlite3"),
+)
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+# 複数のアプリで同じRedisを共有する場合のキーの接頭辞
+RATE_LIMIT_KEY_PREFIX = os.getenv("RATE_LIMIT_KEY_PREFIX", "meta-ad-checker:rate-limit")
+# 共有バックエンドが失敗した後、再び使うまでの秒数（その間は失敗したバックエンドに問い合わせない）
+RATE_LIMIT_BACKEND_COOLDOWN = float(os.getenv("RATE_LIMIT_BACKEND_COOLDOWN", "30"))
+
+# 浮動小数点の誤差で残り回数が1件少なくならないようにする
+_EPSILON = 1e-9
+
+
+# --------------------------------------------
+# GCRA
+# --------------------------------------------
+
+@dataclass
+class RateLimitDecision:
+    """レート制限の判定結果"""
+    allowed: bool
+    # 判定後に受け付けられる残りリクエスト数
+    remaining: int
+    # 次のリクエストを受け付けられるまでの秒数（受け付けられる場合は0）
+    retry_after: float
+
+
+def gcra_update(
+    tat: Optional[float],
+    now: float,
+    interval: float,
+    window: float,
+    cost: int,
+) -> Tuple[RateLimitDecision, float]:
+    """
+    GCRAの判定と次の状態の計算
+
+    Args:
+        tat: 保存されている理論上の次の到着時刻（未保存の場合はNone）
+        now: 現在時刻（UNIX秒）
+        interval: 1件あたりの回復間隔（window / max_requests）
+        window: 制限の期間（秒）
+        cost: 消費する件数（1: 受け付け、0: 確認のみ、-1: 返却）
+
+    Returns:
+        Tuple[RateLimitDecision, float]: (判定結果, 保存する新しいTAT)
+    """
+    tat = now if tat is None else max(tat, now)
+    # 1件（cost件）を受け付けられる最も早い時刻
+    allow_at = tat + interval * max(cost, 1) - window
+    if cost > 0 and allow_at > now + _EPSILON:
+        return RateLimitDecision(False, 0, allow_at - now), tat
+
+    new_tat = max(now, tat + interval * cost)
+    remaining = max(0, math.floor((now + window - new_tat) / interval + _EPSILON))
+    if cost == 0:
+        allowed = remaining > 0
+        retry_after = 0.0 if allowed else allow_at - now
+    else:
+        allowed = True
+        retry_after = 0.0 if remaining > 0 else new_tat + interval - window - now
+    return RateLimitDecision(allowed, remaining, max(0.0, retry_after)), new_tat
+
+
+# --------------------------------------------
+# Backends
+# --------------------------------------------
+
+class RateLimitBackend(ABC):
+    """状態を保存するバックエンドの基底クラス（判定と更新をアトミックに行う）"""
+
+    name = "base"
+    # ブロッキングI/Oを行う（イベントループの外のスレッドで呼び出す）
+    blocking = True
+
+    @abstractmethod
+    def update(self, key: str, now: float, interval: float, window: float, cost: int) -> RateLimitDecision:
+        """
+        キーの状態を判定・更新
+
+        Args:
+            key: 制限の単位のキー
+            now: 現在時刻（UNIX秒）
+            interval: 1件あたりの回復間隔（秒）
+            window: 制限の期間（秒）
+            cost: 消費する件数（1: 受け付け、0: 確認のみ、-1: 返却）
+
+        Returns:
+            RateLimitDecision: 判定結果
+        """
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """プロセス内のバックエンド（ワーカー・インスタンスごとに独立）"""
+
+    name = "memory"
+    blocking = False
+
+    def __init__(self):
+        self._tats: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def update(self, key: str, now: float, interval: float, window: float, cost: int) -> RateLimitDecision:
+        with self._lock:
+            decision, new_tat = gcra_update(self._tats.get(key), now, interval, window, cost)
+            if cost != 0:
+                if new_tat <= now:
+                    self._tats.pop(key, None)
+                else:
+                    self._tats[key] = new_tat
+            return decision
+
+
+class SqliteRateLimitBackend(RateLimitBackend):
+    """
+    SQLiteファイルのバックエンド（同一ホストの複数ワーカーで共有）
+
+    WALモードで開き、更新はBEGIN IMMEDIATEのトランザクション内で読み書きする
+    （書き込みロックを取ってから読むため、ワーカー間で更新が失われない）
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or RATE_LIMIT_SQLITE_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, tat REAL NOT NULL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """スレッドごとの接続（トランザクションは明示的に制御）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def update(self, key: str, now: float, interval: float, window: float, cost: int) -> RateLimitDecision:
+        conn = self._connection()
+        if cost == 0:
+            row = conn.execute("SELECT tat FROM rate_limits WHERE key = ?", (key,)).fetchone()
+            return gcra_update(row[0] if row else None, now, interval, window, cost)[0]
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tat FROM rate_limits WHERE key = ?", (key,)).fetchone()
+            decision, new_tat = gcra_update(row[0] if row else None, now, interval, window, cost)
+            if new_tat <= now:
+                conn.execute("DELETE FROM rate_limits WHERE key = ?", (key,))
+            else:
+                conn.execute(
+                    "INSERT INTO rate_limits (key, tat) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET tat = excluded.tat",
+                    (key, new_tat),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return decision
+
+
+# gcra_updateと同じ計算をRedis上でアトミックに行うLuaスクリプト
+# （浮動小数点はRedisの整数変換で切り捨てられないよう文字列で返す）
+# 注意: 単体テストはLuaを実行しない代役のクライアントで行っており、スクリプト自体は
+# 実際のRedisでのみ検証できる（変更した場合は実際のRedisで動作を確認すること）
+_GCRA_LUA = """
+local tat = tonumber(redis.call('GET', KEYS[1]))
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local window = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local epsilon = 1e-9
+if tat == nil or tat < now then tat = now end
+local allow_at = tat + interval * math.max(cost, 1) - window
+if cost > 0 and allow_at > now + epsilon then
+  return {0, 0, tostring(allow_at - now)}
+end
+local new_tat = math.max(now, tat + interval * cost)
+local remaining = math.max(0, math.floor((now + window - new_tat) / interval + epsilon))
+local allowed = 1
+local retry_after = 0
+if cost == 0 then
+  if remaining == 0 then
+    allowed = 0
+    retry_after = allow_at - now
+  end
+else
+  if remaining == 0 then retry_after = new_tat + interval - window - now end
+  if new_tat <= now then
+    redis.call('DEL', KEYS[1])
+  else
+    redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+  end
+end
+return {allowed, remaining, tostring(math.max(0, retry_after))}
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """
+    Redisプロトコルのバックエンド（複数ホスト・複数インスタンスで共有）
+
+    clientにはredis-py互換のクライアント（eval(script, numkeys, *keys_and_args)を持つもの）を渡す。
+    状態のキーはTATを過ぎると期限切れになるため、使われなくなったキーは残らない
+    """
+
+    name = "redis"
+
+    def __init__(self, client: Any = None, url: Optional[str] = None):
+        if client is None:
+            # オプション依存（RATE_LIMIT_BACKEND=redis の場合のみ必要）
+            import redis
+
+            client = redis.Redis.from_url(url or RATE_LIMIT_REDIS_URL, socket_timeout=1.0, socket_connect_timeout=1.0)
+        self.client = client
+
+    def update(self, key: str, now: float, interval: float, window: float, cost: int) -> RateLimitDecision:
+        allowed, remaining, retry_after = self.client.eval(_GCRA_LUA, 1, key, repr(now), repr(interval), repr(window), cost)
+        if isinstance(retry_after, bytes):
+            retry_after = retry_after.decode()
+        return RateLimitDecision(bool(int(allowed)), int(remaining), float(retry_after))
+
+
+def create_rate_limit_backend(kind: Optional[str] = None) -> RateLimitBackend:
+    """
+    設定に応じたバックエンドを作成（作成できない場合はプロセス内のバックエンドにフォールバック）
+
+    Args:
+        kind: 'memory' / 'sqlite' / 'redis'（未指定の場合はRATE_LIMIT_BACKEND）
+
+    Returns:
+        RateLimitBackend: バックエンド
+    """
+    kind = (kind or RATE_LIMIT_BACKEND).lower()
+    try:
+        if kind == "sqlite":
+            return SqliteRateLimitBackend()
+        if kind == "redis":
+            return RedisRateLimitBackend()
+        if kind != "memory":
+            logger.warning(f"Unknown RATE_LIMIT_BACKEND: {kind}, using 'memory'")
+    except Exception as e:
+        logger.warning(f"Failed to initialize {kind} rate limit backend, using 'memory': {type(e).__name__}: {str(e)}")
+    return MemoryRateLimitBackend()
+
+
+# --------------------------------------------
+# Rate Limiter
+# --------------------------------------------
+
+class RateLimiter:
+    """
+    GCRAによるレート制限（window_seconds秒あたりmax_requests件）
+
+    acquire()で1件を予約し、処理が失敗した場合はrelease()で返却する。共有バックエンドが
+    応答しない場合は、そのプロセス内のバックエンドで判定を続ける（制限を止めない）
+    """
+
+    def __init__(
+        self,
+        max_requests: int,
+        window_seconds: int,
+        backend: Optional[RateLimitBackend] = None,
+        key: str = "claude",
+    ):
+        if max_requests < 1 or window_seconds <= 0:
+            raise ValueError(f"Rate limit must allow at least 1 request per positive window: {max_requests}/{window_seconds}s")
+        self.max_requests = max_requests
+        self.window_seconds = window_seconds
+        self.backend = backend or MemoryRateLimitBackend()
+        self.key = f"{RATE_LIMIT_KEY_PREFIX}:{key}"
+        self._interval = window_seconds / max_requests
+        self._fallback: Optional[MemoryRateLimitBackend] = None
+        # 共有バックエンドを再び使う時刻（time.monotonic）
+        self._backend_retry_at = 0.0
+        self.counters = {
+            "allowed": 0,
+            "rejected": 0,
+            "released": 0,
+            "backend_errors": 0,
+            "backend_skipped": 0,
+        }
+
+    async def _update(self, cost: int, key: Optional[str] = None) -> RateLimitDecision:
+        now = time.time()
+        key = f"{self.key}:{key}" if key else self.key
+        if time.monotonic() >= self._backend_retry_at:
+            try:
+                if self.backend.blocking:
+                    return await asyncio.to_thread(self.backend.update, key, now, self._interval, self.window_seconds, cost)
+                return self.backend.update(key, now, self._interval, self.window_seconds, cost)
+            except Exception as e:
+                self.counters["backend_errors"] += 1
+                self._backend_retry_at = time.monotonic() + RATE_LIMIT_BACKEND_COOLDOWN
+                logger.warning(
+                    f"Rate limit backend '{self.backend.name}' failed, using process-local state for "
+                    f"{RATE_LIMIT_BACKEND_COOLDOWN:.0f}s: {type(e).__name__}: {str(e)}"
+                )
+        else:
+            self.counters["backend_skipped"] += 1
+        if self._fallback is None:
+            self._fallback = MemoryRateLimitBackend()
+        return self._fallback.update(key, now, self._interval, self.window_seconds, cost)
+
+    async def acquire(self, key: Optional[str] = None) -> RateLimitDecision:
+        """
+        1件を予約（判定と消費をアトミックに行う）
+
+        Args:
+            key: 呼び出し元ごとに制限する場合のキー（未指定の場合はリミッター全体で1つ）
+        """
+        decision = await self._update(1, key)
+        self.counters["allowed" if decision.allowed else "rejected"] += 1
+        return decision
+
+    async def release(self, key: Optional[str] = None) -> None:
+        """予約した1件を返却（処理が失敗した場合）"""
+        await self._update(-1, key)
+        self.counters["released"] += 1
+
+    async def peek(self, key: Optional[str] = None) -> RateLimitDecision:
+        """現在の状態を確認（消費しない）"""
+        return await self._update(0, key)
+
+    async def is_allowed(self) -> bool:
+        """リクエストが許可されるかチェック（消費しない）"""
+        return (await self.peek()).allowed
+
+    async def remaining(self) -> int:
+        """残りリクエスト数"""
+        return (await self.peek()).remaining
+
+    async def retry_after(self) -> int:
+        """次にリクエスト可能になるまでの秒数"""
+        return math.ceil((await self.peek()).retry_after)
+
+    async def stats(self) -> Dict[str, Any]:
+        """統計情報"""
+        decision = await self.peek()
+        return {
+            **self.counters,
+            "backend": self.backend.name,
+            "backend_available": time.monotonic() >= self._backend_retry_at,
+            "max_requests": self.max_requests,
+            "window_seconds": self.window_seconds,
+            "remaining": decision.remaining,
+            "retry_after": math.ceil(decision.retry_after),
+        }
@@ -0,0 +1,254 @@
+"""
+============================================
+メタ広告審査チェッカー - 呼び出し元ごとの利用枠
+============================================
+
+呼び出し元（テナント）ごとにレート制限の枠を分け、1つの呼び出し元が全体の枠を使い切らないようにする
+- 識別: 登録済みのAPIキー（X-API-Key / Authorization: Bearer）→ クライアントIP の順
+- 枠: ティア（TENANT_TIERS）ごとの「期間あたりの件数」と、混雑時の公平キューでの重み
+
+未登録のAPIキーはIPで識別する（キーを作り直して枠を増やせないようにするため）
+"""
+
+import os
+import math
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Mapping, Optional
+
+from .errors import RateLimitExceededError
+from .rate_limit import RateLimitBackend, RateLimitDecision, RateLimiter, create_rate_limit_backend
+
+logger = logging.getLogger(__name__)
+
+
+# --------------------------------------------
+# Configuration
+# --------------------------------------------
+
+# ティア定義（「名前:件数/秒数:重み」のカンマ区切り）
+TENANT_TIERS = os.getenv("TENANT_TIERS", "default:5/3600:1")
+# APIキーとティアの対応（「APIキー:ティア名」のカンマ区切り）
+TENANT_API_KEYS = os.getenv("TENANT_API_KEYS", "")
+# APIキーのない呼び出し元（IPで識別）のティア
+TENANT_DEFAULT_TIER = os.getenv("TENANT_DEFAULT_TIER", "default")
+# リバースプロキシ（Vercel等）の背後で動かす場合、X-Forwarded-Forの先頭をクライアントIPとして使う
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "false").lower() == "true"
+
+
+# --------------------------------------------
+# Data Classes
+# --------------------------------------------
+
+@dataclass
+class TenantTier:
+    """利用枠のティア"""
+    name: str
+    max_requests: int
+    window_seconds: int
+    # 混雑時の公平キューでの重み（大きいほど多く処理される）
+    weight: float = 1.0
+
+
+@dataclass
+class Tenant:
+    """呼び出し元"""
+    # 'key:<APIキーのハッシュ>' または 'ip:<クライアントIP>'
+    id: str
+    tier: TenantTier
+
+    @property
+    def weight(self) -> float:
+        return self.tier.weight
+
+
+@dataclass
+class TenantAdmission:
+    """利用枠を予約した呼び出し元"""
+    tenant: Tenant
+    decision: RateLimitDecision
+
+    def headers(self) -> Dict[str, str]:
+        """呼び出し元自身の枠から計算したレスポンスヘッダー"""
+        return _quota_headers(self.tenant.tier, self.decision)
+
+
+def _quota_headers(tier: TenantTier, decision: RateLimitDecision) -> Dict[str, str]:
+    headers = {
+        "X-RateLimit-Limit": str(tier.max_requests),
+        "X-RateLimit-Remaining": str(decision.remaining),
+    }
+    if not decision.allowed:
+        headers["Retry-After"] = str(max(1, math.ceil(decision.retry_after)))
+    return headers
+
+
+# --------------------------------------------
+# Configuration Parsing
+# --------------------------------------------
+
+def parse_tiers(spec: str) -> Dict[str, TenantTier]:
+    """
+    ティア定義を解析
+
+    Args:
+        spec: 「名前:件数/秒数:重み」のカンマ区切り（重みは省略可、例: "default:5/3600,partner:50/3600:4"）
+
+    Returns:
+        Dict[str, TenantTier]: ティア名 → ティア（不正な定義は警告して無視）
+    """
+    tiers: Dict[str, TenantTier] = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            name, rate, *weight = item.split(":")
+            max_requests, window_seconds = (int(value) for value in rate.split("/"))
+            if max_requests < 1 or window_seconds < 1:
+                raise ValueError("limit and window must be positive")
+            tiers[name.strip()] = TenantTier(
+                name=name.strip(),
+                max_requests=max_requests,
+                window_seconds=window_seconds,
+                weight=float(weight[0]) if weight else 1.0,
+            )
+        except ValueError:
+            logger.warning(f"Ignoring invalid tenant tier definition: {item!r}")
+    return tiers
+
+
+def api_key_id(api_key: str) -> str:
+    """APIキーのハッシュ（キーそのものはキー名やログに残さない）"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+def parse_api_keys(spec: str) -> Dict[str, str]:
+    """
+    APIキーとティアの対応を解析
+
+    Returns:
+        Dict[str, str]: APIキーのハッシュ → ティア名
+    """
+    keys: Dict[str, str] = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        api_key, _, tier = item.rpartition(":")
+        if api_key and tier:
+            keys[api_key_id(api_key.strip())] = tier.strip()
+        else:
+            logger.warning("Ignoring invalid TENANT_API_KEYS entry")
+    return keys
+
+
+# --------------------------------------------
+# Tenant Quotas
+# --------------------------------------------
+
+class TenantQuotas:
+    """呼び出し元の識別と、ティアごとのレート制限（状態はRATE_LIMIT_BACKENDで共有）"""
+
+    def __init__(
+        self,
+        tiers: Optional[Dict[str, TenantTier]] = None,
+        api_keys: Optional[Dict[str, str]] = None,
+        default_tier: Optional[str] = None,
+        backend: Optional[RateLimitBackend] = None,
+        trust_proxy_headers: Optional[bool] = None,
+    ):
+        self.tiers = tiers if tiers is not None else parse_tiers(TENANT_TIERS)
+        default_tier = default_tier or TENANT_DEFAULT_TIER
+        if default_tier not in self.tiers:
+            logger.warning(f"Default tenant tier '{default_tier}' is not defined, using 5 requests/hour")
+            self.tiers[default_tier] = TenantTier(default_tier, 5, 3600)
+        self.default_tier = self.tiers[default_tier]
+        self.api_keys = api_keys if api_keys is not None else parse_api_keys(TENANT_API_KEYS)
+        self.trust_proxy_headers = TRUST_PROXY_HEADERS if trust_proxy_headers is None else trust_proxy_headers
+        backend = backend or create_rate_limit_backend()
+        self._limiters = {
+            name: RateLimiter(tier.max_requests, tier.window_seconds, backend=backend, key=f"tenant:{name}")
+            for name, tier in self.tiers.items()
+        }
+        self.counters: Dict[str, int] = {"admitted": 0, "rejected": 0, "released": 0}
+
+    def identify(self, headers: Mapping[str, str], client_host: Optional[str]) -> Tenant:
+        """
+        リクエストの呼び出し元を識別
+
+        Args:
+            headers: リクエストヘッダー
+            client_host: 接続元のIPアドレス
+
+        Returns:
+            Tenant: 呼び出し元
+        """
+        api_key = headers.get("x-api-key")
+        authorization = headers.get("authorization") or ""
+        if not api_key and authorization.lower().startswith("bearer "):
+            api_key = authorization[7:]
+        if api_key:
+            key_id = api_key_id(api_key.strip())
+            tier = self.tiers.get(self.api_keys.get(key_id, ""))
+            if tier is not None:
+                return Tenant(id=f"key:{key_id}", tier=tier)
+
+        host = client_host or "unknown"
+        if self.trust_proxy_headers:
+            forwarded = (headers.get("x-forwarded-for") or "").split(",")[0].strip()
+            host = forwarded or host
+        return Tenant(id=f"ip:{host}", tier=self.default_tier)
+
+    async def admit(self, tenant: Tenant) -> TenantAdmission:
+        """
+        呼び出し元の枠から1件を予約
+
+        Raises:
+            RateLimitExceededError: 呼び出し元の枠を使い切っている場合（Retry-After付き）
+        """
+        decision = await self._limiters[tenant.tier.name].acquire(tenant.id)
+        if not decision.allowed:
+            self.counters["rejected"] += 1
+            retry_after = max(1, math.ceil(decision.retry_after))
+            logger.warning(f"Tenant quota exceeded: tenant={tenant.id}, tier={tenant.tier.name}, retry_after={retry_after}s")
+            raise RateLimitExceededError(
+                message=(
+                    f"リクエスト制限に達しました（{_describe_window(tenant.tier.window_seconds)}あたり"
+                    f"{tenant.tier.max_requests}回まで）。あと{retry_after}秒後に再試行してください。"
+                ),
+                retry_after=retry_after,
+                headers=_quota_headers(tenant.tier, decision),
+            )
+        self.counters["admitted"] += 1
+        return TenantAdmission(tenant=tenant, decision=decision)
+
+    async def release(self, tenant: Tenant) -> None:
+        """予約した1件を返却（審査が失敗した場合は枠を消費しない）"""
+        await self._limiters[tenant.tier.name].release(tenant.id)
+        self.counters["released"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """統計情報"""
+        return {
+            **self.counters,
+            "default_tier": self.default_tier.name,
+            "registered_api_keys": len(self.api_keys),
+            "tiers": {
+                name: {"max_requests": tier.max_requests, "window_seconds": tier.window_seconds, "weight": tier.weight}
+                for name, tier in self.tiers.items()
+            },
+        }
+
+
+def _describe_window(seconds: int) -> str:
+    """制限期間の表記（3600 → '1時間'）"""
+    if seconds % 3600 == 0:
+        return f"{seconds // 3600}時間"
+    if seconds % 60 == 0:
+        return f"{seconds // 60}分"
+    return f"{seconds}秒"
+
+
+# グローバルインスタンス
+_tenant_quotas = TenantQuotas()
+
+
+def get_tenant_quotas() -> TenantQuotas:
+    """グローバルな呼び出し元ごとの利用枠を取得"""
+    return _tenant_quotas
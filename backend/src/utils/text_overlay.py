@@ -0,0 +1,310 @@
+"""
+============================================
+メタ広告審査チェッカー - 画像内テキスト量の推定
+============================================
+
+画像を5×5のグリッド（Metaの旧テキスト20%ルールの判定方式）に分け、
+文字を含むセルの割合からテキスト量（0〜100%）をOCR・通信なしで推定する。
+
+文字の判定は画素の細い明暗構造（ストローク幅の上限以下の線）によるヒューリスティック:
+- 明暗の形態学的トップハット（クロージング − 元画像 / 元画像 − オープニング）で、
+  ストローク幅の上限より細い構造だけを取り出す（ベタ塗り・大きな図形・なだらかな写真は残らない）
+- コントラストの強い細線の密度が一定範囲にあり、かつ弱い細線（写真の質感）に対して
+  十分な割合を占めるセルを「文字あり」とする
+- 見出しなどの太い文字も拾えるよう、縮小率を変えた2段階で判定する
+"""
+
+import io
+import os
+import logging
+from dataclasses import dataclass, field
+from typing import Optional, List, Sequence, Tuple, Dict, Any, Callable
+
+from PIL import Image, ImageChops, ImageOps
+
+from .image import to_grayscale
+from .cpu_pool import get_cpu_pool
+
+logger = logging.getLogger(__name__)
+
+
+# --------------------------------------------
+# Configuration
+# --------------------------------------------
+
+TEXT_OVERLAY_ESTIMATOR_ENABLED = os.getenv("TEXT_OVERLAY_ESTIMATOR_ENABLED", "true").lower() == "true"
+# 文字のない画像をClaude APIに送らない（画像の内容面の審査も省かれるため既定は無効）
+TEXT_OVERLAY_SKIP_CLEAN_IMAGES = os.getenv("TEXT_OVERLAY_SKIP_CLEAN_IMAGES", "false").lower() == "true"
+# AIの推定値とローカル推定値の差がこのポイント数を超えたら不一致として記録
+TEXT_OVERLAY_DISAGREEMENT_POINTS = float(os.getenv("TEXT_OVERLAY_DISAGREEMENT_POINTS", "20"))
+
+# グリッドの分割数（TEXT_OVERLAY_GRID x TEXT_OVERLAY_GRID）
+TEXT_OVERLAY_GRID = 5
+# 判定に使う縮小画像の長辺（細い文字用 / 太い見出し用）
+ANALYSIS_SAMPLES = (400, 160)
+# 文字とみなすストローク幅の上限（縮小画像上で 2 * STROKE_RADIUS + 1 px 未満）
+STROKE_RADIUS = 3
+# 細線とみなす明暗差（強い細線 = 文字候補 / 弱い細線 = 写真の質感を含む）
+STRONG_STROKE_CONTRAST = 48
+WEAK_STROKE_CONTRAST = 24
+# 文字ありとするセル内の強い細線の密度の範囲
+MIN_STROKE_DENSITY = 0.02
+MAX_STROKE_DENSITY = 0.45
+# 文字ありとするセル内の「強い細線 / 弱い細線」の下限（質感の多い写真を除外）
+MIN_STRONG_STROKE_RATIO = 0.25
+
+
+# --------------------------------------------
+# Data Classes
+# --------------------------------------------
+
+@dataclass
+class TextOverlayEstimate:
+    """画像1枚のテキスト量の推定結果"""
+    # 文字を含むセルの割合（0〜100）
+    percentage: float
+    # 文字を含むセル数
+    text_cells: int
+    # セルごとの強い細線の密度（行優先、0.0〜1.0。2段階のうち大きい方）
+    cell_scores: List[float] = field(default_factory=list)
+    grid: int = TEXT_OVERLAY_GRID
+
+    @property
+    def has_text(self) -> bool:
+        return self.text_cells > 0
+
+
+# --------------------------------------------
+# Estimation
+# --------------------------------------------
+
+def _sweep(image: Image.Image, op: Callable, fill: int, horizontal: bool) -> Image.Image:
+    """1方向に半径STROKE_RADIUSの最大値/最小値を取る（ずらした画像同士の画素演算）"""
+    width, height = image.size
+    r = STROKE_RADIUS
+    border = (r, 0, r, 0) if horizontal else (0, r, 0, r)
+    padded = ImageOps.expand(image, border, fill)
+    result = image
+    for offset in range(-r, r + 1):
+        if offset == 0:
+            continue
+        if horizontal:
+            shifted = padded.crop((r + offset, 0, r + offset + width, height))
+        else:
+            shifted = padded.crop((0, r + offset, width, r + offset + height))
+        result = op(result, shifted)
+    return result
+
+
+def _dilate(image: Image.Image) -> Image.Image:
+    return _sweep(_sweep(image, ImageChops.lighter, 0, True), ImageChops.lighter, 0, False)
+
+
+def _erode(image: Image.Image) -> Image.Image:
+    return _sweep(_sweep(image, ImageChops.darker, 255, True), ImageChops.darker, 255, False)
+
+
+def _cell_means(mask: Image.Image, grid: int) -> List[float]:
+    """二値画像のセルごとの平均（0.0〜1.0）"""
+    return [value / 255 for value in mask.resize((grid, grid), Image.Resampling.BOX).getdata()]
+
+
+def _score_cells(gray: Image.Image, sample: int, grid: int) -> Tuple[List[bool], List[float]]:
+    """縮小率1段階分のセルごとの判定（文字ありか, 強い細線の密度）"""
+    long_edge = max(gray.size)
+    if long_edge > sample:
+        ratio = sample / long_edge
+        gray = gray.resize(
+            (max(1, round(gray.width * ratio)), max(1, round(gray.height * ratio))), Image.Resampling.BOX
+        )
+
+    # 暗い細線（白地の黒文字）と明るい細線（写真上の白抜き文字）の両方を取り出す
+    dark_strokes = ImageChops.subtract(_erode(_dilate(gray)), gray)
+    light_strokes = ImageChops.subtract(gray, _dilate(_erode(gray)))
+    strokes = ImageChops.lighter(dark_strokes, light_strokes)
+
+    strong = _cell_means(strokes.point(lambda value: 255 if value >= STRONG_STROKE_CONTRAST else 0), grid)
+    weak = _cell_means(strokes.point(lambda value: 255 if value >= WEAK_STROKE_CONTRAST else 0), grid)
+    flags = [
+        MIN_STROKE_DENSITY <= s <= MAX_STROKE_DENSITY and s >= MIN_STRONG_STROKE_RATIO * w
+        for s, w in zip(strong, weak)
+    ]
+    return flags, strong
+
+
+def estimate_text_overlay_image(image: Image.Image, grid: int = TEXT_OVERLAY_GRID) -> TextOverlayEstimate:
+    """
+    デコード済み画像のテキスト量を推定
+
+    Args:
+        image: デコード済みの画像
+        grid: グリッドの分割数
+
+    Returns:
+        TextOverlayEstimate: 推定結果
+    """
+    gray = to_grayscale(image)
+    flags = [False] * (grid * grid)
+    scores = [0.0] * (grid * grid)
+    for sample in ANALYSIS_SAMPLES:
+        sample_flags, sample_scores = _score_cells(gray, sample, grid)
+        flags = [a or b for a, b in zip(flags, sample_flags)]
+        scores = [max(a, b) for a, b in zip(scores, sample_scores)]
+
+    text_cells = sum(flags)
+    return TextOverlayEstimate(
+        percentage=round(text_cells * 100 / (grid * grid), 1),
+        text_cells=text_cells,
+        cell_scores=[round(score, 3) for score in scores],
+        grid=grid,
+    )
+
+
+def estimate_text_overlay(image_data: bytes) -> Optional[TextOverlayEstimate]:
+    """
+    画像バイナリのテキスト量を推定（JPEGは縮小デコード）
+
+    Args:
+        image_data: 画像のバイナリデータ
+
+    Returns:
+        Optional[TextOverlayEstimate]: 推定結果（画像として読めない場合はNone）
+    """
+    try:
+        image = Image.open(io.BytesIO(image_data))
+        if image.format == "JPEG":
+            image.draft('L', (ANALYSIS_SAMPLES[0], ANALYSIS_SAMPLES[0]))
+        return estimate_text_overlay_image(image)
+    except Exception as e:
+        logger.warning(f"Text overlay estimation failed: {str(e)}")
+        return None
+
+
+def estimate_text_overlays(images: Sequence[bytes]) -> List[Optional[TextOverlayEstimate]]:
+    """複数画像のテキスト量を推定（CPUプールで実行）"""
+    return [estimate_text_overlay(data) for data in images]
+
+
+# --------------------------------------------
+# Estimator
+# --------------------------------------------
+
+class TextOverlayEstimator:
+    """LP画像のテキスト量の事前推定と、AIの推定値との突き合わせ"""
+
+    def __init__(
+        self,
+        enabled: bool = TEXT_OVERLAY_ESTIMATOR_ENABLED,
+        skip_clean_images: bool = TEXT_OVERLAY_SKIP_CLEAN_IMAGES,
+        disagreement_points: float = TEXT_OVERLAY_DISAGREEMENT_POINTS,
+    ):
+        self.enabled = enabled
+        self.skip_clean_images = skip_clean_images
+        self.disagreement_points = disagreement_points
+        self.counters = {
+            "images": 0,
+            "text_images": 0,
+            "clean_images": 0,
+            "skipped_images": 0,
+            "cross_checks": 0,
+            "disagreements": 0,
+            "filled_from_local": 0,
+        }
+
+    async def score(self, images: Sequence[bytes]) -> List[Optional[TextOverlayEstimate]]:
+        """
+        画像ごとのテキスト量を推定
+
+        Args:
+            images: 画像バイナリのリスト
+
+        Returns:
+            List[Optional[TextOverlayEstimate]]: 画像ごとの推定結果（入力と同じ順、無効時・推定失敗時はNone）
+        """
+        if not self.enabled or not images:
+            return [None] * len(images)
+        estimates = await get_cpu_pool().run(
+            estimate_text_overlays, list(images),
+            size=sum(len(data) for data in images), label="text_overlay",
+        )
+
+        self.counters["images"] += len(estimates)
+        self.counters["text_images"] += sum(1 for e in estimates if e is not None and e.has_text)
+        self.counters["clean_images"] += sum(1 for e in estimates if e is not None and not e.has_text)
+        logger.info(
+            "Local text overlay estimates: "
+            + ", ".join(f"{e.percentage:.0f}%" if e is not None else "-" for e in estimates)
+        )
+        return estimates
+
+    def select_images(self, images: list, estimates: List[Optional[TextOverlayEstimate]]) -> list:
+        """
+        Claude APIに送る画像を選ぶ（TEXT_OVERLAY_SKIP_CLEAN_IMAGESの場合、文字のない画像を除く）
+
+        Args:
+            images: 画像のリスト
+            estimates: 画像ごとの推定結果（imagesと同じ順）
+
+        Returns:
+            list: 送信する画像（元の順）
+        """
+        if not self.skip_clean_images:
+            return list(images)
+        selected = [
+            image for image, estimate in zip(images, estimates)
+            if estimate is None or estimate.has_text
+        ]
+        skipped = len(images) - len(selected)
+        if skipped:
+            self.counters["skipped_images"] += skipped
+            logger.info(f"Skipped {skipped} image(s) without text overlay")
+        return selected
+
+    def cross_check(
+        self,
+        ai_percentage: Optional[float],
+        estimates: List[Optional[TextOverlayEstimate]],
+    ) -> Optional[float]:
+        """
+        AIのテキスト量とローカル推定値（最もテキストの多い画像）を突き合わせる
+
+        Args:
+            ai_percentage: AIが返したテキスト量（0〜100、ない場合はNone）
+            estimates: 画像ごとのローカル推定結果
+
+        Returns:
+            Optional[float]: 採用するテキスト量（AIの値を優先し、ない場合はローカル推定値）
+        """
+        local = [e.percentage for e in estimates if e is not None]
+        if not local:
+            return ai_percentage
+        local_max = max(local)
+        if not isinstance(ai_percentage, (int, float)):
+            self.counters["filled_from_local"] += 1
+            return local_max
+
+        self.counters["cross_checks"] += 1
+        if abs(ai_percentage - local_max) > self.disagreement_points:
+            self.counters["disagreements"] += 1
+            logger.warning(
+                f"Text overlay disagreement: AI={ai_percentage:.0f}%, local={local_max:.0f}% "
+                f"(threshold {self.disagreement_points:.0f} points)"
+            )
+        return ai_percentage
+
+    def stats(self) -> Dict[str, Any]:
+        """推定器の統計情報"""
+        return {
+            **self.counters,
+            "enabled": self.enabled,
+            "skip_clean_images": self.skip_clean_images,
+        }
+
+
+# グローバル推定器
+_text_overlay_estimator = TextOverlayEstimator()
+
+
+def get_text_overlay_estimator() -> TextOverlayEstimator:
+    """グローバル画像テキスト量推定器を取得"""
+    return _text_overlay_estimator
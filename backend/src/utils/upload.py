@@ -0,0 +1,377 @@
+"""
+============================================
+メタ広告審査チェッカー - マルチパートアップロードのストリーミング受信
+============================================
+
+multipart/form-dataのリクエスト本文を受信しながら解析する（python-multipart）
+- 画像パートは閾値まではメモリ、超えたらディスクの一時ファイルに退避
+- 先頭チャンクのマジックバイトで形式（JPEG/PNG/WebP/PDF）を確認し、非対応なら受信を打ち切る
+- 20MBの上限を超えた時点で受信を打ち切る（Content-Lengthで分かる場合は本文を読む前に拒否）
+- ファイル未選択のファイル入力（filenameが空・0バイトのパート）は画像なしとして扱う
+"""
+
+import os
+import asyncio
+import logging
+import tempfile
+from dataclasses import dataclass, field
+from typing import Optional, Dict, List, Tuple, Union, AsyncIterator
+
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from .errors import ValidationError, FileSizeExceededError, UnsupportedMediaTypeError
+from .image import (
+    MAX_FILE_SIZE_BYTES,
+    MAX_FILE_SIZE_MB,
+    IMAGE_SNIFF_BYTES,
+    SUPPORTED_MIME_TYPES,
+    detect_image_media_type,
+    is_pdf_file,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# --------------------------------------------
+# Configuration
+# --------------------------------------------
+
+# アップロード画像をメモリに保持する上限（超えたらディスクに退避）
+UPLOAD_SPOOL_THRESHOLD = int(os.getenv("UPLOAD_SPOOL_THRESHOLD", str(1024 * 1024)))
+UPLOAD_SPOOL_DIR = os.getenv(
+    "UPLOAD_SPOOL_DIR",
+    os.path.join(tempfile.gettempdir(), "meta-ad-checker", "uploads"),
+)
+# テキスト項目（見出し・説明文・CTA）1つあたりの最大バイト数
+UPLOAD_MAX_FIELD_BYTES = 64 * 1024
+# マルチパートの境界・ヘッダー・テキスト項目の分としてContent-Lengthに許容する上乗せ分
+MULTIPART_OVERHEAD_BYTES = 256 * 1024
+
+
+# --------------------------------------------
+# Spooled Upload
+# --------------------------------------------
+
+class SpooledUpload:
+    """閾値まではメモリ、超えたらディスクの一時ファイルに書き込むアップロードデータ"""
+
+    def __init__(self, threshold: Optional[int] = None, directory: Optional[str] = None):
+        self.threshold = UPLOAD_SPOOL_THRESHOLD if threshold is None else threshold
+        self.directory = directory or UPLOAD_SPOOL_DIR
+        self.size = 0
+        self.path: Optional[str] = None
+        self._buffer = bytearray()
+        self._head = bytearray()
+        self._file = None
+
+    @property
+    def on_disk(self) -> bool:
+        return self.path is not None
+
+    @property
+    def source(self) -> Union[bytes, str]:
+        """受信済みデータ（メモリ上ならバイト列、ディスクに退避した場合はファイルパス）"""
+        return self.path if self.path is not None else bytes(self._buffer)
+
+    def head(self) -> bytes:
+        """先頭IMAGE_SNIFF_BYTESバイト（マジックバイト判定用、ディスクに退避してもメモリに残す）"""
+        return bytes(self._head)
+
+    async def write(self, data: bytes) -> None:
+        if len(self._head) < IMAGE_SNIFF_BYTES:
+            self._head.extend(data[:IMAGE_SNIFF_BYTES - len(self._head)])
+        self.size += len(data)
+        if self._file is None and self.size <= self.threshold:
+            self._buffer.extend(data)
+            return
+        if self._file is None:
+            # 閾値を超えたらディスクに退避（ファイル書き込みはイベントループの外で行う）
+            os.makedirs(self.directory, exist_ok=True)
+            self._file = tempfile.NamedTemporaryFile(dir=self.directory, suffix=".upload", delete=False)
+            self.path = self._file.name
+            buffered, self._buffer = self._buffer, bytearray()
+            await asyncio.to_thread(self._file.write, bytes(buffered))
+            logger.info(f"Upload spooled to disk after {len(buffered)/1024:.0f}KB: {self.path}")
+        await asyncio.to_thread(self._file.write, data)
+
+    async def finish(self) -> None:
+        """書き込みを完了（ディスクに退避した場合はファイルを閉じる）"""
+        if self._file is not None:
+            await asyncio.to_thread(self._file.close)
+
+    def close(self) -> None:
+        """一時ファイルを削除"""
+        if self._file is not None:
+            self._file.close()
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+        self._buffer = bytearray()
+
+
+# --------------------------------------------
+# Data Classes
+# --------------------------------------------
+
+@dataclass
+class UploadedFile:
+    """受信したファイルパート"""
+    field_name: str
+    filename: Optional[str]
+    content_type: Optional[str]
+    # マジックバイトから判定した形式（"JPEG", "PNG", "WEBP", "PDF"）
+    format: str
+    spool: SpooledUpload
+
+    @property
+    def size(self) -> int:
+        return self.spool.size
+
+
+@dataclass
+class CreativeUpload:
+    """クリエイティブ審査のアップロード内容"""
+    fields: Dict[str, str] = field(default_factory=dict)
+    file: Optional[UploadedFile] = None
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.spool.close()
+
+
+def sniff_upload_format(head: bytes) -> Optional[str]:
+    """
+    先頭のマジックバイトから対応形式を判定
+
+    Args:
+        head: データの先頭（IMAGE_SNIFF_BYTESバイト以上）
+
+    Returns:
+        Optional[str]: "JPEG", "PNG", "WEBP", "PDF"（非対応・判定不能の場合はNone）
+    """
+    if is_pdf_file(head):
+        return "PDF"
+    return SUPPORTED_MIME_TYPES.get(detect_image_media_type(head) or "")
+
+
+# --------------------------------------------
+# Multipart Parsing
+# --------------------------------------------
+
+class _CreativePartHandler:
+    """python-multipartのコールバックを受けて、パートごとにテキスト項目・ファイルへ振り分ける"""
+
+    def __init__(self, file_field: str, max_size: int):
+        self.file_field = file_field
+        self.max_size = max_size
+        self.upload = CreativeUpload()
+        # (書き込み先, データ) の受信済みで未書き込みの分（書き込みは非同期のためチャンクごとにまとめて行う）
+        self.pending: List[Tuple[SpooledUpload, bytes]] = []
+        self._header_name = b""
+        self._header_value = b""
+        self._headers: Dict[bytes, bytes] = {}
+        self._field_name: Optional[str] = None
+        self._field_data = bytearray()
+        # 受信中のパートの書き込み先（テキスト項目の場合はNone）と、画像ファイルの書き込み先
+        self._spool: Optional[SpooledUpload] = None
+        self._file_spool: Optional[SpooledUpload] = None
+        self._file_info: Optional[Tuple[Optional[str], Optional[str]]] = None
+        # ファイル未選択のファイルパート（読み捨てる）
+        self._discard = False
+        self._received = 0
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+    def on_part_begin(self) -> None:
+        self._headers = {}
+        self._field_name = None
+        self._field_data = bytearray()
+        self._spool = None
+        self._discard = False
+        self._received = 0
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._headers[self._header_name.lower()] = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if b"name" not in options:
+            raise ValidationError(
+                message="アップロードの形式が正しくありません。",
+                details={"error": "Content-Disposition name is missing"}
+            )
+        self._field_name = options[b"name"].decode("utf-8", errors="replace")
+        if options.get(b"filename") == b"":
+            # ファイルを選択していないファイル入力（ブラウザは空のfilenameで送る）
+            self._discard = True
+        elif b"filename" in options:
+            if self._field_name != self.file_field or self._file_spool is not None:
+                raise ValidationError(
+                    message=f"画像ファイルは「{self.file_field}」項目で1つだけ送信してください。",
+                    details={"field": self._field_name}
+                )
+            self._spool = self._file_spool = SpooledUpload()
+            self._file_info = (
+                options[b"filename"].decode("utf-8", errors="replace"),
+                self._headers.get(b"content-type", b"").decode("latin-1") or None,
+            )
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._discard:
+            return
+        chunk = data[start:end]
+        if self._spool is None:
+            if len(self._field_data) + len(chunk) > UPLOAD_MAX_FIELD_BYTES:
+                raise ValidationError(
+                    message=f"「{self._field_name}」の入力が長すぎます。",
+                    details={"field": self._field_name, "max_bytes": UPLOAD_MAX_FIELD_BYTES}
+                )
+            self._field_data.extend(chunk)
+            return
+
+        # サイズチェック（受信中）
+        self._received += len(chunk)
+        if self._received > self.max_size:
+            raise FileSizeExceededError(
+                message=f"ファイルサイズが{MAX_FILE_SIZE_MB}MBを超えています。画像を圧縮してください。",
+                details={"max_size_mb": MAX_FILE_SIZE_MB}
+            )
+        self.pending.append((self._spool, bytes(chunk)))
+
+    def on_part_end(self) -> None:
+        if self._spool is None and not self._discard:
+            self.upload.fields[self._field_name] = self._field_data.decode("utf-8", errors="replace")
+
+    async def flush(self) -> None:
+        """受信済みのファイルデータを書き込み、先頭が揃った時点で形式を確認"""
+        for spool, data in self.pending:
+            await spool.write(data)
+        self.pending.clear()
+        spool = self._file_spool
+        if spool is not None and self.upload.file is None and spool.size >= IMAGE_SNIFF_BYTES:
+            self._attach(spool)
+
+    def _attach(self, spool: SpooledUpload) -> None:
+        """マジックバイトで形式を確認し、ファイルパートとして登録"""
+        image_format = sniff_upload_format(spool.head())
+        filename, content_type = self._file_info
+        if image_format is None:
+            raise UnsupportedMediaTypeError(
+                message="対応していない画像形式です。JPEG、PNG、WebP、PDFのいずれかを使用してください。",
+                details={"filename": filename, "content_type": content_type}
+            )
+        self.upload.file = UploadedFile(
+            field_name=self.file_field,
+            filename=filename,
+            content_type=content_type,
+            format=image_format,
+            spool=spool,
+        )
+
+    async def finish(self) -> None:
+        await self.flush()
+        spool = self._file_spool
+        if spool is None:
+            return
+        if spool.size == 0:
+            # 0バイトのファイルパートは画像なしとして扱う
+            spool.close()
+            self._file_spool = None
+            return
+        if self.upload.file is None:
+            # IMAGE_SNIFF_BYTES未満の小さなファイル
+            self._attach(spool)
+        await spool.finish()
+
+    def close(self) -> None:
+        """受信途中のファイルも含めて一時ファイルを削除"""
+        if self._file_spool is not None:
+            self._file_spool.close()
+
+
+async def parse_creative_upload(
+    content_type: str,
+    content_length: Optional[str],
+    stream: AsyncIterator[bytes],
+    file_field: str = "image",
+    max_size: int = MAX_FILE_SIZE_BYTES,
+) -> CreativeUpload:
+    """
+    multipart/form-dataの本文を受信しながら解析
+
+    Args:
+        content_type: Content-Typeヘッダー（boundaryを含む）
+        content_length: Content-Lengthヘッダー（ない場合はNone）
+        stream: リクエスト本文のチャンク（request.stream()）
+        file_field: 画像ファイルの項目名
+        max_size: 画像ファイルの最大サイズ（バイト）
+
+    Returns:
+        CreativeUpload: テキスト項目と画像ファイル（使い終わったらclose()で一時ファイルを削除）
+
+    Raises:
+        ValidationError: マルチパートの形式不正
+        FileSizeExceededError: サイズ超過
+        UnsupportedMediaTypeError: 非対応形式
+    """
+    mime_type, options = parse_options_header(content_type or "")
+    if mime_type != b"multipart/form-data" or b"boundary" not in options:
+        raise ValidationError(
+            message="multipart/form-data形式で送信してください。",
+            details={"content_type": content_type}
+        )
+
+    # サイズチェック（ヘッダー時点）
+    if content_length and content_length.isdigit() and int(content_length) > max_size + MULTIPART_OVERHEAD_BYTES:
+        size_mb = int(content_length) / (1024 * 1024)
+        raise FileSizeExceededError(
+            message=f"ファイルサイズが{MAX_FILE_SIZE_MB}MBを超えています（{size_mb:.2f}MB）。画像を圧縮してください。",
+            details={"current_size_mb": round(size_mb, 2), "max_size_mb": MAX_FILE_SIZE_MB}
+        )
+
+    handler = _CreativePartHandler(file_field, max_size)
+    parser = MultipartParser(options[b"boundary"], handler.callbacks())
+    try:
+        async for chunk in stream:
+            parser.write(chunk)
+            await handler.flush()
+        parser.finalize()
+        await handler.finish()
+    except MultipartParseError as e:
+        handler.close()
+        logger.warning(f"Multipart parse error: {str(e)}")
+        raise ValidationError(
+            message="アップロードの形式が正しくありません。",
+            details={"error": str(e)}
+        )
+    except BaseException:
+        handler.close()
+        raise
+
+    if handler.upload.file is not None:
+        file = handler.upload.file
+        logger.info(
+            f"Upload received: {file.filename} ({file.format}, {file.size/1024:.0f}KB"
+            f"{', spooled to disk' if file.spool.on_disk else ''})"
+        )
+    return handler.upload
@@ -6,20 +6,76 @@
 URLからOGP情報、ページテキスト、画像を取得
 """
 
+import os
+import time
+import codecs
+import asyncio
 import logging
 import httpx
-import re
-import json
-from typing import Optional, Tuple, List
-from bs4 import BeautifulSoup
-from dataclasses import dataclass
-from urllib.parse import urljoin, urlparse
+from contextlib import asynccontextmanager
+from typing import Optional, Tuple, List, Dict, AsyncIterator, Callable
+from dataclasses import dataclass, replace
+from urllib.parse import urlparse
 
 from .errors import ValidationError
-from .image import optimize_image_for_ai
+from .image import (
+    optimize_image,
+    detect_image_media_type,
+    OptimizedImage,
+    IMAGE_SNIFF_BYTES,
+    AI_IMAGE_MAX_DIMENSION,
+    OPTIMIZER_VERSION,
+)
+from .image_store import get_image_store, sha256_hex, UrlRecord
+from .http_clients import PAGE_USER_AGENT
+from .page_cache import get_page_cache, canonicalize_url, compute_cache_policy
+from .cpu_pool import get_cpu_pool
+from .image_probe import (
+    rank_image_candidates,
+    parse_image_header,
+    ImageHeader,
+    ProbeResult,
+    IMAGE_PROBE_ENABLED,
+    IMAGE_PROBE_BYTES,
+)
+from .cdn_rewrite import get_cdn_rewrite_layer
+from .image_hash import dhash_bytes, find_near_duplicate
+from .html_extractor import (
+    extract_page,
+    extract_head_metadata,
+    ExtractedPage,
+)
 
 logger = logging.getLogger(__name__)
 
+
+# --------------------------------------------
+# Configuration
+# --------------------------------------------
+
+# AIに送る画像の最大枚数（OGP画像を含む）
+MAX_PAGE_IMAGES = 3
+# LP内から抽出する画像候補の最大数（サイズ制限等で失敗する分を見込んで多めに取得）
+MAX_IMAGE_CANDIDATES = 10
+# ヘッダープローブで順位付けした主要画像候補のうち、全体をダウンロードする件数
+IMAGE_PROBE_TOP_N = int(os.getenv("IMAGE_PROBE_TOP_N", "4"))
+# 画像候補の同時ダウンロード数
+IMAGE_FETCH_CONCURRENCY = int(os.getenv("IMAGE_FETCH_CONCURRENCY", "4"))
+# LPのHTMLの最大ダウンロードサイズ（超過分は読み込まずに打ち切り）
+PAGE_MAX_BYTES = int(os.getenv("PAGE_MAX_BYTES", str(5 * 1024 * 1024)))
+# </head>を探す際に、チャンク境界を跨ぐ分として前のチャンク末尾から含める文字数
+HEAD_END_LOOKBACK = len('</head')
+# この文字数を読んでも</head>が見つからなければ、先行抽出をあきらめる
+HEAD_SCAN_LIMIT = 512 * 1024
+# 画像1枚あたりの最大ダウンロードサイズ
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+# Content-Typeが汎用バイナリの場合はマジックバイトで判定する
+GENERIC_BINARY_CONTENT_TYPES = {'', 'application/octet-stream', 'binary/octet-stream'}
+
+# バックグラウンド再検証タスクの参照保持（GC対策）
+_background_tasks: set = set()
+
+
 # --------------------------------------------
 # Data Classes
 # --------------------------------------------
@@ -30,6 +86,32 @@ class PageImage:
     url: str
     data: bytes
     source: str  # 'ogp', 'hero', 'main'
+    media_type: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    # Claude APIに送るBase64表現（画像ストアに保存済みの場合）
+    b64: Optional[str] = None
+
+@dataclass
+class ImageFetchReport:
+    """画像候補ごとの取得結果（計測・診断用）"""
+    url: str
+    source: str
+    accepted: bool
+    # 不採用理由: 'duplicate', 'near_duplicate'（知覚ハッシュがほぼ同一の画像を採用済み）, 'http_error', 'too_large', 'not_image', 'fetch_error',
+    #             'surplus'（目標枚数到達後に完了）, 'cancelled'（取得中に打ち切り）, 'skipped'（未着手）,
+    #             'ranked_out'（ヘッダープローブの順位が上位外のためダウンロードせず）
+    reason: Optional[str] = None
+    elapsed_ms: Optional[float] = None
+    size: Optional[int] = None
+    # 画像ストアの利用状況: 'fresh'（通信なし）, 'revalidated'（304）, 'content'（同一内容の最適化結果を再利用）
+    store_hit: Optional[str] = None
+    # CDNのリサイズURLで取得した場合のCDN名と、元画像と比べて削減できたバイト数（元のサイズが分かる場合）
+    cdn: Optional[str] = None
+    bytes_saved: Optional[int] = None
+    # 知覚ハッシュ（dHash）と、'near_duplicate' の場合に代わりに採用した画像のURL
+    dhash: Optional[str] = None
+    duplicate_of: Optional[str] = None
 
 @dataclass
 class PageData:
@@ -42,6 +124,15 @@ class PageData:
     page_text: Optional[str] = None
     # 主要画像リスト（OGP画像を含む）
     images: Optional[List[PageImage]] = None
+    # 画像候補ごとの取得結果
+    image_reports: Optional[List[ImageFetchReport]] = None
+    # LP内の主要画像URL候補（優先順、OGP画像は含まない）
+    image_candidates: Optional[List[str]] = None
+    # LPキャッシュの利用状況: 'miss', 'hit', 'stale', 'revalidated'
+    cache_status: Optional[str] = None
+    # 解析したHTMLのバイト数と、PAGE_MAX_BYTESで打ち切ったかどうか
+    html_bytes: Optional[int] = None
+    truncated: bool = False
 
 
 # --------------------------------------------
@@ -90,13 +181,36 @@ def validate_url(url: str) -> str:
 # Page Fetching
 # --------------------------------------------
 
-async def fetch_page_data(url: str, timeout: float = 15.0) -> PageData:
+@asynccontextmanager
+async def _page_client(client: Optional[httpx.AsyncClient], timeout: float) -> AsyncIterator[httpx.AsyncClient]:
+    """共有クライアントがあればそれを使い、なければリクエスト単位のクライアントを作成"""
+    if client is not None:
+        yield client
+        return
+
+    async with httpx.AsyncClient(
+        timeout=timeout,
+        follow_redirects=True,
+        verify=False,
+        headers={
+            'User-Agent': PAGE_USER_AGENT
+        }
+    ) as owned_client:
+        yield owned_client
+
+
+async def fetch_page_data(
+    url: str,
+    timeout: float = 15.0,
+    client: Optional[httpx.AsyncClient] = None,
+) -> PageData:
     """
     URLからページデータを取得
 
     Args:
         url: 取得するURL
-        timeout: タイムアウト秒数
+        timeout: タイムアウト秒数（clientを渡さない場合のみ使用）
+        client: 共有HTTPクライアント（未指定の場合はリクエスト単位で作成）
 
     Returns:
         PageData: 取得したページデータ
@@ -109,58 +223,54 @@ async def fetch_page_data(url: str, timeout: float = 15.0) -> PageData:
     logger.info(f"Fetching page data from: {url}")
 
     try:
-        async with httpx.AsyncClient(
-            timeout=timeout,
-            follow_redirects=True,
-            verify=False,
-            headers={
-                'User-Agent': 'Mozilla/5.0 (compatible; MetaAdChecker/1.0)'
-            }
-        ) as client:
-            # ページHTMLを取得
-            response = await client.get(url)
-            response.raise_for_status()
+        # 共有クライアントの場合のみ、レスポンス返却後のバックグラウンド再検証が可能
+        background_revalidation = client is not None
 
-            html = response.text
-            soup = BeautifulSoup(html, 'lxml')
-
-            # OGPとメタデータを抽出
-            page_data = _extract_metadata(soup, url)
-
-            # ページテキストを抽出
-            page_data.page_text = _extract_page_text(soup)
-
-            # 画像リストを初期化
-            page_data.images = []
-
-            # OGP画像を取得
-            if page_data.og_image_url:
-                page_data.og_image_data = await _fetch_image(client, page_data.og_image_url)
-                if page_data.og_image_data:
-                    page_data.images.append(PageImage(
-                        url=page_data.og_image_url,
-                        data=page_data.og_image_data,
-                        source='ogp'
-                    ))
-
-            # LP内の主要画像を取得（最大2枚追加）
-            # htmlを渡してVue.js等のJSON埋め込み画像も抽出
-            # サイズ制限で失敗する画像があるため、多めに候補を取得
-            main_image_urls = _extract_main_images(soup, url, max_images=10, html=html)
-            for img_url in main_image_urls:
-                # OGP画像と重複しない場合のみ取得
-                if img_url != page_data.og_image_url:
-                    img_data = await _fetch_image(client, img_url)
-                    if img_data:
-                        page_data.images.append(PageImage(
-                            url=img_url,
-                            data=img_data,
-                            source='main'
-                        ))
-                        if len(page_data.images) >= 3:  # 合計3枚まで
-                            break
-
-            logger.info(f"Page data fetched successfully: title={page_data.title}, images={len(page_data.images)}")
+        async with _page_client(client, timeout) as client:
+            # </head>の受信時点でOGP画像の取得を開始（本文のダウンロードと並行）
+            prefetched: Dict[str, PrefetchedImage] = {}
+
+            def on_head(head: ExtractedPage) -> None:
+                if head.og_image_url and head.og_image_url not in prefetched:
+                    prefetched[head.og_image_url] = _prefetch_image(client, head.og_image_url)
+
+            try:
+                # ページHTMLを取得・解析（キャッシュがあれば再利用）
+                page_data = await _load_page(client, url, background_revalidation, on_head=on_head)
+
+                # 主要画像候補をヘッダーだけ取得して順位付けし、上位のみを全体ダウンロードの対象にする
+                main_urls, ranked_out, original_sizes = await _rank_main_candidates(
+                    client, page_data.image_candidates or []
+                )
+
+                # 画像候補を優先順に並べる（OGP画像 → 順位付けした主要画像）
+                candidates: List[Tuple[str, str]] = []
+                if page_data.og_image_url:
+                    candidates.append((page_data.og_image_url, 'ogp'))
+                candidates.extend((img_url, 'main') for img_url in main_urls)
+
+                # 画像を並列取得（目標枚数に達した時点で残りを打ち切り）
+                page_data.images, page_data.image_reports = await _acquire_images(
+                    client, candidates, target_count=MAX_PAGE_IMAGES, prefetched=prefetched,
+                    original_sizes=original_sizes,
+                )
+                page_data.image_reports.extend(ranked_out)
+            finally:
+                # 使われなかった先行取得（全文解析でOGP画像URLが変わった場合等）を破棄
+                leftovers = [task for task, _ in prefetched.values() if not task.done()]
+                for task in leftovers:
+                    task.cancel()
+                await asyncio.gather(*leftovers, return_exceptions=True)
+
+            for image in page_data.images:
+                if image.source == 'ogp':
+                    page_data.og_image_data = image.data
+
+            logger.info(
+                f"Page data fetched successfully: title={page_data.title}, "
+                f"images={len(page_data.images)}, cache={page_data.cache_status}, "
+                f"html={page_data.html_bytes} bytes{' (truncated)' if page_data.truncated else ''}"
+            )
 
             return page_data
 
@@ -182,336 +292,662 @@ async def fetch_page_data(url: str, timeout: float = 15.0) -> PageData:
         )
 
 
-# --------------------------------------------
-# Metadata Extraction
-# --------------------------------------------
-
-def _extract_metadata(soup: BeautifulSoup, base_url: str) -> PageData:
+async def _load_page(
+    client: httpx.AsyncClient,
+    url: str,
+    background_revalidation: bool,
+    on_head: Optional[Callable[[ExtractedPage], None]] = None,
+) -> PageData:
     """
-    HTMLからメタデータを抽出
+    LPのHTMLを取得して解析（HTTPキャッシュセマンティクスに従いキャッシュを利用）
+
+    - 鮮度内: ネットワークアクセスなしでキャッシュを返却
+    - 期限切れ（stale-while-revalidateモードの猶予期間内）: キャッシュを返却し裏で再検証
+    - 期限切れ（バリデーターあり）: 条件付きGETで再検証し、304ならキャッシュを再利用
 
     Args:
-        soup: BeautifulSoupオブジェクト
-        base_url: ベースURL（相対パス解決用）
+        client: HTTPクライアント
+        url: 取得するURL
+        background_revalidation: バックグラウンド再検証を許可するか
+        on_head: ダウンロード中に</head>を受信した時点で、headのメタデータを渡すコールバック
 
     Returns:
-        PageData: 抽出したメタデータ
+        PageData: 抽出済みのページデータ（画像本体は未取得）
     """
-    page_data = PageData(url=base_url)
+    cache = get_page_cache()
+    key = canonicalize_url(url)
+    entry = cache.get(key)
+    now = time.time()
+
+    if entry is not None:
+        if entry.is_fresh(now):
+            cache.record("hits")
+            return _copy_cached_page_data(entry.page_data, url, 'hit')
+
+        if (
+            cache.stale_while_revalidate
+            and background_revalidation
+            and entry.has_validators()
+            and entry.is_usable_stale(now)
+        ):
+            cache.record("stale_hits")
+            if cache.begin_revalidation(key):
+                task = asyncio.create_task(_revalidate_page(client, url, key))
+                _background_tasks.add(task)
+                task.add_done_callback(_background_tasks.discard)
+            return _copy_cached_page_data(entry.page_data, url, 'stale')
+
+    headers = entry.conditional_headers() if entry is not None else {}
+    async with client.stream('GET', url, headers=headers) as response:
+        if response.status_code == 304 and entry is not None:
+            cache.refresh(key, compute_cache_policy(response.headers))
+            cache.record("revalidated")
+            return _copy_cached_page_data(entry.page_data, url, 'revalidated')
 
-    # タイトル取得（優先順位: og:title > title tag）
-    og_title = soup.find('meta', property='og:title')
-    if og_title and og_title.get('content'):
-        page_data.title = og_title['content']
-    else:
-        title_tag = soup.find('title')
-        if title_tag:
-            page_data.title = title_tag.get_text(strip=True)
-
-    # 説明文取得（優先順位: og:description > meta description）
-    og_desc = soup.find('meta', property='og:description')
-    if og_desc and og_desc.get('content'):
-        page_data.description = og_desc['content']
-    else:
-        meta_desc = soup.find('meta', attrs={'name': 'description'})
-        if meta_desc and meta_desc.get('content'):
-            page_data.description = meta_desc['content']
+        response.raise_for_status()
+        cache.record("misses")
 
-    # OGP画像URL取得
-    og_image = soup.find('meta', property='og:image')
-    if og_image and og_image.get('content'):
-        image_url = og_image['content']
-        # 相対パスの場合は絶対パスに変換
-        page_data.og_image_url = urljoin(base_url, image_url)
+        html, html_bytes, truncated = await _read_html(response, url, on_head)
 
+    page_data = await get_cpu_pool().run(_extract_page, html, url, size=len(html), label="html_extract")
+    page_data.html_bytes = html_bytes
+    page_data.truncated = truncated
+    cache.put(key, url, _copy_cached_page_data(page_data, url, None), compute_cache_policy(response.headers))
+    page_data.cache_status = 'miss'
     return page_data
 
 
-def _extract_images_from_json_data(html: str, base_url: str) -> List[str]:
+async def _read_html(
+    response: httpx.Response,
+    url: str,
+    on_head: Optional[Callable[[ExtractedPage], None]] = None,
+    max_bytes: Optional[int] = None,
+) -> Tuple[str, int, bool]:
     """
-    Vue.js/React等のJSON埋め込みデータから画像URLを抽出
+    HTMLをストリーミングで読み込み（max_bytesで打ち切り）
+
+    </head>（または<body>）を受信した時点でheadのメタデータを抽出してon_headに渡す。
 
     Args:
-        html: 生のHTML文字列
-        base_url: ベースURL（相対パス解決用）
+        response: ストリーミング中のレスポンス
+        url: ページURL（相対パス解決用）
+        on_head: headのメタデータを受け取るコールバック
+        max_bytes: 読み込む最大バイト数（未指定の場合はPAGE_MAX_BYTES）
 
     Returns:
-        List[str]: 画像URLのリスト
+        Tuple[str, int, bool]: (HTML文字列, 読み込んだバイト数, 打ち切ったか)
     """
-    image_urls = []
-
-    # v-bind:data='...' や data='...' 内のJSONを探す
-    # UTAGE等のSPA/Vue.jsサイトで使用されるパターン
-    json_patterns = [
-        r'v-bind:data=\'([^\']+)\'',
-        r':data=\'([^\']+)\'',
-        r'data-elements=\'([^\']+)\'',
-    ]
+    max_bytes = PAGE_MAX_BYTES if max_bytes is None else max_bytes
+    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+    parts: List[str] = []
+    received = 0
+    truncated = False
+    # </head>未検出の間、検索済みの文字数
+    head_scanned = 0 if on_head is not None else None
+
+    async for chunk in response.aiter_bytes():
+        if received + len(chunk) > max_bytes:
+            chunk = chunk[:max_bytes - received]
+            truncated = True
+        received += len(chunk)
+        parts.append(decoder.decode(chunk))
+
+        if head_scanned is not None:
+            text = ''.join(parts)
+            parts = [text]
+            head_end = _find_head_end(text, max(0, head_scanned - HEAD_END_LOOKBACK))
+            if head_end is not None:
+                head_scanned = None
+                on_head(extract_head_metadata(text[:head_end], url))
+            elif len(text) > HEAD_SCAN_LIMIT:
+                head_scanned = None
+            else:
+                head_scanned = len(text)
+
+        if truncated:
+            break
+
+    parts.append(decoder.decode(b'', final=True))
+    html = ''.join(parts)
+    if truncated:
+        logger.warning(f"Page HTML truncated at {max_bytes} bytes: {url}")
+    return html, received, truncated
+
+
+def _find_head_end(text: str, start: int) -> Optional[int]:
+    """</head>または<body の位置（見つからなければNone）"""
+    lowered = text[start:].lower()
+    positions = [position for position in (lowered.find('</head'), lowered.find('<body')) if position >= 0]
+    return start + min(positions) if positions else None
+
+
+async def _revalidate_page(client: httpx.AsyncClient, url: str, key: str) -> None:
+    """期限切れエントリをバックグラウンドで再検証"""
+    cache = get_page_cache()
+    try:
+        entry = cache.get(key)
+        if entry is None:
+            return
+        async with client.stream('GET', url, headers=entry.conditional_headers()) as response:
+            if response.status_code == 304:
+                cache.refresh(key, compute_cache_policy(response.headers))
+                cache.record("background_revalidations")
+            elif response.is_success:
+                html, html_bytes, truncated = await _read_html(response, url)
+                page_data = await get_cpu_pool().run(_extract_page, html, url, size=len(html), label="html_extract")
+                page_data.html_bytes = html_bytes
+                page_data.truncated = truncated
+                cache.put(key, url, page_data, compute_cache_policy(response.headers))
+                cache.record("background_revalidations")
+        logger.info(f"Background revalidation finished: {url} ({response.status_code})")
+    except Exception as e:
+        logger.warning(f"Background revalidation failed: {url}: {str(e)}")
+    finally:
+        cache.end_revalidation(key)
 
-    for pattern in json_patterns:
-        matches = re.findall(pattern, html, re.DOTALL)
-        for match in matches:
-            try:
-                # HTMLエンティティをデコード
-                decoded = match.replace('&quot;', '"').replace('&#039;', "'")
-                data = json.loads(decoded)
-
-                # 再帰的に画像URLを探す
-                def find_images(obj, urls):
-                    if isinstance(obj, dict):
-                        # "type": "image" と "img_src" のパターン
-                        if obj.get('type') == 'image' and obj.get('img_src'):
-                            img_url = obj['img_src'].replace('\\/', '/')
-                            if _is_valid_image_url(img_url):
-                                full_url = urljoin(base_url, img_url)
-                                if full_url not in urls:
-                                    urls.append(full_url)
-                        # "image-text" タイプも対応（プロフィール画像等）
-                        elif obj.get('type') == 'image-text' and obj.get('img_src'):
-                            img_url = obj['img_src'].replace('\\/', '/')
-                            if _is_valid_image_url(img_url):
-                                full_url = urljoin(base_url, img_url)
-                                if full_url not in urls:
-                                    urls.append(full_url)
-                        # 子要素を再帰的に探索
-                        for key, value in obj.items():
-                            find_images(value, urls)
-                    elif isinstance(obj, list):
-                        for item in obj:
-                            find_images(item, urls)
-
-                find_images(data, image_urls)
-            except (json.JSONDecodeError, TypeError) as e:
-                logger.debug(f"Failed to parse JSON data: {e}")
-                continue
-
-    logger.info(f"Extracted {len(image_urls)} images from JSON data")
-    return image_urls
-
-
-def _extract_main_images(soup: BeautifulSoup, base_url: str, max_images: int = 2, html: str = None) -> List[str]:
+
+def _copy_cached_page_data(page_data: PageData, url: str, cache_status: Optional[str]) -> PageData:
+    """キャッシュ用／返却用にページデータを複製（画像本体は含めない）"""
+    return replace(
+        page_data,
+        url=url,
+        og_image_data=None,
+        images=None,
+        image_reports=None,
+        image_candidates=list(page_data.image_candidates or []),
+        cache_status=cache_status,
+    )
+
+
+def _extract_page(html: str, url: str) -> PageData:
     """
-    LP内の主要画像URLを抽出
+    HTMLからメタデータ・本文テキスト・画像候補を抽出
 
     Args:
-        soup: BeautifulSoupオブジェクト
-        base_url: ベースURL（相対パス解決用）
-        max_images: 取得する最大画像数
-        html: 生のHTML文字列（JSON埋め込み画像抽出用）
+        html: HTML文字列
+        url: ページURL（相対パス解決用）
 
     Returns:
-        List[str]: 画像URLのリスト
+        PageData: 抽出したページデータ
     """
-    image_urls = []
-
-    # 0. Vue.js/React等のJSON埋め込み画像を優先的に抽出
-    if html:
-        json_images = _extract_images_from_json_data(html, base_url)
-        for img_url in json_images[:max_images]:
-            if img_url not in image_urls:
-                image_urls.append(img_url)
-                if len(image_urls) >= max_images:
-                    logger.info(f"Found {len(image_urls)} images from JSON data")
-                    return image_urls
-
-    # 1. hero/mainセクション内の画像を優先
-    hero_selectors = [
-        'header img',
-        'section img',
-        '.hero img',
-        '.main-visual img',
-        '.mv img',
-        '.kv img',
-        '.top img',
-        '.banner img',
-        '[class*="hero"] img',
-        '[class*="main"] img',
-        '[class*="visual"] img',
-    ]
-
-    for selector in hero_selectors:
-        try:
-            for img in soup.select(selector)[:3]:
-                src = img.get('src') or img.get('data-src')
-                if src and _is_valid_image_url(src):
-                    full_url = urljoin(base_url, src)
-                    if full_url not in image_urls:
-                        image_urls.append(full_url)
-                        if len(image_urls) >= max_images:
-                            return image_urls
-        except Exception:
-            continue
+    # 1回の走査でOGP・メタデータ、本文テキスト、主要画像候補（JSON埋め込み画像を含む）を抽出
+    extracted = extract_page(html, url, max_images=MAX_IMAGE_CANDIDATES)
 
-    # 2. 大きな画像を探す（width/height属性がある場合）
-    for img in soup.find_all('img')[:20]:
-        src = img.get('src') or img.get('data-src')
-        if not src or not _is_valid_image_url(src):
-            continue
+    return PageData(
+        url=url,
+        title=extracted.title,
+        description=extracted.description,
+        og_image_url=extracted.og_image_url,
+        page_text=extracted.page_text,
+        image_candidates=extracted.image_candidates,
+    )
 
-        # サイズ属性をチェック
-        width = img.get('width', '')
-        height = img.get('height', '')
-        try:
-            w = int(str(width).replace('px', ''))
-            h = int(str(height).replace('px', ''))
-            if w >= 300 or h >= 200:  # 比較的大きな画像
-                full_url = urljoin(base_url, src)
-                if full_url not in image_urls:
-                    image_urls.append(full_url)
-                    if len(image_urls) >= max_images:
-                        return image_urls
-        except (ValueError, TypeError):
-            pass
-
-    # 3. それでも見つからない場合、最初の数枚の画像を取得
-    for img in soup.find_all('img')[:10]:
-        src = img.get('src') or img.get('data-src')
-        if src and _is_valid_image_url(src):
-            full_url = urljoin(base_url, src)
-            if full_url not in image_urls:
-                image_urls.append(full_url)
-                if len(image_urls) >= max_images:
-                    return image_urls
-
-    return image_urls
-
-
-def _is_valid_image_url(url: str) -> bool:
-    """画像URLとして有効かチェック"""
-    if not url:
-        return False
-    # data:URLやsvgは除外
-    if url.startswith('data:'):
-        return False
-    # 小さなアイコン系を除外
-    lower_url = url.lower()
-    exclude_patterns = ['icon', 'logo', 'favicon', 'sprite', 'loading', 'placeholder', '.svg', '.gif']
-    return not any(pattern in lower_url for pattern in exclude_patterns)
 
+# --------------------------------------------
+# Image Fetching
+# --------------------------------------------
 
-def _extract_page_text(soup: BeautifulSoup, max_length: int = 5000) -> str:
+async def _rank_main_candidates(
+    client: httpx.AsyncClient,
+    image_urls: List[str],
+    top_n: Optional[int] = None,
+) -> Tuple[List[str], List[ImageFetchReport], Dict[str, int]]:
     """
-    HTMLから本文テキストを抽出（見出しタグを優先）
+    主要画像候補の先頭数KBだけを取得して寸法を読み取り、面積・縦横比で順位付けする
+
+    画像ストアに鮮度内の寸法の記録がある候補はプローブせず、記録の寸法で順位付けする。
+    プローブした候補の寸法は画像ストアに記録し、同じLPの再チェックでは通信しない
 
     Args:
-        soup: BeautifulSoupオブジェクト
-        max_length: 最大文字数
+        client: HTTPクライアント
+        image_urls: 主要画像URL候補（抽出時の優先順）
+        top_n: 全体をダウンロードする件数（未指定の場合はIMAGE_PROBE_TOP_N）
 
     Returns:
-        str: 抽出したテキスト（構造化）
+        Tuple[List[str], List[ImageFetchReport], Dict[str, int]]:
+            ダウンロード対象のURL（順位順）、対象外になった候補の取得結果、プローブで分かった画像全体のバイト数
     """
-    # soup のコピーを作成（元のsoupを変更しないため）
-    from copy import copy
-    soup_copy = copy(soup)
-
-    # 完全に不要な要素のみを削除（script, style, noscript）
-    for element in soup_copy(['script', 'style', 'noscript']):
-        element.decompose()
-
-    extracted_parts = []
-
-    # 1. 見出しタグを優先的に抽出（h1 > h2 > h3）
-    for tag in ['h1', 'h2', 'h3']:
-        for element in soup_copy.find_all(tag):
-            text = element.get_text(strip=True)
-            if text and len(text) > 2:  # 2文字以上のみ
-                extracted_parts.append(f"【{tag.upper()}】{text}")
-
-    # 2. headerやhero内のキャッチコピー（重要な広告文言が多い）
-    hero_sections = soup_copy.find_all(['header', 'section'], class_=lambda x: x and any(
-        keyword in str(x).lower() for keyword in ['hero', 'main-visual', 'mv', 'kv', 'top', 'first']
+    if top_n is None:
+        top_n = IMAGE_PROBE_TOP_N
+    if not IMAGE_PROBE_ENABLED or len(image_urls) <= 1:
+        return image_urls, [], {}
+
+    started = time.perf_counter()
+    store = get_image_store()
+    records = dict(zip(image_urls, await asyncio.gather(*(store.get_url(image_url) for image_url in image_urls))))
+    now = time.time()
+    known = {
+        image_url: ProbeResult(
+            url=image_url,
+            header=ImageHeader(format=record.format, width=record.width, height=record.height),
+            total_size=record.size,
+        )
+        for image_url, record in records.items()
+        if record is not None and record.is_fresh(now) and record.width and record.height
+    }
+    ranked = await rank_image_candidates(client, image_urls, known=known)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    logger.info(f"Probed {len(ranked) - len(known)} image candidates ({len(known)} from image store) in {elapsed_ms:.0f}ms")
+
+    # 記録のない候補のプローブ結果を保存（全体をダウンロードした候補は_download_imageで上書きされる）
+    probed = [
+        result for result in ranked
+        if result.url not in known and records.get(result.url) is None
+        and result.header is not None and result.cache_policy is not None and result.cache_policy.storable
+    ]
+    await asyncio.gather(*(
+        store.put_url(UrlRecord(
+            url=result.url,
+            etag=result.cache_policy.etag,
+            last_modified=result.cache_policy.last_modified,
+            fresh_until=result.cache_policy.fresh_until,
+            format=result.header.format,
+            width=result.header.width,
+            height=result.header.height,
+            size=result.total_size,
+        ))
+        for result in probed
     ))
-    for section in hero_sections[:3]:  # 最大3セクション
-        for p in section.find_all(['p', 'span', 'div'], recursive=True):
-            text = p.get_text(strip=True)
-            if text and 5 < len(text) < 200:  # 短すぎず長すぎないテキスト
-                if text not in ' '.join(extracted_parts):  # 重複チェック
-                    extracted_parts.append(f"【ヒーロー】{text}")
-
-    # 3. 強調テキスト（strong, b, em）
-    for element in soup_copy.find_all(['strong', 'b', 'em'])[:20]:
-        text = element.get_text(strip=True)
-        if text and 3 < len(text) < 100:
-            if text not in ' '.join(extracted_parts):
-                extracted_parts.append(f"【強調】{text}")
-
-    # 4. メインコンテンツの段落テキスト
-    main_content = soup_copy.find('main') or soup_copy.find('article') or soup_copy.find('body')
-    if main_content:
-        # nav, footer, aside内のテキストは除外
-        for unwanted in main_content.find_all(['nav', 'footer', 'aside']):
-            unwanted.decompose()
-
-        for p in main_content.find_all('p')[:30]:  # 最大30段落
-            text = p.get_text(strip=True)
-            if text and len(text) > 10:
-                if text not in ' '.join(extracted_parts):
-                    extracted_parts.append(text)
-
-    # 5. リスト項目（特徴や利点が書かれていることが多い）
-    for li in soup_copy.find_all('li')[:20]:
-        text = li.get_text(strip=True)
-        if text and 5 < len(text) < 200:
-            if text not in ' '.join(extracted_parts):
-                extracted_parts.append(f"・{text}")
-
-    # 結合
-    full_text = '\n'.join(extracted_parts)
-
-    # 連続する空白を1つに
-    full_text = ' '.join(full_text.split())
-
-    # 最大文字数で切り詰め
-    if len(full_text) > max_length:
-        full_text = full_text[:max_length] + '...'
-
-    logger.info(f"Extracted page text: {len(full_text)} chars, {len(extracted_parts)} parts")
-
-    return full_text
 
+    ranked_out = [
+        ImageFetchReport(url=result.url, source='main', accepted=False, reason='ranked_out', size=result.total_size)
+        for result in ranked[top_n:]
+    ]
+    original_sizes = {result.url: result.total_size for result in ranked if result.total_size is not None}
+    return [result.url for result in ranked[:top_n]], ranked_out, original_sizes
+
+
+async def _acquire_images(
+    client: httpx.AsyncClient,
+    candidates: List[Tuple[str, str]],
+    target_count: int = MAX_PAGE_IMAGES,
+    concurrency: int = IMAGE_FETCH_CONCURRENCY,
+    prefetched: Optional[Dict[str, "PrefetchedImage"]] = None,
+    original_sizes: Optional[Dict[str, int]] = None,
+) -> Tuple[List[PageImage], List[ImageFetchReport]]:
+    """
+    画像候補を並列に取得し、優先順位を保ったまま目標枚数を選ぶ
 
-# --------------------------------------------
-# Image Fetching
-# --------------------------------------------
+    候補リストの先頭から数えて目標枚数の成功が確定した時点で、
+    残りの取得中・未着手のダウンロードをキャンセルする。
+    知覚ハッシュがほぼ同一の画像（同じ画像の別解像度など）は1枚にまとめて解像度の高い方を残し、
+    空いた枠には次の候補を繰り上げる。
 
-async def _fetch_image(client: httpx.AsyncClient, image_url: str, max_size: int = 10 * 1024 * 1024) -> Optional[bytes]:
+    Args:
+        client: HTTPクライアント
+        candidates: (画像URL, ソース種別) のリスト（優先順）
+        target_count: 採用する画像の枚数
+        concurrency: 同時ダウンロード数
+        prefetched: 取得開始済みの画像（URL → _prefetch_imageの戻り値）
+        original_sizes: 画像URLごとの元画像のバイト数（CDN書き換えの削減量の計算用）
+
+    Returns:
+        Tuple[List[PageImage], List[ImageFetchReport]]: 採用画像（優先順）と候補ごとの取得結果
+    """
+    # 重複URLを除外（先に出現した方を優先）
+    unique: List[Tuple[str, str]] = []
+    reports: List[ImageFetchReport] = []
+    seen = set()
+    for img_url, source in candidates:
+        if img_url in seen:
+            reports.append(ImageFetchReport(url=img_url, source=source, accepted=False, reason='duplicate'))
+            continue
+        seen.add(img_url)
+        unique.append((img_url, source))
+
+    if not unique or target_count <= 0:
+        return [], reports
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    started_at: dict = {}
+
+    async def worker(index: int, img_url: str) -> Tuple[Optional["FetchedImage"], Optional[str], float]:
+        async with semaphore:
+            started_at[index] = time.perf_counter()
+            fetched, reason = await _fetch_image(client, img_url, original_size=original_sizes.get(img_url))
+            return fetched, reason, (time.perf_counter() - started_at[index]) * 1000
+
+    prefetched = prefetched or {}
+    original_sizes = original_sizes or {}
+    tasks = []
+    for i, (img_url, _) in enumerate(unique):
+        if img_url in prefetched:
+            task, started_at[i] = prefetched[img_url]
+        else:
+            task = asyncio.create_task(worker(i, img_url))
+        tasks.append(task)
+
+    def selection_settled() -> bool:
+        """
+        先頭から目標枚数の成功が確定したか（途中に未完了の候補があれば未確定）
+
+        先に成功した画像とほぼ同一の画像は数えない（次の候補を繰り上げる）。
+        """
+        hashes: List[Optional[str]] = []
+        for task in tasks:
+            if not task.done():
+                return False
+            if not task.cancelled() and task.exception() is None and task.result()[0]:
+                image_hash = task.result()[0].image.dhash
+                if find_near_duplicate(image_hash, hashes) is not None:
+                    continue
+                hashes.append(image_hash)
+                if len(hashes) >= target_count:
+                    return True
+        return True
+
+    try:
+        pending = set(tasks)
+        while pending and not selection_settled():
+            _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # 優先順に結果を確定（ほぼ同一の画像は1枚にまとめ、解像度の高い方を残す）
+    images: List[PageImage] = []
+    accepted_reports: List[ImageFetchReport] = []
+    now = time.perf_counter()
+    for index, ((img_url, source), task) in enumerate(zip(unique, tasks)):
+        report = ImageFetchReport(url=img_url, source=source, accepted=False)
+        if task.cancelled():
+            if index in started_at:
+                report.reason = 'cancelled'
+                report.elapsed_ms = (now - started_at[index]) * 1000
+            else:
+                report.reason = 'skipped'
+        elif task.exception() is not None:
+            report.reason = 'fetch_error'
+        else:
+            fetched, reason, elapsed_ms = task.result()
+            report.elapsed_ms = elapsed_ms
+            if not fetched:
+                report.reason = reason or 'fetch_error'
+            else:
+                report.size = len(fetched.image.data)
+                report.store_hit = fetched.store_hit
+                report.cdn = fetched.cdn
+                report.bytes_saved = fetched.bytes_saved
+                report.dhash = fetched.image.dhash
+                duplicate = find_near_duplicate(report.dhash, [kept.dhash for kept in accepted_reports])
+                if duplicate is not None:
+                    kept = images[duplicate]
+                    if fetched.image.width * fetched.image.height > (kept.width or 0) * (kept.height or 0):
+                        # 高解像度の方を、先に採用した画像の枠（ソース種別）のまま採用し直す
+                        images[duplicate] = _page_image(img_url, kept.source, fetched.image)
+                        replaced = accepted_reports[duplicate]
+                        replaced.accepted, replaced.reason, replaced.duplicate_of = False, 'near_duplicate', img_url
+                        report.accepted = True
+                        accepted_reports[duplicate] = report
+                    else:
+                        report.reason, report.duplicate_of = 'near_duplicate', kept.url
+                elif len(images) >= target_count:
+                    report.reason = 'surplus'
+                else:
+                    report.accepted = True
+                    images.append(_page_image(img_url, source, fetched.image))
+                    accepted_reports.append(report)
+        reports.append(report)
+
+    for report in reports:
+        elapsed = f"{report.elapsed_ms:.0f}ms" if report.elapsed_ms is not None else "-"
+        if report.accepted:
+            logger.info(f"Image accepted ({report.source}, {elapsed}): {report.url}")
+        else:
+            logger.info(f"Image dropped ({report.source}, {elapsed}, reason={report.reason}): {report.url}")
+
+    return images, reports
+
+
+def _page_image(url: str, source: str, image: OptimizedImage) -> PageImage:
+    return PageImage(
+        url=url,
+        data=image.data,
+        source=source,
+        media_type=image.media_type,
+        width=image.width,
+        height=image.height,
+        b64=image.b64,
+    )
+
+
+@dataclass
+class FetchedImage:
+    """取得・最適化済みの画像"""
+    image: OptimizedImage
+    # 画像ストアの利用状況（ImageFetchReport.store_hit と同じ値）
+    store_hit: Optional[str] = None
+    # ダウンロードしたバイト数（画像ストアから再利用した場合はNone）
+    downloaded_bytes: Optional[int] = None
+    # CDNのリサイズURLで取得した場合のCDN名と削減バイト数（ImageFetchReportと同じ値）
+    cdn: Optional[str] = None
+    bytes_saved: Optional[int] = None
+
+
+# 先行取得中の画像（タスク, 取得開始時刻）
+PrefetchedImage = Tuple[asyncio.Task, float]
+
+
+def _prefetch_image(client: httpx.AsyncClient, image_url: str) -> PrefetchedImage:
+    """画像の取得を先行して開始（_acquire_imagesのprefetchedに渡す）"""
+    started = time.perf_counter()
+
+    async def fetch() -> Tuple[Optional[FetchedImage], Optional[str], float]:
+        fetched, reason = await _fetch_image(client, image_url)
+        return fetched, reason, (time.perf_counter() - started) * 1000
+
+    return asyncio.create_task(fetch()), started
+
+
+def _optimize_and_encode(image_data: bytes, max_dimension: int, passthrough: bool = False) -> OptimizedImage:
+    """
+    画像を最適化し、Base64表現も作成（CPUプールで実行）
+
+    passthroughの場合、既に最大寸法以下のJPEG/WebP（CDNでリサイズ済みの画像）は再エンコードせずそのまま使う。
+    """
+    header = parse_image_header(image_data[:IMAGE_PROBE_BYTES]) if passthrough else None
+    if header is not None and header.format in ('jpeg', 'webp') and max(header.width, header.height) <= max_dimension:
+        optimized = OptimizedImage(
+            data=image_data,
+            media_type=f"image/{header.format}",
+            width=header.width,
+            height=header.height,
+        )
+    else:
+        optimized = optimize_image(image_data, max_dimension=max_dimension)
+    optimized.base64()
+    optimized.dhash = dhash_bytes(optimized.data)
+    return optimized
+
+
+async def _ensure_dhash(image: OptimizedImage) -> OptimizedImage:
+    """知覚ハッシュのない画像（ハッシュ導入前に画像ストアへ保存されたもの）にハッシュを付ける"""
+    if image.dhash is None:
+        image.dhash = await get_cpu_pool().run(
+            dhash_bytes, image.data, size=len(image.data), label="image_hash",
+        )
+    return image
+
+
+def _optimize_variant(max_dimension: int) -> str:
+    """画像ストアのバリアント名（最適化条件が変われば別エントリになる）"""
+    return f"{max_dimension}px-v{OPTIMIZER_VERSION}"
+
+
+async def _fetch_image(
+    client: httpx.AsyncClient,
+    image_url: str,
+    max_size: int = MAX_IMAGE_BYTES,
+    max_dimension: int = AI_IMAGE_MAX_DIMENSION,
+    original_size: Optional[int] = None,
+) -> Tuple[Optional[FetchedImage], Optional[str]]:
     """
-    画像URLから画像データを取得
+    画像URLから画像を取得し、AI送信用に最適化
+
+    リサイズ可能な画像CDNのURLは、最大寸法以下の変換済み画像を返すURLに書き換えて取得し、
+    失敗した場合は元URLで取得し直す。
 
     Args:
         client: HTTPクライアント
         image_url: 画像URL
         max_size: 最大サイズ（バイト）
+        max_dimension: 最適化後の最大寸法（px）
+        original_size: 元画像のバイト数（分かっている場合。CDN書き換えの削減量の計算用）
 
     Returns:
-        Optional[bytes]: 画像データ、取得失敗時はNone
+        Tuple[Optional[FetchedImage], Optional[str]]: (取得画像, 不採用理由)
+        取得成功時は (画像, None)、失敗時は (None, 理由)
     """
-    try:
-        response = await client.get(image_url)
-        response.raise_for_status()
+    cdn_layer = get_cdn_rewrite_layer()
+    rewrite = cdn_layer.rewrite(image_url, max_dimension)
+    if rewrite is not None:
+        fetched, reason = await _download_image(
+            client, rewrite.url, max_size, max_dimension, headers=rewrite.headers, passthrough=True
+        )
+        if fetched is not None:
+            fetched.cdn = rewrite.cdn
+            if fetched.downloaded_bytes is not None:
+                fetched.bytes_saved = cdn_layer.record_served(rewrite.cdn, fetched.downloaded_bytes, original_size)
+            return fetched, None
+        logger.info(f"CDN variant failed ({rewrite.cdn}, reason={reason}), falling back to original: {image_url}")
+        cdn_layer.record_fallback(rewrite.cdn)
+
+    return await _download_image(client, image_url, max_size, max_dimension)
+
+
+async def _download_image(
+    client: httpx.AsyncClient,
+    image_url: str,
+    max_size: int = MAX_IMAGE_BYTES,
+    max_dimension: int = AI_IMAGE_MAX_DIMENSION,
+    headers: Optional[Dict[str, str]] = None,
+    passthrough: bool = False,
+) -> Tuple[Optional[FetchedImage], Optional[str]]:
+    """
+    画像URLから画像データをストリーミング取得し、AI送信用に最適化
+
+    ヘッダー（Content-Type / Content-Length）の時点で不適格なものは本文を受信せずに破棄し、
+    受信中も上限サイズを超えた時点で転送を打ち切る。先頭チャンクのマジックバイトで
+    実際に画像であることも確認する。
+    画像ストアに最適化結果があれば、鮮度内なら通信なし、期限切れなら条件付きGETで再利用し、
+    ダウンロードした場合も同一内容（SHA-256一致）なら最適化処理を省略する。
 
-        # サイズチェック
-        if len(response.content) > max_size:
-            logger.warning(f"Image too large: {len(response.content)} bytes")
-            return None
+    Args:
+        client: HTTPクライアント
+        image_url: 画像URL
+        max_size: 最大サイズ（バイト）
+        max_dimension: 最適化後の最大寸法（px）
+        headers: 追加のリクエストヘッダー
+        passthrough: 最大寸法以下のJPEG/WebPを再エンコードせずに使うか（CDNでリサイズ済みの画像向け）
 
-        # Content-Typeチェック
-        content_type = response.headers.get('content-type', '')
-        if not content_type.startswith('image/'):
-            logger.warning(f"Not an image: {content_type}")
-            return None
+    Returns:
+        Tuple[Optional[FetchedImage], Optional[str]]: (取得画像, 不採用理由)
+        取得成功時は (画像, None)、失敗時は (None, 理由)
+    """
+    store = get_image_store()
+    variant = _optimize_variant(max_dimension)
+
+    # 画像ストアを確認（URL + バリデーター）
+    url_record = await store.get_url(image_url)
+    stored = await store.get_object(url_record.sha256, variant) if url_record and url_record.sha256 else None
+    if stored is not None and url_record.is_fresh(time.time()):
+        store.record_hit("url_hits")
+        return FetchedImage(await _ensure_dhash(stored), store_hit='fresh'), None
+    request_headers = dict(headers or {})
+    if stored is not None:
+        request_headers.update(url_record.conditional_headers())
 
-        image_data = response.content
-        original_size = len(image_data)
+    try:
+        async with client.stream('GET', image_url, headers=request_headers) as response:
+            if response.status_code == 304 and stored is not None:
+                policy = compute_cache_policy(response.headers)
+                url_record.fresh_until = policy.fresh_until
+                url_record.etag = policy.etag or url_record.etag
+                url_record.last_modified = policy.last_modified or url_record.last_modified
+                await store.put_url(url_record)
+                store.record_hit("url_hits")
+                return FetchedImage(await _ensure_dhash(stored), store_hit='revalidated'), None
 
-        # AI処理用に画像を最適化（リサイズ・圧縮）
-        # Gemini APIのタイムアウトを防ぐため、大きな画像は縮小
-        optimized_data = optimize_image_for_ai(image_data, max_dimension=1024)
-        optimized_size = len(optimized_data)
+            response.raise_for_status()
 
-        logger.info(f"Image fetched: {original_size/1024:.0f}KB -> {optimized_size/1024:.0f}KB (optimized)")
-        return optimized_data
+            # Content-Typeチェック（ヘッダー時点）
+            content_type = response.headers.get('content-type', '').split(';')[0].strip().lower()
+            if not content_type.startswith('image/') and content_type not in GENERIC_BINARY_CONTENT_TYPES:
+                logger.warning(f"Not an image: {content_type}")
+                return None, 'not_image'
+
+            # サイズチェック（ヘッダー時点）
+            content_length = response.headers.get('content-length', '')
+            if content_length.isdigit() and int(content_length) > max_size:
+                logger.warning(f"Image too large: {content_length} bytes (Content-Length)")
+                return None, 'too_large'
+
+            buffer = bytearray()
+            sniffed = False
+            async for chunk in response.aiter_bytes():
+                buffer.extend(chunk)
+
+                # サイズチェック（受信中）
+                if len(buffer) > max_size:
+                    logger.warning(f"Image too large: exceeded {max_size} bytes while streaming")
+                    return None, 'too_large'
+
+                # マジックバイトチェック（先頭チャンク）
+                if not sniffed and len(buffer) >= IMAGE_SNIFF_BYTES:
+                    if detect_image_media_type(bytes(buffer[:IMAGE_SNIFF_BYTES])) is None:
+                        logger.warning(f"Not an image: magic bytes mismatch ({content_type})")
+                        return None, 'not_image'
+                    sniffed = True
+
+            if not sniffed and detect_image_media_type(bytes(buffer)) is None:
+                logger.warning(f"Not an image: magic bytes mismatch ({content_type})")
+                return None, 'not_image'
+
+            response_policy = compute_cache_policy(response.headers)
+
+        image_data = bytes(buffer)
+        original_size = len(image_data)
+        digest = sha256_hex(image_data)
+
+        # 同一内容の最適化結果があれば再利用
+        optimized = await store.get_object(digest, variant)
+        store_hit = None
+        if optimized is not None:
+            store.record_hit("content_hits")
+            store_hit = 'content'
+            await _ensure_dhash(optimized)
+        else:
+            store.record_hit("misses")
+            # AI処理用に画像を最適化（リサイズ・圧縮）
+            # Gemini APIのタイムアウトを防ぐため、大きな画像は縮小
+            optimized = await get_cpu_pool().run(
+                _optimize_and_encode, image_data, max_dimension, passthrough,
+                size=len(image_data), label="image_optimize",
+            )
+            await store.put_object(digest, variant, optimized, original_size)
+
+        if response_policy.storable:
+            header = parse_image_header(image_data[:IMAGE_PROBE_BYTES])
+            await store.put_url(UrlRecord(
+                url=image_url,
+                sha256=digest,
+                etag=response_policy.etag,
+                last_modified=response_policy.last_modified,
+                fresh_until=response_policy.fresh_until,
+                format=header.format if header else None,
+                width=header.width if header else None,
+                height=header.height if header else None,
+                size=original_size,
+            ))
+
+        logger.info(f"Image fetched: {original_size/1024:.0f}KB -> {len(optimized.data)/1024:.0f}KB (optimized)")
+        return FetchedImage(optimized, store_hit=store_hit, downloaded_bytes=original_size), None
 
+    except httpx.HTTPStatusError as e:
+        logger.warning(f"Failed to fetch image: HTTP {e.response.status_code}")
+        return None, 'http_error'
     except Exception as e:
         logger.warning(f"Failed to fetch image: {str(e)}")
-        return None
+        return None, 'fetch_error'
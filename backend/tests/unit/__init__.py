@@ -0,0 +1,3 @@
+"""
+メタ広告審査チェッカー - 単体テストモジュール
+"""
@@ -0,0 +1,83 @@
+"""
+============================================
+メタ広告審査チェッカー - 単体テスト用pytest設定
+============================================
+"""
+
+import io
+import random
+from typing import Optional, Union
+
+import pytest
+from PIL import Image
+
+from src.routes import metrics
+from src.utils import fair_queue, tenants
+from src.utils.fair_queue import FairScheduler
+from src.utils.image_store import get_image_store
+from src.utils.rate_limit import MemoryRateLimitBackend
+
+
+@pytest.fixture(autouse=True)
+def isolated_image_store(tmp_path, monkeypatch):
+    """画像ストアをテストごとの一時ディレクトリに向ける"""
+    store = get_image_store()
+    monkeypatch.setattr(store, "root", str(tmp_path / "image-store"))
+    monkeypatch.setattr(store, "_index", None)
+    monkeypatch.setattr(store, "_total_bytes", None)
+    return store
+
+
+@pytest.fixture(autouse=True)
+def isolated_tenant_quotas(monkeypatch):
+    """呼び出し元ごとの利用枠と公平キューをテストごとに初期化"""
+    quotas = tenants.TenantQuotas(backend=MemoryRateLimitBackend())
+    monkeypatch.setattr(tenants, "_tenant_quotas", quotas)
+    monkeypatch.setattr(fair_queue, "_fair_scheduler", FairScheduler())
+    return quotas
+
+
+@pytest.fixture
+def metrics_headers(monkeypatch):
+    """GET /api/metrics を有効にし、参照用のヘッダーを返す"""
+    monkeypatch.setattr(metrics, "METRICS_API_KEY", "test-metrics-key")
+    return {"X-Admin-Key": "test-metrics-key"}
+
+
+# --------------------------------------------
+# テスト用画像
+# --------------------------------------------
+
+def encode_image(image: Image.Image, image_format: str = "PNG", **options) -> bytes:
+    """画像を指定形式でエンコード（optionsはImage.saveに渡す）"""
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return buffer.getvalue()
+
+
+def image_bytes(
+    width: int,
+    height: int,
+    image_format: str = "PNG",
+    pattern: Optional[Union[int, str]] = None,
+    **options,
+) -> bytes:
+    """
+    テスト用の画像を生成してエンコード
+
+    Args:
+        width: 幅
+        height: 高さ
+        image_format: 画像形式
+        pattern: None は単色、"gradient" はグレーのグラデーション、
+            整数は値ごとに見た目の異なるブロック模様
+        **options: Image.saveに渡すオプション
+    """
+    if pattern is None:
+        image = Image.new("RGB", (width, height), (200, 30, 30))
+    elif pattern == "gradient":
+        image = Image.merge("RGB", [Image.linear_gradient("L").resize((width, height))] * 3)
+    else:
+        blocks = Image.frombytes("L", (8, 8), random.Random(pattern).randbytes(64))
+        image = blocks.resize((width, height), Image.Resampling.NEAREST).convert("RGB")
+    return encode_image(image, image_format, **options)
@@ -0,0 +1,156 @@
+"""
+============================================
+メタ広告審査チェッカー - 同時呼び出し数の自動調整単体テスト
+============================================
+"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from src.services import anthropic_service
+from src.services.anthropic_service import AnthropicService, RateLimiter, UsageTracker
+from src.utils import adaptive_limit
+from src.utils.adaptive_limit import AdaptiveConcurrencyLimit
+from src.utils.errors import ExternalAPIError
+from src.utils.fair_queue import FairScheduler, get_fair_scheduler
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """減らした直後の待ち時間を制御する時計"""
+    now = [1000.0]
+    monkeypatch.setattr(adaptive_limit, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+class TestAdaptiveConcurrencyLimit:
+    """上限の調整のテスト"""
+
+    def test_grows_additively_while_utilized(self, clock):
+        """上限まで使われている間の成功で1ずつ増え、使われていない間は増えないことを確認"""
+        limit = AdaptiveConcurrencyLimit(2, min_limit=1, max_limit=4, tolerance=2.0)
+
+        for _ in range(3):
+            limit.record_success(500.0, in_flight=limit.current)
+        assert limit.current == 3
+
+        for _ in range(20):
+            limit.record_success(500.0, in_flight=0)
+        assert limit.current == 3
+
+        for _ in range(20):
+            limit.record_success(500.0, in_flight=limit.current)
+        assert limit.current == 4
+
+    def test_overload_halves_once_per_burst(self, clock):
+        """429/529は半分に減らし、同時に失敗した一群では1回だけ減らすことを確認"""
+        limit = AdaptiveConcurrencyLimit(8, min_limit=1, max_limit=16)
+
+        for _ in range(5):
+            limit.record_overload("status 529")
+        assert (limit.current, limit.counters["overloads"], limit.counters["decreases"]) == (4, 5, 1)
+
+        clock[0] += 2
+        limit.record_overload("status 429")
+        clock[0] += 2
+        limit.record_overload("status 429")
+        clock[0] += 2
+        limit.record_overload("status 429")
+        assert limit.current == 1
+
+    def test_latency_inflation_shrinks_by_gradient(self, clock):
+        """TTFTが基準の許容倍数を超えた分に応じて減らすことを確認"""
+        limit = AdaptiveConcurrencyLimit(10, min_limit=1, max_limit=16, tolerance=2.0)
+        limit.record_success(400.0, in_flight=0)
+
+        limit.record_success(1000.0, in_flight=10)
+
+        # 基準 ≈ 400ms（わずかに追従）→ 許容 ≈ 830ms / 1000ms
+        assert limit.current == 8
+        assert limit.counters["latency_inflations"] == 1
+        assert limit.stats()["baseline_latency_ms"] == pytest.approx(430.0)
+
+
+class TestAdaptiveScheduler:
+    """公平キューの上限との連動のテスト"""
+
+    async def test_overload_stops_new_dispatch_until_recovered(self, clock):
+        """上限を減らすと実行中のものが終わるまで新たに割り当てず、成功で増えると待機中のものを処理することを確認"""
+        scheduler = FairScheduler(capacity=2, timeout=5, adaptive=True)
+        started = []
+        release = asyncio.Event()
+
+        async def request(name):
+            async with scheduler.slot(name):
+                started.append(name)
+                await release.wait()
+
+        tasks = [asyncio.create_task(request("a")), asyncio.create_task(request("b"))]
+        await asyncio.sleep(0)
+        scheduler.record_overload("status 529")
+        tasks.append(asyncio.create_task(request("c")))
+        await asyncio.sleep(0)
+        assert (scheduler.capacity, started, scheduler.stats()["waiting"]) == (1, ["a", "b"], 1)
+
+        # 1 → 2 → 2.5 → 2.9 → 3.2
+        for _ in range(4):
+            scheduler.record_success(300.0)
+        await asyncio.sleep(0.01)
+        assert scheduler.capacity == 3 and started == ["a", "b", "c"]
+
+        release.set()
+        await asyncio.gather(*tasks)
+        assert scheduler.stats()["in_flight"] == 0
+
+    def test_fixed_capacity_when_disabled(self):
+        """自動調整しない場合は指定した上限のままであることを確認"""
+        scheduler = FairScheduler(capacity=3, adaptive=False)
+
+        scheduler.record_overload("status 529")
+
+        assert scheduler.capacity == 3 and scheduler.stats()["adaptive"] is None
+
+
+class TestServiceSignals:
+    """Claude APIの応答から上限を調整するテスト"""
+
+    @pytest.fixture(autouse=True)
+    def service_limits(self, monkeypatch):
+        monkeypatch.setattr(anthropic_service, "_rate_limiter", RateLimiter(100, 3600))
+        monkeypatch.setattr(anthropic_service, "_usage_tracker", UsageTracker())
+        monkeypatch.setattr(anthropic_service, "INITIAL_RETRY_DELAY", 0)
+
+    def _service(self, responses) -> AnthropicService:
+        return AnthropicService(api_key="k", http_client=httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda request: responses.pop(0))
+        ))
+
+    async def test_overloaded_response_shrinks_limit(self, clock):
+        """529で上限を減らし、再試行の成功でTTFTを基準として記録することを確認"""
+        body = "".join(f"data: {json.dumps(event)}\n\n" for event in [
+            {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": "{}"}},
+            {"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {}},
+        ])
+        service = self._service([httpx.Response(529, text="overloaded"), httpx.Response(200, text=body)])
+        initial = get_fair_scheduler().capacity
+
+        assert await service.generate_content_with_retry("prompt") == "{}"
+
+        stats = get_fair_scheduler().stats()["adaptive"]
+        assert stats["overloads"] == 1 and stats["limit"] == max(1, initial // 2)
+        assert stats["baseline_latency_ms"] is not None
+
+    async def test_client_errors_do_not_shrink_limit(self, clock):
+        """リクエスト自体の誤り（400）では上限を変えないことを確認"""
+        service = self._service([httpx.Response(400, text="bad request")])
+
+        with pytest.raises(ExternalAPIError):
+            await service.generate_content_with_retry("prompt")
+
+        assert get_fair_scheduler().stats()["adaptive"]["overloads"] == 0
@@ -0,0 +1,126 @@
+"""
+============================================
+メタ広告審査チェッカー - 画像CDNリサイズURL書き換え単体テスト
+============================================
+"""
+
+import httpx
+import pytest
+
+from src.utils import url_fetcher
+from src.utils.cdn_rewrite import CdnRewriteLayer, CdnRewriter
+from tests.unit.conftest import image_bytes
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def cdn_layer(monkeypatch):
+    """テストごとに新しい書き換えレイヤーを使う"""
+    layer = CdnRewriteLayer(enabled=True)
+    monkeypatch.setattr(url_fetcher, "get_cdn_rewrite_layer", lambda: layer)
+    return layer
+
+
+class TestRewriteUrls:
+    """CDNごとの書き換え規則のテスト"""
+
+    @pytest.mark.parametrize("url, expected", [
+        (
+            "https://acme.imgix.net/hero.jpg?w=3000&auto=format",
+            "https://acme.imgix.net/hero.jpg?w=1024&auto=format&h=1024&fit=max&fm=webp",
+        ),
+        (
+            "https://res.cloudinary.com/demo/image/upload/c_fill,w_2000/v1712/lp/my_hero.jpg",
+            "https://res.cloudinary.com/demo/image/upload/c_fill,w_2000/c_limit,w_1024,h_1024,f_webp,q_auto"
+            "/v1712/lp/my_hero.jpg",
+        ),
+        (
+            "https://res.cloudinary.com/demo/image/upload/my_hero.jpg",
+            "https://res.cloudinary.com/demo/image/upload/c_limit,w_1024,h_1024,f_webp,q_auto/my_hero.jpg",
+        ),
+        (
+            "https://shop.example.com/cdn/shop/files/hero.jpg?v=1&width=3000",
+            "https://shop.example.com/cdn/shop/files/hero.jpg?v=1&width=1024",
+        ),
+        (
+            "https://i0.wp.com/example.com/uploads/hero.jpg?w=2400&ssl=1",
+            "https://i0.wp.com/example.com/uploads/hero.jpg?ssl=1&fit=1024,1024&strip=all",
+        ),
+        (
+            "https://lp.example.com/_next/image?url=%2Fimg%2Fhero.jpg&w=3840&q=75",
+            "https://lp.example.com/_next/image?url=%2Fimg%2Fhero.jpg&w=1080&q=75",
+        ),
+        ("https://i0.wp.com/example.com/uploads/hero.jpg?w=600", None),
+        ("https://acme.imgix.net/hero.jpg?fit=crop&w=3000&h=1000", None),
+        ("https://lp.example.com/_next/image?url=%2Fimg%2Fhero.jpg&w=640&q=75", None),
+        ("https://lp.example.com/img/hero.jpg", None),
+    ])
+    def test_rewrites_to_resized_variant(self, url, expected):
+        """1024px以下の変換済み画像を返すURLに書き換え、対象外・書き換え不要ならNoneになることを確認"""
+        rewrite = CdnRewriteLayer(enabled=True).rewrite(url, 1024)
+
+        assert (rewrite.url if rewrite else None) == expected
+
+    def test_registered_rewriter_takes_precedence(self):
+        """追加登録した規則が組み込みの規則より優先されることを確認"""
+        layer = CdnRewriteLayer(enabled=True)
+        layer.register(CdnRewriter(
+            "custom",
+            lambda parts: parts.hostname == "img.example.com",
+            lambda parts, max_dimension: f"https://img.example.com/{max_dimension}{parts.path}",
+        ))
+
+        rewrite = layer.rewrite("https://img.example.com/hero.jpg", 1024)
+
+        assert (rewrite.url, rewrite.cdn) == ("https://img.example.com/1024/hero.jpg", "custom")
+
+
+class TestFetchThroughCdn:
+    """書き換えURLでの画像取得テスト"""
+
+    async def test_uses_cdn_variant_without_reencoding(self, cdn_layer, isolated_image_store, monkeypatch):
+        """CDNでリサイズ済みの画像は再エンコードせずに使い、削減バイト数を記録することを確認"""
+        variant = image_bytes(1024, 512, "WEBP")
+        requested = []
+
+        def fail_optimize(*args, **kwargs):
+            raise AssertionError("optimize_image should not run for CDN variants")
+
+        monkeypatch.setattr(url_fetcher, "optimize_image", fail_optimize)
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            requested.append((str(request.url), request.headers.get("accept")))
+            return httpx.Response(200, content=variant, headers={"content-type": "image/webp"})
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            fetched, reason = await url_fetcher._fetch_image(
+                client, "https://acme.imgix.net/hero.jpg?w=3000", original_size=2_000_000
+            )
+
+        assert reason is None
+        assert requested[0][0].startswith("https://acme.imgix.net/hero.jpg?w=1024")
+        assert "image/webp" in requested[0][1]
+        assert fetched.image.data == variant
+        assert (fetched.image.width, fetched.image.height, fetched.image.media_type) == (1024, 512, "image/webp")
+        assert (fetched.cdn, fetched.bytes_saved) == ("imgix", 2_000_000 - len(variant))
+        assert cdn_layer.stats()["bytes_saved"] == 2_000_000 - len(variant)
+
+    async def test_falls_back_to_original_url(self, cdn_layer, isolated_image_store):
+        """書き換えURLで取得できなければ元URLで取得し直すことを確認"""
+        original = image_bytes(1600, 900, "JPEG")
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if "c_limit" in request.url.path:
+                return httpx.Response(404)
+            return httpx.Response(200, content=original, headers={"content-type": "image/jpeg"})
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            fetched, reason = await url_fetcher._fetch_image(
+                client, "https://res.cloudinary.com/demo/image/upload/v1/hero.jpg"
+            )
+
+        assert reason is None
+        assert fetched.cdn is None
+        assert max(fetched.image.width, fetched.image.height) == 1024
+        assert cdn_layer.stats()["cdns"]["cloudinary"]["fallbacks"] == 1
@@ -0,0 +1,196 @@
+"""
+============================================
+メタ広告審査チェッカー - ストリーミング審査単体テスト
+============================================
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import Request, Response
+from fastapi.testclient import TestClient
+
+from src.main import app
+from src.routes import check
+from src.services import anthropic_service
+from src.services.anthropic_service import AnthropicService, RateLimiter, UsageTracker
+from src.types import AdCheckRequest
+from src.utils.errors import ExternalAPIError
+from src.utils.tenants import get_tenant_quotas
+from src.utils.url_fetcher import PageData
+
+pytestmark = pytest.mark.unit
+
+AI_RESPONSE = json.dumps({
+    "overall_score": 120,
+    "status": "approved",
+    "confidence": 0.7,
+    "violations": [{"category": "misleading_claims", "severity": "high", "description": "「必ず痩せる」", "location": "text"}],
+    "recommendations": [{"before": "必ず痩せる", "after": "健康的なダイエットを応援", "reason": "断定表現"}],
+    "text_overlay_percentage": None,
+    "nsfw_detected": False,
+    "prohibited_content": [],
+}, ensure_ascii=False)
+
+
+@pytest.fixture
+def fresh_limits(monkeypatch):
+    monkeypatch.setattr(anthropic_service, "_rate_limiter", RateLimiter(100, 3600))
+    tracker = UsageTracker()
+    monkeypatch.setattr(anthropic_service, "_usage_tracker", tracker)
+    monkeypatch.setattr(anthropic_service, "INITIAL_RETRY_DELAY", 0)
+    return tracker
+
+
+def _sse_body(chunks, usage=None) -> str:
+    """Messages APIのストリーミング応答（server-sent events）"""
+    events = [("message_start", {"type": "message_start", "message": {"usage": usage or {"input_tokens": 10}}})]
+    events += [
+        ("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": chunk}})
+        for chunk in chunks
+    ]
+    events.append(("message_delta", {"type": "message_delta", "usage": {"output_tokens": 42}}))
+    events.append(("message_stop", {"type": "message_stop"}))
+    return "".join(f"event: {name}\ndata: {json.dumps(data)}\n\n" for name, data in events)
+
+
+def _parse_sse(text: str):
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+class TestStreamContent:
+    """Claude APIのストリーミング受信のテスト"""
+
+    async def test_yields_text_deltas_and_records_usage(self, fresh_limits):
+        """テキストの差分を順に返し、キャッシュ・初回トークンまでの時間を含む使用量を記録することを確認"""
+        requests = []
+
+        def handler(request):
+            requests.append(json.loads(request.content))
+            return httpx.Response(200, text=_sse_body(
+                ['{"overall', '_score": 80}'],
+                usage={"input_tokens": 10, "cache_read_input_tokens": 3000},
+            ))
+
+        service = AnthropicService(api_key="k", http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+        chunks = [text async for text in service.stream_content_with_retry("prompt", system="static")]
+
+        assert chunks == ['{"overall', '_score": 80}']
+        assert requests[0]["stream"] is True
+        assert (service.last_usage.cache_read_input_tokens, service.last_usage.output_tokens) == (3000, 42)
+        assert service.last_usage.first_token_ms is not None
+        assert fresh_limits.stats()["by_cache_status"]["read"]["avg_first_token_ms"] is not None
+
+    async def test_retries_only_before_first_token(self, fresh_limits):
+        """最初のテキストの受信前の過負荷はリトライし、それ以外のエラーはそのまま返すことを確認"""
+        responses = [httpx.Response(529, text="overloaded"), httpx.Response(200, text=_sse_body(["{}"]))]
+        service = AnthropicService(api_key="k", http_client=httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda request: responses.pop(0))
+        ))
+
+        assert [text async for text in service.stream_content_with_retry("prompt")] == ["{}"]
+
+        failing = AnthropicService(api_key="k", http_client=httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda request: httpx.Response(400, text="bad request"))
+        ))
+        with pytest.raises(ExternalAPIError):
+            [text async for text in failing.stream_content_with_retry("prompt")]
+
+
+class TestCheckStreamEndpoint:
+    """POST /api/check/stream のテスト"""
+
+    def _patch(self, monkeypatch, chunks=None, error=None):
+        async def fake_fetch_page_data(url, client=None):
+            return PageData(url=url, title="LP", page_text="必ず痩せる", images=[])
+
+        class FakeAnthropicService:
+            def __init__(self, *args, **kwargs):
+                pass
+
+            async def ensure_within_rate_limit(self):
+                pass
+
+            async def release_rate_limit(self):
+                pass
+
+            async def stream_content_with_retry(self, prompt, images=None, temperature=0.3, system=None, tool=None):
+                for chunk in chunks or []:
+                    yield chunk
+                if error is not None:
+                    raise error
+
+            async def parse_json_response(self, text):
+                return json.loads(text)
+
+        monkeypatch.setattr(check, "fetch_page_data", fake_fetch_page_data)
+        monkeypatch.setattr(check, "AnthropicService", FakeAnthropicService)
+
+    def test_streams_partial_results_then_final_response(self, monkeypatch):
+        """確定した項目から順に送り、最後にPOST /api/checkと同じレスポンスを送ることを確認"""
+        self._patch(monkeypatch, chunks=[AI_RESPONSE[i:i + 7] for i in range(0, len(AI_RESPONSE), 7)])
+
+        with TestClient(app) as client:
+            response = client.post("/api/check/stream", json={"page_url": "https://lp.example.com/"})
+
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = _parse_sse(response.text)
+        assert [name for name, _ in events] == [
+            "start", "field", "field", "field", "violation", "recommendation", "field", "field", "result",
+        ]
+        assert events[1][1] == {"name": "overall_score", "value": 100}
+        assert events[4][1]["violation"]["category"] == "misleading"
+        assert events[5][1]["recommendation"]["suggestions"] == ["健康的なダイエットを応援"]
+
+        result = events[-1][1]
+        expected = check._build_response_from_ai_result(json.loads(AI_RESPONSE)).model_dump(mode="json")
+        assert {k: v for k, v in result.items() if k != "checked_at"} == {
+            k: v for k, v in expected.items() if k != "checked_at"
+        }
+
+    def test_reports_errors_as_event(self, monkeypatch):
+        """応答開始後のエラーはerrorイベントとして送ることを確認"""
+        self._patch(monkeypatch, chunks=['{"overall_score": 80,'], error=ExternalAPIError(message="failed"))
+
+        with TestClient(app) as client:
+            response = client.post("/api/check/stream", json={"page_url": "https://lp.example.com/"})
+
+        events = _parse_sse(response.text)
+        assert [name for name, _ in events] == ["start", "field", "error"]
+        assert events[-1][1]["status_code"] == 500
+
+    async def test_disconnect_before_streaming_releases_reservations(self, monkeypatch, fresh_limits):
+        """応答を読み始める前に切断された場合も、呼び出し元の枠とClaude API全体の予約を返却することを確認"""
+        async def fake_fetch_page_data(url, client=None):
+            return PageData(url=url, title="LP", page_text="必ず痩せる", images=[])
+
+        monkeypatch.setattr(check, "fetch_page_data", fake_fetch_page_data)
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "k")
+        limiter = RateLimiter(1, 3600)
+        monkeypatch.setattr(anthropic_service, "_rate_limiter", limiter)
+        scope = {"type": "http", "method": "POST", "path": "/api/check/stream", "headers": [], "client": ("10.0.0.1", 1234)}
+
+        response = await check.check_advertisement_stream(
+            AdCheckRequest(page_url="https://lp.example.com/"), Request(scope), Response()
+        )
+        assert await limiter.remaining() == 0
+
+        async def receive():
+            await asyncio.sleep(0)
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            # 応答ヘッダーの送信中に切断される（ジェネレーターは一度も読まれない）
+            await asyncio.Event().wait()
+
+        await response(scope, receive, send)
+
+        assert await limiter.remaining() == 1
+        assert get_tenant_quotas().counters["released"] == 1
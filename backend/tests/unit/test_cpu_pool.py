@@ -0,0 +1,86 @@
+"""
+============================================
+メタ広告審査チェッカー - CPUプール単体テスト
+============================================
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.main import app
+from src.utils.cpu_pool import CpuPool, get_cpu_pool
+
+pytestmark = pytest.mark.unit
+
+
+def _thread_name(_: bytes) -> str:
+    return threading.current_thread().name
+
+
+def _slow_echo(value: int) -> int:
+    time.sleep(0.05)
+    return value
+
+
+class TestCpuPool:
+    """CpuPool の実行先とメトリクスのテスト"""
+
+    async def test_small_inputs_run_inline(self):
+        """閾値未満の入力はイベントループのスレッドで実行されることを確認"""
+        pool = CpuPool(kind="thread", workers=2, inline_threshold=1024)
+        await pool.start()
+        try:
+            small = await pool.run(_thread_name, b"x", size=1, label="echo")
+            large = await pool.run(_thread_name, b"x" * 2048, size=2048, label="echo")
+        finally:
+            await pool.aclose()
+
+        assert small == threading.current_thread().name
+        assert large.startswith("cpu-pool")
+        stats = pool.stats()
+        assert stats["inline"] == 1
+        assert stats["completed"] == 1
+        assert stats["tasks"]["echo"]["count"] == 2
+
+    async def test_reports_queue_depth(self):
+        """ワーカー数を超えた処理が待ち行列として計測されることを確認"""
+        pool = CpuPool(kind="thread", workers=2, inline_threshold=0)
+        await pool.start()
+        try:
+            results = await asyncio.gather(*(pool.run(_slow_echo, i, label="slow") for i in range(6)))
+        finally:
+            await pool.aclose()
+
+        assert results == list(range(6))
+        stats = pool.stats()
+        assert stats["peak_queue_depth"] == 4
+        assert stats["pending"] == 0
+        assert stats["tasks"]["slow"]["avg_run_ms"] >= 40
+        assert stats["tasks"]["slow"]["avg_wait_ms"] > 0
+
+    async def test_runs_inline_when_not_started(self):
+        """未起動のプールでは呼び出し元でそのまま実行されることを確認"""
+        pool = CpuPool(kind="thread", workers=2, inline_threshold=0)
+
+        assert await pool.run(_slow_echo, 7, size=10**6) == 7
+        assert pool.stats()["inline"] == 1
+
+
+class TestLifespanCpuPool:
+    """lifespanによるプール管理のテスト"""
+
+    def test_pool_started_and_stopped_with_app(self, metrics_headers):
+        """起動時にプールが立ち上がり、メトリクスに表示されることを確認"""
+        pool = get_cpu_pool()
+
+        with TestClient(app) as client:
+            assert pool.started == (pool.workers > 0)
+            response = client.get("/api/metrics", headers=metrics_headers)
+            assert response.status_code == 200
+            assert response.json()["cpu_pool"]["workers"] == pool.workers
+
+        assert not pool.started
@@ -0,0 +1,258 @@
+"""
+============================================
+メタ広告審査チェッカー - クリエイティブアップロード単体テスト
+============================================
+"""
+
+import json
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from src.main import app
+from src.routes import check
+from src.utils import image as image_utils
+from src.utils import upload as upload_utils
+from src.utils.errors import FileSizeExceededError, UnsupportedMediaTypeError
+from src.utils.image import open_and_optimize_image
+from src.utils.upload import parse_creative_upload
+from tests.unit.conftest import image_bytes
+
+pytestmark = pytest.mark.unit
+
+BOUNDARY = "creative-boundary"
+
+
+def _multipart(fields: dict, image: bytes = None, filename: str = "ad.jpg") -> bytes:
+    """multipart/form-dataの本文を組み立てる"""
+    body = b""
+    for name, value in fields.items():
+        body += (
+            f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n{value}\r\n"
+        ).encode("utf-8")
+    if image is not None:
+        body += (
+            f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"image\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: application/octet-stream\r\n\r\n"
+        ).encode("utf-8") + image + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode("utf-8")
+
+
+async def _chunks(body: bytes, size: int = 64 * 1024, consumed: list = None):
+    """本文をチャンクに分けて流す（consumedに送出済みのチャンク数を記録）"""
+    for start in range(0, len(body), size):
+        if consumed is not None:
+            consumed.append(start)
+        yield body[start:start + size]
+
+
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+class TestParseCreativeUpload:
+    """マルチパートのストリーミング解析のテスト"""
+
+    async def test_parses_fields_and_small_image_in_memory(self):
+        """テキスト項目と画像を受信し、小さな画像はメモリに保持することを確認"""
+        image = image_bytes(64, 64, "PNG", pattern="gradient")
+        body = _multipart({"headline": "今だけ50%OFF", "cta": "購入する"}, image, "ad.png")
+
+        upload = await parse_creative_upload(CONTENT_TYPE, str(len(body)), _chunks(body, size=100))
+
+        assert upload.fields == {"headline": "今だけ50%OFF", "cta": "購入する"}
+        assert (upload.file.format, upload.file.filename, upload.file.size) == ("PNG", "ad.png", len(image))
+        assert upload.file.spool.source == image
+        upload.close()
+
+    @pytest.mark.parametrize("filename, image", [("", b""), ("ad.png", b"")])
+    async def test_treats_unselected_file_input_as_no_image(self, filename, image):
+        """ファイル未選択のファイル入力（空のfilename・0バイト）は画像なしとしてテキスト項目だけを受け付けることを確認"""
+        body = _multipart({"headline": "今だけ50%OFF"}, image, filename)
+
+        upload = await parse_creative_upload(CONTENT_TYPE, str(len(body)), _chunks(body))
+
+        assert upload.fields == {"headline": "今だけ50%OFF"}
+        assert upload.file is None
+
+    async def test_spools_large_image_to_disk(self, tmp_path, monkeypatch):
+        """閾値を超える画像はディスクに退避し、close()で削除することを確認"""
+        monkeypatch.setattr(upload_utils, "UPLOAD_SPOOL_THRESHOLD", 1024)
+        monkeypatch.setattr(upload_utils, "UPLOAD_SPOOL_DIR", str(tmp_path))
+        image = image_bytes(800, 600, "JPEG", pattern="gradient")
+        body = _multipart({}, image)
+
+        upload = await parse_creative_upload(CONTENT_TYPE, None, _chunks(body, size=700))
+
+        path = upload.file.spool.source
+        assert upload.file.spool.on_disk and upload.file.format == "JPEG"
+        with open(path, "rb") as f:
+            assert f.read() == image
+        upload.close()
+        assert not os.path.exists(path)
+
+    async def test_rejects_unsupported_format_before_reading_body(self, tmp_path, monkeypatch):
+        """先頭のマジックバイトが非対応なら、残りを受信せずに415にすることを確認"""
+        monkeypatch.setattr(upload_utils, "UPLOAD_SPOOL_DIR", str(tmp_path))
+        body = _multipart({}, b"GIF89a" + b"\x00" * 500_000, "ad.gif")
+        consumed = []
+
+        with pytest.raises(UnsupportedMediaTypeError):
+            await parse_creative_upload(CONTENT_TYPE, None, _chunks(body, size=4096, consumed=consumed))
+
+        assert len(consumed) == 1
+        assert os.listdir(tmp_path) == []
+
+    async def test_rejects_oversized_upload_while_streaming(self, tmp_path, monkeypatch):
+        """Content-Lengthがなくても上限を超えた時点で受信を打ち切ることを確認"""
+        monkeypatch.setattr(upload_utils, "UPLOAD_SPOOL_THRESHOLD", 1024)
+        monkeypatch.setattr(upload_utils, "UPLOAD_SPOOL_DIR", str(tmp_path))
+        body = _multipart({}, b"\xff\xd8\xff\xe0" + b"\x00" * 200_000)
+        consumed = []
+
+        with pytest.raises(FileSizeExceededError):
+            await parse_creative_upload(
+                CONTENT_TYPE, None, _chunks(body, size=10_000, consumed=consumed), max_size=50_000
+            )
+
+        assert len(consumed) < 10
+        assert os.listdir(tmp_path) == []
+
+    async def test_rejects_by_content_length(self):
+        """Content-Lengthが上限を大きく超える場合は本文を読まずに拒否することを確認"""
+        consumed = []
+
+        with pytest.raises(FileSizeExceededError):
+            await parse_creative_upload(CONTENT_TYPE, str(100 * 1024 * 1024), _chunks(b"x" * 10, consumed=consumed))
+
+        assert consumed == []
+
+
+class TestOpenAndOptimizeImage:
+    """1回のオープンでの検証・最適化のテスト"""
+
+    def test_opens_image_once(self, monkeypatch):
+        """形式・寸法の取得と最適化で画像を1回だけ開くことを確認"""
+        calls = []
+        real_open = image_utils.Image.open
+
+        def counting_open(*args, **kwargs):
+            calls.append(args)
+            return real_open(*args, **kwargs)
+
+        monkeypatch.setattr(image_utils.Image, "open", counting_open)
+
+        validated = open_and_optimize_image(image_bytes(2048, 1024, "JPEG", pattern="gradient"))
+
+        assert len(calls) == 1
+        assert (validated.format, validated.width, validated.height) == ("JPEG", 2048, 1024)
+        assert (validated.optimized.width, validated.optimized.height) == (1024, 512)
+        assert validated.optimized.b64 is not None
+
+    def test_pdf_first_page(self):
+        """PDFは1ページ目を描画して最適化することを確認"""
+        import fitz
+
+        document = fitz.open()
+        document.new_page(width=595, height=842).insert_text((72, 72), "Creative")
+        validated = open_and_optimize_image(document.tobytes())
+
+        assert validated.format == "PDF"
+        assert (validated.width, validated.height) == (724, 1024)
+        assert (validated.optimized.width, validated.optimized.height) == (724, 1024)
+
+
+class TestCreativeEndpoint:
+    """POST /api/check/creative のテスト"""
+
+    def test_reviews_uploaded_creative(self, monkeypatch):
+        """アップロード画像を最適化して審査に渡し、結果を返すことを確認"""
+        sent = {}
+
+        class FakeAnthropicService:
+            def __init__(self, *args, **kwargs):
+                pass
+
+            async def generate_content_with_retry(self, prompt, images=None, temperature=0.3, system=None, tool=None):
+                sent["prompt"], sent["images"] = prompt, images
+                return "{}"
+
+            async def parse_json_response(self, text):
+                return {"overall_score": 85, "status": "approved", "confidence": 0.9, "text_overlay_percentage": 0}
+
+        monkeypatch.setattr(check, "AnthropicService", FakeAnthropicService)
+        body = _multipart({"headline": "夏の新作"}, image_bytes(1600, 1600, "PNG", pattern="gradient"), "ad.png")
+
+        with TestClient(app) as client:
+            response = client.post("/api/check/creative", content=body, headers={"content-type": CONTENT_TYPE})
+
+        assert response.status_code == 200
+        assert response.json()["overall_score"] == 85
+        assert "夏の新作" in sent["prompt"]
+        image, = sent["images"]
+        assert (image.source, image.width, image.height) == ("upload", 1024, 1024)
+
+    def test_reviews_each_pdf_page(self, monkeypatch):
+        """複数ページのPDFはページごとに画像化して審査に渡すことを確認"""
+        import fitz
+
+        sent = {}
+
+        class FakeAnthropicService:
+            def __init__(self, *args, **kwargs):
+                pass
+
+            async def generate_content_with_retry(self, prompt, images=None, temperature=0.3, system=None, tool=None):
+                sent["images"] = images
+                return "{}"
+
+            async def parse_json_response(self, text):
+                return {"overall_score": 70, "status": "needs_review", "confidence": 0.8}
+
+        monkeypatch.setattr(check, "AnthropicService", FakeAnthropicService)
+        document = fitz.open()
+        for number in (1, 2):
+            document.new_page(width=595, height=842).insert_text((72, 72), f"Page {number}")
+        body = _multipart({}, document.tobytes(), "flyer.pdf")
+
+        with TestClient(app) as client:
+            response = client.post("/api/check/creative", content=body, headers={"content-type": CONTENT_TYPE})
+
+        assert response.status_code == 200
+        assert [image.url for image in sent["images"]] == ["upload:flyer.pdf#page=1", "upload:flyer.pdf#page=2"]
+        assert all((image.width, image.height) == (724, 1024) for image in sent["images"])
+
+    def test_reviews_text_without_selected_file(self, monkeypatch):
+        """ファイルを選択していないフォームの送信でも、テキストだけで審査することを確認"""
+        sent = {}
+
+        class FakeAnthropicService:
+            def __init__(self, *args, **kwargs):
+                pass
+
+            async def generate_content_with_retry(self, prompt, images=None, temperature=0.3, system=None, tool=None):
+                sent["prompt"], sent["images"] = prompt, images
+                return "{}"
+
+            async def parse_json_response(self, text):
+                return {"overall_score": 90, "status": "approved", "confidence": 0.9}
+
+        monkeypatch.setattr(check, "AnthropicService", FakeAnthropicService)
+        body = _multipart({"headline": "夏の新作", "description": "送料無料"}, b"", "")
+
+        with TestClient(app) as client:
+            response = client.post("/api/check/creative", content=body, headers={"content-type": CONTENT_TYPE})
+
+        assert response.status_code == 200
+        assert "夏の新作" in sent["prompt"] and not sent["images"]
+
+    def test_rejects_empty_request(self):
+        """テキストも画像もない場合は400になることを確認"""
+        with TestClient(app) as client:
+            response = client.post(
+                "/api/check/creative", content=_multipart({"headline": " "}), headers={"content-type": CONTENT_TYPE}
+            )
+
+        assert response.status_code == 400
+        assert json.loads(response.text)
@@ -0,0 +1,471 @@
+"""
+============================================
+メタ広告審査チェッカー - HTML抽出エンジン単体テスト
+============================================
+"""
+
+from typing import Dict, List
+from urllib.parse import urljoin
+
+import pytest
+from bs4 import BeautifulSoup, NavigableString, CData
+
+from src.utils.html_extractor import (
+    HERO_CLASS_KEYWORDS,
+    MAIN_EXCLUDED_TAGS,
+    TEXT_EXCLUDED_TAGS,
+    PageTextBuilder,
+    TextDedupIndex,
+    extract_images_from_json_data,
+    extract_page,
+)
+from src.utils.image import parse_srcset, select_image_source
+from src.utils.url_fetcher import PageData
+
+pytestmark = pytest.mark.unit
+
+BASE_URL = "https://example.com/lp/"
+
+SAMPLE_LP = """<!DOCTYPE html>
+<html lang="ja">
+<head>
+  <meta charset="utf-8">
+  <title>  限定キャンペーン | サンプルLP  </title>
+  <meta name="description" content="meta説明文">
+  <meta property="og:description" content="OGP説明文">
+  <meta property="og:image" content="/img/ogp.jpg">
+  <script>var hero = "<p>スクリプト内の文字列</p>";</script>
+</head>
+<body>
+  <header class="site-header">
+    <img src="/img/logo.png">
+    <nav><ul><li>トップページへ戻る</li><li>お問い合わせはこちら</li></ul></nav>
+  </header>
+  <section class="Hero first-view">
+    <h1>今だけ<strong>50%OFF</strong>の特別価格</h1>
+    <p>最短3日で効果を実感できる<!-- comment -->新習慣サプリメント</p>
+    <img data-src="/img/hero.jpg" width="1200px" height="600">
+  </section>
+  <div class="kv"><img src="/img/kv.webp"></div>
+  <noscript><img src="/img/noscript.jpg"></noscript>
+  <main>
+    <h2>選ばれる3つの理由</h2>
+    <p>国内工場で製造し、品質管理を徹底しています。<em>安心の品質</em></p>
+    <aside><p>サイドバーの段落は本文から除外されます。</p></aside>
+    <ul><li>初回限定で送料無料</li><li>いつでも解約OK</li></ul>
+    <img src="/img/large.png" width="640" height="480">
+    <img src="/img/small.jpg" width="80" height="80">
+    <footer><p>フッターの段落も本文から除外されます。</p><li>フッターのリスト項目</li></footer>
+  </main>
+  <div data-elements='[{"type": "image", "img_src": "\\/img\\/json.jpg"}]'></div>
+</body>
+</html>
+"""
+
+RESPONSIVE_LP = """<html><body>
+  <section class="hero">
+    <picture>
+      <source type="image/avif" srcset="/img/hero-1200.avif 1200w, /img/hero-3000.avif 3000w">
+      <source type="image/webp" srcset="/img/hero-640.webp 640w, /img/hero-1200.webp 1200w, /img/hero-3000.webp 3000w">
+      <img src="/img/hero-3000.jpg" width="1200" height="600">
+    </picture>
+  </section>
+  <img src="/img/placeholder.gif" data-srcset="/img/lazy-800.jpg 800w, /img/lazy-1600.jpg 1600w" width="800" height="400">
+  <img src="data:image/gif;base64,R0lGOD" data-lazy-src="/img/lazy-src.jpg" width="600" height="400">
+</body></html>
+"""
+
+
+# --------------------------------------------
+# Reference Implementation (BeautifulSoup版)
+# --------------------------------------------
+# html_extractor.extract_page の参照実装（パリティテストで結果の一致を検証）
+
+def _extract_metadata(soup: BeautifulSoup, base_url: str) -> PageData:
+    """
+    HTMLからメタデータを抽出
+
+    Args:
+        soup: BeautifulSoupオブジェクト
+        base_url: ベースURL（相対パス解決用）
+
+    Returns:
+        PageData: 抽出したメタデータ
+    """
+    page_data = PageData(url=base_url)
+
+    # タイトル取得（優先順位: og:title > title tag）
+    og_title = soup.find('meta', property='og:title')
+    if og_title and og_title.get('content'):
+        page_data.title = og_title['content']
+    else:
+        title_tag = soup.find('title')
+        if title_tag:
+            page_data.title = title_tag.get_text(strip=True)
+
+    # 説明文取得（優先順位: og:description > meta description）
+    og_desc = soup.find('meta', property='og:description')
+    if og_desc and og_desc.get('content'):
+        page_data.description = og_desc['content']
+    else:
+        meta_desc = soup.find('meta', attrs={'name': 'description'})
+        if meta_desc and meta_desc.get('content'):
+            page_data.description = meta_desc['content']
+
+    # OGP画像URL取得
+    og_image = soup.find('meta', property='og:image')
+    if og_image and og_image.get('content'):
+        image_url = og_image['content']
+        # 相対パスの場合は絶対パスに変換
+        page_data.og_image_url = urljoin(base_url, image_url)
+
+    return page_data
+
+
+def _picture_sources(img) -> List[Dict[str, str]]:
+    """<picture>内でimgより前にある<source>要素の属性（文書順、入れ子になった<source>の祖先も含む）"""
+    sources: List[Dict[str, str]] = []
+    node = img
+    while True:
+        sources.extend(sibling.attrs for sibling in node.find_previous_siblings('source'))
+        parent = node.parent
+        if parent is None:
+            return []
+        if parent.name == 'picture':
+            break
+        if parent.name != 'source':
+            return []
+        sources.append(parent.attrs)
+        node = parent
+    sources.reverse()
+    return sources
+
+
+def _extract_main_images(soup: BeautifulSoup, base_url: str, max_images: int = 2, html: str = None) -> List[str]:
+    """
+    LP内の主要画像URLを抽出
+
+    Args:
+        soup: BeautifulSoupオブジェクト
+        base_url: ベースURL（相対パス解決用）
+        max_images: 取得する最大画像数
+        html: 生のHTML文字列（JSON埋め込み画像抽出用）
+
+    Returns:
+        List[str]: 画像URLのリスト
+    """
+    image_urls = []
+
+    # 0. Vue.js/React等のJSON埋め込み画像を優先的に抽出
+    if html:
+        json_images = extract_images_from_json_data(html, base_url)
+        for img_url in json_images[:max_images]:
+            if img_url not in image_urls:
+                image_urls.append(img_url)
+                if len(image_urls) >= max_images:
+                    return image_urls
+
+    # 1. hero/mainセクション内の画像を優先
+    hero_selectors = [
+        'header img',
+        'section img',
+        '.hero img',
+        '.main-visual img',
+        '.mv img',
+        '.kv img',
+        '.top img',
+        '.banner img',
+        '[class*="hero"] img',
+        '[class*="main"] img',
+        '[class*="visual"] img',
+    ]
+
+    for selector in hero_selectors:
+        try:
+            for img in soup.select(selector)[:3]:
+                src = select_image_source(img.attrs, _picture_sources(img))
+                if src:
+                    full_url = urljoin(base_url, src)
+                    if full_url not in image_urls:
+                        image_urls.append(full_url)
+                        if len(image_urls) >= max_images:
+                            return image_urls
+        except Exception:
+            continue
+
+    # 2. 大きな画像を探す（width/height属性がある場合）
+    for img in soup.find_all('img')[:20]:
+        src = select_image_source(img.attrs, _picture_sources(img))
+        if not src:
+            continue
+
+        # サイズ属性をチェック
+        width = img.get('width', '')
+        height = img.get('height', '')
+        try:
+            w = int(str(width).replace('px', ''))
+            h = int(str(height).replace('px', ''))
+            if w >= 300 or h >= 200:  # 比較的大きな画像
+                full_url = urljoin(base_url, src)
+                if full_url not in image_urls:
+                    image_urls.append(full_url)
+                    if len(image_urls) >= max_images:
+                        return image_urls
+        except (ValueError, TypeError):
+            pass
+
+    # 3. それでも見つからない場合、最初の数枚の画像を取得
+    for img in soup.find_all('img')[:10]:
+        src = select_image_source(img.attrs, _picture_sources(img))
+        if src:
+            full_url = urljoin(base_url, src)
+            if full_url not in image_urls:
+                image_urls.append(full_url)
+                if len(image_urls) >= max_images:
+                    return image_urls
+
+    return image_urls
+
+
+def _extract_page_text(soup: BeautifulSoup, max_length: int = 5000) -> str:
+    """
+    HTMLから本文テキストを抽出（見出しタグを優先）
+
+    soupは変更しない（script等やメインコンテンツ内のnav等は走査時に読み飛ばす）。
+
+    Args:
+        soup: BeautifulSoupオブジェクト
+        max_length: 最大文字数
+
+    Returns:
+        str: 抽出したテキスト（構造化）
+    """
+    # メインコンテンツ（この内側の nav, footer, aside は段落・リスト項目の抽出から除外）
+    main_content = None
+    for name in ('main', 'article', 'body'):
+        main_content = next((e for e in soup.find_all(name) if not _in_excluded_tag(e)), None)
+        if main_content:
+            break
+
+    def is_removed(node) -> bool:
+        """メインコンテンツ内の nav, footer, aside（またはその内側）か"""
+        if main_content is None:
+            return False
+        in_unwanted = False
+        for ancestor in [node, *node.parents]:
+            if ancestor is main_content:
+                return in_unwanted
+            if ancestor.name in MAIN_EXCLUDED_TAGS:
+                in_unwanted = True
+        return False
+
+    def text_of(element, skip_removed: bool = False) -> str:
+        texts = []
+        for string in element.descendants:
+            if type(string) not in (NavigableString, CData):
+                continue
+            if _in_excluded_tag(string, stop=element) or (skip_removed and is_removed(string)):
+                continue
+            stripped = string.strip()
+            if stripped:
+                texts.append(stripped)
+        return ''.join(texts)
+
+    def visible(elements):
+        return [e for e in elements if not _in_excluded_tag(e)]
+
+    builder = PageTextBuilder(max_length)
+
+    def finish() -> str:
+        return builder.build()
+
+    # 1. 見出しタグを優先的に抽出（h1 > h2 > h3）
+    for tag in ['h1', 'h2', 'h3']:
+        for element in visible(soup.find_all(tag)):
+            text = text_of(element)
+            if text and len(text) > 2:  # 2文字以上のみ
+                builder.add(f"【{tag.upper()}】{text}")
+                if builder.exhausted:
+                    return finish()
+
+    # 2. headerやhero内のキャッチコピー（重要な広告文言が多い）
+    hero_sections = visible(soup.find_all(['header', 'section'], class_=lambda x: x and any(
+        keyword in str(x).lower() for keyword in HERO_CLASS_KEYWORDS
+    )))
+    for section in hero_sections[:3]:  # 最大3セクション
+        for p in visible(section.find_all(['p', 'span', 'div'], recursive=True)):
+            text = text_of(p)
+            if text and 5 < len(text) < 200:  # 短すぎず長すぎないテキスト
+                if builder.is_new(text):
+                    builder.add(f"【ヒーロー】{text}")
+                    if builder.exhausted:
+                        return finish()
+
+    # 3. 強調テキスト（strong, b, em）
+    for element in visible(soup.find_all(['strong', 'b', 'em']))[:20]:
+        text = text_of(element)
+        if text and 3 < len(text) < 100:
+            if builder.is_new(text):
+                builder.add(f"【強調】{text}")
+                if builder.exhausted:
+                    return finish()
+
+    # 4. メインコンテンツの段落テキスト
+    if main_content:
+        paragraphs = [p for p in visible(main_content.find_all('p')) if not is_removed(p)]
+        for p in paragraphs[:30]:  # 最大30段落
+            text = text_of(p, skip_removed=True)
+            if text and len(text) > 10:
+                if builder.is_new(text):
+                    builder.add(text)
+                    if builder.exhausted:
+                        return finish()
+
+    # 5. リスト項目（特徴や利点が書かれていることが多い）
+    list_items = [li for li in visible(soup.find_all('li')) if not is_removed(li)]
+    for li in list_items[:20]:
+        text = text_of(li, skip_removed=True)
+        if text and 5 < len(text) < 200:
+            if builder.is_new(text):
+                builder.add(f"・{text}")
+                if builder.exhausted:
+                    break
+
+    return finish()
+
+
+def _in_excluded_tag(node, stop=None) -> bool:
+    """script, style, noscript の内側か（stopより上の祖先は見ない）"""
+    for ancestor in node.parents:
+        if ancestor is stop:
+            return False
+        if ancestor.name in TEXT_EXCLUDED_TAGS:
+            return True
+    return False
+
+
+
+def _extract_with_beautifulsoup(html: str, base_url: str):
+    """BeautifulSoup版の参照実装で抽出"""
+    soup = BeautifulSoup(html, "lxml")
+    page_data = _extract_metadata(soup, base_url)
+    page_text = _extract_page_text(soup)
+    images = _extract_main_images(soup, base_url, max_images=10, html=html)
+    return page_data.title, page_data.description, page_data.og_image_url, images, page_text
+
+
+class TestExtractPageParity:
+    """BeautifulSoup版の抽出結果との一致テスト"""
+
+    @pytest.mark.parametrize("html", [
+        SAMPLE_LP,
+        "",
+        "<p>body only paragraph text</p>",
+        "<svg><title>svg title</title></svg><title>page title</title>",
+        "<html><body><main><nav><p>navigation paragraph</p></nav><p>main paragraph text</p></main>"
+        "<ul><li>list item outside main</li></ul></body></html>",
+        RESPONSIVE_LP,
+    ])
+    def test_matches_beautifulsoup_extraction(self, html):
+        """メタデータ・画像候補・構造化テキストがBeautifulSoup版と一致することを確認"""
+        extracted = extract_page(html, BASE_URL, max_images=10)
+
+        assert (
+            extracted.title,
+            extracted.description,
+            extracted.og_image_url,
+            extracted.image_candidates,
+            extracted.page_text,
+        ) == _extract_with_beautifulsoup(html, BASE_URL)
+
+    def test_extracts_sample_lp(self):
+        """代表的なLPから期待どおりの値が取れることを確認"""
+        extracted = extract_page(SAMPLE_LP, BASE_URL, max_images=10)
+
+        assert extracted.title == "限定キャンペーン | サンプルLP"
+        assert extracted.description == "OGP説明文"
+        assert extracted.og_image_url == "https://example.com/img/ogp.jpg"
+        assert extracted.image_candidates[:2] == [
+            "https://example.com/img/json.jpg",
+            "https://example.com/img/hero.jpg",
+        ]
+        assert "https://example.com/img/noscript.jpg" in extracted.image_candidates
+        assert "https://example.com/img/logo.png" not in extracted.image_candidates
+        assert "【H1】今だけ50%OFFの特別価格" in extracted.page_text
+        assert "スクリプト内の文字列" not in extracted.page_text
+        assert "サイドバーの段落" not in extracted.page_text
+        assert "・初回限定で送料無料" in extracted.page_text
+
+
+class TestTextDedupIndex:
+    """TextDedupIndex の包含判定テスト"""
+
+    def test_matches_joined_substring_check(self):
+        """連結文字列に対する `in` 判定（区切りを跨ぐ一致を含む）と同じ結果になることを確認"""
+        index = TextDedupIndex()
+        parts = []
+        for text in ["【H1】今だけ50%OFF", "初回限定キャンペーン", "送料無料", "ab", "cd"]:
+            index.add(text)
+            parts.append(text)
+
+        joined = " ".join(parts)
+        for query in ["今だけ50%OFF", "OFF 初回", "キャンペーン 送料", "b cd", "送料無料!", "未登場のテキスト", "ab"]:
+            assert (query in index) == (query in joined)
+
+
+class TestExtractPageText:
+    """構造化テキスト抽出のテスト"""
+
+    def test_does_not_mutate_soup(self):
+        """BeautifulSoup版がsoupを変更しないことを確認"""
+        soup = BeautifulSoup(SAMPLE_LP, "lxml")
+        before = str(soup)
+
+        _extract_page_text(soup)
+
+        assert str(soup) == before
+
+    @pytest.mark.parametrize("max_length", [20, 60, 100])
+    def test_respects_max_length(self, max_length):
+        """文字数予算で打ち切っても、切り詰め後の結果が変わらないことを確認"""
+        extracted = extract_page(SAMPLE_LP, BASE_URL, max_text_length=max_length)
+        full = extract_page(SAMPLE_LP, BASE_URL, max_text_length=100000)
+
+        assert extracted.page_text == full.page_text[:max_length] + "..."
+        assert extracted.page_text == _extract_page_text(BeautifulSoup(SAMPLE_LP, "lxml"), max_length)
+
+
+class TestResponsiveImages:
+    """srcset・<picture>・遅延読み込み属性からの画像URL選択テスト"""
+
+    def test_parses_srcset_with_commas_in_urls(self):
+        """URL内のカンマ（変換パラメータ・data:URL）を区切りと誤認しないことを確認"""
+        candidates = parse_srcset("/c_w,400/a.jpg 400w,/c_w,2000/a.jpg 2000w, data:image/gif;base64,R0l,GOD 2x")
+
+        assert [(c.url, c.width, c.density) for c in candidates] == [
+            ("/c_w,400/a.jpg", 400, None),
+            ("/c_w,2000/a.jpg", 2000, None),
+            ("data:image/gif;base64,R0l,GOD", None, 2.0),
+        ]
+
+    @pytest.mark.parametrize("attributes, expected", [
+        ({"srcset": "/a-640.jpg 640w, /a-1280.jpg 1280w, /a-3000.jpg 3000w", "src": "/a-3000.jpg"}, "/a-1280.jpg"),
+        ({"srcset": "/a-320.jpg 320w, /a-640.jpg 640w"}, "/a-640.jpg"),
+        ({"srcset": "/a.jpg, /a@2x.jpg 2x, /a@3x.jpg 3x", "width": "400"}, "/a@3x.jpg"),
+        ({"srcset": "/a.jpg, /a@2x.jpg 2x, /a@3x.jpg 3x", "width": "600"}, "/a@2x.jpg"),
+        ({"src": "/loading.gif", "data-src": "/real.jpg"}, "/real.jpg"),
+        ({"src": "/icon.png"}, None),
+    ])
+    def test_selects_smallest_variant_meeting_target(self, attributes, expected):
+        """目標寸法（1024px）以上の最小の候補を選び、なければ最大の候補・遅延読み込みURLを使うことを確認"""
+        assert select_image_source(attributes, target_dimension=1024) == expected
+
+    def test_extracts_responsive_candidates(self):
+        """<picture>では扱える形式の<source>を使い、遅延読み込みの実URLを採用することを確認"""
+        extracted = extract_page(RESPONSIVE_LP, BASE_URL, max_images=10)
+
+        assert extracted.image_candidates == [
+            "https://example.com/img/hero-1200.webp",
+            "https://example.com/img/lazy-1600.jpg",
+            "https://example.com/img/lazy-src.jpg",
+        ]
@@ -0,0 +1,98 @@
+"""
+============================================
+メタ広告審査チェッカー - 共有HTTPクライアント単体テスト
+============================================
+"""
+
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from src.main import app
+from src.utils.http_clients import HostLimitedTransport, PoolConfig, get_http_clients
+
+pytestmark = pytest.mark.unit
+
+
+class TestHostLimitedTransport:
+    """ホスト単位の接続数制限のテスト"""
+
+    async def test_limits_concurrency_per_host(self):
+        """同一ホストへの同時リクエスト数が上限を超えないことを確認"""
+        active = {"lp.example.com": 0, "cdn.example.com": 0}
+        peak = {"lp.example.com": 0, "cdn.example.com": 0}
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            host = request.url.host
+            active[host] += 1
+            peak[host] = max(peak[host], active[host])
+            await asyncio.sleep(0.01)
+            active[host] -= 1
+            return httpx.Response(200, content=b"ok")
+
+        config = PoolConfig(
+            name="test", max_connections=10, max_keepalive_connections=5,
+            keepalive_expiry=5.0, max_per_host=2, timeout=5.0,
+        )
+        transport = HostLimitedTransport(httpx.MockTransport(handler), config)
+        async with httpx.AsyncClient(transport=transport) as client:
+            urls = [f"https://{host}/{i}" for host in active for i in range(6)]
+            responses = await asyncio.gather(*(client.get(url) for url in urls))
+
+        assert all(response.status_code == 200 for response in responses)
+        assert peak == {"lp.example.com": 2, "cdn.example.com": 2}
+        stats = transport.stats()
+        assert stats["requests_total"] == 12
+        assert stats["in_flight"] == 0
+        assert stats["queued"] == 0
+
+    async def test_drops_idle_host_slots(self):
+        """リクエストが終わったホスト（待機を中断した場合を含む）の接続枠を保持し続けないことを確認"""
+        gate = asyncio.Event()
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.host == "slow.example.com":
+                await gate.wait()
+            return httpx.Response(200, content=b"ok")
+
+        config = PoolConfig(
+            name="test", max_connections=10, max_keepalive_connections=5,
+            keepalive_expiry=5.0, max_per_host=1, timeout=5.0,
+        )
+        transport = HostLimitedTransport(httpx.MockTransport(handler), config)
+        async with httpx.AsyncClient(transport=transport) as client:
+            await asyncio.gather(*(client.get(f"https://lp{i}.example.com/") for i in range(50)))
+            assert transport.stats()["active_hosts"] == 0
+
+            holding = asyncio.create_task(client.get("https://slow.example.com/a"))
+            waiting = asyncio.create_task(client.get("https://slow.example.com/b"))
+            await asyncio.sleep(0.01)
+            assert transport.stats()["active_hosts"] == 1 and transport.stats()["queued"] == 1
+            waiting.cancel()
+            gate.set()
+            await holding
+            with pytest.raises(asyncio.CancelledError):
+                await waiting
+
+        assert transport.stats()["active_hosts"] == 0
+
+
+class TestLifespanClients:
+    """lifespanによるクライアント管理のテスト"""
+
+    def test_clients_created_and_closed_with_app(self, monkeypatch, metrics_headers):
+        """起動時に共有クライアントが生成され、終了時に破棄されることを確認"""
+        monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+        registry = get_http_clients()
+
+        with TestClient(app) as client:
+            assert registry.started
+            response = client.get("/api/metrics", headers=metrics_headers)
+            assert response.status_code == 200
+            pools = response.json()["http_pools"]
+            assert set(pools) == {"page", "anthropic"}
+            assert pools["page"]["max_per_host"] > 0
+
+        assert not registry.started
@@ -0,0 +1,93 @@
+"""
+============================================
+メタ広告審査チェッカー - 画像トークン予算エンコーダー単体テスト
+============================================
+"""
+
+import io
+
+import pytest
+from PIL import Image, ImageDraw
+
+from src.utils.image_budget import (
+    ImageBudgetEncoder,
+    allocate_tokens,
+    estimate_image_tokens,
+    fit_images_to_budget,
+)
+from tests.unit.conftest import encode_image
+
+pytestmark = pytest.mark.unit
+
+
+def _photo(width: int, height: int) -> bytes:
+    """なめらかな写真相当の画像（エッジが少ない）"""
+    gradient = Image.linear_gradient("L").resize((width, height))
+    return encode_image(Image.merge("RGB", [gradient, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT), gradient]), "JPEG")
+
+
+def _text_banner(width: int, height: int) -> bytes:
+    """文字の多いバナー"""
+    image = Image.new("RGB", (width, height), (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    for row in range(0, height, 14):
+        draw.text((4, row), "LIMITED OFFER 50% OFF TODAY ONLY " * 6, fill=(0, 0, 0))
+    return encode_image(image)
+
+
+class TestAllocateTokens:
+    """予算配分のテスト"""
+
+    def test_redistributes_unused_share(self):
+        """必要量が配分より少ない画像の余りを他の画像に回すことを確認"""
+        assert allocate_tokens([200, 1400, 1400], [1.0, 1.0, 1.0], budget=2000) == [200, 900, 900]
+
+    def test_weights_favor_text_heavy_images(self):
+        """重みの大きい画像に多く配分し、最低トークン数を守ることを確認"""
+        allocation = allocate_tokens([1400, 1400], [3.0, 1.0], budget=1000, floor=300)
+
+        assert allocation == [750, 300]
+
+
+class TestFitImagesToBudget:
+    """予算に合わせたエンコードのテスト"""
+
+    def test_within_budget_is_untouched(self):
+        """予算内なら再エンコードせず元のまま送ることを確認"""
+        results = fit_images_to_budget([_photo(800, 600), _photo(600, 600)], budget=5000)
+
+        assert [result.data for result in results] == [None, None]
+        assert [result.tokens for result in results] == [estimate_image_tokens(800, 600), estimate_image_tokens(600, 600)]
+
+    def test_over_budget_gives_more_pixels_to_text(self):
+        """予算超過時は合計を予算付近に収め、文字の多い画像に多くの画素を残すことを確認"""
+        results = fit_images_to_budget([_photo(1024, 1024), _text_banner(1024, 1024)], budget=1600)
+
+        photo, banner = results
+        assert photo.data is not None and banner.data is not None
+        assert banner.text_density > photo.text_density
+        assert banner.tokens > photo.tokens
+        assert photo.tokens + banner.tokens <= 1600 + 2
+        assert Image.open(io.BytesIO(banner.data)).size == (banner.width, banner.height)
+
+    def test_oversized_image_is_capped(self):
+        """Claude側で縮小される長辺1568px超の画像は予算内でも事前に縮小することを確認"""
+        result, = fit_images_to_budget([_photo(3000, 1000)], budget=100000)
+
+        assert max(result.width, result.height) == 1568
+        assert result.tokens == result.original_tokens
+
+
+class TestImageBudgetEncoder:
+    """予算エンコーダーの集計テスト"""
+
+    async def test_reports_tokens_per_request(self):
+        """リクエストごとの推定トークン数と削減量を集計することを確認"""
+        encoder = ImageBudgetEncoder(budget=800)
+
+        results = await encoder.fit([_photo(1024, 1024), _photo(1024, 1024)])
+
+        stats = encoder.stats()
+        assert stats["requests"] == 1
+        assert stats["last_request_tokens"] == sum(result.tokens for result in results)
+        assert stats["tokens_saved"] == 2 * estimate_image_tokens(1024, 1024) - stats["last_request_tokens"]
@@ -0,0 +1,100 @@
+"""
+============================================
+メタ広告審査チェッカー - 画像の知覚ハッシュ・重複除外単体テスト
+============================================
+"""
+
+import httpx
+import pytest
+from PIL import Image, ImageDraw
+
+from src.utils.image_hash import dhash_bytes, find_near_duplicate, hamming_distance
+from src.utils.image_store import sha256_hex
+from src.utils.url_fetcher import _acquire_images, _optimize_variant
+from tests.unit.conftest import encode_image
+
+pytestmark = pytest.mark.unit
+
+
+def _hero(width: int, height: int) -> Image.Image:
+    """グラデーションに図形を重ねたメインビジュアル"""
+    gradient = Image.linear_gradient("L").resize((width, height))
+    image = Image.merge("RGB", [gradient, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT), gradient])
+    ImageDraw.Draw(image).ellipse([width // 6, height // 4, width // 2, height * 3 // 4], fill=(200, 30, 40))
+    return image
+
+
+def _banner(width: int, height: int) -> Image.Image:
+    """別の図柄のバナー"""
+    image = Image.new("RGB", (width, height), (250, 245, 235))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([0, 0, width // 2, height // 3], fill=(30, 90, 200))
+    draw.rectangle([width // 2, height * 2 // 3, width - 1, height - 1], fill=(20, 20, 20))
+    return image
+
+
+class TestDhash:
+    """差分ハッシュのテスト"""
+
+    def test_same_picture_in_other_size_and_format_is_near(self):
+        """同じ画像の縮小版・別形式はハミング距離が小さく、別の画像は大きいことを確認"""
+        original = dhash_bytes(encode_image(_hero(1200, 800), "JPEG"))
+        thumbnail = dhash_bytes(encode_image(_hero(1200, 800).resize((300, 200)), "WEBP"))
+        other = dhash_bytes(encode_image(_banner(1200, 800), "PNG"))
+
+        assert hamming_distance(original, thumbnail) <= 10
+        assert hamming_distance(original, other) > 10
+        assert find_near_duplicate(thumbnail, [other, original]) == 1
+        assert find_near_duplicate(other, [original]) is None
+
+    def test_unreadable_data_has_no_hash(self):
+        """画像として読めないデータはハッシュなし（重複判定しない）になることを確認"""
+        assert dhash_bytes(b"not an image") is None
+        assert find_near_duplicate(None, [None]) is None
+
+
+class TestAcquireDistinctImages:
+    """_acquire_images の重複除外テスト"""
+
+    async def test_keeps_highest_resolution_and_promotes_next(self, isolated_image_store):
+        """ほぼ同一の画像は解像度の高い方を残し、空いた枠に次の候補を繰り上げることを確認"""
+        bodies = {
+            "/og.jpg": encode_image(_hero(600, 400), "JPEG"),
+            "/hero.jpg": encode_image(_hero(1200, 800), "JPEG"),
+            "/banner.png": encode_image(_banner(800, 400), "PNG"),
+        }
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, content=bodies[request.url.path], headers={"content-type": "image/jpeg"})
+
+        candidates = [
+            ("https://lp.example.com/og.jpg", "ogp"),
+            ("https://lp.example.com/hero.jpg", "main"),
+            ("https://lp.example.com/banner.png", "main"),
+        ]
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            images, reports = await _acquire_images(client, candidates, target_count=2)
+
+        assert [(image.url, image.source) for image in images] == [
+            ("https://lp.example.com/hero.jpg", "ogp"),
+            ("https://lp.example.com/banner.png", "main"),
+        ]
+        assert images[0].width == 1024
+        dropped = {report.url: report for report in reports if not report.accepted}
+        assert list(dropped) == ["https://lp.example.com/og.jpg"]
+        assert dropped["https://lp.example.com/og.jpg"].reason == "near_duplicate"
+        assert dropped["https://lp.example.com/og.jpg"].duplicate_of == "https://lp.example.com/hero.jpg"
+
+    async def test_hash_is_stored_with_optimized_image(self, isolated_image_store):
+        """知覚ハッシュが最適化済み画像と一緒に画像ストアへ保存されることを確認"""
+        body = encode_image(_banner(800, 400), "PNG")
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, content=body, headers={"content-type": "image/png"})
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            _, reports = await _acquire_images(client, [("https://lp.example.com/banner.png", "main")])
+
+        stored = await isolated_image_store.get_object(sha256_hex(body), _optimize_variant(1024))
+        assert stored.dhash is not None
+        assert stored.dhash == reports[0].dhash
@@ -0,0 +1,77 @@
+"""
+============================================
+メタ広告審査チェッカー - 画像最適化単体テスト
+============================================
+"""
+
+import io
+
+import pytest
+from PIL import Image, ImageDraw
+
+from src.utils.image import optimize_image
+from tests.unit.conftest import encode_image
+
+pytestmark = pytest.mark.unit
+
+
+def _photo(width: int, height: int) -> Image.Image:
+    """色数の多い写真相当の画像"""
+    gradient = Image.linear_gradient("L").resize((width, height))
+    return Image.merge("RGB", [
+        Image.blend(Image.effect_noise((width, height), 40), gradient, 0.6),
+        Image.effect_noise((width, height), 50),
+        gradient.transpose(Image.Transpose.ROTATE_180),
+    ])
+
+
+def _banner(width: int, height: int) -> Image.Image:
+    """ベタ塗りのバナー"""
+    image = Image.new("RGB", (width, height), (250, 245, 235))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([0, 0, width, height // 4], fill=(200, 30, 40))
+    draw.rectangle([width // 4, height // 2, width // 2, height - 1], fill=(30, 90, 200))
+    return image
+
+
+class TestOptimizeImage:
+    """縮小デコードと内容別エンコードのテスト"""
+
+    @pytest.mark.parametrize("image_format", ["JPEG", "PNG"])
+    def test_photo_is_resized_and_encoded_as_jpeg(self, image_format):
+        """写真は元の形式にかかわらず最大寸法に縮小してJPEGで出力することを確認"""
+        data = encode_image(_photo(1536, 1024), image_format)
+
+        optimized = optimize_image(data, max_dimension=1024)
+
+        assert optimized.media_type == "image/jpeg"
+        assert (optimized.width, optimized.height) == (1024, 682)
+        assert Image.open(io.BytesIO(optimized.data)).size == (1024, 682)
+        assert len(optimized.data) < len(data)
+
+    def test_flat_image_is_lossless_png(self):
+        """ベタ塗り画像はパレットPNGで劣化なく出力することを確認"""
+        banner = _banner(800, 400)
+
+        optimized = optimize_image(encode_image(banner, "PNG"))
+
+        assert optimized.media_type == "image/png"
+        assert Image.open(io.BytesIO(optimized.data)).convert("RGB").tobytes() == banner.tobytes()
+
+    def test_transparent_image_keeps_alpha(self):
+        """透過画像は透過を保ったまま出力することを確認"""
+        image = Image.new("RGBA", (1600, 1600), (0, 0, 0, 0))
+        ImageDraw.Draw(image).ellipse([100, 100, 1500, 1500], fill=(240, 180, 20, 255))
+
+        optimized = optimize_image(encode_image(image, "PNG"), max_dimension=1024)
+
+        decoded = Image.open(io.BytesIO(optimized.data))
+        assert optimized.media_type in ("image/png", "image/webp")
+        assert decoded.size == (1024, 1024)
+        assert decoded.convert("RGBA").getchannel("A").getextrema()[0] == 0
+
+    def test_invalid_data_returns_original(self):
+        """画像として読めないデータは元データのまま返すことを確認"""
+        optimized = optimize_image(b"not an image")
+
+        assert optimized.data == b"not an image"
@@ -0,0 +1,142 @@
+"""
+============================================
+メタ広告審査チェッカー - 画像ヘッダープローブ単体テスト
+============================================
+"""
+
+import httpx
+import pytest
+
+from src.utils import url_fetcher
+from src.utils.image_probe import parse_image_header, probe_image, rank_image_candidates
+from tests.unit.conftest import image_bytes
+
+pytestmark = pytest.mark.unit
+
+
+def _range_handler(images: dict, requests: list):
+    """Rangeリクエストに206で応答するモックサーバー"""
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append((request.url.path, request.headers.get("range")))
+        data = images.get(request.url.path)
+        if data is None:
+            return httpx.Response(404)
+        range_header = request.headers.get("range")
+        if range_header:
+            end = int(range_header.split("-")[1])
+            return httpx.Response(
+                206,
+                content=data[:end + 1],
+                headers={"content-range": f"bytes 0-{min(end, len(data) - 1)}/{len(data)}"},
+            )
+        return httpx.Response(200, content=data, headers={"content-type": "image/png"})
+
+    return handler
+
+
+class TestParseImageHeader:
+    """画像ヘッダーの解析テスト"""
+
+    @pytest.mark.parametrize("image_format, options", [
+        ("PNG", {}),
+        ("JPEG", {}),
+        ("JPEG", {"progressive": True, "exif": b"Exif\x00\x00" + b"\x00" * 4000}),
+        ("GIF", {}),
+        ("WEBP", {}),
+        ("WEBP", {"lossless": True}),
+    ])
+    def test_reads_dimensions(self, image_format, options):
+        """各形式の先頭数KBから寸法を読み取れることを確認"""
+        data = image_bytes(1200, 628, image_format, **options)
+
+        header = parse_image_header(data[:16 * 1024])
+
+        assert (header.width, header.height) == (1200, 628)
+        assert header.format == image_format.lower()
+
+    def test_returns_none_for_unknown_data(self):
+        """画像でないデータ・途中で切れたヘッダーはNoneになることを確認"""
+        assert parse_image_header(b"<html></html>") is None
+        assert parse_image_header(image_bytes(100, 100, "PNG")[:12]) is None
+
+
+class TestProbeAndRank:
+    """プローブと順位付けのテスト"""
+
+    async def test_probe_uses_range_request(self):
+        """Rangeリクエストで先頭だけを取得し、全体サイズを読み取ることを確認"""
+        data = image_bytes(800, 800, "PNG")
+        requests = []
+        async with httpx.AsyncClient(transport=httpx.MockTransport(_range_handler({"/a.png": data}, requests))) as client:
+            result = await probe_image(client, "https://lp.example.com/a.png", probe_bytes=1024)
+
+        assert requests == [("/a.png", "bytes=0-1023")]
+        assert (result.header.width, result.header.height) == (800, 800)
+        assert result.total_size == len(data)
+
+    async def test_ranks_by_area_and_aspect_ratio(self):
+        """大きく縦横比が標準的な画像が上位、バッジ・細長い帯・取得失敗が下位になることを確認"""
+        images = {
+            "/badge.png": image_bytes(120, 120, "PNG"),
+            "/strip.png": image_bytes(1600, 200, "PNG"),
+            "/hero.jpg": image_bytes(1200, 800, "JPEG"),
+            "/medium.webp": image_bytes(600, 600, "WEBP"),
+        }
+        urls = [f"https://lp.example.com{path}" for path in [*images, "/missing.png"]]
+        requests = []
+        async with httpx.AsyncClient(transport=httpx.MockTransport(_range_handler(images, requests))) as client:
+            ranked = await rank_image_candidates(client, urls)
+
+        assert [result.url.rsplit("/", 1)[1] for result in ranked] == [
+            "hero.jpg", "medium.webp", "strip.png", "badge.png", "missing.png",
+        ]
+        assert ranked[-1].error == "http_error"
+
+    async def test_fetch_page_data_downloads_only_top_candidates(self, monkeypatch):
+        """fetch_page_data がプローブ上位の候補だけを全体ダウンロードすることを確認"""
+        images = {f"/img{i}.png": image_bytes(100 + i * 100, 100 + i * 100, "PNG", pattern=i) for i in range(6)}
+        html = "<html><body>" + "".join(f'<img src="{path}">' for path in images) + "</body></html>"
+        requests = []
+        image_handler = _range_handler(images, requests)
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/probe-lp":
+                return httpx.Response(200, text=html, headers={"content-type": "text/html"})
+            return await image_handler(request)
+
+        monkeypatch.setattr(url_fetcher, "IMAGE_PROBE_TOP_N", 2)
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            page_data = await url_fetcher.fetch_page_data("https://lp.example.com/probe-lp", client=client)
+
+        full_downloads = [path for path, range_header in requests if range_header is None]
+        assert sorted(full_downloads) == ["/img4.png", "/img5.png"]
+        assert [image.url for image in page_data.images] == [
+            "https://lp.example.com/img5.png", "https://lp.example.com/img4.png",
+        ]
+        assert sum(report.reason == "ranked_out" for report in page_data.image_reports) == 4
+
+    async def test_repeat_fetch_ranks_from_image_store(self, monkeypatch):
+        """同じLPの再チェックでは画像ストアの寸法で順位付けし、プローブもダウンロードもしないことを確認"""
+        images = {f"/img{i}.png": image_bytes(100 + i * 100, 100 + i * 100, "PNG", pattern=i) for i in range(6)}
+        html = "<html><body>" + "".join(f'<img src="{path}">' for path in images) + "</body></html>"
+        requests = []
+        image_handler = _range_handler(images, requests)
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/repeat-lp":
+                return httpx.Response(200, text=html, headers={"content-type": "text/html", "cache-control": "max-age=600"})
+            response = await image_handler(request)
+            response.headers["cache-control"] = "max-age=3600"
+            return response
+
+        monkeypatch.setattr(url_fetcher, "IMAGE_PROBE_TOP_N", 2)
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            first = await url_fetcher.fetch_page_data("https://lp.example.com/repeat-lp", client=client)
+            assert len(requests) == 8
+            requests.clear()
+            second = await url_fetcher.fetch_page_data("https://lp.example.com/repeat-lp", client=client)
+
+        assert requests == []
+        assert [image.url for image in second.images] == [image.url for image in first.images]
+        assert sum(report.reason == "ranked_out" for report in second.image_reports) == 4
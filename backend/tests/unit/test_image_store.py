@@ -0,0 +1,61 @@
+"""
+============================================
+メタ広告審査チェッカー - 画像ストア単体テスト
+============================================
+"""
+
+import os
+
+import pytest
+
+from src.utils import image_store
+from src.utils.image import OptimizedImage
+from src.utils.image_store import ImageStore, UrlRecord
+
+pytestmark = pytest.mark.unit
+
+
+def _image(size: int) -> OptimizedImage:
+    data = bytes(size)
+    return OptimizedImage(data=data, media_type="image/jpeg", width=10, height=10)
+
+
+class TestImageStore:
+    """ディスク画像ストアのテスト"""
+
+    async def test_round_trip_and_overwrite_counted_once(self, tmp_path):
+        """保存した画像を読み出せ、同じ記録の上書きで容量を二重に数えないことを確認"""
+        store = ImageStore(root=str(tmp_path), max_bytes=10 * 1024 * 1024, enabled=True)
+        record = UrlRecord(url="https://cdn.example.com/a.jpg", sha256="ab" * 32)
+
+        await store.put_object(record.sha256, "w1024", _image(1000), 5000)
+        await store.put_url(record)
+        total = store.stats()["bytes"]
+        await store.put_url(record)
+
+        assert store.stats()["bytes"] == total
+        assert (await store.get_url(record.url)).sha256 == record.sha256
+        assert (await store.get_object(record.sha256, "w1024")).data == bytes(1000)
+
+    async def test_evicts_least_recently_used_without_rescanning(self, tmp_path, monkeypatch):
+        """容量超過時は索引からアクセスの古い順に削除し、ディレクトリを再走査しないことを確認"""
+        seeded = ImageStore(root=str(tmp_path), max_bytes=10 * 1024 * 1024, enabled=True)
+        for name in ("a", "b"):
+            await seeded.put_object(name * 64, "w1024", _image(3000), 3000)
+        size = seeded.stats()["bytes"] // 2
+
+        # 再起動後のストア: 最初の書き込みで1回だけ既存のファイルを走査する
+        store = ImageStore(root=str(tmp_path), max_bytes=int(size * 2.5), enabled=True)
+        os.utime(os.path.join(str(tmp_path), "objects", "aa", f"{'a' * 64}-w1024.json"), (1, 1))
+        await store.put_object("c" * 64, "w1024", _image(3000), 3000)
+        assert await store.get_object("a" * 64, "w1024") is None
+
+        monkeypatch.setattr(image_store.os, "walk", lambda *args, **kwargs: pytest.fail("rescanned"))
+        await store.get_object("b" * 64, "w1024")
+        await store.put_object("d" * 64, "w1024", _image(3000), 3000)
+
+        # 直前に読み込んだbは残り、cが削除される
+        assert await store.get_object("b" * 64, "w1024") is not None
+        assert await store.get_object("c" * 64, "w1024") is None
+        assert store.stats()["evictions"] == 2
+        assert store.stats()["bytes"] <= store.max_bytes
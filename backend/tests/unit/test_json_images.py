@@ -0,0 +1,80 @@
+"""
+============================================
+メタ広告審査チェッカー - 埋め込みJSON画像スキャナー単体テスト
+============================================
+"""
+
+import json
+
+import pytest
+
+from src.utils import json_images
+from src.utils.json_images import extract_images_from_json_data
+
+pytestmark = pytest.mark.unit
+
+BASE_URL = "https://lp.example.com/"
+
+
+def _vue_attribute(data) -> str:
+    return "<div v-bind:data='" + json.dumps(data).replace('"', "&quot;") + "'></div>"
+
+
+class TestExtractImagesFromJsonData:
+    """extract_images_from_json_data のテスト"""
+
+    def test_extracts_utage_image_elements(self):
+        """Vue.js属性の image / image-text 要素を文書順・重複なしで抽出することを確認"""
+        html = _vue_attribute({"elements": [
+            {"type": "image", "img_src": "https:\\/\\/cdn.example.com\\/hero.jpg"},
+            {"type": "text", "content": "テキスト"},
+            {"type": "image-text", "img_src": "/profile.png", "children": [
+                {"type": "image", "img_src": "/hero.jpg"},
+                {"type": "image", "img_src": "/logo.png"},
+            ]},
+            {"type": "image", "img_src": "https://cdn.example.com/hero.jpg"},
+        ]})
+
+        assert extract_images_from_json_data(html, BASE_URL) == [
+            "https://cdn.example.com/hero.jpg",
+            "https://lp.example.com/profile.png",
+            "https://lp.example.com/hero.jpg",
+        ]
+
+    def test_extracts_json_ld_and_app_state(self):
+        """JSON-LD・__NEXT_DATA__・Nuxt 2の__NUXT__から画像URLを抽出することを確認"""
+        json_ld = {"@type": "Product", "image": [
+            "/product.jpg", {"@type": "ImageObject", "url": "/product-2.webp"},
+        ]}
+        next_data = {"props": {"pageProps": {"hero": {"src": "/_next/static/hero.png"}, "label": "/about"}}}
+        html = (
+            '<script id="__NEXT_DATA__" type="application/json">' + json.dumps(next_data) + "</script>"
+            '<script type="application/ld+json">' + json.dumps(json_ld) + "</script>"
+            '<script>window.__NUXT__=(function(a){return {img:"\\u002Fnuxt\\u002Fkv.jpg"}}(1));</script>'
+        )
+
+        assert extract_images_from_json_data(html, BASE_URL) == [
+            "https://lp.example.com/product.jpg",
+            "https://lp.example.com/product-2.webp",
+            "https://lp.example.com/_next/static/hero.png",
+            "https://lp.example.com/nuxt/kv.jpg",
+        ]
+
+    def test_stops_at_limit(self):
+        """上限に達したら以降のブロックを解析しないことを確認"""
+        first = _vue_attribute([{"type": "image", "img_src": f"/a{i}.jpg"} for i in range(5)])
+        broken = "<div :data='{not json'></div>"
+
+        assert extract_images_from_json_data(first + broken, BASE_URL, limit=3) == [
+            "https://lp.example.com/a0.jpg",
+            "https://lp.example.com/a1.jpg",
+            "https://lp.example.com/a2.jpg",
+        ]
+
+    def test_skips_blobs_over_size_cap(self, monkeypatch):
+        """サイズ上限を超えるJSONブロックは解析しないことを確認"""
+        monkeypatch.setattr(json_images, "EMBEDDED_JSON_MAX_CHARS", 100)
+        small = _vue_attribute([{"type": "image", "img_src": "/small.jpg"}])
+        large = _vue_attribute([{"type": "image", "img_src": f"/large{i}.jpg"} for i in range(20)])
+
+        assert extract_images_from_json_data(large + small, BASE_URL) == ["https://lp.example.com/small.jpg"]
@@ -0,0 +1,72 @@
+"""
+============================================
+メタ広告審査チェッカー - JSON逐次解析単体テスト
+============================================
+"""
+
+import json
+import random
+
+import pytest
+
+from src.utils.json_stream import IncrementalJsonParser
+
+pytestmark = pytest.mark.unit
+
+RESPONSE = {
+    "overall_score": 45,
+    "status": "needs_review",
+    "confidence": 0.85,
+    "violations": [
+        {"category": "misleading", "severity": "high", "description": "「100%保証」は断定表現です。{注意}", "location": "text"},
+        {"category": "text_overlay", "severity": "medium", "description": "引用符\"と\\記号", "location": "image"},
+    ],
+    "recommendations": [{"target": "text", "suggestions": ["安心保証付き", "詳細を見る"], "title": "見出しを修正"}],
+    "text_overlay_percentage": 35,
+    "nsfw_detected": False,
+    "prohibited_content": [],
+    "image_improvement": None,
+}
+
+
+def _feed_in_chunks(text: str, seed: int):
+    rng = random.Random(seed)
+    parser = IncrementalJsonParser(array_keys=("violations", "recommendations"))
+    events, position = [], 0
+    while position < len(text):
+        size = rng.randint(1, 12)
+        events += parser.feed(text[position:position + size])
+        position += size
+    return parser, events
+
+
+class TestIncrementalJsonParser:
+    """逐次解析のテスト"""
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_matches_full_parse(self, seed):
+        """チャンクの分かれ方によらず、完全な解析と同じ値を出現順に返すことを確認"""
+        text = "```json\n" + json.dumps(RESPONSE, ensure_ascii=False, indent=2) + "\n```"
+
+        parser, events = _feed_in_chunks(text, seed)
+
+        assert parser.finished
+        assert {e.key: e.value for e in events if e.kind == "field"} == RESPONSE
+        assert [(e.index, e.value) for e in events if e.kind == "item" and e.key == "violations"] == list(
+            enumerate(RESPONSE["violations"])
+        )
+        assert [e.key for e in events][:4] == ["overall_score", "status", "confidence", "violations"]
+
+    def test_emits_items_before_array_closes(self):
+        """配列の要素は、配列全体が閉じる前に確定した時点で返すことを確認"""
+        parser = IncrementalJsonParser(array_keys=("violations",))
+
+        first = parser.feed('{"overall_score": 80, "violations": [{"category": "nsfw"}, {"cat')
+        second = parser.feed('egory": "misleading"}]}')
+
+        assert [(e.kind, e.key, e.value) for e in first] == [
+            ("field", "overall_score", 80),
+            ("item", "violations", {"category": "nsfw"}),
+        ]
+        assert [(e.kind, e.index) for e in second] == [("item", 1), ("field", None)]
+        assert parser.finished
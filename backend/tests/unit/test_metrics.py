@@ -0,0 +1,41 @@
+"""
+============================================
+メタ広告審査チェッカー - メトリクスエンドポイント単体テスト
+============================================
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.main import app
+from src.routes import metrics
+
+pytestmark = pytest.mark.unit
+
+
+class TestMetricsAccess:
+    """GET /api/metrics の参照制限のテスト"""
+
+    def test_disabled_without_key(self, monkeypatch):
+        """METRICS_API_KEY が未設定の場合は404を返すことを確認"""
+        monkeypatch.setattr(metrics, "METRICS_API_KEY", "")
+
+        with TestClient(app) as client:
+            response = client.get("/api/metrics", headers={"X-Admin-Key": ""})
+
+        assert response.status_code == 404
+
+    def test_requires_matching_key(self, metrics_headers):
+        """キーがない・一致しない場合は401、X-Admin-Key・Bearerで一致する場合は200を返すことを確認"""
+        key = metrics_headers["X-Admin-Key"]
+
+        with TestClient(app) as client:
+            missing = client.get("/api/metrics")
+            wrong = client.get("/api/metrics", headers={"X-Admin-Key": "wrong"})
+            by_header = client.get("/api/metrics", headers=metrics_headers)
+            by_bearer = client.get("/api/metrics", headers={"Authorization": f"Bearer {key}"})
+
+        assert (missing.status_code, wrong.status_code) == (401, 401)
+        assert missing.headers["WWW-Authenticate"] == "Bearer"
+        assert (by_header.status_code, by_bearer.status_code) == (200, 200)
+        assert "rate_limit" in by_bearer.json()
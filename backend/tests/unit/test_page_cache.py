@@ -0,0 +1,152 @@
+"""
+============================================
+メタ広告審査チェッカー - LPキャッシュ単体テスト
+============================================
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from src.utils import page_cache, url_fetcher
+from src.utils.page_cache import (
+    PageCache,
+    canonicalize_url,
+    compute_cache_policy,
+    get_page_cache,
+)
+
+pytestmark = pytest.mark.unit
+
+LP_HTML = """<html><head>
+    <meta property="og:title" content="キャッシュテスト">
+    <meta property="og:description" content="説明文">
+</head><body><h1>今だけ特別価格でご提供</h1></body></html>"""
+
+
+@pytest.fixture(autouse=True)
+def clear_page_cache():
+    cache = get_page_cache()
+    cache.clear()
+    yield
+    cache.clear()
+
+
+class TestCanonicalizeUrl:
+    """URL正規化のテスト"""
+
+    def test_normalizes_host_port_fragment_and_tracking(self):
+        url = "HTTPS://LP.Example.com:443/offer?utm_source=fb&b=2&a=1&fbclid=xyz#section"
+        assert canonicalize_url(url) == "https://lp.example.com/offer?a=1&b=2"
+
+    def test_keeps_non_default_port(self):
+        assert canonicalize_url("http://lp.example.com:8080") == "http://lp.example.com:8080/"
+
+
+class TestCachePolicy:
+    """キャッシュ方針算出のテスト"""
+
+    def test_max_age(self):
+        policy = compute_cache_policy({"cache-control": "public, max-age=600", "age": "100"}, now=1000.0)
+        assert policy.storable
+        assert policy.fresh_until == 1500.0
+
+    def test_no_store(self):
+        policy = compute_cache_policy({"cache-control": "no-store", "etag": '"v1"'}, now=1000.0)
+        assert not policy.storable
+
+    def test_no_cache_with_validator_is_stored_but_stale(self):
+        policy = compute_cache_policy({"cache-control": "no-cache", "etag": '"v1"'}, now=1000.0)
+        assert policy.storable
+        assert policy.fresh_until == 1000.0
+
+    def test_stale_while_revalidate_directive(self):
+        policy = compute_cache_policy({"cache-control": "max-age=60, stale-while-revalidate=30"}, now=0.0)
+        assert (policy.fresh_until, policy.stale_until) == (60.0, 90.0)
+
+
+class TestPageCacheEviction:
+    """LRU破棄のテスト"""
+
+    def test_evicts_least_recently_used(self):
+        cache = PageCache(max_entries=2, max_bytes=10_000)
+        policy = compute_cache_policy({"cache-control": "max-age=60"})
+        page = url_fetcher.PageData(url="https://lp.example.com/")
+        cache.put("a", "a", page, policy)
+        cache.put("b", "b", page, policy)
+        cache.get("a")
+        cache.put("c", "c", page, policy)
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.stats()["evictions"] == 1
+
+
+class TestFetchWithCache:
+    """fetch_page_data のキャッシュ利用テスト"""
+
+    async def test_revalidates_with_etag(self):
+        """2回目は条件付きGETで304を受け、解析済みデータを再利用することを確認"""
+        requests = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            if request.headers.get("if-none-match") == '"v1"':
+                return httpx.Response(304, headers={"etag": '"v1"'})
+            return httpx.Response(
+                200, text=LP_HTML,
+                headers={"content-type": "text/html; charset=utf-8", "etag": '"v1"', "cache-control": "no-cache"},
+            )
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            first = await url_fetcher.fetch_page_data("https://lp.example.com/?utm_source=a", client=client)
+            second = await url_fetcher.fetch_page_data("https://lp.example.com/?utm_source=b", client=client)
+
+        assert first.cache_status == "miss"
+        assert second.cache_status == "revalidated"
+        assert second.title == "キャッシュテスト"
+        assert second.page_text == first.page_text
+        assert len(requests) == 2
+        assert get_page_cache().stats()["revalidated"] == 1
+
+    async def test_fresh_entry_skips_network(self):
+        """鮮度内のエントリはネットワークアクセスなしで返却されることを確認"""
+        requests = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            return httpx.Response(
+                200, text=LP_HTML,
+                headers={"content-type": "text/html; charset=utf-8", "cache-control": "max-age=300"},
+            )
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            await url_fetcher.fetch_page_data("https://lp.example.com/fresh", client=client)
+            second = await url_fetcher.fetch_page_data("https://lp.example.com/fresh", client=client)
+
+        assert second.cache_status == "hit"
+        assert len(requests) == 1
+
+    async def test_background_revalidation_not_counted_as_lookup(self, monkeypatch):
+        """裏での再検証はヒット率の分母に含めず、stale返却の1回だけを数えることを確認"""
+        cache = PageCache(stale_while_revalidate=True)
+        monkeypatch.setattr(page_cache, "_page_cache", cache)
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if request.headers.get("if-none-match") == '"v1"':
+                return httpx.Response(304, headers={"etag": '"v1"'})
+            return httpx.Response(
+                200, text=LP_HTML,
+                headers={"content-type": "text/html; charset=utf-8", "etag": '"v1"', "cache-control": "max-age=0"},
+            )
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            await url_fetcher.fetch_page_data("https://lp.example.com/swr", client=client)
+            second = await url_fetcher.fetch_page_data("https://lp.example.com/swr", client=client)
+            await asyncio.gather(*url_fetcher._background_tasks)
+
+        stats = cache.stats()
+        assert second.cache_status == "stale"
+        assert (stats["misses"], stats["stale_hits"], stats["revalidated"], stats["background_revalidations"]) == (1, 1, 0, 1)
+        assert stats["hit_ratio"] == 0.5
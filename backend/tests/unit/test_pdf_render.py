@@ -0,0 +1,118 @@
+"""
+============================================
+メタ広告審査チェッカー - PDFクリエイティブ描画単体テスト
+============================================
+"""
+
+import io
+
+import fitz
+import pytest
+from PIL import Image
+
+from src.utils.errors import ValidationError
+from src.utils.image import convert_pdf_to_image, process_and_validate_image, encode_image_to_base64
+from src.utils import pdf_render
+from src.utils.pdf_render import PdfRenderer, choose_render_dpi, inspect_pdf
+
+pytestmark = pytest.mark.unit
+
+A4 = (595, 842)
+
+
+def _pdf_bytes(page_count: int, size=A4) -> bytes:
+    """ページごとに異なる文字を描いたPDF"""
+    document = fitz.open()
+    for number in range(1, page_count + 1):
+        page = document.new_page(width=size[0], height=size[1])
+        page.insert_text((72, 72 * number), f"Page {number}: 100% guaranteed", fontsize=24)
+    return document.tobytes()
+
+
+class TestChooseRenderDpi:
+    """描画DPIの選択のテスト"""
+
+    def test_targets_long_edge(self):
+        """長辺が1024pxになるDPIを選ぶことを確認（A4縦は約88DPI）"""
+        dpi = choose_render_dpi(*A4, max_dimension=1024)
+
+        assert dpi == pytest.approx(87.57, abs=0.01)
+        assert round(842 * dpi / 72) == 1024
+
+    def test_clamps_to_range(self):
+        """極端に小さい・大きいページではDPIの範囲内に収めることを確認"""
+        assert choose_render_dpi(252, 144, 1024, min_dpi=36, max_dpi=200) == 200
+        assert choose_render_dpi(2384 * 4, 3370 * 4, 1024, min_dpi=36, max_dpi=200) == 36
+
+
+class TestPdfRenderer:
+    """複数ページの描画と再利用のテスト"""
+
+    async def test_renders_leading_pages(self):
+        """先頭からmax_pagesページを長辺1024pxで描画することを確認"""
+        renderer = PdfRenderer(max_pages=3)
+
+        pages = await renderer.render(_pdf_bytes(5))
+
+        assert [page.page_number for page in pages] == [1, 2, 3]
+        assert all(max(page.image.width, page.image.height) == 1024 for page in pages)
+        assert len({page.image.data for page in pages}) == 3
+        assert all(page.image.b64 is not None and not page.cached for page in pages)
+        assert renderer.stats()["truncated_documents"] == 1
+
+    async def test_opens_document_once_for_all_pages(self, monkeypatch):
+        """未描画のページはPDFを1回だけ開いてまとめて描画することを確認（確認用の1回を除く）"""
+        opened = []
+        original_open = pdf_render._open_pdf
+
+        def counting_open(source):
+            opened.append(source)
+            return original_open(source)
+
+        monkeypatch.setattr(pdf_render, "_open_pdf", counting_open)
+
+        pages = await PdfRenderer(max_pages=3).render(_pdf_bytes(3))
+
+        assert len(pages) == 3
+        assert len(opened) == 2
+
+    async def test_reuses_rendered_pages(self):
+        """同じPDFの2回目はページごとの描画結果を画像ストアから再利用することを確認"""
+        pdf = _pdf_bytes(2)
+        renderer = PdfRenderer(max_pages=3)
+
+        first = await renderer.render(pdf)
+        second = await renderer.render(pdf)
+
+        assert all(page.cached for page in second)
+        assert [page.image.data for page in second] == [page.image.data for page in first]
+        stats = renderer.stats()
+        assert (stats["pages_rendered"], stats["cache_hits"]) == (2, 2)
+
+    async def test_renders_from_file(self, tmp_path):
+        """ディスクに退避したPDF（ファイルパス）からも描画できることを確認"""
+        path = tmp_path / "creative.pdf"
+        path.write_bytes(_pdf_bytes(2))
+
+        pages = await PdfRenderer(max_pages=3).render(str(path))
+
+        assert len(pages) == 2
+        assert inspect_pdf(str(path)).sha256 == inspect_pdf(path.read_bytes()).sha256
+
+    async def test_rejects_broken_pdf(self):
+        """壊れたPDFはValidationErrorになることを確認"""
+        with pytest.raises(ValidationError):
+            await PdfRenderer().render(b"%PDF-1.7 broken")
+
+
+class TestLegacyPdfConversion:
+    """Base64入力のPDF変換のテスト"""
+
+    def test_converts_first_page_at_target_size(self):
+        """1ページ目をAI送信用の寸法で描画し、変換後の形式を返すことを確認"""
+        pdf = _pdf_bytes(2)
+
+        image_data, image_format = process_and_validate_image(encode_image_to_base64(pdf))
+
+        assert image_format in ("JPEG", "PNG", "WEBP")
+        assert Image.open(io.BytesIO(image_data)).size == Image.open(io.BytesIO(convert_pdf_to_image(pdf))).size == (724, 1024)
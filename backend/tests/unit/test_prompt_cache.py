@@ -0,0 +1,93 @@
+"""
+============================================
+メタ広告審査チェッカー - プロンプトキャッシュ単体テスト
+============================================
+"""
+
+import json
+
+import httpx
+import pytest
+
+from src.services import anthropic_service
+from src.services.anthropic_service import AnthropicService, RateLimiter, UsageTracker
+from src.services.prompts import META_AD_POLICY, META_AD_REVIEW_SYSTEM_PROMPT, build_meta_ad_review_prompt
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def tracker(monkeypatch):
+    """レート制限と使用量の集計をテストごとに初期化"""
+    monkeypatch.setattr(anthropic_service, "_rate_limiter", RateLimiter(100, 3600))
+    usage_tracker = UsageTracker()
+    monkeypatch.setattr(anthropic_service, "_usage_tracker", usage_tracker)
+    return usage_tracker
+
+
+def _service(requests: list, usages: list) -> AnthropicService:
+    """送信したリクエストボディを記録し、usageを順に返すモックのClaude API（ストリーミング応答）"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        events = [
+            {"type": "message_start", "message": {"usage": usages[len(requests) - 1]}},
+            {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": "{}"}},
+            {"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {}},
+        ]
+        return httpx.Response(200, text="".join(f"data: {json.dumps(event)}\n\n" for event in events))
+
+    return AnthropicService(api_key="test-key", http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+class TestPromptSplit:
+    """静的部分とリクエストごとの部分の分割のテスト"""
+
+    def test_policy_only_in_system_prompt(self):
+        """審査基準と出力形式はシステムプロンプトにだけ含まれることを確認"""
+        prompt = build_meta_ad_review_prompt(headline="今だけ50%OFF", has_image=True, image_count=1)
+
+        assert META_AD_POLICY in META_AD_REVIEW_SYSTEM_PROMPT
+        assert '"overall_score": 45' in META_AD_REVIEW_SYSTEM_PROMPT
+        assert META_AD_POLICY not in prompt and "出力形式" not in prompt
+        assert "今だけ50%OFF" in prompt
+
+
+class TestPromptCaching:
+    """Claude APIへのキャッシュ指定と使用量の記録のテスト"""
+
+    async def test_marks_system_prompt_cacheable_and_records_usage(self, tracker):
+        """システムプロンプトにcache_controlを付け、キャッシュの書き込み・読み込みを記録することを確認"""
+        requests = []
+        service = _service(requests, [
+            {"input_tokens": 120, "cache_creation_input_tokens": 3400, "cache_read_input_tokens": 0, "output_tokens": 500},
+            {"input_tokens": 130, "cache_creation_input_tokens": 0, "cache_read_input_tokens": 3400, "output_tokens": 480},
+        ])
+
+        for headline in ("A", "B"):
+            await service.generate_content_with_retry(
+                build_meta_ad_review_prompt(headline=headline), system=META_AD_REVIEW_SYSTEM_PROMPT
+            )
+
+        assert requests[0]["system"] == requests[1]["system"] == [{
+            "type": "text", "text": META_AD_REVIEW_SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"},
+        }]
+        assert requests[0]["messages"] != requests[1]["messages"]
+        assert service.last_usage.cache_status == "read"
+        assert service.last_usage.cache_read_input_tokens == 3400
+
+        stats = tracker.stats()
+        assert (stats["requests"], stats["cache_creation_input_tokens"], stats["cache_read_input_tokens"]) == (2, 3400, 3400)
+        assert set(stats["by_cache_status"]) == {"write", "read"}
+        assert stats["cache_read_ratio"] == round(3400 / (250 + 6800), 3)
+
+    async def test_caching_can_be_disabled(self, tracker, monkeypatch):
+        """無効時はcache_controlを付けず、usageにキャッシュ項目がなくても記録できることを確認"""
+        monkeypatch.setattr(anthropic_service, "PROMPT_CACHE_ENABLED", False)
+        requests = []
+        service = _service(requests, [{"input_tokens": 3500, "output_tokens": 400}])
+
+        await service.generate_content_with_retry("prompt", system="static")
+
+        assert requests[0]["system"] == [{"type": "text", "text": "static"}]
+        assert service.last_usage.cache_status == "none"
+        assert tracker.stats()["by_cache_status"]["none"]["count"] == 1
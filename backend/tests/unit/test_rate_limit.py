@@ -0,0 +1,218 @@
+"""
+============================================
+メタ広告審査チェッカー - レート制限単体テスト
+============================================
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+import httpx
+import pytest
+
+from src.services import anthropic_service
+from src.services.anthropic_service import AnthropicService, UsageTracker
+from src.utils.errors import ExternalAPIError, RateLimitExceededError
+from src.utils.rate_limit import (
+    MemoryRateLimitBackend,
+    RateLimitBackend,
+    RateLimiter,
+    RedisRateLimitBackend,
+    SqliteRateLimitBackend,
+    gcra_update,
+)
+
+pytestmark = pytest.mark.unit
+
+
+class FakeRedis:
+    """
+    Luaスクリプトの代わりにgcra_updateで同じ計算を行うRedisクライアントの代役
+
+    Luaを実行する環境がないため、_GCRA_LUA自体はこのテストでは検証されない
+    （キーの組み立て・引数・戻り値の解釈のみを検証する）
+    """
+
+    def __init__(self):
+        self.store = {}
+        self.calls = 0
+
+    def eval(self, script, numkeys, key, now, interval, window, cost):
+        self.calls += 1
+        now = float(now)
+        decision, new_tat = gcra_update(self.store.get(key), now, float(interval), float(window), int(cost))
+        if int(cost) != 0 and decision.allowed:
+            self.store[key] = new_tat
+        return [int(decision.allowed), decision.remaining, str(decision.retry_after).encode()]
+
+
+class BrokenBackend(RateLimitBackend):
+    name = "broken"
+
+    def __init__(self):
+        self.calls = 0
+
+    def update(self, key, now, interval, window, cost):
+        self.calls += 1
+        raise ConnectionError("backend unavailable")
+
+
+class SlowBackend(MemoryRateLimitBackend):
+    """ロック待ちで止まる共有バックエンドの代役"""
+
+    name = "slow"
+    blocking = True
+
+    def update(self, key, now, interval, window, cost):
+        time.sleep(0.2)
+        return super().update(key, now, interval, window, cost)
+
+
+class TestGcra:
+    """GCRAの判定のテスト"""
+
+    def test_burst_then_steady_recovery(self):
+        """期間内の上限件数まで連続で受け付け、その後は回復間隔ごとに1件ずつ受け付けることを確認"""
+        tat, now = None, 1000.0
+        for expected_remaining in range(9, -1, -1):
+            decision, tat = gcra_update(tat, now, 360.0, 3600.0, 1)
+            assert (decision.allowed, decision.remaining) == (True, expected_remaining)
+
+        denied, tat = gcra_update(tat, now, 360.0, 3600.0, 1)
+        assert not denied.allowed and denied.retry_after == pytest.approx(360.0)
+
+        recovered, tat = gcra_update(tat, now + 360.0, 360.0, 3600.0, 1)
+        assert recovered.allowed and recovered.remaining == 0
+
+    def test_release_returns_one_unit(self):
+        """返却すると1件分回復し、確認（cost=0）では状態が変わらないことを確認"""
+        _, tat = gcra_update(None, 0.0, 10.0, 30.0, 1)
+        _, tat = gcra_update(tat, 0.0, 10.0, 30.0, 1)
+        peek, peek_tat = gcra_update(tat, 0.0, 10.0, 30.0, 0)
+        assert (peek.allowed, peek.remaining, peek_tat) == (True, 1, tat)
+
+        released, tat = gcra_update(tat, 0.0, 10.0, 30.0, -1)
+        assert released.remaining == 2
+
+
+class TestBackends:
+    """バックエンドのテスト"""
+
+    async def test_sqlite_state_shared_between_workers(self, tmp_path):
+        """同じSQLiteファイルを使う複数のリミッター（ワーカー）で上限を共有することを確認"""
+        path = str(tmp_path / "rate_limit.sqlite3")
+        workers = [RateLimiter(5, 3600, backend=SqliteRateLimitBackend(path)) for _ in range(3)]
+
+        results = [(await workers[i % 3].acquire()).allowed for i in range(8)]
+
+        assert results == [True] * 5 + [False] * 3
+        assert [await worker.remaining() for worker in workers] == [0, 0, 0]
+
+    def test_sqlite_atomic_under_concurrency(self, tmp_path):
+        """並行して予約しても上限件数を超えて受け付けないことを確認"""
+        backend = SqliteRateLimitBackend(str(tmp_path / "rate_limit.sqlite3"))
+        allowed = []
+
+        def worker():
+            for _ in range(10):
+                allowed.append(backend.update("claude", time.time(), 180.0, 3600.0, 1).allowed)
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert allowed.count(True) == 20
+
+    async def test_redis_backend(self):
+        """Redisバックエンドはキーの接頭辞付きでスクリプトを実行し、結果を解釈することを確認"""
+        client = FakeRedis()
+        limiter = RateLimiter(2, 60, backend=RedisRateLimitBackend(client=client), key="claude")
+
+        assert [(await limiter.acquire()).allowed for _ in range(3)] == [True, True, False]
+        assert list(client.store) == ["meta-ad-checker:rate-limit:claude"]
+        assert await limiter.retry_after() == 30
+
+    async def test_falls_back_to_memory_during_cooldown(self):
+        """共有バックエンドが失敗した後は、待機時間の間は問い合わせずプロセス内の状態で制限を続けることを確認"""
+        backend = BrokenBackend()
+        limiter = RateLimiter(1, 60, backend=backend)
+
+        assert [(await limiter.acquire()).allowed for _ in range(3)] == [True, False, False]
+        assert backend.calls == 1
+        stats = await limiter.stats()
+        assert (stats["backend_errors"], stats["backend_available"]) == (1, False)
+
+        # 待機時間が過ぎると再び共有バックエンドに問い合わせる
+        limiter._backend_retry_at = 0.0
+        await limiter.acquire()
+        assert backend.calls == 2
+
+    async def test_blocking_backend_runs_off_event_loop(self):
+        """ブロッキングするバックエンドの呼び出し中もイベントループが止まらないことを確認"""
+        limiter = RateLimiter(5, 60, backend=SlowBackend())
+
+        acquiring = asyncio.create_task(limiter.acquire())
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+
+        assert time.perf_counter() - started < 0.1
+        assert (await acquiring).allowed
+
+    def test_backend_without_update_cannot_be_created(self):
+        """updateを実装していないバックエンドは最初のリクエストではなく作成時にエラーになることを確認"""
+        class IncompleteBackend(RateLimitBackend):
+            name = "incomplete"
+
+        with pytest.raises(TypeError):
+            IncompleteBackend()
+
+    def test_rejects_zero_limit(self):
+        """0件の制限は設定の誤りとして作成時に分かるようにすることを確認"""
+        with pytest.raises(ValueError):
+            RateLimiter(0, 3600)
+
+
+class TestServiceReservation:
+    """AnthropicServiceでの予約・確定・返却のテスト"""
+
+    @pytest.fixture
+    def limiter(self, monkeypatch):
+        limiter = RateLimiter(2, 3600, backend=MemoryRateLimitBackend())
+        monkeypatch.setattr(anthropic_service, "_rate_limiter", limiter)
+        monkeypatch.setattr(anthropic_service, "_usage_tracker", UsageTracker())
+        monkeypatch.setattr(anthropic_service, "MAX_RETRIES", 1)
+        return limiter
+
+    def _service(self, status_code: int) -> AnthropicService:
+        body = "".join(f"data: {json.dumps(event)}\n\n" for event in [
+            {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": "{}"}},
+            {"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {}},
+        ])
+        return AnthropicService(api_key="k", http_client=httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda request: httpx.Response(status_code, text=body))
+        ))
+
+    async def test_failed_requests_are_not_counted(self, limiter):
+        """失敗したリクエストの予約は返却され、成功したリクエストだけが上限に数えられることを確認"""
+        with pytest.raises(ExternalAPIError):
+            await self._service(400).generate_content_with_retry("prompt")
+        assert await limiter.remaining() == 2
+
+        for _ in range(2):
+            await self._service(200).generate_content_with_retry("prompt")
+        with pytest.raises(RateLimitExceededError):
+            await self._service(200).generate_content_with_retry("prompt")
+        assert limiter.counters["released"] == 1
+
+    async def test_stream_uses_reservation_made_before_response(self, limiter):
+        """応答開始前の確認で予約した1件を、ストリーミングで二重に消費しないことを確認"""
+        service = self._service(200)
+
+        await service.ensure_within_rate_limit()
+        assert [text async for text in service.stream_content_with_retry("prompt")] == ["{}"]
+
+        assert await limiter.remaining() == 1
@@ -0,0 +1,213 @@
+"""
+============================================
+メタ広告審査チェッカー - 構造化出力・JSON修復単体テスト
+============================================
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from src.services import anthropic_service
+from src.services.anthropic_service import AnthropicService, RateLimiter, UsageTracker
+from src.services.prompts import META_AD_REVIEW_TOOL, REVIEW_TOOL_NAME
+from src.utils.errors import ExternalAPIError
+from src.utils.json_repair import repair_json
+
+pytestmark = pytest.mark.unit
+
+AI_RESULT = {
+    "overall_score": 45,
+    "status": "needs_review",
+    "confidence": 0.85,
+    "violations": [
+        {"category": "misleading", "severity": "high", "description": "「100%保証」は断定表現です", "location": "text"},
+        {"category": "text_overlay", "severity": "medium", "description": "画像内テキスト約35%", "location": "image"},
+    ],
+    "recommendations": [],
+    "text_overlay_percentage": 35,
+    "nsfw_detected": False,
+    "prohibited_content": [],
+}
+
+
+@pytest.fixture
+def tracker(monkeypatch):
+    """レート制限と使用量の集計をテストごとに初期化"""
+    monkeypatch.setattr(anthropic_service, "_rate_limiter", RateLimiter(100, 3600))
+    usage_tracker = UsageTracker()
+    monkeypatch.setattr(anthropic_service, "_usage_tracker", usage_tracker)
+    return usage_tracker
+
+
+def _tool_sse_body(chunks, stop_reason="tool_use", delta_type="input_json_delta") -> str:
+    """ツールの入力（JSON）を差分で返すMessages APIのストリーミング応答"""
+    key = "partial_json" if delta_type == "input_json_delta" else "text"
+    events = [{"type": "message_start", "message": {"usage": {"input_tokens": 10}}}]
+    events += [
+        {"type": "content_block_delta", "index": 0, "delta": {"type": delta_type, key: chunk}}
+        for chunk in chunks
+    ]
+    events.append({"type": "message_delta", "delta": {"stop_reason": stop_reason}, "usage": {"output_tokens": 42}})
+    return "".join(f"data: {json.dumps(event, ensure_ascii=False)}\n\n" for event in events)
+
+
+def _service(requests: list, bodies: list) -> AnthropicService:
+    """送信したリクエストボディを記録し、応答を順に返すモックのClaude API"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        return httpx.Response(200, text=bodies[len(requests) - 1])
+
+    return AnthropicService(api_key="test-key", http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+class TestRepairJson:
+    """ローカルでのJSON修復のテスト"""
+
+    def test_ignores_surrounding_prose_and_trailing_commas(self):
+        """前後の説明文・コードブロックと、閉じ括弧の直前のカンマを除いて解析できることを確認"""
+        text = '審査結果です。\n```json\n{"overall_score": 80, "prohibited_content": ["a", "b",],}\n```\n以上です。'
+
+        assert repair_json(text) == {"overall_score": 80, "prohibited_content": ["a", "b"]}
+
+    def test_closes_truncated_output_at_last_complete_value(self):
+        """打ち切られた応答は確定した値までで閉じ、書きかけの配列要素は要素ごと捨てることを確認"""
+        full = json.dumps(AI_RESULT, ensure_ascii=False)
+        truncated = full[:full.index("画像内テキスト") + 3]
+
+        repaired = repair_json(truncated)
+
+        assert repaired["overall_score"] == 45
+        assert repaired["violations"] == AI_RESULT["violations"][:1]
+        assert "text_overlay_percentage" not in repaired
+
+    def test_keeps_commas_inside_strings(self):
+        """文字列内の「,]」や改行はそのまま残すことを確認"""
+        assert repair_json('{"a": "x,]\ny", "b": [1, 2') == {"a": "x,]\ny", "b": [1]}
+
+    def test_raises_when_no_json(self):
+        """JSONが含まれない場合はValueErrorを送出することを確認"""
+        with pytest.raises(ValueError):
+            repair_json("申し訳ありませんが審査できません。")
+
+
+class TestReviewOutputSchema:
+    """AdCheckResponseから生成する出力スキーマのテスト"""
+
+    def test_schema_derived_from_response_model(self):
+        """サーバー側の項目を除き、$refを展開したスキーマになることを確認"""
+        schema = META_AD_REVIEW_TOOL["input_schema"]
+
+        assert META_AD_REVIEW_TOOL["name"] == REVIEW_TOOL_NAME
+        assert "checked_at" not in schema["properties"] and "api_used" not in schema["required"]
+        assert "$ref" not in json.dumps(schema) and "$defs" not in schema
+        violation = schema["properties"]["violations"]["items"]
+        assert violation["properties"]["category"]["enum"] == [
+            "text_overlay", "prohibited_content", "nsfw", "before_after", "misleading",
+        ]
+        # "title"という名前のプロパティは残る
+        assert "title" in schema["properties"]["recommendations"]["items"]["properties"]
+
+
+class TestStructuredOutput:
+    """tool useによる出力の制約と、打ち切り時の続きの生成のテスト"""
+
+    async def test_forces_review_tool_and_returns_tool_input(self, tracker):
+        """ツールの使用を指定し、ツールの入力（JSON）をそのまま応答として返すことを確認"""
+        requests = []
+        text = json.dumps(AI_RESULT, ensure_ascii=False)
+        service = _service(requests, [_tool_sse_body([text[:20], text[20:]])])
+
+        result = await service.generate_content_with_retry("prompt", system="static", tool=META_AD_REVIEW_TOOL)
+
+        assert requests[0]["tools"] == [META_AD_REVIEW_TOOL]
+        assert requests[0]["tool_choice"] == {"type": "tool", "name": REVIEW_TOOL_NAME}
+        assert await service.parse_json_response(result) == AI_RESULT
+        assert service.last_stop_reason == "tool_use"
+
+    async def test_continues_output_cut_at_max_tokens(self, tracker):
+        """max_tokensで打ち切られた場合、打ち切られた出力を書き出しにして続きだけを生成することを確認"""
+        requests = []
+        text = json.dumps(AI_RESULT, ensure_ascii=False)
+        cut = text.index('"text_overlay_percentage"')
+        service = _service(requests, [
+            _tool_sse_body([text[:cut] + "\n  "], stop_reason="max_tokens"),
+            _tool_sse_body([text[cut:]], stop_reason="end_turn", delta_type="text_delta"),
+        ])
+
+        result = await service.generate_content_with_retry("prompt", system="static", tool=META_AD_REVIEW_TOOL)
+
+        assert json.loads(result) == AI_RESULT
+        continuation = requests[1]
+        assert continuation["messages"][0] == requests[0]["messages"][0]
+        assert continuation["messages"][1] == {"role": "assistant", "content": [{"type": "text", "text": text[:cut].rstrip()}]}
+        assert continuation["tool_choice"] == {"type": "none"}
+        assert continuation["max_tokens"] == anthropic_service.CONTINUATION_MAX_TOKENS
+        assert tracker.stats()["continuations"] == 1
+
+    async def test_stream_continues_after_max_tokens(self, tracker):
+        """ストリーミングでも打ち切られた後に続きの差分を返すことを確認"""
+        requests = []
+        service = _service(requests, [
+            _tool_sse_body(['{"overall_score": 80, "status": "app'], stop_reason="max_tokens"),
+            _tool_sse_body(['roved"}'], stop_reason="end_turn", delta_type="text_delta"),
+        ])
+
+        chunks = [chunk async for chunk in service.stream_content_with_retry("prompt", tool=META_AD_REVIEW_TOOL)]
+
+        assert json.loads("".join(chunks)) == {"overall_score": 80, "status": "approved"}
+
+    async def test_repairs_when_continuation_fails(self, tracker):
+        """続きの生成に失敗しても、打ち切られた出力をローカルで修復して解析できることを確認"""
+        responses = [
+            httpx.Response(200, text=_tool_sse_body(['{"overall_score": 80, "violations": [{"category": "ns'], stop_reason="max_tokens")),
+            httpx.Response(400, text="bad request"),
+        ]
+        service = AnthropicService(api_key="test-key", http_client=httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda request: responses.pop(0))
+        ))
+
+        result = await service.generate_content_with_retry("prompt", tool=META_AD_REVIEW_TOOL)
+
+        assert await service.parse_json_response(result) == {"overall_score": 80, "violations": []}
+        assert (tracker.stats()["continuations"], tracker.stats()["json_repairs"]) == (1, 1)
+
+    async def test_hanging_continuation_keeps_partial_output(self, tracker, monkeypatch):
+        """続きの生成がタイムアウトしても全体をやり直さず、打ち切られた出力を修復して使うことを確認"""
+        monkeypatch.setattr(anthropic_service, "CLAUDE_TIMEOUT", 0.05)
+        requests = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(json.loads(request.content))
+            if len(requests) > 1:
+                await asyncio.sleep(10)
+            return httpx.Response(200, text=_tool_sse_body(
+                ['{"overall_score": 80, "violations": [{"category": "ns'], stop_reason="max_tokens"
+            ))
+
+        service = AnthropicService(api_key="test-key", http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+        result = await service.generate_content_with_retry("prompt", tool=META_AD_REVIEW_TOOL)
+
+        assert len(requests) == 2
+        assert await service.parse_json_response(result) == {"overall_score": 80, "violations": []}
+
+    async def test_unrepairable_response_raises(self, tracker):
+        """修復できない応答はこれまでどおりExternalAPIErrorにすることを確認"""
+        service = AnthropicService(api_key="test-key")
+
+        with pytest.raises(ExternalAPIError):
+            await service.parse_json_response("審査できませんでした")
+        assert tracker.stats()["json_parse_failures"] == 1
+
+    async def test_structured_output_can_be_disabled(self, tracker, monkeypatch):
+        """無効時はツールを指定しないことを確認"""
+        monkeypatch.setattr(anthropic_service, "STRUCTURED_OUTPUT_ENABLED", False)
+        requests = []
+        service = _service(requests, [_tool_sse_body(["{}"], stop_reason="end_turn", delta_type="text_delta")])
+
+        await service.generate_content_with_retry("prompt", tool=META_AD_REVIEW_TOOL)
+
+        assert "tools" not in requests[0] and "tool_choice" not in requests[0]
@@ -0,0 +1,204 @@
+"""
+============================================
+メタ広告審査チェッカー - 呼び出し元ごとの利用枠・公平キュー単体テスト
+============================================
+"""
+
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.main import app
+from src.routes import check
+from src.utils import tenants
+from src.utils.errors import ExternalAPIError, RateLimitExceededError, ServiceUnavailableError
+from src.utils.fair_queue import FairScheduler
+from src.utils.rate_limit import MemoryRateLimitBackend
+from src.utils.tenants import TenantQuotas, api_key_id, parse_tiers
+from src.utils.url_fetcher import PageData
+
+pytestmark = pytest.mark.unit
+
+AI_RESPONSE = json.dumps({
+    "overall_score": 90,
+    "status": "approved",
+    "confidence": 0.9,
+    "violations": [],
+    "recommendations": [],
+    "text_overlay_percentage": None,
+    "nsfw_detected": False,
+    "prohibited_content": [],
+})
+
+
+def _quotas(**kwargs) -> TenantQuotas:
+    return TenantQuotas(
+        tiers=parse_tiers("default:2/3600:1,partner:10/3600:4"),
+        api_keys={api_key_id("partner-secret"): "partner"},
+        default_tier="default",
+        backend=MemoryRateLimitBackend(),
+        **kwargs,
+    )
+
+
+class TestTenantQuotas:
+    """呼び出し元の識別と利用枠のテスト"""
+
+    def test_parse_tiers_skips_invalid_entries(self):
+        """重みの省略・不正な定義の無視を確認"""
+        tiers = parse_tiers("default:5/3600, partner:50/60:4, broken:abc, closed:0/3600")
+
+        assert (tiers["default"].max_requests, tiers["default"].weight) == (5, 1.0)
+        assert (tiers["partner"].window_seconds, tiers["partner"].weight) == (60, 4.0)
+        assert "broken" not in tiers and "closed" not in tiers
+
+    def test_identify_by_registered_key_then_ip(self):
+        """登録済みのAPIキーはキーで、未登録のキー・キーなしはIPで識別することを確認"""
+        quotas = _quotas()
+
+        by_key = quotas.identify({"authorization": "Bearer partner-secret"}, "10.0.0.1")
+        unknown_key = quotas.identify({"x-api-key": "made-up"}, "10.0.0.1")
+        spoofed = quotas.identify({"x-forwarded-for": "1.2.3.4"}, "10.0.0.1")
+
+        assert (by_key.id, by_key.tier.name) == (f"key:{api_key_id('partner-secret')}", "partner")
+        assert (unknown_key.id, unknown_key.tier.name) == ("ip:10.0.0.1", "default")
+        assert spoofed.id == "ip:10.0.0.1"
+        trusted = _quotas(trust_proxy_headers=True).identify({"x-forwarded-for": "1.2.3.4, 10.0.0.2"}, "10.0.0.1")
+        assert trusted.id == "ip:1.2.3.4"
+
+    async def test_buckets_are_isolated_per_tenant(self):
+        """1つの呼び出し元が枠を使い切っても他の呼び出し元には影響しないことを確認"""
+        quotas = _quotas()
+        heavy = quotas.identify({}, "10.0.0.1")
+        light = quotas.identify({}, "10.0.0.2")
+
+        assert [(await quotas.admit(heavy)).decision.remaining for _ in range(2)] == [1, 0]
+        with pytest.raises(RateLimitExceededError) as exc_info:
+            await quotas.admit(heavy)
+        assert exc_info.value.headers["Retry-After"] == "1800"
+        assert exc_info.value.headers["X-RateLimit-Remaining"] == "0"
+
+        assert (await quotas.admit(light)).headers() == {"X-RateLimit-Limit": "2", "X-RateLimit-Remaining": "1"}
+
+        await quotas.release(heavy)
+        assert (await quotas.admit(heavy)).decision.allowed
+
+
+class TestFairScheduler:
+    """重み付き公平キューのテスト"""
+
+    async def _run(self, scheduler: FairScheduler, requests):
+        """同時に到着したリクエストを処理し、処理を始めた順の呼び出し元を返す"""
+        order = []
+        gate = asyncio.Event()
+
+        async def holder():
+            async with scheduler.slot("holder"):
+                await gate.wait()
+
+        async def request(tenant_id, weight):
+            async with scheduler.slot(tenant_id, weight):
+                order.append(tenant_id)
+                await asyncio.sleep(0)
+
+        holding = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        tasks = []
+        for tenant_id, weight in requests:
+            tasks.append(asyncio.create_task(request(tenant_id, weight)))
+            await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(holding, *tasks)
+        return order
+
+    async def test_interleaves_tenants_instead_of_fifo(self):
+        """先に大量に並んだ呼び出し元があっても、他の呼び出し元が交互に処理されることを確認"""
+        scheduler = FairScheduler(capacity=1, timeout=5)
+
+        order = await self._run(scheduler, [("heavy", 1.0)] * 4 + [("light", 1.0)] * 2)
+
+        assert order == ["heavy", "light", "heavy", "light", "heavy", "heavy"]
+        assert scheduler.stats()["queued"] == 6 and scheduler.stats()["in_flight"] == 0
+
+    async def test_weight_scales_share(self):
+        """重みの大きい呼び出し元ほど多く処理されることを確認"""
+        scheduler = FairScheduler(capacity=1, timeout=5)
+
+        order = await self._run(scheduler, [("partner", 2.0)] * 4 + [("default", 1.0)] * 4)
+
+        assert order[:6] == ["partner", "default", "partner", "partner", "default", "partner"]
+
+    async def test_times_out_with_503(self):
+        """空きができないまま待機時間を過ぎた場合は503にし、枠を消費しないことを確認"""
+        scheduler = FairScheduler(capacity=1, timeout=0.01)
+
+        async with scheduler.slot("holder"):
+            with pytest.raises(ServiceUnavailableError):
+                async with scheduler.slot("waiting"):
+                    pass
+
+        assert scheduler.stats()["timeouts"] == 1
+        async with scheduler.slot("next"):
+            assert scheduler.stats()["in_flight"] == 1
+
+
+class TestCheckEndpointQuotas:
+    """POST /api/check の呼び出し元ごとの利用枠のテスト"""
+
+    @pytest.fixture
+    def quotas(self, monkeypatch):
+        async def fake_fetch_page_data(url, client=None):
+            return PageData(url=url, title="LP", page_text="テキスト", images=[])
+
+        class FakeAnthropicService:
+            fail = False
+
+            def __init__(self, *args, **kwargs):
+                pass
+
+            async def generate_content_with_retry(self, prompt, images=None, temperature=0.3, system=None, tool=None):
+                if FakeAnthropicService.fail:
+                    raise ExternalAPIError(message="failed")
+                return AI_RESPONSE
+
+            async def parse_json_response(self, text):
+                return json.loads(text)
+
+        monkeypatch.setattr(check, "fetch_page_data", fake_fetch_page_data)
+        monkeypatch.setattr(check, "AnthropicService", FakeAnthropicService)
+        self.service = FakeAnthropicService
+        quotas = _quotas(trust_proxy_headers=False)
+        monkeypatch.setattr(tenants, "_tenant_quotas", quotas)
+        return quotas
+
+    def _post(self, client, **headers):
+        return client.post("/api/check", json={"page_url": "https://lp.example.com/"}, headers=headers)
+
+    def test_headers_from_callers_own_bucket(self, quotas):
+        """残り回数と429のRetry-Afterが呼び出し元自身の枠から計算されることを確認"""
+        with TestClient(app) as client:
+            first = self._post(client)
+            second = self._post(client)
+            rejected = self._post(client)
+            other = self._post(client, **{"x-forwarded-for": "1.2.3.4"})
+
+        assert (first.status_code, first.headers["X-RateLimit-Remaining"]) == (200, "1")
+        assert (second.status_code, second.headers["X-RateLimit-Remaining"]) == (200, "0")
+        assert rejected.status_code == 429
+        assert rejected.headers["Retry-After"] == "1800"
+        assert rejected.headers["X-RateLimit-Limit"] == "2"
+        # X-Forwarded-Forは信頼しない設定のため、同じ呼び出し元として扱う
+        assert other.status_code == 429
+
+    def test_failed_review_does_not_consume_quota(self, quotas):
+        """審査が失敗した場合・リクエストが不正な場合は枠を返却することを確認"""
+        with TestClient(app) as client:
+            self.service.fail = True
+            assert self._post(client).status_code == 500
+            assert client.post("/api/check", json={}).status_code in (400, 422)
+            self.service.fail = False
+            assert self._post(client).headers["X-RateLimit-Remaining"] == "1"
+
+        assert quotas.counters["released"] == 1
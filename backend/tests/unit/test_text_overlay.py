@@ -0,0 +1,115 @@
+"""
+============================================
+メタ広告審査チェッカー - 画像内テキスト量推定単体テスト
+============================================
+"""
+
+import pytest
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from src.utils.text_overlay import TextOverlayEstimator, estimate_text_overlay
+from tests.unit.conftest import encode_image
+
+pytestmark = pytest.mark.unit
+
+
+def _photo(width: int, height: int) -> Image.Image:
+    """質感のある写真相当の画像"""
+    gradient = Image.linear_gradient("L").resize((width, height))
+    image = Image.merge("RGB", [
+        Image.blend(Image.effect_noise((width, height), 60), gradient, 0.6),
+        Image.effect_noise((width, height), 70),
+        gradient.transpose(Image.Transpose.ROTATE_180),
+    ])
+    return image.filter(ImageFilter.GaussianBlur(1.0))
+
+
+def _with_text(image: Image.Image, cells, fill=(255, 255, 255)) -> Image.Image:
+    """5×5グリッドの指定セル（行優先の番号）に、セル内に収まる文字を描く"""
+    image = image.copy()
+    draw = ImageDraw.Draw(image)
+    cell_w, cell_h = image.width / 5, image.height / 5
+    size = int(cell_h / 6)
+    font = ImageFont.load_default(size=size)
+    for cell in cells:
+        row, col = divmod(cell, 5)
+        y = row * cell_h + cell_h * 0.1
+        while y + size < (row + 1) * cell_h - cell_h * 0.1:
+            draw.text((col * cell_w + cell_w * 0.08, y), "50%OFF!", font=font, fill=fill)
+            y += size * 1.4
+    return image
+
+
+class TestEstimateTextOverlay:
+    """グリッド判定のテスト"""
+
+    @pytest.mark.parametrize("image", [
+        Image.new("RGB", (1000, 1000), (250, 240, 230)),
+        _photo(1000, 1000),
+    ])
+    def test_clean_images_have_no_text(self, image):
+        """ベタ塗り・写真は文字なしと判定することを確認"""
+        estimate = estimate_text_overlay(encode_image(image))
+
+        assert (estimate.percentage, estimate.text_cells) == (0.0, 0)
+        assert not estimate.has_text
+
+    def test_counts_cells_with_text(self):
+        """文字のあるセルだけを数え、セル数の割合をテキスト量とすることを確認"""
+        cells = [0, 1, 7, 12, 24]
+        image = _with_text(Image.new("RGB", (1000, 1000), (250, 240, 230)), cells, fill=(20, 20, 20))
+
+        estimate = estimate_text_overlay(encode_image(image))
+
+        flagged = [i for i, score in enumerate(estimate.cell_scores) if score > 0.02]
+        assert flagged == cells
+        assert estimate.percentage == 20.0
+
+    def test_white_text_on_photo(self):
+        """写真の上の白抜き文字を検出することを確認"""
+        estimate = estimate_text_overlay(encode_image(_with_text(_photo(1200, 800), [5, 6, 7, 8, 9]), "JPEG"))
+
+        assert estimate.text_cells == 5
+
+    def test_large_headline(self):
+        """太い見出し文字も検出することを確認"""
+        image = Image.new("RGB", (1000, 1000), (30, 90, 200))
+        ImageDraw.Draw(image).text((60, 230), "SALE", font=ImageFont.load_default(size=160), fill=(255, 255, 255))
+
+        estimate = estimate_text_overlay(encode_image(image))
+
+        assert estimate.text_cells >= 2
+
+    def test_invalid_data_returns_none(self):
+        """画像として読めないデータはNoneになることを確認"""
+        assert estimate_text_overlay(b"not an image") is None
+
+
+class TestTextOverlayEstimator:
+    """事前推定・送信画像の選別・AI推定値との突き合わせのテスト"""
+
+    async def test_skips_clean_images_when_enabled(self):
+        """有効時は文字のない画像を送信対象から外すことを確認"""
+        images = [encode_image(_photo(800, 800)), encode_image(_with_text(_photo(800, 800), [12]))]
+        estimator = TextOverlayEstimator(enabled=True, skip_clean_images=True)
+
+        estimates = await estimator.score(images)
+
+        assert estimator.select_images(["photo", "banner"], estimates) == ["banner"]
+        assert estimator.stats()["skipped_images"] == 1
+        assert TextOverlayEstimator(skip_clean_images=False).select_images(["photo", "banner"], estimates) == [
+            "photo", "banner"
+        ]
+
+    async def test_cross_check_records_disagreement(self):
+        """AIの値を優先し、大きくずれた場合に不一致を記録、AIの値がなければローカル推定値を使うことを確認"""
+        estimator = TextOverlayEstimator(enabled=True, disagreement_points=20)
+        estimates = await estimator.score([encode_image(_with_text(_photo(800, 800), range(10)))])
+
+        assert estimator.cross_check(45, estimates) == 45
+        assert estimator.cross_check(0, estimates) == 0
+        assert estimator.cross_check(None, estimates) == estimates[0].percentage == 40.0
+        assert estimator.cross_check(None, []) is None
+
+        stats = estimator.stats()
+        assert (stats["cross_checks"], stats["disagreements"], stats["filled_from_local"]) == (2, 1, 1)
@@ -0,0 +1,322 @@
+"""
+============================================
+メタ広告審査チェッカー - URL取得ユーティリティ単体テスト
+============================================
+"""
+
+import io
+import random
+import asyncio
+
+import httpx
+import pytest
+from PIL import Image
+
+from src.utils import url_fetcher
+from src.utils.url_fetcher import _acquire_images, _fetch_image
+
+pytestmark = pytest.mark.unit
+
+
+def _png_bytes(width: int = 32, height: int = 32, pattern=None) -> bytes:
+    """テスト用のPNG画像を生成（patternを指定すると、値ごとに見た目の異なる模様の画像）"""
+    if pattern is None:
+        image = Image.new("RGB", (width, height), (200, 30, 30))
+    else:
+        blocks = Image.frombytes("L", (8, 8), random.Random(pattern).randbytes(64))
+        image = blocks.resize((width, height), Image.Resampling.NEAREST).convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _mock_client(handler) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+class TestAcquireImages:
+    """_acquire_images の並列取得テスト"""
+
+    async def test_keeps_priority_order(self):
+        """完了順ではなく候補の優先順で採用されることを確認"""
+        delays = {"/a.png": 0.05, "/b.png": 0.0, "/c.png": 0.01}
+        pngs = {path: _png_bytes(pattern=i) for i, path in enumerate(delays)}
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            await asyncio.sleep(delays[request.url.path])
+            return httpx.Response(200, content=pngs[request.url.path], headers={"content-type": "image/png"})
+
+        candidates = [(f"https://lp.example.com{path}", "main") for path in delays]
+        async with _mock_client(handler) as client:
+            images, reports = await _acquire_images(client, candidates, target_count=3, concurrency=3)
+
+        assert [image.url for image in images] == [url for url, _ in candidates]
+        assert all(report.accepted for report in reports)
+        assert all(report.elapsed_ms is not None for report in reports)
+
+    async def test_cancels_remaining_after_target(self):
+        """目標枚数に達したら残りの取得を打ち切ることを確認"""
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/slow.png":
+                await asyncio.sleep(10)
+            png = _png_bytes(pattern=request.url.path)
+            return httpx.Response(200, content=png, headers={"content-type": "image/png"})
+
+        candidates = [
+            ("https://lp.example.com/og.png", "ogp"),
+            ("https://lp.example.com/main.png", "main"),
+            ("https://lp.example.com/slow.png", "main"),
+            ("https://lp.example.com/late.png", "main"),
+        ]
+        async with _mock_client(handler) as client:
+            images, reports = await asyncio.wait_for(
+                _acquire_images(client, candidates, target_count=2, concurrency=3), timeout=2
+            )
+
+        assert [image.source for image in images] == ["ogp", "main"]
+        reasons = {report.url.rsplit("/", 1)[1]: report.reason for report in reports}
+        assert reasons["slow.png"] == "cancelled"
+        assert reasons["late.png"] in ("skipped", "cancelled", "surplus")
+
+    async def test_reports_drop_reasons(self):
+        """失敗した候補の不採用理由が記録されることを確認"""
+        png = _png_bytes()
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/missing.png":
+                return httpx.Response(404)
+            if request.url.path == "/page.png":
+                return httpx.Response(200, content=b"<html></html>", headers={"content-type": "text/html"})
+            return httpx.Response(200, content=png, headers={"content-type": "image/png"})
+
+        candidates = [
+            ("https://lp.example.com/missing.png", "ogp"),
+            ("https://lp.example.com/page.png", "main"),
+            ("https://lp.example.com/page.png", "main"),
+            ("https://lp.example.com/ok.png", "main"),
+        ]
+        async with _mock_client(handler) as client:
+            images, reports = await _acquire_images(client, candidates, target_count=3)
+
+        assert [image.url for image in images] == ["https://lp.example.com/ok.png"]
+        assert sorted(report.reason for report in reports if not report.accepted) == [
+            "duplicate", "http_error", "not_image"
+        ]
+
+
+class _CountingStream(httpx.AsyncByteStream):
+    """送出したチャンク数を記録するストリーム"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.sent = 0
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            self.sent += 1
+            yield chunk
+
+
+class TestFetchImageStreaming:
+    """_fetch_image のストリーミング取得テスト"""
+
+    async def test_rejects_by_content_length_header(self):
+        """Content-Lengthが上限超過なら本文を受信しないことを確認"""
+        stream = _CountingStream([b"\xff\xd8\xff" + b"0" * 100])
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(
+                200, stream=stream,
+                headers={"content-type": "image/jpeg", "content-length": str(50 * 1024 * 1024)},
+            )
+
+        async with _mock_client(handler) as client:
+            data, reason = await _fetch_image(client, "https://lp.example.com/big.jpg")
+
+        assert (data, reason) == (None, "too_large")
+        assert stream.sent == 0
+
+    async def test_aborts_mid_stream_when_cap_exceeded(self):
+        """ヘッダーにサイズがなくても上限を超えた時点で受信を打ち切ることを確認"""
+        chunk = b"\xff\xd8\xff" + b"0" * (64 * 1024 - 3)
+        stream = _CountingStream([chunk] + [b"0" * 64 * 1024] * 100)
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, stream=stream, headers={"content-type": "image/jpeg"})
+
+        async with _mock_client(handler) as client:
+            data, reason = await _fetch_image(client, "https://lp.example.com/big.jpg", max_size=256 * 1024)
+
+        assert (data, reason) == (None, "too_large")
+        assert stream.sent < 10
+
+    async def test_rejects_mislabelled_html(self):
+        """image/*と偽ったHTMLをマジックバイトで弾くことを確認"""
+        async def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(
+                200, stream=_CountingStream([b"<!DOCTYPE html><html>error</html>"]),
+                headers={"content-type": "image/png"},
+            )
+
+        async with _mock_client(handler) as client:
+            data, reason = await _fetch_image(client, "https://lp.example.com/error.png")
+
+        assert (data, reason) == (None, "not_image")
+
+    async def test_accepts_octet_stream_image(self):
+        """汎用バイナリのContent-Typeでもマジックバイトが画像なら採用することを確認"""
+        png = _png_bytes()
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(
+                200, stream=_CountingStream([png[:8], png[8:]]),
+                headers={"content-type": "application/octet-stream"},
+            )
+
+        async with _mock_client(handler) as client:
+            fetched, reason = await _fetch_image(client, "https://lp.example.com/image")
+
+        assert reason is None
+        assert fetched.image.media_type == "image/png"
+        assert fetched.image.data[:8] == b"\x89PNG\r\n\x1a\n"
+
+
+class TestFetchPageData:
+    """fetch_page_data のテスト"""
+
+    async def test_collects_ogp_and_main_images(self, monkeypatch):
+        """OGP画像を先頭に、最大3枚の画像を取得することを確認"""
+        html = """<html><head>
+            <meta property="og:title" content="テストLP">
+            <meta property="og:image" content="/og.png">
+        </head><body><section>
+            <img src="/hero1.png"><img src="/hero2.png"><img src="/hero3.png">
+        </section><p>本文テキストのサンプルです。</p></body></html>"""
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/":
+                return httpx.Response(200, text=html, headers={"content-type": "text/html; charset=utf-8"})
+            png = _png_bytes(pattern=request.url.path)
+            return httpx.Response(200, content=png, headers={"content-type": "image/png"})
+
+        real_client = httpx.AsyncClient
+
+        def client_factory(*args, **kwargs):
+            kwargs["transport"] = httpx.MockTransport(handler)
+            return real_client(*args, **kwargs)
+
+        monkeypatch.setattr(url_fetcher.httpx, "AsyncClient", client_factory)
+
+        page_data = await url_fetcher.fetch_page_data("https://lp.example.com/")
+
+        assert page_data.title == "テストLP"
+        assert [image.source for image in page_data.images] == ["ogp", "main", "main"]
+        assert page_data.og_image_data is not None
+        assert len(page_data.image_reports) == 4
+
+
+class _GatedStream(httpx.AsyncByteStream):
+    """head送出後、ゲートが開くまで本文の送出を待つストリーム"""
+
+    def __init__(self, head: bytes, body: bytes, gate: asyncio.Event):
+        self.head = head
+        self.body = body
+        self.gate = gate
+
+    async def __aiter__(self):
+        yield self.head
+        await asyncio.wait_for(self.gate.wait(), timeout=2)
+        yield self.body
+
+
+class TestStreamingPageFetch:
+    """LP HTMLのストリーミング取得テスト"""
+
+    async def test_starts_ogp_image_before_body_arrives(self):
+        """</head>受信時点でOGP画像の取得が始まることを確認"""
+        png = _png_bytes()
+        body_gate = asyncio.Event()
+        head = b'<html><head><meta property="og:image" content="/og.png"></head>'
+        body = "<body><p>本文のテキストが後から届きます。</p></body></html>".encode("utf-8")
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/head-first":
+                return httpx.Response(
+                    200, stream=_GatedStream(head, body, body_gate),
+                    headers={"content-type": "text/html; charset=utf-8"},
+                )
+            # OGP画像のリクエストが届いたら本文の送出を再開
+            body_gate.set()
+            return httpx.Response(200, content=png, headers={"content-type": "image/png"})
+
+        async with _mock_client(handler) as client:
+            page_data = await url_fetcher.fetch_page_data("https://lp.example.com/head-first", client=client)
+
+        assert [image.source for image in page_data.images] == ["ogp"]
+        assert "本文のテキスト" in page_data.page_text
+        assert page_data.truncated is False
+
+    async def test_truncates_at_byte_cap(self, monkeypatch):
+        """上限バイト数で受信を打ち切り、打ち切りを結果に記録することを確認"""
+        monkeypatch.setattr(url_fetcher, "PAGE_MAX_BYTES", 4096)
+        filler = "<p>" + "長いLPの本文です。" * 20 + "</p>"
+        stream = _CountingStream([(filler * 5).encode("utf-8")] * 50)
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, stream=stream, headers={"content-type": "text/html; charset=utf-8"})
+
+        async with _mock_client(handler) as client:
+            page_data = await url_fetcher.fetch_page_data("https://lp.example.com/huge", client=client)
+
+        assert page_data.truncated is True
+        assert page_data.html_bytes == 4096
+        assert stream.sent == 2
+        assert "長いLPの本文です。" in page_data.page_text
+
+
+class TestImageStoreReuse:
+    """画像ストアによる再利用のテスト"""
+
+    async def test_revalidated_image_skips_transfer(self, isolated_image_store):
+        """2回目は条件付きGETの304で保存済みの最適化結果を再利用することを確認"""
+        png = _png_bytes(64, 48)
+        statuses = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if request.headers.get("if-none-match") == '"img-v1"':
+                statuses.append(304)
+                return httpx.Response(304, headers={"etag": '"img-v1"'})
+            statuses.append(200)
+            return httpx.Response(200, content=png, headers={"content-type": "image/png", "etag": '"img-v1"'})
+
+        async with _mock_client(handler) as client:
+            first, _ = await _fetch_image(client, "https://cdn.example.com/hero.png")
+            second, _ = await _fetch_image(client, "https://cdn.example.com/hero.png")
+
+        assert statuses == [200, 304]
+        assert first.store_hit is None
+        assert second.store_hit == "revalidated"
+        assert (second.image.width, second.image.height) == (64, 48)
+        assert second.image.b64 == first.image.base64()
+
+    async def test_same_content_at_new_url_skips_optimization(self, isolated_image_store, monkeypatch):
+        """URLが異なっても同一内容なら最適化処理を省略することを確認"""
+        png = _png_bytes()
+        calls = []
+        original_optimize = url_fetcher.optimize_image
+
+        def counting_optimize(*args, **kwargs):
+            calls.append(1)
+            return original_optimize(*args, **kwargs)
+
+        monkeypatch.setattr(url_fetcher, "optimize_image", counting_optimize)
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, content=png, headers={"content-type": "image/png"})
+
+        async with _mock_client(handler) as client:
+            await _fetch_image(client, "https://cdn.example.com/a.png")
+            fetched, _ = await _fetch_image(client, "https://cdn.example.com/b.png?v=2")
+
+        assert len(calls) == 1
+        assert fetched.store_hit == "content"